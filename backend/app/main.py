@@ -1,16 +1,94 @@
-import os
-from dotenv import load_dotenv
+import asyncio
+import json
+import logging
+import math
+import zlib
+from contextlib import asynccontextmanager
 
-# Load environment variables at the very beginning
-load_dotenv()
+# Reads the environment (and .env) before any service module does
+from app.settings import settings
 
-from fastapi import FastAPI, File, Header, HTTPException, UploadFile
+from fastapi import FastAPI, File, Header, HTTPException, Query, Request, UploadFile
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional
-from app.services import openai_service, translate_service, file_parser, history_service
+from app.services import admission, compression, db, incremental, openai_service, translate_service, file_parser, history_cache, history_export, history_service, summary_cache, job_queue, metrics, response_encoding
 
-app = FastAPI(title="Transcript Summarizer API")
+logger = logging.getLogger(__name__)
+
+
+def _preload() -> None:
+    """Import the client SDKs this configuration will use, which the services
+    otherwise import on first use. Under gunicorn --preload this runs once in
+    the master and workers are forked with them loaded. Only imports: clients,
+    pools and threads must not cross the fork and are built per worker in
+    _warm_up. openai needs no preloading: the LLM services import it with
+    the app, since its exception types are what admission retries on."""
+    if history_service.BACKEND == "mongo" and db.is_configured():
+        db.client_class()
+    if settings.translate_warm_languages:
+        translate_service.translator_class()
+
+
+_preload()
+
+
+async def _warm_mongo() -> None:
+    await db.ping()
+    await history_service.ensure_indexes()
+
+
+async def _warm_up() -> None:
+    """Build and connect clients before the worker takes traffic. Failures are
+    logged rather than fatal; the clients are retried lazily on first use."""
+    steps = {}
+    if settings.translate_warm_languages:
+        # Builds translators, which may block or reject a language code
+        steps["translate"] = asyncio.to_thread(translate_service.warm_up, settings.translate_warm_languages)
+    if history_service.get_store() is not None:
+        steps["sqlite"] = history_service.ensure_indexes()
+    elif db.is_configured():
+        steps["mongo"] = _warm_mongo()
+    if openai_service.is_configured():
+        steps["llm"] = openai_service.warm_up()
+    results = await asyncio.gather(
+        *(asyncio.wait_for(step, settings.startup_warmup_timeout) for step in steps.values()),
+        return_exceptions=True,
+    )
+    for name, result in zip(steps, results):
+        if isinstance(result, BaseException):
+            logger.warning("%s warm-up failed: %r", name, result)
+
+
+async def _shutdown() -> None:
+    """Let queued batch work finish, then close every pool this worker owns.
+    In-flight HTTP requests have already been drained by the server by now."""
+    await job_queue.shutdown(settings.shutdown_drain_timeout)
+    await history_service.stop_compaction()
+    await admission.close()
+    await openai_service.close()
+    translate_service.close()
+    file_parser.close()
+    await history_service.close_store()
+    await history_cache.cache.close()
+    db.close()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await _warm_up()
+    if history_service.get_store() is not None or db.is_configured():
+        history_service.start_compaction()
+    app.state.ready = True
+    try:
+        yield
+    finally:
+        app.state.ready = False
+        await _shutdown()
+
+
+app = FastAPI(title="Transcript Summarizer API", lifespan=lifespan, default_response_class=response_encoding.JSONResponse)
 
 # CORS setup
 app.add_middleware(
@@ -20,23 +98,63 @@ app.add_middleware(
         "https://calm-tree-002b26003.1.azurestaticapps.net",
         "https://calm-tree-002b26003.azurestaticapps.net",
         "https://green-wave-035404f03.6.azurestaticapps.net",
-        os.environ.get("FRONTEND_URL", "").rstrip("/"),
+        settings.frontend_url,
     ],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(response_encoding.CompressionMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
+
+metrics.register_stats("summary_cache", summary_cache.stats)
+metrics.register_stats("translation_cache", translate_service.cache.stats)
+metrics.register_stats("batch_queue", job_queue.stats)
+metrics.register_stats("admission", admission.stats)
+metrics.register_stats("summary_flights", openai_service.flights.stats)
+metrics.register_stats("translation_flights", translate_service.flights.stats)
+metrics.register_stats("incremental", incremental.stats)
+metrics.register_stats("history_cache", history_cache.cache.stats)
+metrics.register_stats("response_compression", response_encoding.stats)
+
+class SummaryVariant(BaseModel):
+    summary_type: Optional[str] = "brief"
+    style: Optional[str] = "paragraph"
+    tonality: Optional[str] = "professional"
+
+class CompressionOptions(BaseModel):
+    max_tokens: Optional[int] = Field(None, gt=0)  # Token budget for the transcript
+    ratio: Optional[float] = Field(None, gt=0, le=1)  # Or a fraction of its size; COMPRESSION_DEFAULT_RATIO if neither
 
 class SummarizeRequest(BaseModel):
     text: str
     summary_type: Optional[str] = "brief"
     style: Optional[str] = "paragraph"
     tonality: Optional[str] = "professional"
+    bypass_cache: bool = False
+    variants: Optional[list[SummaryVariant]] = None  # Several summaries of the same text in one call
+    compression: Optional[CompressionOptions] = None  # Trim filler sentences before summarizing
+    incremental: bool = False  # Build on the device's closest earlier history entry; needs X-Device-Id, not with variants
+
+class BatchItem(BaseModel):
+    text: Optional[str] = None
+    summary_type: Optional[str] = "brief"
+    style: Optional[str] = "paragraph"
+    tonality: Optional[str] = "professional"
+
+class BatchSummarizeRequest(BaseModel):
+    items: list[BatchItem]
+    text: Optional[str] = None  # Shared text for items that don't carry their own
+    save_to_history: bool = False
 
 class TranslateRequest(BaseModel):
     text: str
     target_language: str
 
+class TranslateMultiRequest(BaseModel):
+    text: str
+    target_languages: list[str]
+
 class SaveHistoryRequest(BaseModel):
     input_text: str
     summary: str
@@ -45,23 +163,258 @@ class SaveHistoryRequest(BaseModel):
     style: Optional[str] = "paragraph"
     tonality: Optional[str] = "professional"
     language: Optional[str] = "original"
+    parent_id: Optional[str] = None  # incremental.parent_id of the summarize response, if any
+
+def _variants(request: SummarizeRequest) -> list[dict] | None:
+    if request.variants is None:
+        return None
+    if not request.variants:
+        raise HTTPException(status_code=400, detail="variants must not be empty")
+    if len(request.variants) > settings.summarize_max_variants:
+        raise HTTPException(status_code=400, detail=f"At most {settings.summarize_max_variants} variants per request")
+    return [variant.model_dump() for variant in request.variants]
+
+
+def _admit(http_request: Request, x_device_id: Optional[str]) -> None:
+    """Queue this request's LLM calls under its device (or client address) and
+    shed it now, before any response starts, if that queue is already full."""
+    client = http_request.client
+    admission.client_key.set(x_device_id or (client.host if client else "anonymous"))
+    try:
+        admission.check()
+    except admission.Overloaded as e:
+        raise _llm_http_error(e, "summarize")
+
+
+def _retry_after_header(seconds: float | None) -> dict:
+    return {"Retry-After": str(max(1, math.ceil(seconds or 0)))}
+
+
+def _llm_http_error(e: Exception, action: str) -> HTTPException:
+    """429/503 with Retry-After when the call was shed or the provider kept
+    rate limiting it, logged as a warning; anything else is a 500, logged
+    with its traceback. Call from the except block handling e."""
+    if isinstance(e, admission.Overloaded):
+        logger.warning("%s shed: %s", action, e)
+        return HTTPException(status_code=e.status, detail=str(e), headers=_retry_after_header(e.retry_after))
+    if admission.is_rate_limit(e):
+        logger.warning("%s rate limited: %s", action, e)
+        return HTTPException(
+            status_code=429,
+            detail="The summarization provider is rate limiting requests",
+            headers=_retry_after_header(admission.retry_after(e)),
+        )
+    logger.exception("%s failed", action)
+    return HTTPException(status_code=500, detail=str(e))
+
+
+async def _compress(request: SummarizeRequest) -> tuple[str, dict | None]:
+    """The text to summarize and, when compression was requested, its token report."""
+    if request.compression is None:
+        return request.text, None
+    with metrics.stage("compress"):
+        # CPU-bound; keep the event loop free for other requests
+        result = await asyncio.to_thread(
+            compression.compress, request.text, request.compression.max_tokens, request.compression.ratio
+        )
+    return result.text, result.report()
+
+
+def _with_compression(body: dict, report: dict | None) -> dict:
+    return {**body, "compression": report} if report is not None else body
+
+
+async def _incremental_plan(request: SummarizeRequest, x_device_id: Optional[str]) -> incremental.Plan | None:
+    """How to summarize request.text from the device's closest earlier history
+    entry, if incremental mode was asked for and it would save tokens."""
+    if not request.incremental or not x_device_id or request.variants is not None:
+        return None
+    try:
+        previous = await history_service.find_predecessor(
+            x_device_id, request.text, request.summary_type, request.style, request.tonality
+        )
+    except Exception:
+        logger.warning("looking up the previous history entry failed", exc_info=True)
+        return None
+    return incremental.plan(previous, request.text) if previous else None
+
+
+def _with_incremental(body: dict, request: SummarizeRequest, plan: incremental.Plan | None) -> dict:
+    """Tokens saved (or null when the transcript was summarized in full) for incremental requests."""
+    return {**body, "incremental": plan.report() if plan else None} if request.incremental else body
+
 
 @app.post("/summarize")
-async def summarize_text(request: SummarizeRequest):
+async def summarize_text(
+    request: SummarizeRequest,
+    http_request: Request,
+    x_device_id: Optional[str] = Header(None, alias="X-Device-Id"),
+):
+    """Summarize text; with `variants`, returns every requested summary in request order."""
+    _admit(http_request, x_device_id)
+    variants = _variants(request)
+    plan = await _incremental_plan(request, x_device_id)
+    # The changes sent incrementally are short already
+    text, compression_report = await _compress(request) if plan is None else (request.text, None)
+    if variants is not None:
+        results: list[dict | None] = [None] * len(variants)
+        try:
+            async for index, result in openai_service.summarize_variants(text, variants, request.bypass_cache):
+                results[index] = result
+        except Exception as e:
+            raise _llm_http_error(e, "summarize variants")
+        return _with_compression({"variants": results}, compression_report)
+
     try:
         summary = await openai_service.summarize(
-            text=request.text,
+            text=text,
             summary_type=request.summary_type,
             style=request.style,
-            tonality=request.tonality
+            tonality=request.tonality,
+            bypass_cache=request.bypass_cache,
+            plan=plan,
         )
-        return {
+        return _with_incremental(_with_compression({
             "summary": summary,
             "summary_type": request.summary_type,
             "style": request.style
-        }
+        }, compression_report), request, plan)
     except Exception as e:
-        return {"error": str(e)}, 500
+        raise _llm_http_error(e, "summarize")
+
+def _sse(data: dict, event: str | None = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
+@app.post("/summarize/stream")
+async def summarize_text_stream(
+    request: SummarizeRequest,
+    http_request: Request,
+    x_device_id: Optional[str] = Header(None, alias="X-Device-Id"),
+):
+    """Stream the summary as server-sent events: `delta` chunks, then `done` or `error`.
+    With `variants`, each finished summary is sent as a `variant` event instead."""
+    _admit(http_request, x_device_id)
+    variants = _variants(request)
+    plan = await _incremental_plan(request, x_device_id)
+    text, compression_report = await _compress(request) if plan is None else (request.text, None)
+    if variants is not None:
+        return _stream_variants(text, variants, request.bypass_cache, compression_report, http_request)
+
+    deltas = openai_service.summarize_stream(
+        text=text,
+        summary_type=request.summary_type,
+        style=request.style,
+        tonality=request.tonality,
+        bypass_cache=request.bypass_cache,
+        plan=plan,
+    )
+
+    async def events():
+        try:
+            async for delta in deltas:
+                # Stop pulling from the model as soon as the client goes away
+                if await http_request.is_disconnected():
+                    return
+                yield _sse({"delta": delta})
+            done = {"summary_type": request.summary_type, "style": request.style}
+            yield _sse(_with_incremental(_with_compression(done, compression_report), request, plan), event="done")
+        except Exception as e:
+            logger.exception("summary stream failed")
+            yield _sse({"error": str(e)}, event="error")
+        finally:
+            await deltas.aclose()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _stream_variants(
+    text: str,
+    variants: list[dict],
+    bypass_cache: bool,
+    compression_report: dict | None,
+    http_request: Request,
+) -> StreamingResponse:
+    results = openai_service.summarize_variants(text, variants, bypass_cache)
+
+    async def events():
+        try:
+            async for index, result in results:
+                if await http_request.is_disconnected():
+                    return
+                yield _sse({"index": index, **result}, event="variant")
+            yield _sse(_with_compression({"total": len(variants)}, compression_report), event="done")
+        except Exception as e:
+            logger.exception("summary variants stream failed")
+            yield _sse({"error": str(e)}, event="error")
+        finally:
+            await results.aclose()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/batch/summarize", status_code=202)
+async def submit_batch(
+    request: BatchSummarizeRequest,
+    x_device_id: Optional[str] = Header(None, alias="X-Device-Id"),
+):
+    """Queue many summaries (many texts, or many option combinations for one text)."""
+    if not request.items:
+        raise HTTPException(status_code=400, detail="At least one item is required")
+    if len(request.items) > settings.batch_max_items:
+        raise HTTPException(status_code=400, detail=f"A batch may contain at most {settings.batch_max_items} items")
+    if request.save_to_history and not x_device_id:
+        raise HTTPException(status_code=400, detail="X-Device-Id header is required to save to history")
+
+    items = []
+    for item in request.items:
+        text = item.text if item.text is not None else request.text
+        if not text:
+            raise HTTPException(status_code=400, detail="Every item needs text (or a shared batch text)")
+        items.append({**item.model_dump(), "text": text})
+
+    job = job_queue.get_queue().submit(
+        job_queue.Job(items, device_id=x_device_id, save_to_history=request.save_to_history)
+    )
+    return job.progress()
+
+
+@app.get("/batch/{job_id}")
+async def get_batch(job_id: str):
+    """Progress and (partial) results of a batch job."""
+    job = job_queue.get_queue().get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+
+@app.get("/batch/{job_id}/stream")
+async def stream_batch(job_id: str):
+    """Stream batch results as server-sent events as each item completes."""
+    job = job_queue.get_queue().get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def events():
+        async for result in job.events():
+            yield _sse(result, event="result")
+        yield _sse(job.progress(), event="done")
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 
 @app.post("/translate")
 async def translate_text(request: TranslateRequest):
@@ -75,21 +428,48 @@ async def translate_text(request: TranslateRequest):
             "target_language": request.target_language
         }
     except Exception as e:
-        return {"error": str(e)}, 500
+        logger.exception("translate failed")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/translate/multi")
+async def translate_text_multi(request: TranslateMultiRequest):
+    """Translate one text into several target languages in parallel."""
+    if not request.target_languages:
+        raise HTTPException(status_code=400, detail="At least one target language is required")
+    try:
+        translations = await translate_service.translate_many(
+            text=request.text,
+            target_languages=request.target_languages
+        )
+        return {"translations": translations}
+    except Exception as e:
+        logger.exception("multi-language translate failed")
+        raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/upload")
 async def upload_file(file: UploadFile = File(...)):
     try:
         text = await file_parser.parse_file(file)
-        return {"text": text}
+        # The whole transcript comes back; skip FastAPI's walk over it
+        return response_encoding.JSONResponse({"text": text})
     except HTTPException:
         raise
     except Exception as e:
-        return {"error": str(e)}, 500
+        logger.exception("upload failed")
+        raise HTTPException(status_code=500, detail=str(e))
 
 
 # ── History endpoints ────────────────────────────────────────────────────────
 
+def _cached_response(entry: history_cache.Entry, if_none_match: Optional[str]) -> Response:
+    """A cached history body, or 304 with no body if the client already has it.
+    no-cache lets clients keep the body but makes them revalidate every time."""
+    headers = {"ETag": entry.etag, "Cache-Control": "private, no-cache", "Vary": "X-Device-Id"}
+    if history_cache.cache.matches(if_none_match, entry):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
 @app.post("/history")
 async def save_history(
     request: SaveHistoryRequest,
@@ -100,37 +480,139 @@ async def save_history(
         raise HTTPException(status_code=400, detail="X-Device-Id header is required")
     try:
         saved = await history_service.upsert_summary(x_device_id, request.model_dump())
-        return saved
+        return response_encoding.JSONResponse(saved)
     except Exception as e:
+        logger.exception("saving history failed")
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/history")
 async def get_history(
     x_device_id: str = Header(..., alias="X-Device-Id"),
-    skip: int = 0,
-    limit: int = 10,
+    cursor: Optional[str] = None,
+    limit: int = Query(10, ge=1, le=settings.history_page_max),
+    if_none_match: Optional[str] = Header(None),
+):
+    """Get a page of summary list items for the current device, newest first.
+    Pass the returned next_cursor to fetch the following page."""
+    if not x_device_id:
+        raise HTTPException(status_code=400, detail="X-Device-Id header is required")
+    try:
+        entry = await history_cache.cache.history(
+            x_device_id, cursor, limit,
+            lambda: history_service.get_history(x_device_id, cursor=cursor, limit=limit),
+        )
+    except history_service.InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.exception("loading history failed")
+        raise HTTPException(status_code=500, detail=str(e))
+    return _cached_response(entry, if_none_match)
+
+
+@app.get("/history/search")
+async def search_history(
+    q: str = Query(..., min_length=1, max_length=200),
+    x_device_id: str = Header(..., alias="X-Device-Id"),
+    cursor: Optional[str] = None,
+    limit: int = Query(10, ge=1, le=settings.history_page_max),
+):
+    """Search the device's history by title, summary and translation, best
+    match first. Each item has a snippet with highlight offsets."""
+    if not x_device_id:
+        raise HTTPException(status_code=400, detail="X-Device-Id header is required")
+    try:
+        page = await history_service.search_history(x_device_id, q, cursor=cursor, limit=limit)
+    except history_service.InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.exception("searching history failed")
+        raise HTTPException(status_code=500, detail=str(e))
+    return response_encoding.JSONResponse(page)
+
+
+_EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+
+
+@app.get("/history/export")
+async def export_history(
+    x_device_id: str = Header(..., alias="X-Device-Id"),
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    gzip: bool = False,
 ):
-    """Get paginated summaries for the current device, newest first."""
+    """Download the device's whole history, oldest first, as NDJSON or CSV,
+    optionally gzip-compressed. Streamed batch by batch from one cursor."""
     if not x_device_id:
         raise HTTPException(status_code=400, detail="X-Device-Id header is required")
+    body = history_export.render(history_service.export_history(x_device_id), format)
+    if gzip:
+        body = history_export.gzipped(body)
     try:
-        result = await history_service.get_history(x_device_id, skip=skip, limit=limit)
-        return result
+        # Pull the first chunk here so an unreachable database is a 500, not a truncated 200
+        first = await anext(body, b"")
     except Exception as e:
+        logger.exception("exporting history failed")
         raise HTTPException(status_code=500, detail=str(e))
 
+    async def chunks():
+        yield first
+        try:
+            async for chunk in body:
+                yield chunk
+        except Exception:
+            # Headers are already sent; the client sees a truncated download
+            logger.exception("exporting history failed mid-stream")
+        finally:
+            await body.aclose()
+
+    filename = f"history.{format}" + (".gz" if gzip else "")
+    return StreamingResponse(
+        chunks(),
+        media_type="application/gzip" if gzip else _EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@app.post("/history/import")
+async def import_history(
+    http_request: Request,
+    x_device_id: str = Header(..., alias="X-Device-Id"),
+    content_encoding: Optional[str] = Header(None),
+):
+    """Import NDJSON as written by /history/export (optionally sent with
+    Content-Encoding: gzip), upserting by input_text like POST /history.
+    Lines are applied in order; invalid ones are skipped and reported."""
+    if not x_device_id:
+        raise HTTPException(status_code=400, detail="X-Device-Id header is required")
+    if content_encoding not in (None, "identity", "gzip"):
+        raise HTTPException(status_code=415, detail=f"Unsupported Content-Encoding: {content_encoding}")
+    errors: list[dict] = []
+    items = history_export.parse_ndjson(
+        http_request.stream(), errors, gzip=content_encoding == "gzip", max_errors=settings.history_import_max_errors
+    )
+    try:
+        result = await history_service.import_history(x_device_id, items)
+    except zlib.error as e:
+        raise HTTPException(status_code=400, detail=f"Invalid gzip body: {e}")
+    except Exception as e:
+        logger.exception("importing history failed")
+        raise HTTPException(status_code=500, detail=str(e))
+    return {**result, "errors": errors}
+
 
 @app.get("/history/{summary_id}")
 async def get_summary(
     summary_id: str,
     x_device_id: str = Header(..., alias="X-Device-Id"),
+    if_none_match: Optional[str] = Header(None),
 ):
     """Get a single summary by ID for the current device."""
-    item = await history_service.get_summary(x_device_id, summary_id)
-    if not item:
+    entry = await history_cache.cache.summary(
+        x_device_id, summary_id, lambda: history_service.get_summary(x_device_id, summary_id)
+    )
+    if entry is None:
         raise HTTPException(status_code=404, detail="Summary not found")
-    return item
+    return _cached_response(entry, if_none_match)
 
 
 @app.delete("/history/{summary_id}")
@@ -145,6 +627,55 @@ async def delete_summary(
     return {"deleted": True}
 
 
+@app.get("/cache/stats")
+async def cache_stats():
+    """Hit/miss/eviction counters for the summary and translation caches, and
+    how many concurrent identical requests shared one upstream call."""
+    return {
+        "summary": summary_cache.stats(),
+        "translation": translate_service.cache.stats(),
+        "coalescing": {
+            "summary": openai_service.flights.stats(),
+            "translation": translate_service.flights.stats(),
+        },
+        "history": history_cache.cache.stats(),
+    }
+
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Prometheus scrape endpoint; 404 when METRICS_ENABLED is off."""
+    if not metrics.ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    content, content_type = metrics.render()
+    return Response(content=content, media_type=content_type)
+
+
 @app.get("/health")
 async def health_check():
+    """Liveness: the process is up and serving."""
     return {"status": "ok"}
+
+
+@app.get("/ready")
+async def readiness_check(request: Request):
+    """Readiness: startup has finished, shutdown has not begun and the database answers."""
+    if not getattr(request.app.state, "ready", False):
+        return JSONResponse(status_code=503, content={"status": "not ready"})
+    store = history_service.get_store()
+    if store is not None:
+        try:
+            await asyncio.wait_for(store.ping(), settings.ready_check_timeout)
+        except Exception as e:
+            logger.warning("readiness ping failed: %r", e)
+            return JSONResponse(status_code=503, content={"status": "not ready", "checks": {"sqlite": "unavailable"}})
+        return {"status": "ready", "checks": {"sqlite": "ok"}}
+    checks = {"mongo": "disabled"}
+    if db.is_configured():
+        try:
+            await asyncio.wait_for(db.ping(), settings.ready_check_timeout)
+            checks["mongo"] = "ok"
+        except Exception as e:
+            logger.warning("readiness ping failed: %r", e)
+            return JSONResponse(status_code=503, content={"status": "not ready", "checks": {"mongo": "unavailable"}})
+    return {"status": "ready", "checks": checks}
@@ -0,0 +1,30 @@
+"""
+One-shot history migration: bring documents written by older versions to the
+current layout, then build the indexes. Run once per deploy, before starting
+the new workers, which only create indexes:
+
+    python -m app.migrate
+"""
+import asyncio
+import logging
+
+# Reads the environment (and .env) before any service module does
+import app.settings  # noqa: F401
+from app.services import db, history_service
+
+logger = logging.getLogger(__name__)
+
+
+async def main() -> None:
+    try:
+        await history_service.migrate()
+        await history_service.ensure_indexes()
+        logger.info("history migrated and indexed")
+    finally:
+        await history_service.close_store()
+        db.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
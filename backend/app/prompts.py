@@ -1,22 +1,20 @@
-def get_system_prompt(summary_type: str, style: str, tonality: str) -> str:
-    """
-    Constructs the system prompt based on summary type, style, and tonality.
-    """
-    
-    # Base instructions
-    prompt = f"You are a medical assistant helping a doctor summarize patient transcripts. "
-    
+_ROLE = "You are a medical assistant helping a doctor summarize patient transcripts. "
+_SAME_LANGUAGE = "IMPORTANT: Detect the language of the transcript and respond in that same language. Do not translate."
+
+
+def _variant_instructions(summary_type: str, style: str, tonality: str) -> str:
+    """The part of the prompt that depends on summary type, style, and tonality."""
     # 1. Summary Type logic
     if summary_type == "brief":
-        prompt += "Provide a very concise summary focusing on the most critical clinical information. "
+        prompt = "Provide a very concise summary focusing on the most critical clinical information. "
     elif summary_type == "detailed":
-        prompt += "Provide a comprehensive summary including background, symptoms, diagnosis, and plan. "
+        prompt = "Provide a comprehensive summary including background, symptoms, diagnosis, and plan. "
     elif summary_type == "key_points":
-        prompt += "Extract the main topics and key information points from the transcript. "
+        prompt = "Extract the main topics and key information points from the transcript. "
     elif summary_type == "action_points":
-        prompt += "Extract all actionable items as a to-do list (e.g., follow-ups, prescriptions, tests). "
+        prompt = "Extract all actionable items as a to-do list (e.g., follow-ups, prescriptions, tests). "
     else:
-        prompt += "Summarize the following transcript. "
+        prompt = "Summarize the following transcript. "
 
     # 2. Style logic
     if style == "bullets":
@@ -34,6 +32,68 @@ def get_system_prompt(summary_type: str, style: str, tonality: str) -> str:
     else:
         prompt += "Use a professional and formal medical tone. "
 
-    prompt += "\n\nIMPORTANT: Detect the language of the transcript and respond in that same language. Do not translate.\n\nTranscript to process:\n"
-    
     return prompt
+
+
+def get_prefix_prompt() -> str:
+    """
+    System prompt sent ahead of the transcript. It does not depend on the
+    requested summary, so the system prompt plus transcript form a prefix that
+    is identical across summary types and the provider's prompt cache can
+    reuse it; the variant is described afterwards by get_variant_prompt().
+    """
+    return (
+        _ROLE + "The next message is the transcript. The message after it says which summary to write."
+        f"\n\n{_SAME_LANGUAGE}"
+    )
+
+
+def get_notes_prefix_prompt() -> str:
+    """get_prefix_prompt() for long transcripts condensed into section notes."""
+    return (
+        _ROLE + "The transcript was too long to process at once, so the next message gives it as notes from its "
+        "consecutive sections; treat the notes as the full transcript. The message after it says which summary to write."
+        f"\n\n{_SAME_LANGUAGE}"
+    )
+
+
+def get_incremental_prefix_prompt() -> str:
+    """get_prefix_prompt() for a transcript that extends or edits one summarized before."""
+    return (
+        _ROLE + "The transcript was summarized before and has changed since, so the next message gives the earlier "
+        "summary followed by the passages that were removed or added. Treat the earlier summary, updated with those "
+        "changes, as the full transcript: drop anything that only came from a removed passage. "
+        "The message after it says which summary to write."
+        f"\n\n{_SAME_LANGUAGE}"
+    )
+
+
+def get_variant_prompt(summary_type: str, style: str, tonality: str) -> str:
+    """Instructions for one summary variant, sent after the transcript."""
+    return "Write a summary of the transcript above. " + _variant_instructions(summary_type, style, tonality).rstrip()
+
+
+def get_chunk_prompt() -> str:
+    """
+    Prompt for the map step of long-transcript summarization. It is deliberately
+    independent of summary type, style and tonality so section notes can be
+    cached and reused across all of them.
+    """
+    return (
+        "You are a medical assistant helping a doctor summarize patient transcripts. "
+        "The text below is one section of a longer transcript and may start or end mid-conversation. "
+        "Write dense notes capturing every clinically relevant fact in this section: symptoms, history, "
+        "findings, diagnoses, medications and doses, tests, decisions and follow-ups, and who said what "
+        "where it matters. Do not add information that is not in the section. "
+        "\n\nIMPORTANT: Write the notes in the same language as the transcript. Do not translate.\n\nSection to process:\n"
+    )
+
+
+def get_merge_prompt() -> str:
+    """Prompt for intermediate reduce steps when section notes are still too long."""
+    return (
+        "You are a medical assistant helping a doctor summarize patient transcripts. "
+        "Below are notes from consecutive sections of one transcript. Merge them into a single set of notes "
+        "in chronological order, removing repetition but keeping every clinically relevant detail. "
+        "\n\nIMPORTANT: Write the notes in the same language as the input. Do not translate.\n\nNotes to merge:\n"
+    )
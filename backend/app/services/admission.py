@@ -0,0 +1,408 @@
+"""
+Admission control in front of the LLM provider.
+
+Every backend call first takes one request and its estimated tokens from a
+pair of token buckets sized to the provider's requests-per-minute and
+tokens-per-minute limits. Callers that have to wait are queued per client
+(X-Device-Id) and admitted round-robin, so one device submitting a burst
+cannot starve everyone else. The buckets follow the provider's
+x-ratelimit-* response headers, and a 429 pauses admission for its
+Retry-After before the call is retried with jittered backoff. Connection
+errors and 5xx responses are retried with the same backoff, without the
+pause. The SDK's own retries are off, so every attempt goes through
+admission and is counted against the buckets.
+
+When the queue is too deep, or the wait would exceed ADMISSION_MAX_WAIT,
+calls fail fast with Overloaded, which the API turns into 429/503 with a
+Retry-After header.
+"""
+import asyncio
+import contextvars
+import random
+import re
+import time
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, TypeVar
+
+import httpx
+import openai
+from app.services import chunking
+from app.settings import settings
+
+# Provider limits for this worker. 0 means unknown: admission is unlimited until
+# a response carries x-ratelimit-limit-* headers.
+RPM_LIMIT = settings.llm_rpm_limit
+TPM_LIMIT = settings.llm_tpm_limit
+# Completion tokens count toward TPM too; reserved per call on top of the prompt.
+EXPECTED_OUTPUT_TOKENS = settings.admission_output_tokens
+MAX_QUEUE = settings.admission_max_queue
+MAX_QUEUE_PER_CLIENT = settings.admission_max_queue_per_client
+MAX_WAIT = settings.admission_max_wait
+MAX_RETRIES = settings.admission_max_retries
+BACKOFF_BASE = settings.admission_backoff_base
+BACKOFF_MAX = settings.admission_backoff_max
+
+# Who the current call is queued as; set per request by the API and per item by
+# the batch queue. Tasks spawned for variants and map steps inherit it.
+client_key: contextvars.ContextVar[str] = contextvars.ContextVar("admission_client_key", default="anonymous")
+
+T = TypeVar("T")
+
+# Retried like rate limits, but do not say anything about the provider's limits
+TRANSIENT_ERRORS = (openai.APIConnectionError, openai.InternalServerError)
+
+
+class Overloaded(Exception):
+    """The call was shed instead of queued. status is 429 when the client
+    itself has too much queued and 503 when the service as a whole does."""
+
+    def __init__(self, message: str, retry_after: float, status: int = 503):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.status = status
+
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_duration(value: str | None) -> float | None:
+    """Seconds from a rate-limit reset header: "20ms", "1s", "6m0s" or plain seconds."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def is_rate_limit(error: Exception) -> bool:
+    """Whether error is the provider's 429."""
+    return isinstance(error, openai.RateLimitError)
+
+
+def retry_after(error: Exception) -> float | None:
+    """The wait a provider error (or Overloaded) asked for, if any."""
+    if isinstance(error, Overloaded):
+        return error.retry_after
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return parse_duration(headers.get("x-ratelimit-reset-requests") or headers.get("x-ratelimit-reset-tokens"))
+
+
+def backoff(attempt: int, error: Exception, base: float, cap: float) -> float:
+    """Jittered exponential backoff that never undercuts the server's Retry-After."""
+    delay = min(cap, base * 2 ** attempt) * (0.5 + random.random() / 2)
+    return max(retry_after(error) or 0.0, delay)
+
+
+class TokenBucket:
+    """Continuously refilling bucket holding up to one minute of a per-minute limit.
+    A per_minute of 0 is unlimited."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.level = per_minute
+        self._updated = time.monotonic()
+
+    @property
+    def limited(self) -> bool:
+        return self.capacity > 0
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / 60
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def time_until(self, amount: float, now: float) -> float:
+        """Seconds until the bucket holds amount."""
+        if not self.limited:
+            return 0.0
+        self._refill(now)
+        missing = amount - self.level
+        return missing / self.rate if missing > 0 else 0.0
+
+    def wait_time(self, amount: float, now: float) -> float:
+        # Calls larger than the whole bucket go through once it is full
+        return self.time_until(min(amount, self.capacity), now)
+
+    def take(self, amount: float, now: float) -> None:
+        if self.limited:
+            self._refill(now)
+            self.level -= amount
+
+    def sync(self, limit: float | None, remaining: float | None, now: float) -> None:
+        """Adopt the provider's view: its limit, and never more headroom than it reports."""
+        if limit and limit > 0:
+            if not self.limited:
+                self.level = limit
+            self.capacity = limit
+        if remaining is not None and self.limited:
+            self._refill(now)
+            self.level = min(self.level, remaining)
+
+
+class _Waiter:
+    __slots__ = ("tokens", "future")
+
+    def __init__(self, tokens: int, future: asyncio.Future):
+        self.tokens = tokens
+        self.future = future
+
+
+class AdmissionController:
+    """Per-worker scheduler admitting LLM calls against the request and token buckets."""
+
+    def __init__(self, rpm: float = RPM_LIMIT, tpm: float = TPM_LIMIT):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self._queues: OrderedDict[str, deque[_Waiter]] = OrderedDict()
+        self._queued = 0
+        self._queued_tokens = 0
+        self._paused_until = 0.0
+        self._wakeup = asyncio.Event()
+        self._dispatcher: asyncio.Task | None = None
+        self.counters = {"admitted": 0, "shed": 0, "rate_limited": 0, "retries": 0}
+        self.loop = asyncio.get_running_loop()
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "queued": self._queued,
+            "clients_waiting": len(self._queues),
+            "rpm_limit": self.requests.capacity,
+            "tpm_limit": self.tokens.capacity,
+        }
+
+    def _expected_wait(self, tokens: int) -> float:
+        """How long a call joining the back of the queue now would wait."""
+        now = time.monotonic()
+        return max(
+            self._paused_until - now,
+            self.requests.time_until(self._queued + 1, now),
+            self.tokens.time_until(self._queued_tokens + tokens, now),
+            0.0,
+        )
+
+    def check(self, key: str, tokens: int = 0) -> None:
+        """Raise Overloaded if a call for key would be shed right now."""
+        queue = self._queues.get(key)
+        if queue is not None and len(queue) >= MAX_QUEUE_PER_CLIENT:
+            self.counters["shed"] += 1
+            raise Overloaded("Too many summaries queued for this client", self._expected_wait(tokens), status=429)
+        if self._queued >= MAX_QUEUE:
+            self.counters["shed"] += 1
+            raise Overloaded("Summarization queue is full", self._expected_wait(tokens))
+        wait = self._expected_wait(tokens)
+        if wait > MAX_WAIT:
+            self.counters["shed"] += 1
+            raise Overloaded("Summarization is rate limited", wait)
+
+    async def acquire(self, key: str, tokens: int) -> None:
+        """Wait for this client's turn and room in both buckets, then take it."""
+        self.check(key, tokens)
+        waiter = _Waiter(tokens, self.loop.create_future())
+        self._queues.setdefault(key, deque()).append(waiter)
+        self._queued += 1
+        self._queued_tokens += tokens
+        self._wakeup.set()
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if not waiter.future.done() or waiter.future.cancelled():
+                self._forget(key, waiter)
+            raise
+
+    def _forget(self, key: str, waiter: _Waiter) -> None:
+        queue = self._queues.get(key)
+        if queue is None or waiter not in queue:
+            return
+        queue.remove(waiter)
+        if not queue:
+            del self._queues[key]
+        self._queued -= 1
+        self._queued_tokens -= waiter.tokens
+        self._wakeup.set()
+
+    async def _dispatch(self) -> None:
+        while True:
+            if not self._queues:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            key, queue = next(iter(self._queues.items()))
+            waiter = queue[0]
+            if waiter.future.done():
+                # Cancelled while queued; its task has not run _forget yet
+                self._forget(key, waiter)
+                continue
+            now = time.monotonic()
+            delay = max(
+                self._paused_until - now,
+                self.requests.wait_time(1, now),
+                self.tokens.wait_time(waiter.tokens, now),
+            )
+            if delay > 0:
+                # Woken early by new arrivals, cancellations and header updates.
+                # Not wait_for(): on 3.11 it can swallow a cancel that races the wakeup.
+                self._wakeup.clear()
+                timer = self.loop.call_later(delay, self._wakeup.set)
+                try:
+                    await self._wakeup.wait()
+                finally:
+                    timer.cancel()
+                continue
+
+            queue.popleft()
+            if queue:
+                self._queues.move_to_end(key)  # Round-robin between clients
+            else:
+                del self._queues[key]
+            self._queued -= 1
+            self._queued_tokens -= waiter.tokens
+            self.requests.take(1, now)
+            self.tokens.take(waiter.tokens, now)
+            self.counters["admitted"] += 1
+            waiter.future.set_result(None)
+
+    def pause(self, seconds: float) -> None:
+        """Hold all admissions for seconds, e.g. after a 429."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._wakeup.set()
+
+    def observe_headers(self, headers: httpx.Headers) -> None:
+        now = time.monotonic()
+        for bucket, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+            bucket.sync(
+                _number(headers.get(f"x-ratelimit-limit-{kind}")),
+                _number(headers.get(f"x-ratelimit-remaining-{kind}")),
+                now,
+            )
+        self._wakeup.set()
+
+    async def run(self, key: str, tokens: int, call: Callable[[], Awaitable[T]]) -> T:
+        """Admit, then run call, retrying rate-limit and transient errors with backoff."""
+        attempt = 0
+        while True:
+            await self.acquire(key, tokens)
+            try:
+                return await call()
+            except openai.RateLimitError as e:
+                if not self.on_rate_limited(attempt, e):
+                    raise
+            except TRANSIENT_ERRORS as e:
+                delay = self.on_transient(attempt, e)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+            attempt += 1
+
+    def on_rate_limited(self, attempt: int, error: Exception) -> bool:
+        """Pause admissions after a 429 and say whether the call should be retried."""
+        self.counters["rate_limited"] += 1
+        self.pause(backoff(attempt, error, BACKOFF_BASE, BACKOFF_MAX))
+        if attempt >= MAX_RETRIES:
+            return False
+        self.counters["retries"] += 1
+        return True
+
+    def on_transient(self, attempt: int, error: Exception) -> float | None:
+        """Seconds to wait before retrying after a connection error or 5xx, or None to give up."""
+        if attempt >= MAX_RETRIES:
+            return None
+        self.counters["retries"] += 1
+        return backoff(attempt, error, BACKOFF_BASE, BACKOFF_MAX)
+
+    async def close(self) -> None:
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            await asyncio.gather(self._dispatcher, return_exceptions=True)
+            self._dispatcher = None
+        for queue in self._queues.values():
+            for waiter in queue:
+                waiter.future.cancel()
+        self._queues.clear()
+        self._queued = self._queued_tokens = 0
+
+
+def _number(value: str | None) -> float | None:
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+_controller: AdmissionController | None = None
+
+
+def get_controller() -> AdmissionController:
+    """Return this worker's controller, rebuilding it if the event loop changed."""
+    global _controller
+    loop = asyncio.get_running_loop()
+    if _controller is None or _controller.loop is not loop:
+        _controller = AdmissionController()
+    return _controller
+
+
+def estimate_tokens(messages: list[dict]) -> int:
+    """Prompt tokens estimated from the messages, plus the expected completion."""
+    return sum(chunking.estimate_tokens(m.get("content") or "") for m in messages) + EXPECTED_OUTPUT_TOKENS
+
+
+def check() -> None:
+    """Shed the current client's request up front, before a response starts streaming."""
+    get_controller().check(client_key.get())
+
+
+async def run(messages: list[dict], call: Callable[[], Awaitable[T]]) -> T:
+    """Run one backend call for messages under admission control, as the current client."""
+    return await get_controller().run(client_key.get(), estimate_tokens(messages), call)
+
+
+async def acquire(messages: list[dict]) -> None:
+    """Admission without the retry loop, for streams that retry themselves."""
+    await get_controller().acquire(client_key.get(), estimate_tokens(messages))
+
+
+def rate_limited(attempt: int, error: Exception) -> bool:
+    return get_controller().on_rate_limited(attempt, error)
+
+
+def transient(attempt: int, error: Exception) -> float | None:
+    return get_controller().on_transient(attempt, error)
+
+
+async def observe_response(response: httpx.Response) -> None:
+    """httpx response hook feeding x-ratelimit-* headers into the buckets."""
+    headers = response.headers
+    if _controller is not None and (
+        "x-ratelimit-remaining-requests" in headers or "x-ratelimit-remaining-tokens" in headers
+    ):
+        _controller.observe_headers(headers)
+
+
+def stats() -> dict:
+    if _controller is None:
+        return {"admitted": 0, "shed": 0, "rate_limited": 0, "retries": 0, "queued": 0}
+    return _controller.stats()
+
+
+async def close() -> None:
+    global _controller
+    if _controller is not None and _controller.loop is asyncio.get_running_loop():
+        await _controller.close()
+    _controller = None
@@ -0,0 +1,68 @@
+import re
+
+# Rough size of an English token; good enough for budgeting without a tokenizer.
+CHARS_PER_TOKEN = 4
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def split_units(text: str, max_tokens: int) -> list[str]:
+    """
+    Break a transcript into the smallest pieces we are willing to cut between:
+    speaker turns (or lines), then sentences, then fixed-size slices as a last
+    resort for run-on text. Every unit fits within max_tokens.
+    """
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    units: list[str] = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if len(line) <= max_chars:
+            units.append(line)
+            continue
+        for sentence in _SENTENCE_END.split(line):
+            while len(sentence) > max_chars:
+                units.append(sentence[:max_chars])
+                sentence = sentence[max_chars:]
+            if sentence:
+                units.append(sentence)
+    return units
+
+
+def chunk_text(text: str, max_tokens: int, overlap_tokens: int = 0) -> list[str]:
+    """
+    Pack units greedily into chunks of at most max_tokens, repeating roughly
+    overlap_tokens of trailing context at the start of the next chunk.
+
+    Packing starts from the beginning of the text, so editing the end of a
+    transcript leaves the leading chunks byte-for-byte identical (and cacheable).
+    """
+    chunks: list[str] = []
+    current: list[str] = []
+    current_tokens = 0
+    for unit in split_units(text, max_tokens):
+        unit_tokens = estimate_tokens(unit) + 1
+        if current and current_tokens + unit_tokens > max_tokens:
+            chunks.append("\n".join(current))
+            # Carry trailing units over as overlap, newest first
+            carried: list[str] = []
+            carried_tokens = 0
+            for previous in reversed(current):
+                previous_tokens = estimate_tokens(previous) + 1
+                if carried_tokens + previous_tokens > overlap_tokens:
+                    break
+                carried.insert(0, previous)
+                carried_tokens += previous_tokens
+            if carried_tokens + unit_tokens > max_tokens:
+                carried, carried_tokens = [], 0
+            current, current_tokens = carried, carried_tokens
+        current.append(unit)
+        current_tokens += unit_tokens
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
@@ -0,0 +1,232 @@
+"""
+Extractive pre-compression of transcripts before they are sent to the LLM.
+
+Sentences are scored with TextRank over their TF-IDF vectors and the best
+ones are kept, in their original order and under their speaker labels, until
+the token budget is spent. Disfluencies ("um", "uh") are stripped first,
+sentences with clinical content (medications, doses, measurements, symptoms)
+are kept ahead of everything else, and a short reply stays attached to the
+question it answers.
+
+TextRank runs on the sentence similarity graph S = X Xᵀ without building it:
+each power iteration is two sparse products computed with np.bincount, so
+the cost grows with the number of words rather than sentences squared.
+"""
+import os
+import re
+from dataclasses import dataclass
+
+import numpy as np
+
+from app.services import chunking
+
+DEFAULT_RATIO = float(os.getenv("COMPRESSION_DEFAULT_RATIO", "0.5"))
+# Transcripts at or below this size are sent as they are.
+MIN_TOKENS = int(os.getenv("COMPRESSION_MIN_TOKENS", "1000"))
+DAMPING = 0.85
+ITERATIONS = 30
+
+_SPEAKER = re.compile(r"^\s*([A-Z][\w .'-]{0,30}):\s+")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_WORD = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+_DISFLUENCY = re.compile(r"\b(?:u+m+|u+h+|e+r+m+|h+m+|mm+-?hm+|uh-huh)\b[,.]?\s*", re.IGNORECASE)
+_CLINICAL = re.compile(
+    r"\b\d+(?:\.\d+)?\s*(?:mg|mcg|g|ml|l|mmhg|bpm|kg|lbs?|cm|mm|%|units?|times|days?|weeks?|months?|years?)\b"
+    r"|\b(?:pain|ache|fever|cough|bleed\w*|allerg\w*|medication\w*|medicine|dose\w*|dosage|prescri\w*|tablet\w*"
+    r"|pill\w*|inhaler|insulin|diagnos\w*|symptom\w*|blood|pressure|sugar|glucose|rash|swelling|nausea|vomit\w*"
+    r"|dizz\w*|breath\w*|chest|surgery|scan|x-ray|mri|test\w*|results?|referr\w*|follow-up|smok\w*|alcohol"
+    r"|pregnan\w*|infection|antibiotic\w*|headache\w*|migraine\w*)\b",
+    re.IGNORECASE,
+)
+_STOPWORDS = frozenset(
+    "a an and are as at be been but by can could did do does doing for from had has have he her him his how i "
+    "if in into is it its just me my no not now of oh ok okay on or our she so that the their them then there "
+    "these they this to too up us very was we well were what when where which who will with would yeah yes you "
+    "your right sure alright thanks thank hi hello good morning afternoon evening bye see got get go going "
+    "like know think mean really".split()
+)
+# Replies this short are kept or dropped together with the question before them
+_SHORT_REPLY_WORDS = 4
+
+
+@dataclass
+class Sentence:
+    line: int
+    speaker: str | None
+    text: str
+    tokens: int
+
+
+@dataclass
+class CompressionResult:
+    text: str
+    original_tokens: int
+    compressed_tokens: int
+
+    def report(self) -> dict:
+        saved = self.original_tokens - self.compressed_tokens
+        return {
+            "original_tokens": self.original_tokens,
+            "compressed_tokens": self.compressed_tokens,
+            "reduction": round(saved / self.original_tokens, 3) if self.original_tokens else 0.0,
+        }
+
+
+def split_sentences(text: str) -> list[Sentence]:
+    """Sentences with their line and speaker label, disfluencies removed."""
+    sentences = []
+    for line_number, line in enumerate(text.splitlines()):
+        match = _SPEAKER.match(line)
+        speaker = match.group(1) if match else None
+        body = line[match.end():] if match else line
+        for raw in _SENTENCE_END.split(body.strip()):
+            cleaned = _DISFLUENCY.sub("", raw).strip()
+            if cleaned:
+                cleaned = cleaned[0].upper() + cleaned[1:]
+                # Charged as if it opened its own turn, so the rendered text never exceeds the budget
+                rendered = f"{speaker}: {cleaned}" if speaker else cleaned
+                sentences.append(Sentence(line_number, speaker, cleaned, chunking.estimate_tokens(rendered) + 1))
+    return sentences
+
+
+def _term_matrix(sentences: list[Sentence]) -> tuple[np.ndarray, np.ndarray, np.ndarray, int]:
+    """Sparse sentence x term TF-IDF matrix as (rows, cols, values), rows L2-normalized."""
+    vocabulary: dict[str, int] = {}
+    rows: list[int] = []
+    cols: list[int] = []
+    for i, sentence in enumerate(sentences):
+        for word in _WORD.findall(sentence.text.lower()):
+            if word not in _STOPWORDS and len(word) > 1:
+                rows.append(i)
+                cols.append(vocabulary.setdefault(word, len(vocabulary)))
+    n, d = len(sentences), len(vocabulary)
+    if not rows:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, np.zeros(0), 0
+
+    # Collapse repeated words within a sentence into term counts
+    keys = np.asarray(rows, dtype=np.int64) * d + np.asarray(cols, dtype=np.int64)
+    keys, counts = np.unique(keys, return_counts=True)
+    rows, cols = keys // d, keys % d
+
+    document_frequency = np.bincount(cols, minlength=d)
+    idf = np.log((1 + n) / (1 + document_frequency)) + 1
+    values = (1 + np.log(counts)) * idf[cols]
+    norms = np.sqrt(np.bincount(rows, weights=values ** 2, minlength=n))
+    values /= norms[rows]
+    return rows, cols, values, d
+
+
+def textrank(sentences: list[Sentence]) -> np.ndarray:
+    """PageRank over cosine similarities between sentences. Sentences with no
+    content words score 0."""
+    n = len(sentences)
+    rows, cols, values, d = _term_matrix(sentences)
+    if d == 0:
+        return np.zeros(n)
+
+    has_terms = np.bincount(rows, minlength=n) > 0
+
+    def similarity_times(v: np.ndarray) -> np.ndarray:
+        # (X Xᵀ - I) v: each sentence's similarity to every other sentence
+        projected = np.bincount(cols, weights=values * v[rows], minlength=d)
+        result = np.bincount(rows, weights=values * projected[cols], minlength=n)
+        return result - v * has_terms
+
+    degree = similarity_times(np.ones(n))
+    connected = degree > 1e-12
+    if not connected.any():
+        # No two sentences share a word: every sentence with content ranks the same
+        return has_terms.astype(float)
+    inverse_degree = np.where(connected, 1 / np.where(connected, degree, 1), 0)
+    count = int(connected.sum())
+    rank = connected / count
+    for _ in range(ITERATIONS):
+        updated = (1 - DAMPING) / count * connected + DAMPING * similarity_times(rank * inverse_degree) * connected
+        if np.abs(updated - rank).sum() < 1e-6:
+            rank = updated
+            break
+        rank = updated
+    return rank
+
+
+def _units(sentences: list[Sentence]) -> list[list[int]]:
+    """Group each short reply with the question it answers."""
+    units: list[list[int]] = []
+    for i, sentence in enumerate(sentences):
+        previous = sentences[i - 1] if i else None
+        if (
+            previous is not None
+            and previous.text.endswith("?")
+            and previous.speaker != sentence.speaker
+            and len(sentence.text.split()) <= _SHORT_REPLY_WORDS
+        ):
+            units[-1].append(i)
+        else:
+            units.append([i])
+    return units
+
+
+def _render(sentences: list[Sentence], keep: list[int]) -> str:
+    """Kept sentences in transcript order, one line per speaker turn."""
+    lines: list[str] = []
+    current_line = None
+    for i in sorted(keep):
+        sentence = sentences[i]
+        if sentence.line != current_line:
+            current_line = sentence.line
+            prefix = f"{sentence.speaker}: " if sentence.speaker else ""
+            lines.append(prefix + sentence.text)
+        else:
+            lines[-1] += " " + sentence.text
+    return "\n".join(lines)
+
+
+def compress(text: str, max_tokens: int | None = None, ratio: float | None = None) -> CompressionResult:
+    """
+    Trim text to about max_tokens (or ratio of its estimated tokens, default
+    COMPRESSION_DEFAULT_RATIO). Text already within budget, or shorter than
+    COMPRESSION_MIN_TOKENS, is returned unchanged, and so is text that would
+    compress to nothing.
+    """
+    original_tokens = chunking.estimate_tokens(text)
+    if max_tokens is None:
+        max_tokens = int(original_tokens * (ratio if ratio is not None else DEFAULT_RATIO))
+    if original_tokens <= max(max_tokens, MIN_TOKENS):
+        return CompressionResult(text, original_tokens, original_tokens)
+
+    sentences = split_sentences(text)
+    scores = textrank(sentences)
+    if scores.max(initial=0) > 0:
+        scores = scores / scores.max()
+    clinical = np.fromiter((bool(_CLINICAL.search(s.text)) for s in sentences), dtype=bool, count=len(sentences))
+    # Clinical content outranks everything else; ties keep earlier sentences first
+    scores = scores + clinical
+
+    units = _units(sentences)
+    # Units are runs of consecutive sentences, so one reduceat scores them all
+    unit_scores = np.maximum.reduceat(scores, [unit[0] for unit in units])
+    keep: list[int] = []
+    used = 0
+    for u in np.argsort(-unit_scores, kind="stable"):
+        if unit_scores[u] <= 0:
+            break  # Nothing but filler left
+        unit_tokens = sum(sentences[i].tokens for i in units[u])
+        if used + unit_tokens > max_tokens:
+            continue
+        keep.extend(units[u])
+        used += unit_tokens
+    if not keep:
+        # All filler: fall back to the opening of the transcript
+        for i, sentence in enumerate(sentences):
+            if used + sentence.tokens > max_tokens:
+                break
+            keep.append(i)
+            used += sentence.tokens
+
+    compressed = _render(sentences, keep)
+    if not compressed.strip():
+        # Only disfluencies, or one sentence longer than the budget: an empty
+        # prompt would summarize nothing, so send the transcript as it is
+        return CompressionResult(text, original_tokens, original_tokens)
+    return CompressionResult(compressed, original_tokens, chunking.estimate_tokens(compressed))
@@ -1,23 +1,60 @@
 import os
-from motor.motor_asyncio import AsyncIOMotorClient
-from dotenv import load_dotenv
-import certifi
+from typing import TYPE_CHECKING
 
-load_dotenv()
+from app.settings import settings
 
-_client: AsyncIOMotorClient | None = None
+if TYPE_CHECKING:
+    from motor.motor_asyncio import AsyncIOMotorClient
 
+# Per-worker connection pool. minPoolSize keeps connections open between
+# bursts so requests don't pay for a fresh TLS handshake.
+MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "2"))
+SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
 
-def get_client() -> AsyncIOMotorClient:
+_client: "AsyncIOMotorClient | None" = None
+
+
+def client_class() -> type["AsyncIOMotorClient"]:
+    """motor's client, imported on first use: the SQLite backend and runs
+    without MONGODB_URI never load motor."""
+    from motor.motor_asyncio import AsyncIOMotorClient
+    return AsyncIOMotorClient
+
+
+def get_client() -> "AsyncIOMotorClient":
     global _client
     if _client is None:
-        uri = os.getenv("MONGODB_URI")
+        uri = settings.mongodb_uri
         if not uri:
             raise ValueError("MONGODB_URI environment variable is not set")
+        import certifi
         # Use certifi's bundle for SSL verification (common fix for Azure/Atlas)
-        _client = AsyncIOMotorClient(uri, tlsCAFile=certifi.where())
+        _client = client_class()(
+            uri,
+            tlsCAFile=certifi.where(),
+            maxPoolSize=MAX_POOL_SIZE,
+            minPoolSize=MIN_POOL_SIZE,
+            serverSelectionTimeoutMS=SERVER_SELECTION_TIMEOUT_MS,
+        )
     return _client
 
 
 def get_db():
     return get_client()["text_summarizer"]
+
+
+def is_configured() -> bool:
+    return bool(settings.mongodb_uri)
+
+
+async def ping() -> None:
+    """Round-trip to the server; opens the first pooled connection if needed."""
+    await get_client().admin.command("ping")
+
+
+def close() -> None:
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
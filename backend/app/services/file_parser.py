@@ -1,15 +1,344 @@
+import asyncio
+import codecs
+import io
+import json
+import os
+import re
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncIterator
+from xml.etree import ElementTree
 from fastapi import UploadFile, HTTPException
+from app.services import metrics
 
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+READ_CHUNK_BYTES = 256 * 1024
+PARSE_PROCESSES = int(os.getenv("PARSE_PROCESSES", "2"))
+
+TEXT_FORMATS = (".txt", ".vtt", ".srt")
+BINARY_FORMATS = (".docx", ".pdf", ".json")
+SUPPORTED_FORMATS = TEXT_FORMATS + BINARY_FORMATS
+
+_BOMS = (
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+_FALLBACK_ENCODING = "cp1252"
+
+_executor: ProcessPoolExecutor | None = None
+
+
+class ParseError(ValueError):
+    """The upload is in a supported format but its content could not be read."""
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=PARSE_PROCESSES)
+    return _executor
+
+
+def close() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def _extension(filename: str | None) -> str:
+    return os.path.splitext(filename or "")[1].lower()
+
+
+async def _read_chunks(file: UploadFile) -> AsyncIterator[bytes]:
+    """Yield the upload in fixed-size chunks, enforcing MAX_UPLOAD_BYTES."""
+    if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"File exceeds the {MAX_UPLOAD_BYTES} byte limit.")
+    total = 0
+    while True:
+        chunk = await file.read(READ_CHUNK_BYTES)
+        if not chunk:
+            return
+        total += len(chunk)
+        if total > MAX_UPLOAD_BYTES:
+            raise HTTPException(status_code=413, detail=f"File exceeds the {MAX_UPLOAD_BYTES} byte limit.")
+        yield chunk
+
+
+def _decoder_for(head: bytes) -> codecs.IncrementalDecoder:
+    """The decoder for a stream starting with head, chosen once, before any
+    byte is decoded. A BOM fixes the encoding, and invalid sequences in it
+    become replacement characters; without one the decoder is strict UTF-8,
+    so _decode_chunk can tell when to switch to cp1252."""
+    encoding = next((encoding for bom, encoding in _BOMS if head.startswith(bom)), None)
+    if encoding is None:
+        return codecs.getincrementaldecoder("utf-8")()
+    return codecs.getincrementaldecoder(encoding)(errors="replace")
+
+
+def _decode_chunk(decoder: codecs.IncrementalDecoder, data: bytes, final: bool = False) -> tuple[str, codecs.IncrementalDecoder]:
+    """data decoded, and the decoder to use from here on."""
+    try:
+        return decoder.decode(data, final), decoder
+    except UnicodeDecodeError as e:
+        # Only the BOM-less UTF-8 decoder raises. e.object includes bytes it had
+        # buffered from earlier chunks; what came before e.start was valid UTF-8.
+        fallback = codecs.getincrementaldecoder(_FALLBACK_ENCODING)(errors="replace")
+        return e.object[:e.start].decode("utf-8") + fallback.decode(e.object[e.start:], final), fallback
+
+
+async def _decode(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """
+    Incrementally decode a byte stream. A BOM selects UTF-8/16/32; otherwise
+    UTF-8 is assumed until an invalid sequence shows up, from which point on
+    the rest of the stream is read as cp1252.
+    """
+    decoder = None
+    head = b""
+    async for chunk in chunks:
+        if decoder is None:
+            # Buffer a few bytes so a BOM split across reads is still detected
+            head += chunk
+            if len(head) < 4:
+                continue
+            decoder = _decoder_for(head)
+            chunk, head = head, b""
+        text, decoder = _decode_chunk(decoder, chunk)
+        yield text
+    if decoder is None:
+        decoder = _decoder_for(head)
+        text, decoder = _decode_chunk(decoder, head)
+        yield text
+    text, _ = _decode_chunk(decoder, b"", final=True)
+    yield text
+
+
+_TO_SPACE = str.maketrans({"\t": " ", "\f": " ", "\v": " ", "\u00a0": " ", "\r": "\n"})
+
+
+def _normalize_block(block: str) -> str:
+    # Plain str methods run in C and are several times faster than re.sub here
+    block = block.replace("\r\n", "\n").translate(_TO_SPACE)
+    while "  " in block:
+        block = block.replace("  ", " ")
+    block = block.replace(" \n", "\n").replace("\n ", "\n").strip(" ")
+    while "\n\n\n" in block:
+        block = block.replace("\n\n\n", "\n\n")
+    return block
+
+
+class _Normalizer:
+    """
+    Normalize text fed in pieces: unify line endings, collapse inline
+    whitespace, trim lines and keep at most one blank line in a row. Pieces
+    are normalized in blocks ending on a line break, and newline runs spanning
+    blocks are carried over, so the result does not depend on where the text
+    was cut.
+    """
+
+    def __init__(self):
+        self.parts: list[str] = []
+        self.pending = ""
+        self.held_newlines = 0
+
+    def _emit(self, block: str) -> None:
+        block = _normalize_block(block)
+        body = block.strip("\n")
+        if not body:
+            self.held_newlines += len(block)
+            return
+        leading = len(block) - len(block.lstrip("\n"))
+        if self.parts:
+            self.parts.append("\n" * min(self.held_newlines + leading, 2))
+        self.parts.append(body)
+        self.held_newlines = len(block) - len(block.rstrip("\n"))
+
+    def feed(self, piece: str) -> None:
+        text = self.pending + piece
+        cut = text.rfind("\n")
+        if cut == -1:
+            self.pending = text
+            return
+        self._emit(text[:cut + 1])
+        self.pending = text[cut + 1:]
+
+    def result(self) -> str:
+        self._emit(self.pending)
+        self.pending = ""
+        return "".join(self.parts)
+
+
+def _normalize(text: str) -> str:
+    normalizer = _Normalizer()
+    normalizer.feed(text)
+    return normalizer.result()
+
+
+async def _normalized_text(pieces: AsyncIterator[str]) -> str:
+    normalizer = _Normalizer()
+    async for piece in pieces:
+        normalizer.feed(piece)
+    return normalizer.result()
+
+
+async def _split_lines(pieces: AsyncIterator[str]) -> AsyncIterator[str]:
+    """Re-chunk decoded text into lines, handling \\r\\n split across chunks."""
+    pending = ""
+    async for piece in pieces:
+        text = pending + piece
+        if text.endswith("\r"):
+            text, pending = text[:-1], "\r"
+        else:
+            pending = ""
+        lines = text.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+        pending = lines.pop() + pending
+        for line in lines:
+            yield line
+    if pending.strip("\r"):
+        yield pending.strip("\r")
+
+
+# ── Subtitle transcripts (.srt / .vtt) ───────────────────────────────────────
+
+_CUE_TIMING = re.compile(r"\d+:\d{2}[:.,]\d{2}.*-->")
+_VOICE_TAG = re.compile(r"<v(?:\.[^ >]*)?\s+([^>]+)>")
+_MARKUP_TAG = re.compile(r"</?[^>]+>")
+
+
+async def _subtitle_lines(lines: AsyncIterator[str]) -> AsyncIterator[str]:
+    """Drop headers, cue numbers and timings; keep spoken text and speaker labels, one per line."""
+    previous = None
+    skipping_block = False
+    async for line in lines:
+        stripped = line.strip()
+        if not stripped:
+            skipping_block = False
+            continue
+        if skipping_block or stripped.startswith("WEBVTT"):
+            continue
+        if stripped.startswith(("NOTE", "STYLE", "REGION")):
+            skipping_block = True
+            continue
+        if stripped.isdigit() or _CUE_TIMING.match(stripped):
+            continue
+        text = _VOICE_TAG.sub(lambda m: f"{m.group(1).strip()}: ", stripped)
+        text = _MARKUP_TAG.sub("", text).strip()
+        # Auto-generated captions often repeat the previous cue verbatim
+        if text and text != previous:
+            previous = text
+            yield text + "\n"
+
+
+# ── Heavy formats, parsed in a worker process ────────────────────────────────
+
+_WORD_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+def _parse_docx(data: bytes) -> str:
+    try:
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            # Guard against zip bombs before inflating the document body
+            if archive.getinfo("word/document.xml").file_size > MAX_UPLOAD_BYTES * 10:
+                raise ParseError("The .docx document body is too large.")
+            xml = archive.read("word/document.xml")
+    except (zipfile.BadZipFile, KeyError) as e:
+        raise ParseError(f"Not a valid .docx file: {e}")
+    paragraphs = []
+    for paragraph in ElementTree.fromstring(xml).iter(f"{_WORD_NS}p"):
+        parts = []
+        for node in paragraph.iter():
+            if node.tag == f"{_WORD_NS}t" and node.text:
+                parts.append(node.text)
+            elif node.tag == f"{_WORD_NS}tab":
+                parts.append("\t")
+            elif node.tag in (f"{_WORD_NS}br", f"{_WORD_NS}cr"):
+                parts.append("\n")
+        paragraphs.append("".join(parts))
+    return _normalize("\n".join(paragraphs))
+
+
+def _parse_pdf(data: bytes) -> str:
+    try:
+        from pypdf import PdfReader
+        from pypdf.errors import PdfReadError
+    except ImportError:
+        raise ParseError("PDF support requires the pypdf package.")
+    try:
+        reader = PdfReader(io.BytesIO(data))
+        pages = [page.extract_text() or "" for page in reader.pages]
+    except (PdfReadError, ValueError) as e:
+        raise ParseError(f"Not a valid .pdf file: {e}")
+    return _normalize("\n\n".join(pages))
+
+
+def _json_segments(payload) -> list[str]:
+    if isinstance(payload, str):
+        return [payload]
+    if isinstance(payload, list):
+        lines = []
+        for segment in payload:
+            if isinstance(segment, str):
+                lines.append(segment)
+            elif isinstance(segment, dict) and isinstance(segment.get("text"), str):
+                speaker = segment.get("speaker") or segment.get("role")
+                lines.append(f"{speaker}: {segment['text']}" if speaker else segment["text"])
+        return lines
+    if isinstance(payload, dict):
+        for key in ("text", "transcript", "content"):
+            if isinstance(payload.get(key), str):
+                return [payload[key]]
+        for key in ("segments", "utterances", "messages", "transcript"):
+            if isinstance(payload.get(key), list):
+                return _json_segments(payload[key])
+    return []
+
+
+def _parse_json(data: bytes) -> str:
+    try:
+        payload = json.loads(data)
+    except ValueError as e:
+        raise ParseError(f"Not a valid .json file: {e}")
+    lines = _json_segments(payload)
+    if not lines:
+        raise ParseError("JSON export has no recognizable transcript text.")
+    return _normalize("\n".join(lines))
+
+
+_BINARY_PARSERS = {".docx": _parse_docx, ".pdf": _parse_pdf, ".json": _parse_json}
+
+
+@metrics.timed("parse")
 async def parse_file(file: UploadFile) -> str:
     """
-    Reads a .txt file and returns its content as a string.
-    Only allows .txt files.
+    Reads an uploaded transcript and returns its text with normalized whitespace.
+    Supports .txt, .vtt/.srt subtitles, .docx, .pdf and .json exports. Uploads
+    are read in chunks and capped at MAX_UPLOAD_BYTES; heavy formats are parsed
+    in a process pool so they don't block the event loop.
     """
-    if not file.filename.endswith('.txt'):
-        raise HTTPException(status_code=400, detail="Only .txt files are supported currently.")
-    
+    extension = _extension(file.filename)
+    if extension not in SUPPORTED_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported file type. Supported formats: {', '.join(SUPPORTED_FORMATS)}.",
+        )
+
     try:
-        contents = await file.read()
-        return contents.decode('utf-8')
+        if extension == ".txt":
+            return await _normalized_text(_decode(_read_chunks(file)))
+        if extension in TEXT_FORMATS:
+            return await _normalized_text(_subtitle_lines(_split_lines(_decode(_read_chunks(file)))))
+
+        data = bytearray()
+        async for chunk in _read_chunks(file):
+            data += chunk
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_executor(), _BINARY_PARSERS[extension], bytes(data))
+    except HTTPException:
+        raise
+    except ParseError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error reading file: {str(e)}")
@@ -0,0 +1,274 @@
+"""
+Read-through cache for history reads: pages of GET /history and single
+entries of GET /history/{summary_id}, per device, stored as the rendered
+JSON body with its ETag so hits skip the database and serialization, and
+unchanged pages can be answered with 304.
+
+Writes through history_service invalidate precisely: every write retires
+the device's pages (any page may have shifted) and the one entry it touched;
+bulk writes, which do not report what they touched, retire all of the
+device's entries. Both work by bumping per-device counters that are part of
+the cache keys, so nothing has to be enumerated and fills that raced with a
+write are not stored.
+
+By default the cache is an in-process LRU per worker, so writes through
+other workers reach it only when entries expire after HISTORY_CACHE_TTL. With
+HISTORY_CACHE_REDIS_URL set, entries and counters live in a Redis-compatible
+server instead, shared by every worker, so a write through one worker is
+seen by all of them at once.
+"""
+import hashlib
+import logging
+import os
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+from app.services import response_encoding
+from app.services.cache import TTLCache
+from app.services.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+CACHE_SIZE = int(os.getenv("HISTORY_CACHE_SIZE", "4096"))
+CACHE_TTL = float(os.getenv("HISTORY_CACHE_TTL", "10"))
+REDIS_URL = os.getenv("HISTORY_CACHE_REDIS_URL", "")
+KEY_PREFIX = os.getenv("HISTORY_CACHE_KEY_PREFIX", "history")
+
+
+@dataclass(frozen=True, slots=True)
+class Entry:
+    body: bytes
+    etag: str
+
+
+def render(value) -> Entry:
+    """value as a JSON response body, rendered as the app renders it, with a strong ETag."""
+    body = response_encoding.dumps(value)
+    return Entry(body, f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"')
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Whether an If-None-Match header names etag (weak comparison, as RFC 9110 asks for)."""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in (tag.removeprefix("W/") for tag in tags)
+
+
+class _LocalTier:
+    def __init__(self, maxsize: int, ttl: float):
+        self.entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        # device_id -> [pages generation (also counts writes), entries epoch],
+        # least recently used first, for at most maxsize devices
+        self._versions: OrderedDict[str, list[int]] = OrderedDict()
+        self._maxsize = maxsize
+        # Devices without versions start here: at or past any version an
+        # evicted device had, so no key it was cached under comes back stale
+        self._floor = 0
+
+    async def versions(self, device_id: str) -> tuple[int, int]:
+        versions = self._versions.get(device_id)
+        if versions is None:
+            return self._floor, self._floor
+        self._versions.move_to_end(device_id)
+        return versions[0], versions[1]
+
+    async def get(self, key: str) -> Entry | None:
+        return self.entries.get(key)
+
+    async def set(self, key: str, entry: Entry) -> None:
+        self.entries.set(key, entry)
+
+    async def invalidate(self, device_id: str, item_key: Callable[[int], str] | None) -> None:
+        versions = self._versions.get(device_id)
+        if versions is None:
+            versions = self._versions[device_id] = [self._floor, self._floor]
+        self._versions.move_to_end(device_id)
+        versions[0] += 1
+        if item_key is None:
+            versions[1] += 1
+        else:
+            self.entries.pop(item_key(versions[1]))
+        while len(self._versions) > self._maxsize:
+            _, evicted = self._versions.popitem(last=False)
+            # The generation is never behind the epoch
+            self._floor = max(self._floor, evicted[0])
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self._versions.clear()
+        self._floor = 0
+
+    def stats(self) -> dict:
+        return {"backend": "local", **self.entries.stats(), "devices": len(self._versions)}
+
+
+class _RedisTier:
+    def __init__(self, url: str, ttl: float):
+        self._url = url
+        self._ttl = max(1, int(ttl))
+        self._client = None
+
+    def _connection(self):
+        if self._client is None:
+            try:
+                import redis.asyncio as redis
+            except ImportError:
+                raise RuntimeError("HISTORY_CACHE_REDIS_URL requires the redis package.")
+            self._client = redis.from_url(self._url)
+        return self._client
+
+    async def versions(self, device_id: str) -> tuple[int, int]:
+        generation, epoch = await self._connection().mget(f"{KEY_PREFIX}:{device_id}:gen", f"{KEY_PREFIX}:{device_id}:epoch")
+        return int(generation or 0), int(epoch or 0)
+
+    async def get(self, key: str) -> Entry | None:
+        value = await self._connection().get(key)
+        if value is None:
+            return None
+        etag, _, body = value.partition(b"\n")
+        return Entry(body, etag.decode("ascii"))
+
+    async def set(self, key: str, entry: Entry) -> None:
+        await self._connection().set(key, entry.etag.encode("ascii") + b"\n" + entry.body, ex=self._ttl)
+
+    async def invalidate(self, device_id: str, item_key: Callable[[int], str] | None) -> None:
+        client = self._connection()
+        await client.incr(f"{KEY_PREFIX}:{device_id}:gen")
+        if item_key is None:
+            await client.incr(f"{KEY_PREFIX}:{device_id}:epoch")
+        else:
+            epoch = await client.get(f"{KEY_PREFIX}:{device_id}:epoch")
+            await client.delete(item_key(int(epoch or 0)))
+
+    def clear(self) -> None:
+        """Entries in Redis are left to expire."""
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self) -> dict:
+        return {"backend": "redis"}
+
+
+class HistoryCache:
+    def __init__(self, maxsize: int = CACHE_SIZE, ttl: float = CACHE_TTL, redis_url: str = REDIS_URL):
+        self.tier = _RedisTier(redis_url, ttl) if redis_url else _LocalTier(maxsize, ttl)
+        # Concurrent misses for the same key share one database read
+        self.flights = SingleFlight()
+        self.hits = 0
+        self.misses = 0
+        self.stale_fills = 0
+        self.not_modified = 0
+        self.invalidations = 0
+        self.errors = 0
+
+    @staticmethod
+    def _page_key(device_id: str, generation: int, cursor: str | None, limit: int) -> str:
+        return f"{KEY_PREFIX}:{device_id}:p:{generation}:{limit}:{cursor or ''}"
+
+    @staticmethod
+    def _item_key(device_id: str, epoch: int, summary_id: str) -> str:
+        return f"{KEY_PREFIX}:{device_id}:i:{epoch}:{summary_id}"
+
+    def _unavailable(self) -> None:
+        # The shared tier is down; serve from the database meanwhile
+        self.errors += 1
+        logger.warning("history cache unavailable", exc_info=True)
+
+    @staticmethod
+    async def _uncached(load: Callable[[], Awaitable]) -> Entry | None:
+        value = await load()
+        return None if value is None else render(value)
+
+    async def _read(self, device_id: str, key: str, generation: int, load: Callable[[], Awaitable]) -> Entry | None:
+        try:
+            entry = await self.tier.get(key)
+        except Exception:
+            self._unavailable()
+            return await self._uncached(load)
+        if entry is not None:
+            self.hits += 1
+            return entry
+        self.misses += 1
+
+        async def fill() -> Entry | None:
+            entry = await self._uncached(load)
+            if entry is None:
+                return None
+            try:
+                # A write since the versions were read may not be reflected in value
+                if (await self.tier.versions(device_id))[0] == generation:
+                    await self.tier.set(key, entry)
+                else:
+                    self.stale_fills += 1
+            except Exception:
+                self._unavailable()
+            return entry
+
+        return await self.flights.do(key, fill)
+
+    async def _versions(self, device_id: str) -> tuple[int, int] | None:
+        try:
+            return await self.tier.versions(device_id)
+        except Exception:
+            self._unavailable()
+            return None
+
+    async def history(self, device_id: str, cursor: str | None, limit: int, load: Callable[[], Awaitable[dict]]) -> Entry:
+        """The rendered history page, from the cache or from load()."""
+        versions = await self._versions(device_id)
+        if versions is None:
+            return await self._uncached(load)
+        generation = versions[0]
+        return await self._read(device_id, self._page_key(device_id, generation, cursor, limit), generation, load)
+
+    async def summary(self, device_id: str, summary_id: str, load: Callable[[], Awaitable[dict | None]]) -> Entry | None:
+        """The rendered history entry, from the cache or from load(); None if load() finds none."""
+        versions = await self._versions(device_id)
+        if versions is None:
+            return await self._uncached(load)
+        generation, epoch = versions
+        return await self._read(device_id, self._item_key(device_id, epoch, summary_id), generation, load)
+
+    async def invalidate(self, device_id: str, summary_id: str | None = None) -> None:
+        """Retire the device's pages and the entry summary_id, or all its entries if None."""
+        self.invalidations += 1
+        item_key = None if summary_id is None else (lambda epoch: self._item_key(device_id, epoch, summary_id))
+        try:
+            await self.tier.invalidate(device_id, item_key)
+        except Exception:
+            self.errors += 1
+            logger.warning("history cache invalidation failed", exc_info=True)
+
+    def matches(self, if_none_match: str | None, entry: Entry) -> bool:
+        if etag_matches(if_none_match, entry.etag):
+            self.not_modified += 1
+            return True
+        return False
+
+    def stats(self) -> dict:
+        return {
+            **self.tier.stats(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale_fills": self.stale_fills,
+            "not_modified": self.not_modified,
+            "invalidations": self.invalidations,
+            "errors": self.errors,
+        }
+
+    def clear(self) -> None:
+        self.tier.clear()
+        self.flights.clear()
+        self.hits = self.misses = self.stale_fills = self.not_modified = self.invalidations = self.errors = 0
+
+    async def close(self) -> None:
+        if isinstance(self.tier, _RedisTier):
+            await self.tier.close()
+
+
+cache = HistoryCache()
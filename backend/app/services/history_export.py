@@ -0,0 +1,139 @@
+"""
+Formats for history export and import: NDJSON and CSV rendering of
+history_service.export_history batches, streaming gzip, and incremental
+parsing of (optionally gzip-compressed) NDJSON uploads.
+
+Everything works chunk by chunk, so memory use stays bounded by the batch
+size or the longest line, whatever the size of the history.
+"""
+import csv
+import io
+import json
+import os
+import zlib
+from datetime import datetime, timezone
+from typing import AsyncIterable, AsyncIterator
+
+# Column order of CSV exports and key order of NDJSON lines
+FIELDS = (
+    "id", "title", "input_text", "summary", "translated_summary", "summary_type", "style", "tonality",
+    "language", "parent_id", "created_at", "updated_at",
+)
+# Fields an import line may set; id, parent_id and updated_at are assigned on import
+IMPORT_FIELDS = ("input_text", "summary", "translated_summary", "summary_type", "style", "tonality", "language")
+MAX_LINE_BYTES = int(os.getenv("HISTORY_IMPORT_MAX_LINE_BYTES", str(16 * 1024 * 1024)))
+
+_GZIP_WBITS = 31
+
+
+def _value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _record(doc: dict) -> dict:
+    return {field: _value(doc.get(field)) for field in FIELDS}
+
+
+async def render(batches: AsyncIterable[list[dict]], fmt: str) -> AsyncIterator[bytes]:
+    """One chunk of NDJSON ("ndjson") or CSV ("csv") per batch."""
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(FIELDS)
+        async for batch in batches:
+            for doc in batch:
+                writer.writerow(["" if value is None else value for value in _record(doc).values()])
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode("utf-8")
+        return
+    async for batch in batches:
+        yield "".join(json.dumps(_record(doc), ensure_ascii=False) + "\n" for doc in batch).encode("utf-8")
+
+
+async def gzipped(chunks: AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, _GZIP_WBITS)
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def _parse_created_at(value) -> datetime | None:
+    if value is None:
+        return None
+    parsed = datetime.fromisoformat(value)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def parse_record(line: bytes) -> dict:
+    """One import line as upsert_summary data. Raises ValueError if invalid."""
+    record = json.loads(line)
+    if not isinstance(record, dict):
+        raise ValueError("expected a JSON object")
+    for field in ("input_text", "summary"):
+        if not isinstance(record.get(field), str):
+            raise ValueError(f"{field} must be a string")
+    data = {}
+    for field in IMPORT_FIELDS:
+        value = record.get(field)
+        if value is not None and not isinstance(value, str):
+            raise ValueError(f"{field} must be a string")
+        if value is not None:
+            data[field] = value
+    try:
+        created_at = _parse_created_at(record.get("created_at"))
+    except (TypeError, ValueError):
+        raise ValueError("created_at must be an ISO 8601 timestamp")
+    if created_at is not None:
+        data["created_at"] = created_at
+    return data
+
+
+async def parse_ndjson(
+    chunks: AsyncIterable[bytes], errors: list[dict], gzip: bool = False, max_errors: int = 20,
+) -> AsyncIterator[dict]:
+    """
+    Records of an NDJSON upload, read chunk by chunk. Invalid lines are
+    skipped and the first max_errors of them appended to errors as {"line",
+    "error"}, with 1-based line numbers.
+    """
+    decompressor = zlib.decompressobj(_GZIP_WBITS) if gzip else None
+    buffer = b""
+    line_number = 0
+    skipping = False  # Inside a line that was already rejected as too long
+
+    def reject(message: str, line: int) -> None:
+        if len(errors) < max_errors:
+            errors.append({"line": line, "error": message})
+
+    async for chunk in chunks:
+        if decompressor is not None:
+            chunk = decompressor.decompress(chunk)
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_number += 1
+            if skipping:
+                skipping = False
+                continue
+            if line.strip():
+                try:
+                    yield parse_record(line)
+                except ValueError as e:
+                    reject(str(e), line_number)
+        if len(buffer) > MAX_LINE_BYTES:
+            if not skipping:
+                reject(f"line longer than {MAX_LINE_BYTES} bytes", line_number + 1)
+            buffer = b""
+            skipping = True
+    if decompressor is not None:
+        buffer += decompressor.flush()
+    if buffer.strip() and not skipping:
+        try:
+            yield parse_record(buffer)
+        except ValueError as e:
+            reject(str(e), line_number + 1)
@@ -1,26 +1,362 @@
-from datetime import datetime, timezone
+import asyncio
+import base64
+import functools
+import hashlib
+import json
+import logging
+import os
+import random
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterable, AsyncIterator
 from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, TEXT, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from app.services import history_cache, incremental, metrics, search_index, text_codec
 from app.services.db import get_db
 
+logger = logging.getLogger(__name__)
 
-def _serialize(doc: dict) -> dict:
-    """Convert MongoDB document to JSON-serializable dict."""
-    doc["id"] = str(doc.pop("_id"))
-    return doc
+# Where history lives: "mongo" (MONGODB_URI, the code in this module) or
+# "sqlite" (an embedded database file, see history_sqlite)
+BACKEND = os.getenv("HISTORY_BACKEND", "mongo")
+SQLITE_PATH = os.getenv("HISTORY_SQLITE_PATH", "history.db")
 
+BULK_WRITE_BATCH_SIZE = 500
+# Documents per cursor batch, and per yielded batch, of export_history
+EXPORT_BATCH_SIZE = int(os.getenv("HISTORY_EXPORT_BATCH_SIZE", "1000"))
+# Items per ordered bulk write of import_history
+IMPORT_BATCH_SIZE = int(os.getenv("HISTORY_IMPORT_BATCH_SIZE", "500"))
 
+# Transcripts live once per distinct input_hash in this collection, shared by
+# every summary of that input; summaries only keep the hash.
+TRANSCRIPTS = "transcripts"
+ARCHIVE = "summaries_archive"
+# Soft-deleted summaries are kept this long, then purged by compact_history
+RETENTION_DAYS = float(os.getenv("HISTORY_RETENTION_DAYS", "30"))
+# Seconds between background compaction passes per worker; 0 disables them
+COMPACTION_INTERVAL = float(os.getenv("HISTORY_COMPACTION_INTERVAL", "3600"))
+# "delete" drops expired summaries; "archive" moves them, transcript included, to summaries_archive
+COMPACTION_MODE = os.getenv("HISTORY_COMPACTION_MODE", "delete")
+
+# Search with the MongoDB text index; off uses search_index's local index, for
+# MongoDB stand-ins without $text (mongomock in development)
+TEXT_SEARCH = os.getenv("HISTORY_TEXT_SEARCH", "true").lower() not in ("0", "false", "no", "off")
+
+# How many entries sharing leading segments with a transcript find_predecessor compares
+PREDECESSOR_CANDIDATES = 20
+
+_DUPLICATE_KEY = 11000
+
+# Fields the history sidebar needs; bodies are fetched one at a time via get_summary
+LIST_PROJECTION = {
+    "title": 1,
+    "summary_type": 1,
+    "style": 1,
+    "tonality": 1,
+    "language": 1,
+    "created_at": 1,
+    "updated_at": 1,
+}
+
+
+# Stored for lookups (dedup, find_predecessor), never returned to clients
+INTERNAL_FIELDS = ("input_hash", "prefix_hashes")
+
+# Search results also carry the text fields, for snippets
+SEARCH_PROJECTION = {**LIST_PROJECTION, "summary": 1, "translated_summary": 1}
+
+# Everything an export carries; the transcript is joined in from TRANSCRIPTS
+EXPORT_PROJECTION = {
+    **SEARCH_PROJECTION,
+    "input_hash": 1,
+    "input_text": 1,
+    "parent_id": 1,
+}
+
+# MongoDB error code for a $text query without a text index
+_INDEX_NOT_FOUND = 27
+
+
+class InvalidCursor(ValueError):
+    """The pagination cursor is malformed or was not issued by get_history or search_history."""
+
+
+_store = None
+
+
+def get_store():
+    """The SQLiteHistoryStore when HISTORY_BACKEND=sqlite, None for MongoDB."""
+    global _store
+    if BACKEND == "mongo":
+        return None
+    if BACKEND != "sqlite":
+        raise ValueError(f"Unknown HISTORY_BACKEND {BACKEND!r}")
+    if _store is None:
+        from app.services.history_sqlite import SQLiteHistoryStore
+        _store = SQLiteHistoryStore(SQLITE_PATH)
+    return _store
+
+
+def _routed(func):
+    """
+    Storage operations have one implementation per backend with the same
+    signature and results: the decorated MongoDB one, and the
+    SQLiteHistoryStore method of the same name.
+    """
+    @functools.wraps(func)
+    def call(*args, **kwargs):
+        store = get_store()
+        if store is None:
+            return func(*args, **kwargs)
+        return getattr(store, func.__name__)(*args, **kwargs)
+    return call
+
+
+async def close_store() -> None:
+    """Close the embedded store's connection, if there is one."""
+    if _store is not None:
+        await _store.close()
+
+
+def _serialize(doc: dict, omit: tuple[str, ...] = ()) -> dict:
+    """A MongoDB document as an API item, id first as a string, without the
+    internal or omitted fields. Built in one pass; the document is left as it was."""
+    item = {"id": str(doc["_id"])}
+    item.update(
+        (key, value) for key, value in doc.items()
+        if key != "_id" and key not in INTERNAL_FIELDS and key not in omit
+    )
+    return item
+
+
+def _make_title(input_text: str) -> str:
+    """Build a short title from the first 60 chars of input text."""
+    raw_title = input_text.strip()
+    return (raw_title[:57] + "...") if len(raw_title) > 60 else raw_title
+
+
+def hash_input(input_text: str) -> str:
+    """Content hash used to match summaries of the same transcript."""
+    return hashlib.sha256(input_text.encode("utf-8")).hexdigest()
+
+
+def _transcript_update(input_text: str, now: datetime) -> dict:
+    return {
+        "$setOnInsert": {
+            "body": text_codec.encode(input_text),
+            "size": len(input_text.encode("utf-8")),
+            "created_at": now,
+        },
+        # Keeps compaction from collecting a transcript a save is about to reference
+        "$set": {"last_used_at": now},
+    }
+
+
+async def _store_transcripts(db, texts: dict[str, str], now: datetime) -> None:
+    """Store each distinct transcript once, keyed by its input hash."""
+    ops = [UpdateOne({"_id": input_hash}, _transcript_update(text, now), upsert=True) for input_hash, text in texts.items()]
+    for start in range(0, len(ops), BULK_WRITE_BATCH_SIZE):
+        try:
+            await db[TRANSCRIPTS].bulk_write(ops[start:start + BULK_WRITE_BATCH_SIZE], ordered=False)
+        except BulkWriteError as e:
+            # A concurrent save inserted the same transcript first, which is all we need
+            if any(error["code"] != _DUPLICATE_KEY for error in e.details.get("writeErrors", [])):
+                raise
+
+
+async def _load_transcript(db, input_hash: str) -> str:
+    doc = await db[TRANSCRIPTS].find_one({"_id": input_hash}, {"body": 1})
+    return text_codec.decode(doc["body"]) if doc else ""
+
+
+def _update_fields(data: dict, now: datetime) -> dict:
+    return {
+        "title": _make_title(data.get("input_text", "")),
+        "summary": data.get("summary", ""),
+        "translated_summary": data.get("translated_summary"),
+        "summary_type": data.get("summary_type", "brief"),
+        "style": data.get("style", "paragraph"),
+        "tonality": data.get("tonality", "professional"),
+        "language": data.get("language", "original"),
+        "updated_at": now,
+        # The history entry this one was summarized incrementally from
+        **({"parent_id": data["parent_id"]} if data.get("parent_id") else {}),
+    }
+
+
+def _insert_fields(input_text: str, now: datetime) -> dict:
+    return {"created_at": now, "prefix_hashes": incremental.prefix_hashes(input_text)}
+
+
+async def _backfill_input_hashes(collection) -> None:
+    """Add input_hash to documents written before it existed."""
+    ops = []
+    async for doc in collection.find({"input_hash": {"$exists": False}}, {"input_text": 1}):
+        ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"input_hash": hash_input(doc.get("input_text", ""))}}))
+        if len(ops) >= BULK_WRITE_BATCH_SIZE:
+            await collection.bulk_write(ops, ordered=False)
+            ops = []
+    if ops:
+        await collection.bulk_write(ops, ordered=False)
+
+
+async def _resolve_duplicates(collection) -> None:
+    """
+    The old find-then-insert upsert could race and leave several live copies of
+    one transcript. Keep the most recently updated one and soft-delete the rest
+    so the unique index can be built.
+    """
+    now = datetime.now(timezone.utc)
+    duplicates = collection.aggregate([
+        {"$match": {"deleted_at": None}},
+        # Unmigrated documents still carry their transcripts; sort only the keys
+        {"$project": {"device_id": 1, "input_hash": 1, "updated_at": 1}},
+        {"$sort": {"updated_at": DESCENDING}},
+        {"$group": {
+            "_id": {"device_id": "$device_id", "input_hash": "$input_hash"},
+            "ids": {"$push": "$_id"},
+            "count": {"$sum": 1},
+        }},
+        {"$match": {"count": {"$gt": 1}}},
+    ], allowDiskUse=True)
+    async for group in duplicates:
+        # Distinct deletion times keep the soft-deleted copies unique too
+        await collection.bulk_write([
+            UpdateOne({"_id": _id}, {"$set": {"deleted_at": now + timedelta(milliseconds=i)}})
+            for i, _id in enumerate(group["ids"][1:])
+        ])
+
+
+async def _move_transcripts(db) -> None:
+    """
+    Move transcripts stored inline in summaries into the shared, compressed
+    transcripts collection. Runs in batches that each finish on their own,
+    so an interrupted run picks up where it stopped.
+    """
+    collection = db["summaries"]
+    while True:
+        docs = await collection.find(
+            {"input_text": {"$exists": True}}, {"input_text": 1, "input_hash": 1}
+        ).limit(BULK_WRITE_BATCH_SIZE).to_list(length=BULK_WRITE_BATCH_SIZE)
+        if not docs:
+            return
+        now = datetime.now(timezone.utc)
+        await _store_transcripts(db, {doc["input_hash"]: doc["input_text"] or "" for doc in docs}, now)
+        await collection.bulk_write(
+            [UpdateOne({"_id": doc["_id"]}, {"$unset": {"input_text": ""}}) for doc in docs], ordered=False
+        )
+
+
+async def _backfill_prefix_hashes(db) -> None:
+    """Add prefix_hashes to documents written before incremental summaries existed."""
+    collection = db["summaries"]
+    while True:
+        docs = await collection.find(
+            {"prefix_hashes": {"$exists": False}}, {"input_hash": 1}
+        ).limit(BULK_WRITE_BATCH_SIZE).to_list(length=BULK_WRITE_BATCH_SIZE)
+        if not docs:
+            return
+        bodies = {
+            transcript["_id"]: transcript["body"]
+            async for transcript in db[TRANSCRIPTS].find({"_id": {"$in": [doc.get("input_hash") for doc in docs]}})
+        }
+        await collection.bulk_write([
+            UpdateOne(
+                {"_id": doc["_id"]},
+                {"$set": {"prefix_hashes": incremental.prefix_hashes(text_codec.decode(bodies.get(doc.get("input_hash"))) or "")}},
+            )
+            for doc in docs
+        ], ordered=False)
+
+
+async def migrate() -> None:
+    """
+    Bring documents written by older versions to the current layout. Run once
+    per deploy with `python -m app.migrate`, not at worker startup: on a large
+    collection it outlasts the warm-up timeout, and every worker would run it
+    at once. Every step is safe to repeat, so an interrupted run can be
+    started again. SQLite databases are created in the current layout.
+    """
+    if get_store() is not None:
+        return
+    db = get_db()
+    collection = db["summaries"]
+    await _backfill_input_hashes(collection)
+    await _resolve_duplicates(collection)
+    await _move_transcripts(db)
+    await _backfill_prefix_hashes(db)
+
+
+@_routed
+@metrics.timed("mongo.ensure_indexes")
+async def ensure_indexes() -> None:
+    """Create the indexes history queries rely on. The unique index cannot be
+    built until migrate() has resolved duplicates left by older versions."""
+    db = get_db()
+    collection = db["summaries"]
+    # deleted_at is part of the key: live documents all share deleted_at=None,
+    # so there can be only one live copy per transcript, while soft-deleted
+    # copies are told apart by their deletion time.
+    await collection.create_index(
+        [("device_id", ASCENDING), ("input_hash", ASCENDING), ("deleted_at", ASCENDING)],
+        name="device_input_hash_live_unique",
+        unique=True,
+    )
+    # Serves get_history's filter and sort, including the _id tie-breaker
+    await collection.create_index(
+        [("device_id", ASCENDING), ("deleted_at", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+        name="device_live_created_at",
+    )
+    # search_history. The device_id prefix keeps each search within one
+    # device's entries. No stemming: summaries and translations span languages.
+    await collection.create_index(
+        [("device_id", ASCENDING), ("title", TEXT), ("summary", TEXT), ("translated_summary", TEXT)],
+        name="device_text",
+        weights=search_index.FIELD_WEIGHTS,
+        default_language="none",
+    )
+    # compact_history: expired soft-deleted summaries, and whether a
+    # transcript is still referenced. Only soft-deleted documents enter the
+    # first index.
+    await collection.create_index(
+        [("deleted_at", ASCENDING)],
+        name="soft_deleted",
+        partialFilterExpression={"deleted_at": {"$type": "date"}},
+    )
+    await collection.create_index([("input_hash", ASCENDING)], name="input_hash")
+    # find_predecessor (multikey)
+    await collection.create_index([("device_id", ASCENDING), ("prefix_hashes", ASCENDING)], name="device_prefix_hashes")
+    await db[TRANSCRIPTS].create_index([("last_used_at", ASCENDING)], name="last_used_at")
+
+
+def encode_cursor(doc: dict) -> str:
+    """Opaque token pointing just past doc in (created_at, _id) order."""
+    raw = json.dumps({"t": doc["created_at"].isoformat(), "id": str(doc["_id"])})
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, ObjectId]:
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(raw["t"]), ObjectId(raw["id"])
+    except Exception:
+        raise InvalidCursor("Invalid history cursor.")
+
+
+@_routed
+@metrics.timed("mongo.save_summary")
 async def save_summary(device_id: str, data: dict) -> dict:
     """Save a new summary document for the given device."""
     db = get_db()
     now = datetime.now(timezone.utc)
-    # Build a short title from the first 60 chars of input text
-    raw_title = data.get("input_text", "").strip()
-    title = (raw_title[:57] + "...") if len(raw_title) > 60 else raw_title
+    input_text = data.get("input_text", "")
+    input_hash = hash_input(input_text)
+    await _store_transcripts(db, {input_hash: input_text}, now)
 
     doc = {
         "device_id": device_id,
-        "title": title,
-        "input_text": data.get("input_text", ""),
+        "title": _make_title(input_text),
+        "input_hash": input_hash,
         "summary": data.get("summary", ""),
         "translated_summary": data.get("translated_summary"),
         "summary_type": data.get("summary_type", "brief"),
@@ -30,68 +366,337 @@ async def save_summary(device_id: str, data: dict) -> dict:
         "created_at": now,
         "updated_at": now,
         "deleted_at": None,
+        "prefix_hashes": incremental.prefix_hashes(input_text),
     }
     result = await db["summaries"].insert_one(doc)
+    search_index.cache.invalidate(device_id)
+    await history_cache.cache.invalidate(device_id, str(result.inserted_id))
     doc["_id"] = result.inserted_id
+    doc["input_text"] = input_text
     return _serialize(doc)
 
 
-async def get_history(device_id: str, skip: int = 0, limit: int = 10) -> dict:
-    """Return paginated non-deleted summaries for a device, newest first."""
+@_routed
+@metrics.timed("mongo.get_history")
+async def get_history(device_id: str, cursor: str | None = None, limit: int = 10) -> dict:
+    """Return a page of non-deleted summaries for a device, newest first.
+
+    Pages are keyed on (created_at, _id) rather than skipped over, so every
+    page costs the same index seek however deep the history goes. Items only
+    carry list fields; pass next_cursor back to get the following page.
+    """
     db = get_db()
-    cursor = db["summaries"].find(
-        {"device_id": device_id, "deleted_at": None},
-        sort=[("created_at", -1)]
-    ).skip(skip).limit(limit + 1)  # Fetch one extra to detect has_more
-    docs = await cursor.to_list(length=limit + 1)
+    query: dict = {"device_id": device_id, "deleted_at": None}
+    if cursor:
+        created_at, oid = decode_cursor(cursor)
+        query["$or"] = [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lt": oid}},
+        ]
+    docs = await db["summaries"].find(
+        query,
+        LIST_PROJECTION,
+        sort=[("created_at", DESCENDING), ("_id", DESCENDING)],
+    ).limit(limit + 1).to_list(length=limit + 1)  # Fetch one extra to detect has_more
     has_more = len(docs) > limit
+    docs = docs[:limit]
+    next_cursor = encode_cursor(docs[-1]) if has_more else None
     return {
-        "items": [_serialize(doc) for doc in docs[:limit]],
+        "items": [_serialize(doc) for doc in docs],
         "has_more": has_more,
-        "skip": skip,
+        "next_cursor": next_cursor,
     }
 
 
+def _encode_search_cursor(score: float, oid) -> str:
+    raw = json.dumps({"s": score, "id": str(oid)})
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def _decode_search_cursor(cursor: str) -> tuple[float, ObjectId]:
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return float(raw["s"]), ObjectId(raw["id"])
+    except Exception:
+        raise InvalidCursor("Invalid search cursor.")
+
+
+def _search_page(docs: list[dict], terms: list[str], limit: int) -> dict:
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+    next_cursor = _encode_search_cursor(docs[-1]["score"], docs[-1]["_id"]) if has_more else None
+    items = []
+    for doc in docs:
+        item = _serialize(doc, omit=("summary", "translated_summary"))
+        item["snippet"] = search_index.snippet(doc, terms)
+        items.append(item)
+    return {"items": items, "has_more": has_more, "next_cursor": next_cursor}
+
+
+async def _text_search(collection, device_id: str, query: str, after, limit: int) -> list[dict]:
+    """One page from the MongoDB text index, best match first."""
+    pipeline: list[dict] = [
+        {"$match": {"device_id": device_id, "deleted_at": None, "$text": {"$search": query}}},
+        {"$addFields": {"score": {"$meta": "textScore"}}},
+    ]
+    if after:
+        score, oid = after
+        pipeline.append({"$match": {"$or": [{"score": {"$lt": score}}, {"score": score, "_id": {"$lt": oid}}]}})
+    pipeline += [
+        {"$sort": {"score": DESCENDING, "_id": DESCENDING}},
+        {"$limit": limit + 1},
+        {"$project": {**SEARCH_PROJECTION, "score": 1}},
+    ]
+    return await collection.aggregate(pipeline).to_list(length=limit + 1)
+
+
+async def _local_index(collection, device_id: str) -> search_index.InvertedIndex:
+    """The device's cached local index, rebuilt if its history changed since."""
+    index = search_index.cache.fresh(device_id)
+    if index is not None:
+        return index
+    live = {"device_id": device_id, "deleted_at": None}
+    summary = await collection.aggregate([
+        {"$match": live},
+        {"$group": {"_id": None, "count": {"$sum": 1}, "updated_at": {"$max": "$updated_at"}}},
+    ]).to_list(length=1)
+    signature = (summary[0]["count"], summary[0]["updated_at"]) if summary else (0, None)
+    index = search_index.cache.validate(device_id, signature)
+    if index is None:
+        fields = {"created_at": 1, **{field: 1 for field in search_index.FIELD_WEIGHTS}}
+        docs = await collection.find(live, fields, sort=[("_id", ASCENDING)]).to_list(length=None)
+        index = search_index.InvertedIndex(docs)
+        search_index.cache.put(device_id, signature, index)
+    return index
+
+
+async def _local_search(collection, device_id: str, terms: list[str], after, limit: int) -> list[dict]:
+    """One page from the local inverted index, in the same order as _text_search."""
+    index = await _local_index(collection, device_id)
+    positions, scores = index.search(terms)
+    page: list[tuple] = []
+    for position, score in zip(positions.tolist(), scores.tolist()):
+        oid = index.ids[position]
+        if after and (score > after[0] or (score == after[0] and oid >= after[1])):
+            continue
+        page.append((oid, score))
+        if len(page) > limit:
+            break
+    if not page:
+        return []
+    docs = await collection.find({"_id": {"$in": [oid for oid, _ in page]}}, SEARCH_PROJECTION).to_list(length=None)
+    by_id = {doc["_id"]: doc for doc in docs}
+    results = []
+    for oid, score in page:
+        doc = by_id.get(oid)
+        if doc is not None:
+            doc["score"] = score
+            results.append(doc)
+    return results
+
+
+
+
+@_routed
+@metrics.timed("mongo.search_history")
+async def search_history(device_id: str, query: str, cursor: str | None = None, limit: int = 10) -> dict:
+    """Full-text search over a device's live summaries, best match first.
+
+    Each item carries the list fields, its relevance score and a snippet with
+    highlight offsets. Pass next_cursor back for the following page. Uses the
+    MongoDB text index, or a local inverted index when TEXT_SEARCH is off or
+    the text index is missing.
+    """
+    terms = search_index.query_terms(query)
+    if not terms:
+        return {"items": [], "has_more": False, "next_cursor": None}
+    after = _decode_search_cursor(cursor) if cursor else None
+    collection = get_db()["summaries"]
+    if TEXT_SEARCH:
+        try:
+            docs = await _text_search(collection, device_id, query, after, limit)
+            return _search_page(docs, terms, limit)
+        except OperationFailure as e:
+            if e.code != _INDEX_NOT_FOUND:
+                raise
+            logger.warning("no text index on summaries; searching with the local index")
+    docs = await _local_search(collection, device_id, terms, after, limit)
+    return _search_page(docs, terms, limit)
+
+
+@_routed
+@metrics.timed("mongo.find_predecessor")
+async def find_predecessor(device_id: str, input_text: str, summary_type: str, style: str, tonality: str) -> dict | None:
+    """
+    The device's live history entry whose transcript shares the longest run
+    of leading segments with input_text (see incremental.prefix_hashes), as
+    {"id", "input_text", "summary"}. None if none shares even one. Only
+    entries summarized with the same summary_type, style and tonality count:
+    an incremental update builds on the earlier summary, so it cannot add
+    back what a briefer one left out.
+    """
+    hashes = incremental.prefix_hashes(input_text)
+    if not hashes:
+        return None
+    db = get_db()
+    candidates = await db["summaries"].find(
+        {
+            "device_id": device_id,
+            "deleted_at": None,
+            "prefix_hashes": {"$in": hashes},
+            "input_hash": {"$ne": hash_input(input_text)},
+            "summary_type": summary_type,
+            "style": style,
+            "tonality": tonality,
+        },
+        {"prefix_hashes": 1, "input_hash": 1, "summary": 1, "updated_at": 1},
+        sort=[("updated_at", DESCENDING)],
+    ).limit(PREDECESSOR_CANDIDATES).to_list(length=PREDECESSOR_CANDIDATES)
+    if not candidates:
+        return None
+    position = {value: i for i, value in enumerate(hashes)}
+
+    def shared(doc: dict) -> int:
+        return max(position.get(value, -1) for value in doc["prefix_hashes"])
+
+    # Most recently updated first among equals, since max() keeps the first
+    best = max(candidates, key=shared)
+    return {
+        "id": str(best["_id"]),
+        "input_text": await _load_transcript(db, best["input_hash"]),
+        "summary": best.get("summary", ""),
+    }
+
+
+@_routed
+@metrics.timed("mongo.upsert_summary")
 async def upsert_summary(device_id: str, data: dict) -> dict:
     """Insert or update a summary based on input_text for the device.
-    
+
     If a non-deleted summary with the same input_text already exists,
     update it with the latest values. Otherwise insert a new document.
+    Done as a single atomic find_one_and_update keyed on the input hash.
     """
     db = get_db()
     now = datetime.now(timezone.utc)
-    raw_title = data.get("input_text", "").strip()
-    title = (raw_title[:57] + "...") if len(raw_title) > 60 else raw_title
+    input_text = data.get("input_text", "")
+    input_hash = hash_input(input_text)
+    await _store_transcripts(db, {input_hash: input_text}, now)
+    query = {"device_id": device_id, "input_hash": input_hash, "deleted_at": None}
+    update = {
+        "$set": _update_fields(data, now),
+        "$setOnInsert": _insert_fields(input_text, now),
+    }
 
-    # Look for an existing non-deleted doc with the same input_text
-    existing = await db["summaries"].find_one({
-        "device_id": device_id,
-        "input_text": data.get("input_text", ""),
-        "deleted_at": None,
-    })
-
-    if existing:
-        # Update in place
-        update_fields = {
-            "title": title,
-            "summary": data.get("summary", existing["summary"]),
-            "translated_summary": data.get("translated_summary", existing.get("translated_summary")),
-            "summary_type": data.get("summary_type", existing["summary_type"]),
-            "style": data.get("style", existing["style"]),
-            "tonality": data.get("tonality", existing["tonality"]),
-            "language": data.get("language", existing["language"]),
-            "updated_at": now,
-        }
-        await db["summaries"].update_one(
-            {"_id": existing["_id"]},
-            {"$set": update_fields}
+    try:
+        doc = await db["summaries"].find_one_and_update(
+            query, update, upsert=True, return_document=ReturnDocument.AFTER
         )
-        existing.update(update_fields)
-        return _serialize(existing)
-    else:
-        return await save_summary(device_id, data)
+    except DuplicateKeyError:
+        # A concurrent save inserted the same transcript first; update that one
+        doc = await db["summaries"].find_one_and_update(
+            query, update, upsert=True, return_document=ReturnDocument.AFTER
+        )
+    search_index.cache.invalidate(device_id)
+    await history_cache.cache.invalidate(device_id, str(doc["_id"]))
+    doc["input_text"] = input_text
+    return _serialize(doc)
+
+
+@_routed
+@metrics.timed("mongo.bulk_upsert_summaries")
+async def bulk_upsert_summaries(device_id: str, items: list[dict], ordered: bool = False) -> int:
+    """Upsert many summaries for a device with the same dedup rule as
+    upsert_summary, using bulk writes instead of a round trip per item.
+    Ordered writes apply items in list order, so the last of several items
+    with the same transcript wins; an item may carry its own created_at,
+    which is kept if it inserts a new entry.
+    Returns the number of inserted plus modified documents."""
+    db = get_db()
+    now = datetime.now(timezone.utc)
+    ops = []
+    texts = {}
+    for data in items:
+        input_text = data.get("input_text", "")
+        input_hash = hash_input(input_text)
+        texts[input_hash] = input_text
+        ops.append(UpdateOne(
+            {"device_id": device_id, "input_hash": input_hash, "deleted_at": None},
+            {
+                "$set": _update_fields(data, now),
+                "$setOnInsert": _insert_fields(input_text, data.get("created_at") or now),
+            },
+            upsert=True,
+        ))
+    await _store_transcripts(db, texts, now)
+
+    written = 0
+    for start in range(0, len(ops), BULK_WRITE_BATCH_SIZE):
+        result = await db["summaries"].bulk_write(ops[start:start + BULK_WRITE_BATCH_SIZE], ordered=ordered)
+        written += result.upserted_count + result.modified_count
+    search_index.cache.invalidate(device_id)
+    await history_cache.cache.invalidate(device_id)
+    return written
+
+
+async def import_history(device_id: str, items: AsyncIterable[dict], batch_size: int = IMPORT_BATCH_SIZE) -> dict:
+    """Upsert a stream of summaries in ordered chunks of batch_size, in the
+    order given, with the dedup rule of upsert_summary. Only one chunk is held
+    in memory at a time."""
+    received = written = 0
+    batch = []
+    async for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            written += await bulk_upsert_summaries(device_id, batch, ordered=True)
+            received += len(batch)
+            batch = []
+    if batch:
+        written += await bulk_upsert_summaries(device_id, batch, ordered=True)
+        received += len(batch)
+    return {"received": received, "written": written}
+
+
+async def _with_transcripts(db, docs: list[dict]) -> list[dict]:
+    """Serialize docs with their input_text, loading the transcripts of a batch in one query."""
+    hashes = {doc.get("input_hash") for doc in docs if "input_text" not in doc}
+    bodies = {}
+    if hashes:
+        async for transcript in db[TRANSCRIPTS].find({"_id": {"$in": list(hashes)}}, {"body": 1}):
+            bodies[transcript["_id"]] = text_codec.decode(transcript["body"])
+    for doc in docs:
+        input_hash = doc.pop("input_hash", None)
+        if "input_text" not in doc:
+            doc["input_text"] = bodies.get(input_hash, "")
+    return [_serialize(doc) for doc in docs]
+
+
+@_routed
+async def export_history(device_id: str, batch_size: int = EXPORT_BATCH_SIZE) -> AsyncIterator[list[dict]]:
+    """Yield a device's non-deleted summaries, oldest first, in batches of at most batch_size.
+
+    Reads through a single server-side cursor fetching batch_size documents
+    per round trip, so memory use depends on the batch size, not on how long
+    the history is.
+    """
+    db = get_db()
+    cursor = db["summaries"].find(
+        {"device_id": device_id, "deleted_at": None},
+        EXPORT_PROJECTION,
+        sort=[("created_at", ASCENDING), ("_id", ASCENDING)],
+    ).batch_size(batch_size)
+    batch = []
+    async for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            yield await _with_transcripts(db, batch)
+            batch = []
+    if batch:
+        yield await _with_transcripts(db, batch)
 
 
+@_routed
+@metrics.timed("mongo.get_summary")
 async def get_summary(device_id: str, summary_id: str) -> dict | None:
     """Return a single summary by ID for the given device."""
     db = get_db()
@@ -99,10 +704,16 @@ async def get_summary(device_id: str, summary_id: str) -> dict | None:
         oid = ObjectId(summary_id)
     except Exception:
         return None
-    doc = await db["summaries"].find_one({"_id": oid, "device_id": device_id})
-    return _serialize(doc) if doc else None
+    doc = await db["summaries"].find_one({"_id": oid, "device_id": device_id}, {"prefix_hashes": 0})
+    if doc is None:
+        return None
+    if "input_text" not in doc:
+        doc["input_text"] = await _load_transcript(db, doc.get("input_hash"))
+    return _serialize(doc)
 
 
+@_routed
+@metrics.timed("mongo.delete_summary")
 async def delete_summary(device_id: str, summary_id: str) -> bool:
     """Soft-delete a summary (set deleted_at). Returns True if found."""
     db = get_db()
@@ -114,4 +725,100 @@ async def delete_summary(device_id: str, summary_id: str) -> bool:
         {"_id": oid, "device_id": device_id, "deleted_at": None},
         {"$set": {"deleted_at": datetime.now(timezone.utc)}}
     )
+    search_index.cache.invalidate(device_id)
+    await history_cache.cache.invalidate(device_id, summary_id)
     return result.modified_count > 0
+
+
+async def _archive(db, docs: list[dict]) -> None:
+    """Copy summaries to the archive, each with its transcript body."""
+    hashes = list({doc.get("input_hash") for doc in docs})
+    bodies = {
+        transcript["_id"]: transcript["body"]
+        async for transcript in db[TRANSCRIPTS].find({"_id": {"$in": hashes}}, {"body": 1})
+    }
+    for doc in docs:
+        if "input_text" not in doc:
+            doc["input_text"] = bodies.get(doc.get("input_hash"), "")
+    try:
+        await db[ARCHIVE].insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        # Archived by an earlier pass that stopped before deleting them
+        if any(error["code"] != _DUPLICATE_KEY for error in e.details.get("writeErrors", [])):
+            raise
+
+
+@_routed
+@metrics.timed("mongo.compact_history")
+async def compact_history(retention: timedelta | None = None, batch_size: int = BULK_WRITE_BATCH_SIZE) -> dict:
+    """
+    Purge summaries soft-deleted longer than retention (HISTORY_RETENTION_DAYS
+    by default), archiving them first in "archive" mode, then delete the
+    transcripts no summary refers to any more. Works in batches of
+    batch_size; returns how many summaries and transcripts were removed.
+    """
+    db = get_db()
+    collection = db["summaries"]
+    cutoff = datetime.now(timezone.utc) - (retention if retention is not None else timedelta(days=RETENTION_DAYS))
+    expired = {"deleted_at": {"$type": "date", "$lt": cutoff}}
+    projection = None if COMPACTION_MODE == "archive" else {"input_hash": 1}
+    removed = 0
+    hashes: set[str] = set()
+    while True:
+        docs = await collection.find(expired, projection).limit(batch_size).to_list(length=batch_size)
+        if not docs:
+            break
+        if COMPACTION_MODE == "archive":
+            await _archive(db, docs)
+        result = await collection.delete_many({"_id": {"$in": [doc["_id"] for doc in docs]}})
+        removed += result.deleted_count
+        hashes.update(doc["input_hash"] for doc in docs if doc.get("input_hash"))
+
+    orphans = 0
+    candidates = list(hashes)
+    for start in range(0, len(candidates), batch_size):
+        batch = candidates[start:start + batch_size]
+        referenced = set(await collection.distinct("input_hash", {"input_hash": {"$in": batch}}))
+        unreferenced = [input_hash for input_hash in batch if input_hash not in referenced]
+        if unreferenced:
+            # A save touches last_used_at before it writes its summary, so a
+            # transcript used since the cutoff is kept even if unreferenced now
+            result = await db[TRANSCRIPTS].delete_many(
+                {"_id": {"$in": unreferenced}, "last_used_at": {"$lt": cutoff}}
+            )
+            orphans += result.deleted_count
+    return {"summaries": removed, "transcripts": orphans}
+
+
+_compaction_task: asyncio.Task | None = None
+
+
+async def _compaction_loop(interval: float) -> None:
+    # Start each worker at a different point in the interval
+    await asyncio.sleep(random.uniform(0, interval))
+    while True:
+        try:
+            result = await compact_history()
+            if result["summaries"] or result["transcripts"]:
+                logger.info("history compaction removed %(summaries)d summaries, %(transcripts)d transcripts", result)
+        except Exception:
+            logger.warning("history compaction failed", exc_info=True)
+        await asyncio.sleep(interval)
+
+
+def start_compaction() -> None:
+    """Run compact_history every HISTORY_COMPACTION_INTERVAL seconds in the background."""
+    global _compaction_task
+    if COMPACTION_INTERVAL > 0 and (_compaction_task is None or _compaction_task.done()):
+        _compaction_task = asyncio.create_task(_compaction_loop(COMPACTION_INTERVAL))
+
+
+async def stop_compaction() -> None:
+    global _compaction_task
+    if _compaction_task is not None:
+        _compaction_task.cancel()
+        try:
+            await _compaction_task
+        except asyncio.CancelledError:
+            pass
+        _compaction_task = None
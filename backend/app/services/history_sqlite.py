@@ -0,0 +1,544 @@
+"""
+Embedded SQLite storage for history, selected with HISTORY_BACKEND=sqlite.
+
+Implements the same operations as the MongoDB code in history_service, with
+the same results, on a local database file: single-node deployments and
+tests need no external services, and reads skip the network entirely.
+
+sqlite3 calls block, so each store owns one thread that opens the connection
+and runs every statement; coroutines hand work to it and await the result.
+The database runs in WAL mode, so readers (other workers on the same file)
+are not blocked by a writer. Transcripts are stored once per input hash and
+compressed with text_codec, as in MongoDB; ids are ObjectId strings and
+timestamps come back as naive UTC datetimes, as from Motor.
+"""
+import asyncio
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator
+
+from bson import ObjectId
+from bson.binary import Binary
+
+from app.services import history_cache, history_service, incremental, metrics, search_index, text_codec
+
+BUSY_TIMEOUT = 5.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS summaries (
+    id TEXT PRIMARY KEY,
+    device_id TEXT NOT NULL,
+    input_hash TEXT NOT NULL,
+    title TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    translated_summary TEXT,
+    summary_type TEXT,
+    style TEXT,
+    tonality TEXT,
+    language TEXT,
+    parent_id TEXT,
+    created_at INTEGER NOT NULL,
+    updated_at INTEGER NOT NULL,
+    deleted_at INTEGER
+);
+-- One live copy per transcript and device; upserts conflict on it
+CREATE UNIQUE INDEX IF NOT EXISTS summaries_device_input_hash_live
+    ON summaries (device_id, input_hash) WHERE deleted_at IS NULL;
+-- get_history and export_history, including the id tie-breaker
+CREATE INDEX IF NOT EXISTS summaries_device_live_created_at
+    ON summaries (device_id, created_at, id) WHERE deleted_at IS NULL;
+-- compact_history: expired soft-deleted summaries, and whether a transcript is still referenced
+CREATE INDEX IF NOT EXISTS summaries_soft_deleted ON summaries (deleted_at) WHERE deleted_at IS NOT NULL;
+CREATE INDEX IF NOT EXISTS summaries_input_hash ON summaries (input_hash);
+
+-- find_predecessor: incremental.prefix_hashes of each summary's transcript
+CREATE TABLE IF NOT EXISTS prefix_hashes (
+    device_id TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    summary_id TEXT NOT NULL,
+    PRIMARY KEY (device_id, hash, summary_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS prefix_hashes_summary ON prefix_hashes (summary_id);
+
+CREATE TABLE IF NOT EXISTS transcripts (
+    hash TEXT PRIMARY KEY,
+    body,
+    size INTEGER NOT NULL,
+    created_at INTEGER NOT NULL,
+    last_used_at INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS transcripts_last_used_at ON transcripts (last_used_at);
+
+CREATE TABLE IF NOT EXISTS summaries_archive (
+    id TEXT PRIMARY KEY,
+    device_id TEXT NOT NULL,
+    input_hash TEXT NOT NULL,
+    input_text,
+    title TEXT,
+    summary TEXT,
+    translated_summary TEXT,
+    summary_type TEXT,
+    style TEXT,
+    tonality TEXT,
+    language TEXT,
+    parent_id TEXT,
+    created_at INTEGER,
+    updated_at INTEGER,
+    deleted_at INTEGER
+);
+"""
+
+_FIELDS = (
+    "id", "device_id", "input_hash", "title", "summary", "translated_summary", "summary_type", "style",
+    "tonality", "language", "parent_id", "created_at", "updated_at", "deleted_at",
+)
+_LIST_FIELDS = ("id", *history_service.LIST_PROJECTION)
+_SEARCH_FIELDS = ("id", *history_service.SEARCH_PROJECTION)
+_EXPORT_FIELDS = (
+    "id", "title", "summary", "translated_summary", "summary_type", "style", "tonality", "language",
+    "parent_id", "created_at", "updated_at",
+)
+_TIMESTAMPS = ("created_at", "updated_at", "deleted_at")
+_EPOCH = datetime(1970, 1, 1)
+
+_UPSERT = f"""
+INSERT INTO summaries ({", ".join(_FIELDS)}) VALUES ({", ".join("?" * len(_FIELDS))})
+ON CONFLICT (device_id, input_hash) WHERE deleted_at IS NULL DO UPDATE SET
+    title = excluded.title,
+    summary = excluded.summary,
+    translated_summary = excluded.translated_summary,
+    summary_type = excluded.summary_type,
+    style = excluded.style,
+    tonality = excluded.tonality,
+    language = excluded.language,
+    parent_id = coalesce(excluded.parent_id, parent_id),
+    updated_at = excluded.updated_at
+RETURNING {", ".join(_FIELDS)}
+"""
+
+_STORE_TRANSCRIPT = """
+INSERT INTO transcripts (hash, body, size, created_at, last_used_at) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (hash) DO UPDATE SET last_used_at = excluded.last_used_at
+"""
+
+
+def _to_db(value: datetime | None) -> int | None:
+    """Microseconds since the epoch; naive datetimes are taken as UTC."""
+    if value is None:
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (value - _EPOCH) // timedelta(microseconds=1)
+
+
+def _from_db(value: int | None) -> datetime | None:
+    return None if value is None else _EPOCH + timedelta(microseconds=value)
+
+
+def _encode_body(text: str) -> str | bytes:
+    body = text_codec.encode(text)
+    return bytes(body) if isinstance(body, Binary) else body
+
+
+def _decode_body(body) -> str:
+    if isinstance(body, bytes):
+        return text_codec.decode(Binary(body, text_codec.ZLIB_SUBTYPE))
+    return body or ""
+
+
+def _doc(row: sqlite3.Row) -> dict:
+    doc = dict(row)
+    for field in _TIMESTAMPS:
+        if field in doc:
+            doc[field] = _from_db(doc[field])
+    if doc.get("parent_id") is None:
+        # MongoDB documents only have parent_id once one was saved
+        doc.pop("parent_id", None)
+    return doc
+
+
+def _placeholders(values) -> str:
+    return ", ".join("?" * len(values))
+
+
+class SQLiteHistoryStore:
+    """History on a SQLite file; one instance per process and database file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="history-sqlite")
+        # Opened, used and closed only on the executor's thread
+        self._conn: sqlite3.Connection | None = None
+
+    # ── Thread plumbing ──────────────────────────────────────────────────────
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode = WAL")
+            # With WAL, NORMAL only risks the last transactions on power loss, never corruption
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    async def _call(self, func, *args):
+        """Run func(connection, *args) on the store's thread."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, lambda: func(self._connection(), *args))
+
+    async def close(self) -> None:
+        """Close the connection. The store reopens it on next use."""
+        def close():
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+        await asyncio.get_running_loop().run_in_executor(self._executor, close)
+
+    async def ping(self) -> None:
+        await self._call(lambda conn: conn.execute("SELECT 1").fetchone())
+
+    @metrics.timed("sqlite.ensure_indexes")
+    async def ensure_indexes(self) -> None:
+        """Create the schema and indexes (done on first use anyway)."""
+        await self._call(lambda conn: None)
+
+    # ── Writes ───────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _store_transcripts(conn, texts: dict[str, str], now: int) -> None:
+        conn.executemany(_STORE_TRANSCRIPT, [
+            (input_hash, _encode_body(text), len(text.encode("utf-8")), now, now)
+            for input_hash, text in texts.items()
+        ])
+
+    @staticmethod
+    def _row(device_id: str, data: dict, now: int, created_at: int | None = None) -> tuple:
+        input_text = data.get("input_text", "")
+        return (
+            str(ObjectId()),
+            device_id,
+            history_service.hash_input(input_text),
+            history_service._make_title(input_text),
+            data.get("summary", ""),
+            data.get("translated_summary"),
+            data.get("summary_type", "brief"),
+            data.get("style", "paragraph"),
+            data.get("tonality", "professional"),
+            data.get("language", "original"),
+            data.get("parent_id") or None,
+            created_at if created_at is not None else now,
+            now,
+            None,
+        )
+
+    @staticmethod
+    def _add_prefix_hashes(conn, device_id: str, summary_id: str, input_text: str) -> None:
+        conn.executemany(
+            "INSERT OR IGNORE INTO prefix_hashes (device_id, hash, summary_id) VALUES (?, ?, ?)",
+            [(device_id, value, summary_id) for value in incremental.prefix_hashes(input_text)],
+        )
+
+    def _upsert(self, conn, device_id: str, items: list[dict], now: int) -> list[dict]:
+        docs = []
+        for data in items:
+            input_text = data.get("input_text", "")
+            row = self._row(device_id, data, now, _to_db(data.get("created_at")))
+            doc = _doc(conn.execute(_UPSERT, row).fetchone())
+            if doc["id"] == row[0]:
+                # Inserted rather than updated; prefix hashes are set on insert, as in MongoDB
+                self._add_prefix_hashes(conn, device_id, doc["id"], input_text)
+            doc.pop("input_hash")
+            doc["input_text"] = input_text
+            docs.append(doc)
+        return docs
+
+    def _write_summaries(self, conn, device_id: str, items: list[dict]) -> list[dict]:
+        now = _to_db(datetime.now(timezone.utc))
+        texts = {history_service.hash_input(data.get("input_text", "")): data.get("input_text", "") for data in items}
+        with conn:
+            self._store_transcripts(conn, texts, now)
+            return self._upsert(conn, device_id, items, now)
+
+    @metrics.timed("sqlite.save_summary")
+    async def save_summary(self, device_id: str, data: dict) -> dict:
+        def insert(conn):
+            now = _to_db(datetime.now(timezone.utc))
+            input_text = data.get("input_text", "")
+            row = self._row(device_id, {**data, "parent_id": None}, now)
+            with conn:
+                self._store_transcripts(conn, {row[2]: input_text}, now)
+                conn.execute(f"INSERT INTO summaries ({', '.join(_FIELDS)}) VALUES ({_placeholders(row)})", row)
+                self._add_prefix_hashes(conn, device_id, row[0], input_text)
+            doc = _doc(dict(zip(_FIELDS, row)))
+            doc.pop("input_hash")
+            return {**doc, "input_text": input_text}
+
+        doc = await self._call(insert)
+        search_index.cache.invalidate(device_id)
+        await history_cache.cache.invalidate(device_id, doc["id"])
+        return doc
+
+    @metrics.timed("sqlite.upsert_summary")
+    async def upsert_summary(self, device_id: str, data: dict) -> dict:
+        # created_at is only taken from imports (bulk_upsert_summaries), as with MongoDB
+        data = {key: value for key, value in data.items() if key != "created_at"}
+        docs = await self._call(self._write_summaries, device_id, [data])
+        search_index.cache.invalidate(device_id)
+        await history_cache.cache.invalidate(device_id, docs[0]["id"])
+        return docs[0]
+
+    @metrics.timed("sqlite.bulk_upsert_summaries")
+    async def bulk_upsert_summaries(self, device_id: str, items: list[dict], ordered: bool = False) -> int:
+        # Always applied in list order, in one transaction per batch
+        written = 0
+        batch_size = history_service.BULK_WRITE_BATCH_SIZE
+        for start in range(0, len(items), batch_size):
+            written += len(await self._call(self._write_summaries, device_id, items[start:start + batch_size]))
+        search_index.cache.invalidate(device_id)
+        await history_cache.cache.invalidate(device_id)
+        return written
+
+    @metrics.timed("sqlite.delete_summary")
+    async def delete_summary(self, device_id: str, summary_id: str) -> bool:
+        if not ObjectId.is_valid(summary_id):
+            return False
+
+        def delete(conn):
+            with conn:
+                return conn.execute(
+                    "UPDATE summaries SET deleted_at = ? WHERE id = ? AND device_id = ? AND deleted_at IS NULL",
+                    (_to_db(datetime.now(timezone.utc)), summary_id, device_id),
+                ).rowcount
+
+        deleted = await self._call(delete)
+        search_index.cache.invalidate(device_id)
+        await history_cache.cache.invalidate(device_id, summary_id)
+        return deleted > 0
+
+    # ── Reads ────────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _transcript(conn, input_hash: str) -> str:
+        row = conn.execute("SELECT body FROM transcripts WHERE hash = ?", (input_hash,)).fetchone()
+        return _decode_body(row["body"]) if row else ""
+
+    @metrics.timed("sqlite.get_summary")
+    async def get_summary(self, device_id: str, summary_id: str) -> dict | None:
+        def get(conn):
+            row = conn.execute(
+                f"SELECT {', '.join(_FIELDS)} FROM summaries WHERE id = ? AND device_id = ?", (summary_id, device_id)
+            ).fetchone()
+            if row is None:
+                return None
+            doc = _doc(row)
+            doc["input_text"] = self._transcript(conn, doc.pop("input_hash"))
+            return doc
+
+        return await self._call(get)
+
+    @metrics.timed("sqlite.get_history")
+    async def get_history(self, device_id: str, cursor: str | None = None, limit: int = 10) -> dict:
+        sql = f"SELECT {', '.join(_LIST_FIELDS)} FROM summaries WHERE device_id = ? AND deleted_at IS NULL"
+        params: list = [device_id]
+        if cursor:
+            created_at, oid = history_service.decode_cursor(cursor)
+            sql += " AND (created_at, id) < (?, ?)"
+            params += [_to_db(created_at), str(oid)]
+        sql += " ORDER BY created_at DESC, id DESC LIMIT ?"
+        params.append(limit + 1)  # One extra to detect has_more
+
+        rows = await self._call(lambda conn: conn.execute(sql, params).fetchall())
+        docs = [_doc(row) for row in rows]
+        has_more = len(docs) > limit
+        docs = docs[:limit]
+        next_cursor = history_service.encode_cursor({**docs[-1], "_id": docs[-1]["id"]}) if has_more else None
+        return {"items": docs, "has_more": has_more, "next_cursor": next_cursor}
+
+    @staticmethod
+    def _signature(conn, device_id: str) -> tuple:
+        return tuple(conn.execute(
+            "SELECT count(*), max(updated_at) FROM summaries WHERE device_id = ? AND deleted_at IS NULL", (device_id,)
+        ).fetchone())
+
+    @staticmethod
+    def _build_index(conn, device_id: str) -> search_index.InvertedIndex:
+        rows = conn.execute(
+            f"SELECT id, created_at, {', '.join(search_index.FIELD_WEIGHTS)} FROM summaries "
+            "WHERE device_id = ? AND deleted_at IS NULL ORDER BY id",
+            (device_id,),
+        )
+        return search_index.InvertedIndex({**dict(row), "_id": ObjectId(row["id"])} for row in rows)
+
+    async def _search_index(self, device_id: str) -> search_index.InvertedIndex:
+        """The device's cached search index, rebuilt if its history changed since.
+        The cache is only touched from the event loop; the store's thread reads."""
+        index = search_index.cache.fresh(device_id)
+        if index is not None:
+            return index
+        signature = await self._call(self._signature, device_id)
+        index = search_index.cache.validate(device_id, signature)
+        if index is None:
+            index = await self._call(self._build_index, device_id)
+            search_index.cache.put(device_id, signature, index)
+        return index
+
+    @staticmethod
+    def _search_docs(conn, page: list[tuple]) -> list[dict]:
+        ids = [str(oid) for oid, _ in page]
+        rows = conn.execute(
+            f"SELECT {', '.join(_SEARCH_FIELDS)} FROM summaries WHERE id IN ({_placeholders(ids)})", ids
+        ).fetchall()
+        by_id = {row["id"]: _doc(row) for row in rows}
+        docs = []
+        for oid, score in page:
+            doc = by_id.get(str(oid))
+            if doc is not None:
+                del doc["id"]
+                docs.append({"_id": oid, **doc, "score": score})
+        return docs
+
+    @metrics.timed("sqlite.search_history")
+    async def search_history(self, device_id: str, query: str, cursor: str | None = None, limit: int = 10) -> dict:
+        terms = search_index.query_terms(query)
+        if not terms:
+            return {"items": [], "has_more": False, "next_cursor": None}
+        after = history_service._decode_search_cursor(cursor) if cursor else None
+        index = await self._search_index(device_id)
+        positions, scores = index.search(terms)
+        page: list[tuple] = []
+        for position, score in zip(positions.tolist(), scores.tolist()):
+            oid = index.ids[position]
+            if after and (score > after[0] or (score == after[0] and oid >= after[1])):
+                continue
+            page.append((oid, score))
+            if len(page) > limit:
+                break
+        docs = await self._call(self._search_docs, page) if page else []
+        return history_service._search_page(docs, terms, limit)
+
+    @metrics.timed("sqlite.find_predecessor")
+    async def find_predecessor(self, device_id: str, input_text: str, summary_type: str, style: str, tonality: str) -> dict | None:
+        hashes = incremental.prefix_hashes(input_text)
+        if not hashes:
+            return None
+        position = {value: i for i, value in enumerate(hashes)}
+
+        def find(conn):
+            rows = conn.execute(
+                f"""
+                SELECT s.id, s.input_hash, s.summary, p.hash
+                FROM prefix_hashes p JOIN summaries s ON s.id = p.summary_id
+                WHERE p.device_id = ? AND p.hash IN ({_placeholders(hashes)})
+                  AND s.deleted_at IS NULL AND s.input_hash != ?
+                  AND s.summary_type = ? AND s.style = ? AND s.tonality = ?
+                ORDER BY s.updated_at DESC, s.id
+                """,
+                [device_id, *hashes, history_service.hash_input(input_text), summary_type, style, tonality],
+            ).fetchall()
+            # The most recently updated candidates, as in MongoDB; rows are in that order
+            shared: dict[str, int] = {}
+            candidates: dict[str, sqlite3.Row] = {}
+            for row in rows:
+                if row["id"] not in candidates:
+                    if len(candidates) >= history_service.PREDECESSOR_CANDIDATES:
+                        continue
+                    candidates[row["id"]] = row
+                shared[row["id"]] = max(shared.get(row["id"], -1), position[row["hash"]])
+            if not candidates:
+                return None
+            # Most recently updated first among equals, since max() keeps the first
+            best = candidates[max(candidates, key=shared.__getitem__)]
+            return {
+                "id": best["id"],
+                "input_text": self._transcript(conn, best["input_hash"]),
+                "summary": best["summary"] or "",
+            }
+
+        return await self._call(find)
+
+    async def export_history(self, device_id: str, batch_size: int = history_service.EXPORT_BATCH_SIZE) -> AsyncIterator[list[dict]]:
+        fields = ", ".join(f"s.{field}" for field in _EXPORT_FIELDS)
+        sql = f"""
+            SELECT {fields}, t.body FROM summaries s LEFT JOIN transcripts t ON t.hash = s.input_hash
+            WHERE s.device_id = ? AND s.deleted_at IS NULL AND (s.created_at, s.id) > (?, ?)
+            ORDER BY s.created_at, s.id LIMIT ?
+        """
+        after = (-1, "")
+        while True:
+            rows = await self._call(lambda conn, params: conn.execute(sql, params).fetchall(), (device_id, *after, batch_size))
+            if not rows:
+                return
+            after = (rows[-1]["created_at"], rows[-1]["id"])
+            batch = []
+            for row in rows:
+                doc = _doc(row)
+                doc["input_text"] = _decode_body(doc.pop("body"))
+                batch.append(doc)
+            yield batch
+            if len(rows) < batch_size:
+                return
+
+    # ── Compaction ───────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _archive(conn, ids: list[str]) -> None:
+        conn.execute(
+            f"""
+            INSERT OR IGNORE INTO summaries_archive ({", ".join(_FIELDS)}, input_text)
+            SELECT {", ".join(f"s.{field}" for field in _FIELDS)}, t.body
+            FROM summaries s LEFT JOIN transcripts t ON t.hash = s.input_hash
+            WHERE s.id IN ({_placeholders(ids)})
+            """,
+            ids,
+        )
+
+    @metrics.timed("sqlite.compact_history")
+    async def compact_history(self, retention: timedelta | None = None, batch_size: int = history_service.BULK_WRITE_BATCH_SIZE) -> dict:
+        if retention is None:
+            retention = timedelta(days=history_service.RETENTION_DAYS)
+        cutoff = _to_db(datetime.now(timezone.utc) - retention)
+        archive = history_service.COMPACTION_MODE == "archive"
+
+        def purge_batch(conn):
+            rows = conn.execute(
+                "SELECT id, input_hash FROM summaries WHERE deleted_at IS NOT NULL AND deleted_at < ? LIMIT ?",
+                (cutoff, batch_size),
+            ).fetchall()
+            ids = [row["id"] for row in rows]
+            if ids:
+                with conn:
+                    if archive:
+                        self._archive(conn, ids)
+                    conn.execute(f"DELETE FROM summaries WHERE id IN ({_placeholders(ids)})", ids)
+                    conn.execute(f"DELETE FROM prefix_hashes WHERE summary_id IN ({_placeholders(ids)})", ids)
+            return len(ids), {row["input_hash"] for row in rows}
+
+        def purge_transcripts(conn, batch: list[str]) -> int:
+            # A save touches last_used_at before it writes its summary, so a
+            # transcript used since the cutoff is kept even if unreferenced now
+            with conn:
+                return conn.execute(
+                    f"""
+                    DELETE FROM transcripts WHERE hash IN ({_placeholders(batch)}) AND last_used_at < ?
+                      AND NOT EXISTS (SELECT 1 FROM summaries WHERE input_hash = transcripts.hash)
+                    """,
+                    [*batch, cutoff],
+                ).rowcount
+
+        removed = 0
+        hashes: set[str] = set()
+        while True:
+            count, batch_hashes = await self._call(purge_batch)
+            if not count:
+                break
+            removed += count
+            hashes.update(batch_hashes)
+
+        orphans = 0
+        candidates = list(hashes)
+        for start in range(0, len(candidates), batch_size):
+            orphans += await self._call(purge_transcripts, candidates[start:start + batch_size])
+        return {"summaries": removed, "transcripts": orphans}
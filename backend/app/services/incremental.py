@@ -0,0 +1,123 @@
+"""
+Incremental re-summarization of transcripts that were appended to or edited
+after they were summarized.
+
+Saved summaries carry prefix_hashes: hashes of their transcript up to each
+segment boundary. A transcript that extends an earlier one shares those
+hashes, which finds the earlier history entry with one indexed query. The
+two transcripts are then compared line by line, and the model gets the
+earlier summary plus only what changed after the shared opening, instead of
+the whole transcript again.
+"""
+import hashlib
+import os
+from dataclasses import dataclass
+
+from app.services import chunking
+
+# A boundary falls at the first line end after this many characters since the last one
+SEGMENT_CHARS = int(os.getenv("INCREMENTAL_SEGMENT_CHARS", "2000"))
+# Summarize in full when the incremental prompt would be larger than this share of the transcript
+MAX_RATIO = float(os.getenv("INCREMENTAL_MAX_RATIO", "0.7"))
+_HASH_CHARS = 16
+
+requests = 0
+fallbacks = 0
+tokens_saved = 0
+
+
+def prefix_hashes(text: str) -> list[str]:
+    """
+    Hashes of text up to each segment boundary. Boundaries depend only on the
+    text before them, so a transcript extended at the end keeps every
+    boundary, and hash, of the original. Line endings are normalized, so a
+    last line without one still matches once more lines follow it.
+    """
+    digest = hashlib.sha256()
+    hashes = []
+    pending = 0
+    for line in text.splitlines():
+        digest.update(line.encode("utf-8") + b"\n")
+        pending += len(line) + 1
+        if pending >= SEGMENT_CHARS:
+            hashes.append(digest.copy().hexdigest()[:_HASH_CHARS])
+            pending = 0
+    return hashes
+
+
+@dataclass
+class Delta:
+    shared_chars: int
+    removed: str  # The earlier transcript after the shared lines
+    added: str  # The new transcript after the shared lines
+
+
+def diff(previous: str, current: str) -> Delta:
+    """Split both transcripts after their longest run of identical leading lines."""
+    old_lines = previous.splitlines(keepends=True)
+    new_lines = current.splitlines(keepends=True)
+    shared = shared_chars = 0
+    for old, new in zip(old_lines, new_lines):
+        if old.rstrip("\r\n") != new.rstrip("\r\n"):
+            break
+        shared += 1
+        shared_chars += len(new)
+    return Delta(shared_chars, "".join(old_lines[shared:]), "".join(new_lines[shared:]))
+
+
+def render(previous_summary: str, delta: Delta) -> str:
+    """The user message for get_incremental_prefix_prompt()."""
+    parts = [f"Summary of the earlier version of the transcript:\n{previous_summary.strip()}"]
+    if delta.removed.strip():
+        parts.append(f"Passage of the earlier version that has since been removed or rewritten:\n{delta.removed.strip()}")
+    parts.append(f"Passage added to the transcript since then:\n{delta.added.strip()}")
+    return "\n\n".join(parts)
+
+
+@dataclass
+class Plan:
+    parent_id: str
+    text: str
+    full_tokens: int
+    sent_tokens: int
+
+    def report(self) -> dict:
+        saved = self.full_tokens - self.sent_tokens
+        return {
+            "parent_id": self.parent_id,
+            "full_tokens": self.full_tokens,
+            "sent_tokens": self.sent_tokens,
+            "tokens_saved": saved,
+            "reduction": round(saved / self.full_tokens, 3) if self.full_tokens else 0.0,
+        }
+
+
+def plan(previous: dict, text: str) -> Plan | None:
+    """
+    How to summarize text given the previous history entry ({"id",
+    "input_text", "summary"}), or None when summarizing it in full is as
+    cheap or the two share nothing.
+    """
+    global requests, fallbacks, tokens_saved
+    requests += 1
+    delta = diff(previous["input_text"], text)
+    if delta.shared_chars == 0 or not delta.added.strip():
+        fallbacks += 1
+        return None
+    message = render(previous["summary"], delta)
+    full_tokens = chunking.estimate_tokens(text)
+    sent_tokens = chunking.estimate_tokens(message)
+    if sent_tokens > full_tokens * MAX_RATIO:
+        fallbacks += 1
+        return None
+    tokens_saved += full_tokens - sent_tokens
+    return Plan(previous["id"], message, full_tokens, sent_tokens)
+
+
+def stats() -> dict:
+    return {"requests": requests, "fallbacks": fallbacks, "tokens_saved": tokens_saved}
+
+
+def clear() -> None:
+    global requests, fallbacks, tokens_saved
+    requests = fallbacks = tokens_saved = 0
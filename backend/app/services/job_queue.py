@@ -0,0 +1,239 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from typing import AsyncIterator
+
+from app.services import admission, history_service, openai_service
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+WORKERS = settings.batch_workers
+MAX_RETRIES = settings.batch_max_retries
+BACKOFF_BASE = settings.batch_backoff_base
+BACKOFF_MAX = settings.batch_backoff_max
+MAX_JOBS_RETAINED = settings.batch_max_jobs_retained
+
+# Provider errors are already retried by admission; an item is only retried
+# here when admission shed it without calling the provider.
+_RETRYABLE = (admission.Overloaded,)
+
+
+class Job:
+    """A batch of summarize requests and their results, in submission order."""
+
+    def __init__(self, items: list[dict], device_id: str | None = None, save_to_history: bool = False):
+        self.id = uuid.uuid4().hex
+        self.items = items
+        self.device_id = device_id
+        self.save_to_history = save_to_history
+        self.results: list[dict | None] = [None] * len(items)
+        self.completed = 0
+        self.failed = 0
+        self.status = "queued"
+        self.created_at = time.time()
+        self.finished_at: float | None = None
+        self._changed = asyncio.Condition()
+
+    @property
+    def done(self) -> bool:
+        return self.completed + self.failed == len(self.items)
+
+    def progress(self) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "total": len(self.items),
+            "completed": self.completed,
+            "failed": self.failed,
+        }
+
+    def to_dict(self) -> dict:
+        return {**self.progress(), "results": self.results}
+
+    async def _record(self, index: int, result: dict) -> None:
+        self.results[index] = result
+        if "error" in result:
+            self.failed += 1
+        else:
+            self.completed += 1
+        async with self._changed:
+            self._changed.notify_all()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("completed", "failed")
+
+    async def events(self) -> AsyncIterator[dict]:
+        """Yield each result as it lands (with its index), ending once the job is finished."""
+        sent: set[int] = set()
+
+        def unsent() -> list[int]:
+            return [i for i, result in enumerate(self.results) if result is not None and i not in sent]
+
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: unsent() or self.finished)
+                ready = unsent()
+                finished = self.finished
+            # Yield outside the lock so a slow consumer never stalls the workers
+            for index in ready:
+                sent.add(index)
+                yield {"index": index, **self.results[index]}
+            if finished:
+                return
+
+    async def _finish(self, status: str) -> None:
+        self.status = status
+        self.finished_at = time.time()
+        async with self._changed:
+            self._changed.notify_all()
+
+
+class JobQueue:
+    """
+    In-process async job queue: a fixed pool of worker tasks pulls individual
+    batch items. Items that admission sheds are retried with jittered
+    exponential backoff, and the whole pool pauses for the wait admission
+    asked for.
+    """
+
+    def __init__(self, workers: int = WORKERS):
+        self.workers = workers
+        self.jobs: OrderedDict[str, Job] = OrderedDict()
+        self._queue: asyncio.Queue[tuple[Job, int]] = asyncio.Queue()
+        self._tasks: list[asyncio.Task] = []
+        self._paused_until = 0.0
+        self.loop = asyncio.get_running_loop()
+
+    def start(self) -> None:
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def drain(self, timeout: float) -> None:
+        """Let queued items finish for up to timeout seconds, then stop the workers."""
+        if self._tasks:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning("batch queue still had %d items at shutdown", self._queue.qsize())
+        await self.stop()
+
+    def submit(self, job: Job) -> Job:
+        self.start()
+        self.jobs[job.id] = job
+        while len(self.jobs) > MAX_JOBS_RETAINED:
+            oldest_id, oldest = next(iter(self.jobs.items()))
+            if not oldest.done:
+                break
+            del self.jobs[oldest_id]
+        for index in range(len(job.items)):
+            self._queue.put_nowait((job, index))
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        return self.jobs.get(job_id)
+
+    def stats(self) -> dict:
+        return {
+            "workers": len(self._tasks),
+            "queued_items": self._queue.qsize(),
+            "jobs": len(self.jobs),
+        }
+
+    def _retry_delay(self, attempt: int, error: Exception) -> float:
+        return admission.backoff(attempt, error, BACKOFF_BASE, BACKOFF_MAX)
+
+    async def _wait_if_paused(self) -> None:
+        delay = self._paused_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def _run_item(self, item: dict) -> dict:
+        attempt = 0
+        while True:
+            await self._wait_if_paused()
+            try:
+                summary = await openai_service.summarize(
+                    text=item["text"],
+                    summary_type=item["summary_type"],
+                    style=item["style"],
+                    tonality=item["tonality"],
+                )
+                return {**item, "summary": summary}
+            except _RETRYABLE as e:
+                if attempt >= MAX_RETRIES:
+                    return {**item, "error": str(e)}
+                delay = self._retry_delay(attempt, e)
+                # Back the whole pool off, not just this worker
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+                attempt += 1
+                await asyncio.sleep(delay)
+            except Exception as e:
+                return {**item, "error": str(e)}
+
+    async def _worker(self) -> None:
+        while True:
+            job, index = await self._queue.get()
+            # Batches share the provider's rate limit fairly with interactive clients
+            admission.client_key.set(f"batch:{job.device_id or job.id}")
+            try:
+                if job.status == "queued":
+                    job.status = "running"
+                result = await self._run_item(job.items[index])
+                result.pop("text", None)
+                await job._record(index, result)
+                if job.done:
+                    await self._complete(job)
+            except Exception:
+                logger.exception("batch worker failed on job %s item %d", job.id, index)
+            finally:
+                self._queue.task_done()
+
+    async def _complete(self, job: Job) -> None:
+        if job.save_to_history and job.device_id:
+            entries = [
+                {"input_text": job.items[index]["text"], **result}
+                for index, result in enumerate(job.results)
+                if "error" not in result
+            ]
+            try:
+                await history_service.bulk_upsert_summaries(job.device_id, entries)
+            except Exception:
+                logger.exception("saving batch %s to history failed", job.id)
+                await job._finish("failed")
+                return
+        await job._finish("completed")
+
+
+_queue: JobQueue | None = None
+
+
+def get_queue() -> JobQueue:
+    """Return this worker's queue, rebuilding it if the event loop changed."""
+    global _queue
+    loop = asyncio.get_running_loop()
+    if _queue is None or _queue.loop is not loop:
+        _queue = JobQueue()
+    return _queue
+
+
+def stats() -> dict:
+    if _queue is None:
+        return {"workers": 0, "queued_items": 0, "jobs": 0}
+    return _queue.stats()
+
+
+async def shutdown(timeout: float) -> None:
+    global _queue
+    if _queue is not None and _queue.loop is asyncio.get_running_loop():
+        await _queue.drain(timeout)
+    _queue = None
@@ -0,0 +1,222 @@
+"""
+Chat completion backends behind openai_service, selected with LLM_BACKEND:
+
+  openai             the OpenAI SDK (default; OPENAI_API_KEY, OPENAI_BASE_URL)
+  openai_compatible  plain HTTP against any server speaking the OpenAI chat
+                     completions protocol, e.g. vLLM or llama.cpp (LLM_BASE_URL)
+  fake               deterministic in-process stand-in for tests and offline
+                     benchmarks; no network, no key
+
+All backends raise the openai package's error types, so retry and rate-limit
+handling elsewhere does not depend on which one is configured.
+"""
+import asyncio
+import json
+import re
+from types import SimpleNamespace
+from typing import AsyncIterator, Callable
+
+import httpx
+import openai
+from app.services import chunking, metrics
+
+
+class LLMBackend:
+    """Async chat completion interface. messages use the OpenAI role/content format."""
+
+    name = "base"
+
+    async def complete(self, messages: list[dict], model: str, temperature: float) -> str:
+        raise NotImplementedError
+
+    def stream(self, messages: list[dict], model: str, temperature: float) -> AsyncIterator[str]:
+        """Yield text deltas. Closing the iterator early must stop generation upstream."""
+        raise NotImplementedError
+
+    async def warm_up(self) -> None:
+        """Open connections ahead of the first request."""
+
+    async def close(self) -> None:
+        """Release connections."""
+
+
+class OpenAIBackend(LLMBackend):
+    """The OpenAI SDK; the client (and its connection pool) comes from client_factory."""
+
+    name = "openai"
+
+    def __init__(self, client_factory: Callable[[], openai.AsyncOpenAI]):
+        self._client_factory = client_factory
+
+    async def complete(self, messages: list[dict], model: str, temperature: float) -> str:
+        response = await self._client_factory().chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature
+        )
+        metrics.record_tokens(response.usage)
+        return response.choices[0].message.content
+
+    async def stream(self, messages: list[dict], model: str, temperature: float) -> AsyncIterator[str]:
+        stream = await self._client_factory().chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        try:
+            async for chunk in stream:
+                if not chunk.choices:
+                    # The final chunk carries usage and no choices
+                    metrics.record_tokens(getattr(chunk, "usage", None))
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield delta
+        finally:
+            await stream.close()
+
+    async def warm_up(self) -> None:
+        await self._client_factory().models.list()
+
+
+def _raise_for_status(response: httpx.Response) -> None:
+    if response.status_code < 400:
+        return
+    message = f"{response.status_code} from {response.request.url}"
+    if response.status_code == 429:
+        raise openai.RateLimitError(message, response=response, body=None)
+    if response.status_code >= 500:
+        raise openai.InternalServerError(message, response=response, body=None)
+    raise openai.APIStatusError(message, response=response, body=None)
+
+
+def _usage(payload: dict | None):
+    if not payload:
+        return None
+    details = payload.get("prompt_tokens_details") or {}
+    return SimpleNamespace(
+        prompt_tokens=payload.get("prompt_tokens"),
+        completion_tokens=payload.get("completion_tokens"),
+        prompt_tokens_details=SimpleNamespace(cached_tokens=details.get("cached_tokens")),
+    )
+
+
+class OpenAICompatibleBackend(LLMBackend):
+    """
+    Chat completions over plain HTTP for self-hosted servers. Local servers
+    rarely need retries or auth, so this skips the SDK entirely.
+    """
+
+    name = "openai_compatible"
+
+    def __init__(
+        self,
+        base_url: str,
+        api_key: str | None,
+        limits: httpx.Limits,
+        timeout: httpx.Timeout,
+        transport: httpx.AsyncBaseTransport | None = None,
+        event_hooks: dict | None = None,
+    ):
+        headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        self._http = httpx.AsyncClient(
+            base_url=base_url.rstrip("/") + "/",
+            headers=headers,
+            limits=limits,
+            timeout=timeout,
+            transport=transport,
+            event_hooks=event_hooks,
+        )
+
+    async def _send(self, body: dict, stream: bool) -> httpx.Response:
+        request = self._http.build_request("POST", "chat/completions", json=body)
+        try:
+            response = await self._http.send(request, stream=stream)
+        except httpx.TimeoutException:
+            raise openai.APITimeoutError(request=request)
+        except httpx.TransportError as e:
+            raise openai.APIConnectionError(message=str(e), request=request)
+        if response.status_code >= 400:
+            await response.aread()
+            await response.aclose()
+            _raise_for_status(response)
+        return response
+
+    async def complete(self, messages: list[dict], model: str, temperature: float) -> str:
+        response = await self._send({"model": model, "messages": messages, "temperature": temperature}, stream=False)
+        payload = response.json()
+        metrics.record_tokens(_usage(payload.get("usage")))
+        return payload["choices"][0]["message"]["content"]
+
+    async def stream(self, messages: list[dict], model: str, temperature: float) -> AsyncIterator[str]:
+        body = {"model": model, "messages": messages, "temperature": temperature, "stream": True}
+        response = await self._send(body, stream=True)
+        try:
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                chunk = json.loads(data)
+                metrics.record_tokens(_usage(chunk.get("usage")))
+                for choice in chunk.get("choices") or []:
+                    delta = (choice.get("delta") or {}).get("content")
+                    if delta:
+                        yield delta
+        finally:
+            await response.aclose()
+
+    async def warm_up(self) -> None:
+        # Any response proves the connection is open; not every server has /models
+        await self._http.get("models")
+
+    async def close(self) -> None:
+        await self._http.aclose()
+
+
+_WORD = re.compile(r"\S+")
+
+
+class FakeBackend(LLMBackend):
+    """
+    Deterministic in-process backend. The output is the model name followed by
+    the first output_tokens words of the last message that is not an
+    instruction, i.e. the transcript or notes, so identical requests produce
+    identical summaries. Time to first token is latency seconds, then tokens
+    arrive at tokens_per_second (0 means instantly).
+    """
+
+    name = "fake"
+
+    def __init__(self, latency: float = 0.0, tokens_per_second: float = 0.0, output_tokens: int = 50):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.output_tokens = output_tokens
+
+    def _tokens(self, messages: list[dict], model: str) -> list[str]:
+        source = messages[1]["content"] if len(messages) > 1 else messages[-1]["content"]
+        words = _WORD.findall(source)[:self.output_tokens - 1] or ["(empty)"]
+        return [f"[{model}]"] + [f" {word}" for word in words]
+
+    def _record_usage(self, messages: list[dict], tokens: list[str]) -> None:
+        prompt_tokens = sum(chunking.estimate_tokens(m.get("content") or "") for m in messages)
+        metrics.record_tokens(SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=len(tokens)))
+
+    async def complete(self, messages: list[dict], model: str, temperature: float) -> str:
+        tokens = self._tokens(messages, model)
+        delay = self.latency + (len(tokens) / self.tokens_per_second if self.tokens_per_second else 0)
+        await asyncio.sleep(delay)
+        self._record_usage(messages, tokens)
+        return "".join(tokens)
+
+    async def stream(self, messages: list[dict], model: str, temperature: float) -> AsyncIterator[str]:
+        tokens = self._tokens(messages, model)
+        await asyncio.sleep(self.latency)
+        for i, token in enumerate(tokens):
+            if i and self.tokens_per_second:
+                await asyncio.sleep(1 / self.tokens_per_second)
+            yield token
+        self._record_usage(messages, tokens)
@@ -0,0 +1,205 @@
+"""
+Prometheus metrics: per-route request latency, per-stage timings, LLM token
+counts and gauges read from the caches and the batch queue at scrape time.
+
+Setting METRICS_ENABLED=false turns every helper here into a no-op, so the
+instrumented code never needs to check the flag itself.
+"""
+import functools
+import os
+import time
+from typing import Callable
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+
+ENABLED = os.getenv("METRICS_ENABLED", "true").lower() not in ("0", "false", "no", "off")
+
+# LLM calls and streams run for seconds to minutes, Mongo and prompt building
+# for microseconds, so the buckets span both ends.
+_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+registry = CollectorRegistry(auto_describe=True)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template, until the last body byte is sent.",
+    ["method", "route", "status"],
+    buckets=_BUCKETS,
+    registry=registry,
+)
+STAGE_LATENCY = Histogram(
+    "app_stage_duration_seconds",
+    "Time spent in one stage of request handling (prompt, llm, translate, parse, mongo.*).",
+    ["stage"],
+    buckets=_BUCKETS,
+    registry=registry,
+)
+LLM_TOKENS = Counter(
+    "llm_tokens",
+    "Tokens reported by the LLM provider.",
+    ["kind"],
+    registry=registry,
+)
+
+# Labelled children are looked up once and reused; .labels() takes a lock and
+# builds a tuple on every call.
+_request_children: dict[tuple[str, str, int], Callable[[float], None]] = {}
+_stage_children: dict[str, Callable[[float], None]] = {}
+_token_children = {kind: LLM_TOKENS.labels(kind=kind) for kind in ("prompt", "completion", "cached_prompt")}
+
+
+class _Timer:
+    __slots__ = ("_observe", "_start")
+
+    def __init__(self, observe: Callable[[float], None]):
+        self._observe = observe
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> bool:
+        self._observe(time.perf_counter() - self._start)
+        return False
+
+
+class _NoopTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> bool:
+        return False
+
+
+_NOOP_TIMER = _NoopTimer()
+
+
+def _stage_observer(name: str) -> Callable[[float], None]:
+    observe = _stage_children.get(name)
+    if observe is None:
+        observe = _stage_children[name] = STAGE_LATENCY.labels(stage=name).observe
+    return observe
+
+
+def stage(name: str):
+    """Context manager timing one stage: `with metrics.stage("llm"): ...`"""
+    if not ENABLED:
+        return _NOOP_TIMER
+    return _Timer(_stage_observer(name))
+
+
+def observe_stage(name: str, seconds: float) -> None:
+    """Record a stage duration measured by the caller."""
+    if ENABLED:
+        _stage_observer(name)(seconds)
+
+
+def timed(name: str):
+    """Decorator form of stage() for coroutine functions."""
+    def decorate(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with stage(name):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def record_tokens(usage) -> None:
+    """Count prompt/completion tokens from a provider usage object, if it has them."""
+    if not ENABLED or usage is None:
+        return
+    for kind in ("prompt", "completion"):
+        tokens = getattr(usage, f"{kind}_tokens", None)
+        if isinstance(tokens, int) and tokens > 0:
+            _token_children[kind].inc(tokens)
+    # Prompt tokens served from the provider's prefix cache
+    cached = getattr(getattr(usage, "prompt_tokens_details", None), "cached_tokens", None)
+    if isinstance(cached, int) and cached > 0:
+        _token_children["cached_prompt"].inc(cached)
+
+
+def observe_request(method: str, route: str, status: int, seconds: float) -> None:
+    key = (method, route, status)
+    observe = _request_children.get(key)
+    if observe is None:
+        observe = _request_children[key] = REQUEST_LATENCY.labels(method, route, str(status)).observe
+    observe(seconds)
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware timing each HTTP request. Routes are labelled by their
+    template (/history/{summary_id}), never the raw path, to bound cardinality.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = getattr(scope.get("route"), "path", "unmatched")
+            observe_request(scope["method"], route, status, time.perf_counter() - start)
+
+
+# ── Gauges read at scrape time ───────────────────────────────────────────────
+
+_stats_sources: dict[str, Callable[[], dict]] = {}
+
+
+def register_stats(name: str, source: Callable[[], dict]) -> None:
+    """Expose the numeric values of source() as app_<name>_<key> gauges."""
+    _stats_sources[name] = source
+
+
+def _flatten(prefix: str, values: dict):
+    for key, value in values.items():
+        name = f"{prefix}_{key}"
+        if isinstance(value, dict):
+            yield from _flatten(name, value)
+        elif isinstance(value, (int, float)):
+            yield name, float(value)
+
+
+class _StatsCollector:
+    def collect(self):
+        for source_name, source in _stats_sources.items():
+            for name, value in _flatten(f"app_{source_name}", source()):
+                yield GaugeMetricFamily(name, f"{source_name} stats", value=value)
+
+
+_stats_collector = _StatsCollector()
+registry.register(_stats_collector)
+
+
+def render() -> tuple[bytes, str]:
+    """
+    Serialize all metrics. Under gunicorn with PROMETHEUS_MULTIPROC_DIR set,
+    histograms and counters are aggregated across workers; gauges always come
+    from the worker that serves the scrape.
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        scrape_registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(scrape_registry)
+        scrape_registry.register(_stats_collector)
+        return generate_latest(scrape_registry), CONTENT_TYPE_LATEST
+    return generate_latest(registry), CONTENT_TYPE_LATEST
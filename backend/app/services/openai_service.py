@@ -1,38 +1,401 @@
-import os
-from openai import OpenAI
-from app.prompts import get_system_prompt
-from dotenv import load_dotenv
+import asyncio
+import time
+from typing import AsyncIterator
+import httpx
+import openai
+from openai import AsyncOpenAI
+from app.prompts import (
+    get_chunk_prompt, get_incremental_prefix_prompt, get_merge_prompt, get_notes_prefix_prompt, get_prefix_prompt,
+    get_variant_prompt,
+)
+from app.services import admission, chunking, incremental, llm_backends, metrics, summary_cache
+from app.services.single_flight import SingleFlight
+from app.settings import settings
 
-load_dotenv()
+# Which llm_backends implementation serves completions: openai, openai_compatible or fake.
+BACKEND = settings.llm_backend
+MODEL = settings.llm_model
+# Model for the map/merge steps of long documents, which only write notes.
+NOTES_MODEL = settings.llm_notes_model or MODEL
+# Per-summary-type overrides, e.g. "brief=gpt-4o-mini,detailed=gpt-4o".
+MODELS_BY_SUMMARY_TYPE = settings.llm_model_by_summary_type
+
+# Per-worker limits. Each gunicorn worker owns one client, so the totals scale
+# with the number of workers started in startup.txt.
+MAX_CONNECTIONS = settings.openai_max_connections
+MAX_KEEPALIVE_CONNECTIONS = settings.openai_max_keepalive_connections
+MAX_CONCURRENCY = settings.openai_max_concurrency
+REQUEST_TIMEOUT = settings.openai_timeout
+CONNECT_TIMEOUT = settings.openai_connect_timeout
+
+# openai_compatible backend
+LLM_BASE_URL = settings.llm_base_url
+LLM_API_KEY = settings.llm_api_key
+
+# fake backend
+FAKE_LLM_LATENCY = settings.fake_llm_latency
+FAKE_LLM_TOKENS_PER_SECOND = settings.fake_llm_tokens_per_second
+FAKE_LLM_OUTPUT_TOKENS = settings.fake_llm_output_tokens
+
+# Long-document (map-reduce) mode kicks in above this estimated prompt size.
+LONG_DOC_THRESHOLD_TOKENS = settings.long_doc_threshold_tokens
+CHUNK_TOKENS = settings.chunk_tokens
+CHUNK_OVERLAP_TOKENS = settings.chunk_overlap_tokens
+MAP_CONCURRENCY = settings.map_concurrency
+
+# Providers only cache prompt prefixes from this size up (OpenAI: 1024 tokens).
+PREFIX_CACHE_MIN_TOKENS = settings.prefix_cache_min_tokens
+PRIME_PREFIX = settings.variant_prime_prefix
 
 client = None
+_backend: llm_backends.LLMBackend | None = None
+_semaphore: asyncio.Semaphore | None = None
+# Identical completions in flight at the same time, keyed like the summary cache
+flights = SingleFlight()
+
 
 def get_client():
     global client
     if client is None:
-        api_key = os.getenv("OPENAI_API_KEY")
+        api_key = settings.openai_api_key
         if not api_key or "your_openai_api_key_here" in api_key:
             raise ValueError("OPENAI_API_KEY is not set correctly in .env file")
-        client = OpenAI(api_key=api_key)
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+            ),
+            timeout=httpx.Timeout(REQUEST_TIMEOUT, connect=CONNECT_TIMEOUT),
+            event_hooks={"response": [admission.observe_response]},
+        )
+        client = AsyncOpenAI(
+            api_key=api_key,
+            base_url=settings.openai_base_url,
+            http_client=http_client,
+            # Retried by admission, which has to see every attempt to keep its buckets right
+            max_retries=0,
+        )
     return client
 
-async def summarize(text: str, summary_type: str, style: str, tonality: str) -> str:
+
+def get_backend() -> llm_backends.LLMBackend:
+    global _backend
+    if _backend is None:
+        if BACKEND == "openai":
+            # Looked up on each call so the client can be rebuilt (or replaced in tests)
+            _backend = llm_backends.OpenAIBackend(lambda: get_client())
+        elif BACKEND == "openai_compatible":
+            _backend = llm_backends.OpenAICompatibleBackend(
+                LLM_BASE_URL,
+                LLM_API_KEY,
+                limits=httpx.Limits(
+                    max_connections=MAX_CONNECTIONS,
+                    max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                ),
+                timeout=httpx.Timeout(REQUEST_TIMEOUT, connect=CONNECT_TIMEOUT),
+                event_hooks={"response": [admission.observe_response]},
+            )
+        elif BACKEND == "fake":
+            _backend = llm_backends.FakeBackend(FAKE_LLM_LATENCY, FAKE_LLM_TOKENS_PER_SECOND, FAKE_LLM_OUTPUT_TOKENS)
+        else:
+            raise ValueError(f"Unknown LLM_BACKEND {BACKEND!r}")
+    return _backend
+
+
+def is_configured() -> bool:
+    """Whether the configured backend has what it needs to start."""
+    return BACKEND != "openai" or bool(settings.openai_api_key)
+
+
+def model_for(summary_type: str | None) -> str:
+    return MODELS_BY_SUMMARY_TYPE.get(summary_type or "", MODEL)
+
+
+async def warm_up() -> None:
+    """Build the backend and open a pooled connection to it."""
+    await get_backend().warm_up()
+
+
+async def close() -> None:
+    global client, _backend, _semaphore
+    if _backend is not None:
+        await _backend.close()
+        _backend = None
+    if client is not None:
+        await client.close()
+        client = None
+    _semaphore = None
+
+
+def get_semaphore() -> asyncio.Semaphore:
+    """Bound the number of in-flight completions for this worker."""
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+    return _semaphore
+
+
+def _messages(system_prompt: str, text: str, instructions: str | None) -> list[dict]:
+    """System prompt, then the text, then (optionally) per-variant instructions.
+    Everything before the instructions is a prefix shared by all variants."""
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": text}
+    ]
+    if instructions:
+        messages.append({"role": "user", "content": instructions})
+    return messages
+
+
+def _cache_key(system_prompt: str, text: str, instructions: str | None, model: str) -> str:
+    prompt = f"{system_prompt}\n{instructions}" if instructions else system_prompt
+    return summary_cache.make_key(text, prompt, model)
+
+
+async def _complete(
+    system_prompt: str,
+    text: str,
+    bypass_cache: bool = False,
+    instructions: str | None = None,
+    model: str | None = None,
+) -> str:
     """
-    Calls OpenAI GPT-4o-mini to summarize the text.
+    Run one cached chat completion for a system prompt, user text and optional
+    trailing instructions. Concurrent identical calls share one completion;
+    one started with bypass_cache is fresh, so it is shared with those too.
+    """
+    model = model or MODEL
+    cache_key = _cache_key(system_prompt, text, instructions, model)
+    if not bypass_cache:
+        cached = await summary_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    backend = get_backend()
+    messages = _messages(system_prompt, text, instructions)
+
+    async def call() -> str:
+        async with get_semaphore():
+            with metrics.stage("llm"):
+                return await backend.complete(messages, model, temperature=0.7)
+
+    async def complete_and_cache() -> str:
+        summary = await admission.run(messages, call)
+        # Cached before the flight lands, so later callers never miss in between
+        await summary_cache.put(cache_key, summary)
+        return summary
+
+    return await flights.do(cache_key, complete_and_cache)
+
+
+def is_long_document(text: str) -> bool:
+    return chunking.estimate_tokens(text) > LONG_DOC_THRESHOLD_TOKENS
+
+
+async def _map_chunks(chunks: list[str], system_prompt: str) -> list[str]:
+    """Summarize chunks concurrently, at most MAP_CONCURRENCY at a time, keeping order."""
+    fan_out = asyncio.Semaphore(MAP_CONCURRENCY)
+
+    async def run(chunk: str) -> str:
+        async with fan_out:
+            return await _complete(system_prompt, chunk, model=NOTES_MODEL)
+
+    return await asyncio.gather(*(run(chunk) for chunk in chunks))
+
+
+def _join_notes(notes: list[str]) -> str:
+    return "\n\n".join(f"--- Section {i} ---\n{note}" for i, note in enumerate(notes, start=1))
+
+
+async def condense(text: str) -> str:
+    """
+    Map step of long-document mode: summarize overlapping chunks into section
+    notes, merging the notes hierarchically until they fit in a single prompt.
+    Every call is cached, so unchanged leading chunks are never re-summarized.
+    """
+    chunks = chunking.chunk_text(text, CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS)
+    notes = await _map_chunks(chunks, get_chunk_prompt())
+    merge_prompt = get_merge_prompt()
+    while len(notes) > 1 and chunking.estimate_tokens(_join_notes(notes)) > LONG_DOC_THRESHOLD_TOKENS:
+        groups: list[list[str]] = [[]]
+        group_tokens = 0
+        for note in notes:
+            note_tokens = chunking.estimate_tokens(note)
+            if groups[-1] and group_tokens + note_tokens > CHUNK_TOKENS:
+                groups.append([])
+                group_tokens = 0
+            groups[-1].append(note)
+            group_tokens += note_tokens
+        if len(groups) == len(notes):
+            # Notes are individually too large to pair up; merge two at a time
+            groups = [notes[i:i + 2] for i in range(0, len(notes), 2)]
+        notes = await _map_chunks([_join_notes(group) for group in groups], merge_prompt)
+    return _join_notes(notes)
+
+
+async def _prepare(text: str, plan: incremental.Plan | None = None) -> tuple[str, str]:
+    """
+    Return the (system prompt, user text) prefix for the final completion. It
+    does not depend on the summary variant, so long documents are condensed
+    once however many variants are requested. With an incremental plan the
+    user text is the earlier summary plus the transcript's changes instead.
+    """
+    if plan is not None:
+        return get_incremental_prefix_prompt(), plan.text
+    if is_long_document(text):
+        with metrics.stage("condense"):
+            notes = await condense(text)
+        return get_notes_prefix_prompt(), notes
+    return get_prefix_prompt(), text
+
+
+async def summarize(
+    text: str,
+    summary_type: str,
+    style: str,
+    tonality: str,
+    bypass_cache: bool = False,
+    plan: incremental.Plan | None = None,
+) -> str:
+    """
+    Summarizes the text with the configured LLM backend (gpt-4o-mini by default,
+    or the LLM_MODEL_BY_SUMMARY_TYPE override for summary_type).
+    Results are cached by text, prompt and model; bypass_cache forces a fresh
+    completion (which then replaces the cached entry). Transcripts over
+    LONG_DOC_THRESHOLD_TOKENS are summarized map-reduce style; bypass_cache
+    then only applies to the final step. An incremental plan (see
+    incremental.plan) replaces the transcript with the earlier summary and
+    the changes since.
     """
     try:
-        openai_client = get_client()
-        system_prompt = get_system_prompt(summary_type, style, tonality)
-        
-        response = openai_client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": text}
-            ],
-            temperature=0.7
-        )
-        
-        return response.choices[0].message.content
+        system_prompt, user_text = await _prepare(text, plan)
+        with metrics.stage("prompt"):
+            instructions = get_variant_prompt(summary_type, style, tonality)
+        return await _complete(system_prompt, user_text, bypass_cache, instructions, model_for(summary_type))
     except Exception as e:
         raise e
+
+
+async def summarize_variants(text: str, variants: list[dict], bypass_cache: bool = False) -> AsyncIterator[tuple[int, dict]]:
+    """
+    Summarize one transcript several ways, yielding (index, result) as each
+    variant finishes. Every request shares the system prompt and transcript as
+    a byte-identical prefix, with only the trailing instructions differing.
+
+    The provider caches a prefix once it has processed it, so requests sent
+    at the same instant all miss. When the prefix is long enough to be cached,
+    the first variant is streamed and the others start as soon as its first
+    token arrives, i.e. right after the prefix has been processed once.
+    A failed variant yields {"error": ...} without failing the others.
+    """
+    system_prompt, user_text = await _prepare(text)
+    primed = asyncio.Event()
+    if len(variants) < 2 or not PRIME_PREFIX or (
+        chunking.estimate_tokens(system_prompt) + chunking.estimate_tokens(user_text) < PREFIX_CACHE_MIN_TOKENS
+    ):
+        primed.set()
+
+    async def run(index: int, variant: dict) -> tuple[int, dict]:
+        try:
+            instructions = get_variant_prompt(variant["summary_type"], variant["style"], variant["tonality"])
+            model = model_for(variant["summary_type"])
+            if index == 0 and not primed.is_set():
+                parts = []
+                try:
+                    async for delta in _stream_complete(system_prompt, user_text, bypass_cache, instructions, model):
+                        primed.set()
+                        parts.append(delta)
+                finally:
+                    primed.set()
+                summary = "".join(parts)
+            else:
+                await primed.wait()
+                summary = await _complete(system_prompt, user_text, bypass_cache, instructions, model)
+            return index, {**variant, "summary": summary}
+        except Exception as e:
+            return index, {**variant, "error": str(e)}
+
+    tasks = [asyncio.create_task(run(index, variant)) for index, variant in enumerate(variants)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # A client that disconnects mid-stream should not keep completions running
+        for task in tasks:
+            task.cancel()
+
+
+async def _stream_complete(
+    system_prompt: str,
+    text: str,
+    bypass_cache: bool = False,
+    instructions: str | None = None,
+    model: str | None = None,
+) -> AsyncIterator[str]:
+    """Streaming counterpart of _complete(): yields deltas, caching only complete output."""
+    model = model or MODEL
+    cache_key = _cache_key(system_prompt, text, instructions, model)
+    if not bypass_cache:
+        cached = await summary_cache.get(cache_key)
+        if cached is not None:
+            yield cached
+            return
+
+    backend = get_backend()
+    messages = _messages(system_prompt, text, instructions)
+    parts: list[str] = []
+    attempt = 0
+    while True:
+        await admission.acquire(messages)
+        # Rate limits wait in admission; transient errors back off here, outside the semaphore
+        delay = 0.0
+        async with get_semaphore():
+            deltas = backend.stream(messages, model, temperature=0.7)
+            started = time.perf_counter()
+            try:
+                with metrics.stage("llm.stream"):
+                    async for delta in deltas:
+                        if not parts:
+                            metrics.observe_stage("llm.first_token", time.perf_counter() - started)
+                        parts.append(delta)
+                        yield delta
+                break
+            except openai.RateLimitError as e:
+                # Only retried before the first delta; a partial stream cannot be replayed
+                if not admission.rate_limited(attempt, e) or parts:
+                    raise
+            except admission.TRANSIENT_ERRORS as e:
+                delay = None if parts else admission.transient(attempt, e)
+                if delay is None:
+                    raise
+            finally:
+                await deltas.aclose()
+        attempt += 1
+        await asyncio.sleep(delay)
+
+    await summary_cache.put(cache_key, "".join(parts))
+
+
+async def summarize_stream(
+    text: str,
+    summary_type: str,
+    style: str,
+    tonality: str,
+    bypass_cache: bool = False,
+    plan: incremental.Plan | None = None,
+) -> AsyncIterator[str]:
+    """
+    Streaming variant of summarize(): yields text deltas as the model produces them.
+    Closing the generator early closes the upstream HTTP stream, which stops
+    generation on the provider side. Only complete summaries are cached.
+    For long documents the map step runs first and only the final step streams.
+    """
+    system_prompt, text = await _prepare(text, plan)
+    deltas = _stream_complete(
+        system_prompt, text, bypass_cache, get_variant_prompt(summary_type, style, tonality), model_for(summary_type)
+    )
+    try:
+        async for delta in deltas:
+            yield delta
+    finally:
+        await deltas.aclose()
@@ -0,0 +1,246 @@
+"""
+Response encoding: JSON rendered with orjson, and bodies compressed with
+brotli or gzip as the client's Accept-Encoding allows.
+
+orjson serializes datetimes, dataclasses and nested containers natively, in
+one pass in C, so JSONResponse here renders what FastAPI's default renders
+(compact, UTF-8, no NaN) several times faster. Endpoints that return large
+bodies build it themselves, which also skips FastAPI's jsonable_encoder walk
+over the result.
+
+CompressionMiddleware compresses bodies of at least
+RESPONSE_COMPRESSION_MIN_BYTES; smaller ones cost more CPU than the bytes
+saved. Brotli is used only when the brotli package is installed, gzip
+otherwise. Streamed bodies (NDJSON exports) are compressed chunk by chunk
+with a sync flush so clients still see each chunk as it is produced; event
+streams, already-encoded bodies and media are passed through untouched.
+"""
+import asyncio
+import os
+import zlib
+
+import orjson
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import Response
+
+ENABLED = os.getenv("RESPONSE_COMPRESSION_ENABLED", "true").lower() not in ("0", "false", "no", "off")
+MIN_BYTES = int(os.getenv("RESPONSE_COMPRESSION_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("RESPONSE_GZIP_LEVEL", "6"))
+# Brotli's higher qualities are meant for static assets; 4 compresses dynamic
+# JSON smaller than gzip -6 in about the same time.
+BROTLI_QUALITY = int(os.getenv("RESPONSE_BROTLI_QUALITY", "4"))
+# Whole bodies at least this large are compressed off the event loop
+THREAD_BYTES = int(os.getenv("RESPONSE_COMPRESSION_THREAD_BYTES", "262144"))
+
+# Event streams must reach the client event by event; the rest is compressed already
+_PASSTHROUGH_TYPES = ("text/event-stream", "application/gzip", "application/zip", "image/", "audio/", "video/")
+
+
+def dumps(value) -> bytes:
+    """value as compact UTF-8 JSON. Raises TypeError for what JSON cannot hold."""
+    return orjson.dumps(value)
+
+
+class JSONResponse(Response):
+    """FastAPI's JSONResponse, rendered with orjson."""
+
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+# ── Compression ──────────────────────────────────────────────────────────────
+
+_brotli = None
+
+
+def brotli_available() -> bool:
+    global _brotli
+    if _brotli is None:
+        try:
+            import brotli
+        except ImportError:
+            brotli = False
+        _brotli = brotli
+    return _brotli is not False
+
+
+def negotiate(accept_encoding: str, brotli: bool | None = None) -> str | None:
+    """The encoding to use for a request's Accept-Encoding header: "br", "gzip"
+    or None for identity. The highest q-value wins, brotli on a tie."""
+    if brotli is None:
+        brotli = brotli_available()
+    qualities: dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key.lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name.strip():
+            qualities[name.strip().lower()] = quality
+    best, best_quality = None, 0.0
+    for encoding in ("br", "gzip") if brotli else ("gzip",):
+        quality = qualities.get(encoding, qualities.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+class _Gzip:
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class _Brotli:
+    def __init__(self, quality: int):
+        if not brotli_available():
+            raise RuntimeError("Brotli compression requires the brotli package.")
+        self._compressor = _brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+def compressor(encoding: str, gzip_level: int = GZIP_LEVEL, brotli_quality: int = BROTLI_QUALITY):
+    return _Brotli(brotli_quality) if encoding == "br" else _Gzip(gzip_level)
+
+
+def compress(body: bytes, encoding: str, gzip_level: int = GZIP_LEVEL, brotli_quality: int = BROTLI_QUALITY) -> bytes:
+    """A whole body, compressed."""
+    stream = compressor(encoding, gzip_level, brotli_quality)
+    return stream.compress(body) + stream.finish()
+
+
+responses = compressed = bytes_in = bytes_out = 0
+
+
+def stats() -> dict:
+    """Responses seen, and how many were compressed from bytes_in to bytes_out."""
+    return {"responses": responses, "compressed": compressed, "bytes_in": bytes_in, "bytes_out": bytes_out}
+
+
+def clear() -> None:
+    global responses, compressed, bytes_in, bytes_out
+    responses = compressed = bytes_in = bytes_out = 0
+
+
+def _count(size_in: int, size_out: int, finished: bool) -> None:
+    global compressed, bytes_in, bytes_out
+    compressed += finished
+    bytes_in += size_in
+    bytes_out += size_out
+
+
+def _compressible(start: dict, headers: Headers) -> bool:
+    status = start["status"]
+    if status < 200 or status in (204, 304) or "content-encoding" in headers:
+        return False
+    return not headers.get("content-type", "").startswith(_PASSTHROUGH_TYPES)
+
+
+def _weaken_etag(headers: MutableHeaders) -> None:
+    """Mark a strong ETag weak: encoded bytes differ from the ones it names.
+    Done for every response to a client that accepts an encoding, compressed
+    or not and 304s included, so the tag a client revalidates with is the one
+    it is answered with."""
+    etag = headers.get("etag")
+    if etag and not etag.startswith("W/"):
+        headers["ETag"] = f"W/{etag}"
+
+
+class CompressionMiddleware:
+    """
+    Pure ASGI middleware compressing response bodies. A body that arrives in
+    one message is compressed whole, with its Content-Length updated; one
+    that is streamed is compressed as it streams, without a Content-Length.
+    """
+
+    def __init__(self, app, minimum_size: int = MIN_BYTES, gzip_level: int = GZIP_LEVEL, brotli_quality: int = BROTLI_QUALITY):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        global responses
+        responses += 1
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        start = None
+        stream = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, stream, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                if start["status"] == 304:
+                    # Carries the headers the 200 it stands for would have
+                    headers = MutableHeaders(raw=start["headers"])
+                    headers.add_vary_header("Accept-Encoding")
+                    if encoding is not None:
+                        _weaken_etag(headers)
+                if not _compressible(start, Headers(raw=start["headers"])):
+                    passthrough = True
+                    await send(start)
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if stream is None:
+                headers = MutableHeaders(raw=start["headers"])
+                headers.add_vary_header("Accept-Encoding")
+                if encoding is not None:
+                    _weaken_etag(headers)
+                if encoding is None or (not more_body and len(body) < self.minimum_size):
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                headers["Content-Encoding"] = encoding
+                if not more_body:
+                    if len(body) >= THREAD_BYTES:
+                        data = await asyncio.to_thread(compress, body, encoding, self.gzip_level, self.brotli_quality)
+                    else:
+                        data = compress(body, encoding, self.gzip_level, self.brotli_quality)
+                    headers["Content-Length"] = str(len(data))
+                    _count(len(body), len(data), True)
+                    await send(start)
+                    await send({"type": "http.response.body", "body": data})
+                    return
+                del headers["Content-Length"]
+                stream = compressor(encoding, self.gzip_level, self.brotli_quality)
+                await send(start)
+
+            data = stream.compress(body) + (stream.flush() if more_body else stream.finish())
+            _count(len(body), len(data), not more_body)
+            await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
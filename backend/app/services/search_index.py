@@ -0,0 +1,170 @@
+"""
+Local full-text search for history: tokenizing, an in-memory inverted index
+per device and snippet highlighting.
+
+MongoDB answers searches with its text index. This index covers the SQLite
+store and MongoDB stand-ins without $text support (HISTORY_TEXT_SEARCH=false,
+for mongomock in development and tests): it is built from a device's live
+summaries on first search and rebuilt only when the device's history changes: writes through history_service drop it at once, and writes
+from other workers are caught by rechecking a signature of the history every
+SEARCH_INDEX_REVALIDATE_SECONDS. Ranking is BM25 with the same field weights as the MongoDB
+text index.
+"""
+import math
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Iterable
+
+import numpy as np
+
+# Field weights, shared with the MongoDB text index
+FIELD_WEIGHTS = {"title": 10, "summary": 5, "translated_summary": 3}
+CACHE_DEVICES = int(os.getenv("SEARCH_INDEX_CACHE_DEVICES", "64"))
+REVALIDATE_SECONDS = float(os.getenv("SEARCH_INDEX_REVALIDATE_SECONDS", "10"))
+SNIPPET_CHARS = int(os.getenv("SEARCH_SNIPPET_CHARS", "160"))
+
+_TOKEN = re.compile(r"\w+")
+_BM25_K1 = 1.2
+_BM25_B = 0.75
+
+
+def tokenize(text: str | None) -> list[str]:
+    return _TOKEN.findall(text.casefold()) if text else []
+
+
+def query_terms(query: str) -> list[str]:
+    """Distinct search terms in query order."""
+    return list(dict.fromkeys(tokenize(query)))
+
+
+class InvertedIndex:
+    """Weighted BM25 index over the FIELD_WEIGHTS fields of a set of documents."""
+
+    def __init__(self, docs: Iterable[dict]):
+        self.ids: list = []
+        self.created_at: list = []
+        postings: dict[str, dict[int, float]] = {}
+        lengths: list[float] = []
+        for doc in docs:
+            position = len(self.ids)
+            self.ids.append(doc["_id"])
+            self.created_at.append(doc.get("created_at"))
+            length = 0.0
+            for field, weight in FIELD_WEIGHTS.items():
+                for token in tokenize(doc.get(field)):
+                    entry = postings.setdefault(token, {})
+                    entry[position] = entry.get(position, 0.0) + weight
+                    length += weight
+            lengths.append(length)
+
+        self._postings = {
+            term: (np.fromiter(entry.keys(), dtype=np.int64, count=len(entry)),
+                   np.fromiter(entry.values(), dtype=np.float64, count=len(entry)))
+            for term, entry in postings.items()
+        }
+        self._lengths = np.asarray(lengths, dtype=np.float64)
+        self._average_length = float(self._lengths.mean()) if lengths else 0.0
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def search(self, terms: list[str]) -> tuple[np.ndarray, np.ndarray]:
+        """Positions of documents matching any term and their scores, best first.
+        Ties go to the later position; documents are indexed in _id order, so
+        that is the newer document, as in the MongoDB search."""
+        n = len(self.ids)
+        scores = np.zeros(n)
+        matched = np.zeros(n, dtype=bool)
+        for term in terms:
+            posting = self._postings.get(term)
+            if posting is None:
+                continue
+            positions, frequencies = posting
+            idf = math.log(1 + (n - len(positions) + 0.5) / (len(positions) + 0.5))
+            norm = _BM25_K1 * (1 - _BM25_B + _BM25_B * self._lengths[positions] / self._average_length)
+            scores[positions] += idf * frequencies * (_BM25_K1 + 1) / (frequencies + norm)
+            matched[positions] = True
+        hits = np.flatnonzero(matched)
+        order = np.lexsort((-hits, -scores[hits]))
+        return hits[order], scores[hits][order]
+
+
+class IndexCache:
+    """
+    Per-device indexes, least recently used evicted first. Each entry carries
+    the signature of the history it was built from and when that was last
+    confirmed; within revalidate_after seconds of that it is used as is.
+    """
+
+    def __init__(self, max_devices: int = CACHE_DEVICES, revalidate_after: float = REVALIDATE_SECONDS):
+        self.max_devices = max_devices
+        self.revalidate_after = revalidate_after
+        # device_id -> [signature, confirmed_at, index]
+        self._entries: OrderedDict[str, list] = OrderedDict()
+
+    def fresh(self, device_id: str) -> InvertedIndex | None:
+        """The device's index if its signature was confirmed recently enough."""
+        entry = self._entries.get(device_id)
+        if entry is None or time.monotonic() - entry[1] > self.revalidate_after:
+            return None
+        self._entries.move_to_end(device_id)
+        return entry[2]
+
+    def validate(self, device_id: str, signature) -> InvertedIndex | None:
+        """The device's index if it was built from history with this signature."""
+        entry = self._entries.get(device_id)
+        if entry is None or entry[0] != signature:
+            return None
+        entry[1] = time.monotonic()
+        self._entries.move_to_end(device_id)
+        return entry[2]
+
+    def put(self, device_id: str, signature, index: InvertedIndex) -> None:
+        self._entries[device_id] = [signature, time.monotonic(), index]
+        self._entries.move_to_end(device_id)
+        while len(self._entries) > self.max_devices:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, device_id: str) -> None:
+        self._entries.pop(device_id, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+def snippet(doc: dict, terms: list[str], width: int = SNIPPET_CHARS) -> dict | None:
+    """
+    A window of about width characters around the first match, from the
+    summary, then the translation, then the title. highlights are [start, end)
+    offsets of every matched word within text, so clients can mark them up
+    without trusting any HTML from us.
+    """
+    if not terms:
+        return None
+    pattern = re.compile(r"\b(?:" + "|".join(re.escape(term) for term in terms) + r")\b", re.IGNORECASE)
+    for field in ("summary", "translated_summary", "title"):
+        text = doc.get(field) or ""
+        first = pattern.search(text)
+        if first is None:
+            continue
+        start = max(0, first.start() - width // 3)
+        end = min(len(text), start + width)
+        start = max(0, end - width)
+        # Widen to word boundaries so no word is cut in half
+        while start > 0 and not text[start - 1].isspace():
+            start -= 1
+        while end < len(text) and not text[end].isspace():
+            end += 1
+        window = text[start:end]
+        prefix = "…" if start > 0 else ""
+        suffix = "…" if end < len(text) else ""
+        highlights = [
+            [m.start() + len(prefix), m.end() + len(prefix)] for m in pattern.finditer(window)
+        ]
+        return {"field": field, "text": prefix + window + suffix, "highlights": highlights}
+    return None
+
+
+cache = IndexCache()
@@ -0,0 +1,81 @@
+"""
+Request coalescing: concurrent callers asking for the same key share one
+in-flight upstream call instead of each making their own.
+
+The call runs in its own task, so the caller that started it (the leader)
+can go away without taking it down: it keeps running while anyone is still
+waiting and is cancelled once the last waiter leaves. A failure is raised to
+every caller that was waiting on it and is not remembered; the next caller
+starts a fresh call.
+"""
+import asyncio
+from typing import Awaitable, Callable, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class _Flight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    In-flight calls by key. Not thread-safe; intended for use from a single
+    event loop.
+    """
+
+    def __init__(self):
+        self._flights: dict[Hashable, _Flight] = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.failures = 0
+        self.abandoned = 0
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable[T]]) -> T:
+        """Await call(), or the call already in flight for key."""
+        flight = self._flights.get(key)
+        if flight is None or flight.task.get_loop() is not asyncio.get_running_loop():
+            flight = _Flight(asyncio.ensure_future(call()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda task: self._finish(key, flight))
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # Every caller has gone (e.g. disconnected); nobody needs the result
+                flight.task.cancel()
+                self.abandoned += 1
+
+    def _finish(self, key: Hashable, flight: _Flight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        # Retrieving the exception also keeps asyncio from logging it when
+        # every waiter has already left
+        if not flight.task.cancelled() and flight.task.exception() is not None:
+            self.failures += 1
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._flights),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "failures": self.failures,
+            "abandoned": self.abandoned,
+        }
+
+    def clear(self) -> None:
+        """Reset the counters. Calls still in flight are left to finish."""
+        self.leaders = self.coalesced = self.failures = self.abandoned = 0
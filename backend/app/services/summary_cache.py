@@ -0,0 +1,107 @@
+import hashlib
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from app.services.cache import TTLCache
+from app.services import metrics
+from app.services.db import get_db
+
+logger = logging.getLogger(__name__)
+
+CACHE_SIZE = int(os.getenv("SUMMARY_CACHE_SIZE", "1024"))
+CACHE_TTL = float(os.getenv("SUMMARY_CACHE_TTL", "3600"))
+# Shared tier: opt in so deployments without MongoDB keep working unchanged.
+MONGO_ENABLED = os.getenv("SUMMARY_CACHE_MONGO", "").lower() in ("1", "true", "yes")
+MONGO_TTL = float(os.getenv("SUMMARY_CACHE_MONGO_TTL", str(7 * 24 * 3600)))
+COLLECTION = "summary_cache"
+
+memory = TTLCache(maxsize=CACHE_SIZE, ttl=CACHE_TTL)
+mongo_hits = 0
+mongo_misses = 0
+_indexes_ready = False
+
+
+def normalize(text: str) -> str:
+    """Collapse whitespace so trivially different copies share a cache entry."""
+    return " ".join(text.split())
+
+
+def make_key(text: str, prompt: str, model: str) -> str:
+    digest = hashlib.sha256()
+    for part in (model, prompt, normalize(text)):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+async def _ensure_indexes(collection) -> None:
+    global _indexes_ready
+    if not _indexes_ready:
+        await collection.create_index("expires_at", expireAfterSeconds=0)
+        _indexes_ready = True
+
+
+def _collection():
+    return get_db()[COLLECTION]
+
+
+async def get(key: str) -> str | None:
+    """Look up a summary in memory first, then in the shared MongoDB tier."""
+    global mongo_hits, mongo_misses
+    value = memory.get(key)
+    if value is not None or not MONGO_ENABLED:
+        return value
+    try:
+        with metrics.stage("mongo.summary_cache_get"):
+            doc = await _collection().find_one(
+                {"_id": key, "expires_at": {"$gt": datetime.now(timezone.utc)}},
+                {"summary": 1},
+            )
+    except Exception:
+        logger.warning("summary cache lookup failed", exc_info=True)
+        return None
+    if doc is None:
+        mongo_misses += 1
+        return None
+    mongo_hits += 1
+    memory.set(key, doc["summary"])
+    return doc["summary"]
+
+
+async def put(key: str, summary: str) -> None:
+    memory.set(key, summary)
+    if not MONGO_ENABLED:
+        return
+    try:
+        collection = _collection()
+        await _ensure_indexes(collection)
+        now = datetime.now(timezone.utc)
+        with metrics.stage("mongo.summary_cache_put"):
+            await collection.update_one(
+                {"_id": key},
+                {"$set": {
+                    "summary": summary,
+                    "created_at": now,
+                    "expires_at": now + timedelta(seconds=MONGO_TTL),
+                }},
+                upsert=True,
+            )
+    except Exception:
+        logger.warning("summary cache write failed", exc_info=True)
+
+
+def stats() -> dict:
+    return {
+        "memory": memory.stats(),
+        "mongo": {
+            "enabled": MONGO_ENABLED,
+            "hits": mongo_hits,
+            "misses": mongo_misses,
+        },
+    }
+
+
+def clear() -> None:
+    global mongo_hits, mongo_misses
+    memory.clear()
+    mongo_hits = mongo_misses = 0
@@ -0,0 +1,41 @@
+"""
+Compressed storage of large text fields in MongoDB.
+
+Text at or above COMPRESS_MIN_BYTES is stored as zlib-compressed UTF-8 in a
+BSON binary with a user-defined subtype; shorter text, and text that does
+not shrink, stays a plain string. decode() accepts either form, so fields
+written before compression existed read back unchanged.
+"""
+import os
+import zlib
+
+from bson.binary import Binary
+
+COMPRESS_MIN_BYTES = int(os.getenv("HISTORY_COMPRESS_MIN_BYTES", "1024"))
+COMPRESS_LEVEL = int(os.getenv("HISTORY_COMPRESS_LEVEL", "6"))
+
+# BSON reserves subtypes 0x80-0xFF for application use
+ZLIB_SUBTYPE = 0x80
+
+
+def encode(text: str) -> str | Binary:
+    raw = text.encode("utf-8")
+    if len(raw) < COMPRESS_MIN_BYTES:
+        return text
+    compressed = zlib.compress(raw, COMPRESS_LEVEL)
+    if len(compressed) >= len(raw):
+        return text
+    return Binary(compressed, ZLIB_SUBTYPE)
+
+
+def decode(value) -> str | None:
+    if isinstance(value, Binary) and value.subtype == ZLIB_SUBTYPE:
+        return zlib.decompress(value).decode("utf-8")
+    return value
+
+
+def stored_size(value) -> int:
+    """Bytes value takes up in a document, before BSON framing."""
+    if isinstance(value, bytes):
+        return len(value)
+    return len(value.encode("utf-8")) if value else 0
@@ -1,15 +1,172 @@
-from deep_translator import GoogleTranslator
+import asyncio
+import hashlib
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
+from app.services import metrics
+from app.services.cache import TTLCache
+from app.services.single_flight import SingleFlight
+
+if TYPE_CHECKING:
+    import deep_translator
+
+# GoogleTranslator rejects inputs over 5000 characters
+SEGMENT_CHARS = int(os.getenv("TRANSLATE_SEGMENT_CHARS", "4500"))
+THREADS = int(os.getenv("TRANSLATE_THREADS", "8"))
+CACHE_SIZE = int(os.getenv("TRANSLATE_CACHE_SIZE", "1024"))
+CACHE_TTL = float(os.getenv("TRANSLATE_CACHE_TTL", "86400"))
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+cache = TTLCache(maxsize=CACHE_SIZE, ttl=CACHE_TTL)
+# Identical translations in flight at the same time, keyed like the cache
+flights = SingleFlight()
+_executor: ThreadPoolExecutor | None = None
+
+# Idle translators per target language. An instance keeps per-request state,
+# so each one is checked out by a single thread at a time.
+_idle: dict[str, list["deep_translator.GoogleTranslator"]] = {}
+_idle_lock = threading.Lock()
+
+# Set by translator_class() on first use
+GoogleTranslator = None
+
+
+def translator_class() -> type["deep_translator.GoogleTranslator"]:
+    """deep_translator's GoogleTranslator, imported on first use rather than
+    with the app (see main._preload)."""
+    global GoogleTranslator
+    if GoogleTranslator is None:
+        from deep_translator import GoogleTranslator
+    return GoogleTranslator
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=THREADS, thread_name_prefix="translate")
+    return _executor
+
+
+def _acquire(target_language: str) -> "deep_translator.GoogleTranslator":
+    with _idle_lock:
+        pool = _idle.get(target_language)
+        if pool:
+            return pool.pop()
+    return translator_class()(source='auto', target=target_language)
+
+
+def _release(target_language: str, translator: "deep_translator.GoogleTranslator") -> None:
+    with _idle_lock:
+        _idle.setdefault(target_language, []).append(translator)
+
+
+def _translate_segment(segment: str, target_language: str) -> str:
+    translator = _acquire(target_language)
+    try:
+        return translator.translate(segment)
+    finally:
+        _release(target_language, translator)
+
+
+def split_segments(text: str, max_chars: int) -> list[tuple[str, str]]:
+    """
+    Split text into (segment, separator) pairs no longer than max_chars,
+    cutting at line breaks first and sentence ends second. Joining each
+    segment with its separator reproduces the original layout.
+    """
+    pieces: list[tuple[str, str]] = []
+    for line in text.split("\n"):
+        if len(line) <= max_chars:
+            pieces.append((line, "\n"))
+            continue
+        for sentence in _SENTENCE_END.split(line):
+            while len(sentence) > max_chars:
+                pieces.append((sentence[:max_chars], ""))
+                sentence = sentence[max_chars:]
+            pieces.append((sentence, " "))
+        pieces[-1] = (pieces[-1][0], "\n")
+    pieces[-1] = (pieces[-1][0], "")
+
+    segments: list[tuple[str, str]] = []
+    current, current_sep = "", ""
+    for piece, sep in pieces:
+        if current and len(current) + len(current_sep) + len(piece) > max_chars:
+            segments.append((current, current_sep))
+            current, current_sep = piece, sep
+        elif current or current_sep:
+            current, current_sep = current + current_sep + piece, sep
+        else:
+            current, current_sep = piece, sep
+    segments.append((current, current_sep))
+    return segments
+
+
+def _cache_key(text: str, target_language: str) -> tuple[str, str]:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest(), target_language
+
+
+async def _translate_and_cache(text: str, target_language: str, key: tuple[str, str]) -> str:
+    loop = asyncio.get_running_loop()
+    segments = split_segments(text, SEGMENT_CHARS)
+    with metrics.stage("translate"):
+        translated_segments = await asyncio.gather(*(
+            loop.run_in_executor(_get_executor(), _translate_segment, segment, target_language)
+            if segment.strip() else asyncio.sleep(0, result=segment)
+            for segment, _ in segments
+        ))
+    translated = "".join(
+        (translated_segment or "") + sep
+        for translated_segment, (_, sep) in zip(translated_segments, segments)
+    )
+    cache.set(key, translated)
+    return translated
+
 
 async def translate(text: str, target_language: str) -> str:
     """
     Translates text to the target language using deep-translator (GoogleTranslator).
-    Source language is auto-detected.
+    Source language is auto-detected. The blocking HTTP calls run on a thread
+    pool; long texts are split into segments translated concurrently.
+    Concurrent requests for the same text and language share one translation.
     """
     try:
-        # GoogleTranslator(source='auto', target='fi')
-        # Map some common names to codes if needed, but the UI will send codes.
-        translator = GoogleTranslator(source='auto', target=target_language)
-        translated = translator.translate(text)
-        return translated
+        key = _cache_key(text, target_language)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+        return await flights.do(key, lambda: _translate_and_cache(text, target_language, key))
     except Exception as e:
         raise e
+
+
+async def translate_many(text: str, target_languages: list[str]) -> dict[str, str]:
+    """Translate one text into several languages in parallel."""
+    unique = list(dict.fromkeys(target_languages))
+    results = await asyncio.gather(*(translate(text, language) for language in unique))
+    return dict(zip(unique, results))
+
+
+def warm_up(languages: list[str]) -> None:
+    """Create the thread pool and pre-build translators for common languages."""
+    _get_executor()
+    for language in languages:
+        _release(language, translator_class()(source='auto', target=language))
+
+
+def close() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+    with _idle_lock:
+        _idle.clear()
+
+
+def clear() -> None:
+    cache.clear()
+    flights.clear()
+    with _idle_lock:
+        _idle.clear()
@@ -0,0 +1,147 @@
+"""
+Process-wide settings, read from the environment once, when the app is first
+imported: credentials and endpoints, the lifecycle knobs, the API's request
+limits, and the LLM layer (backend and models, client pool, long-document
+mode, admission control and the batch queue). .env is loaded here and
+nowhere else. The services this covers bind their constants from this
+object, so tests can still patch them per module.
+
+Not everything is here yet: the history store, caches, compression,
+translation and upload parsing still read their own tuning constants with
+os.getenv at import. They import this module first, so they see .env too.
+
+Under gunicorn --preload this happens once in the master and every worker
+inherits the result.
+"""
+import os
+from dataclasses import dataclass, field
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def _list(value: str) -> list[str]:
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def _mapping(value: str) -> dict[str, str]:
+    """"a=x,b=y" as {"a": "x", "b": "y"}; entries without "=" are ignored."""
+    return dict(item.split("=", 1) for item in _list(value) if "=" in item)
+
+
+def _flag(value: str) -> bool:
+    return value.lower() not in ("0", "false", "no", "off")
+
+
+@dataclass
+class Settings:
+    openai_api_key: str | None = None
+    openai_base_url: str | None = None
+    mongodb_uri: str | None = None
+    frontend_url: str = ""
+    startup_warmup_timeout: float = 15
+    # Keep below gunicorn's --graceful-timeout so workers are not killed mid-drain
+    shutdown_drain_timeout: float = 20
+    ready_check_timeout: float = 2
+    translate_warm_languages: list[str] = field(default_factory=list)
+
+    # API request limits
+    summarize_max_variants: int = 8
+    batch_max_items: int = 500
+    history_page_max: int = 100
+    history_import_max_errors: int = 20
+
+    # LLM backend and models
+    llm_backend: str = "openai"
+    llm_model: str = "gpt-4o-mini"
+    llm_notes_model: str | None = None
+    llm_model_by_summary_type: dict[str, str] = field(default_factory=dict)
+    llm_base_url: str = "http://127.0.0.1:8080/v1"
+    llm_api_key: str | None = None
+    fake_llm_latency: float = 0
+    fake_llm_tokens_per_second: float = 0
+    fake_llm_output_tokens: int = 50
+    openai_max_connections: int = 100
+    openai_max_keepalive_connections: int = 20
+    openai_max_concurrency: int = 64
+    openai_timeout: float = 120
+    openai_connect_timeout: float = 10
+    long_doc_threshold_tokens: int = 12000
+    chunk_tokens: int = 3000
+    chunk_overlap_tokens: int = 150
+    map_concurrency: int = 8
+    prefix_cache_min_tokens: int = 1024
+    variant_prime_prefix: bool = True
+
+    # Admission control
+    llm_rpm_limit: float = 0
+    llm_tpm_limit: float = 0
+    admission_output_tokens: int = 400
+    admission_max_queue: int = 256
+    admission_max_queue_per_client: int = 16
+    admission_max_wait: float = 30
+    admission_max_retries: int = 3
+    admission_backoff_base: float = 0.5
+    admission_backoff_max: float = 20
+
+    # Batch queue
+    batch_workers: int = 4
+    batch_max_retries: int = 5
+    batch_backoff_base: float = 1.0
+    batch_backoff_max: float = 60
+    batch_max_jobs_retained: int = 200
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        return cls(
+            openai_api_key=os.getenv("OPENAI_API_KEY") or None,
+            openai_base_url=os.getenv("OPENAI_BASE_URL") or None,
+            mongodb_uri=os.getenv("MONGODB_URI") or None,
+            frontend_url=os.getenv("FRONTEND_URL", "").rstrip("/"),
+            startup_warmup_timeout=float(os.getenv("STARTUP_WARMUP_TIMEOUT", "15")),
+            shutdown_drain_timeout=float(os.getenv("SHUTDOWN_DRAIN_TIMEOUT", "20")),
+            ready_check_timeout=float(os.getenv("READY_CHECK_TIMEOUT", "2")),
+            translate_warm_languages=_list(os.getenv("TRANSLATE_WARM_LANGUAGES", "en,fi,sv,ar,ur")),
+            summarize_max_variants=int(os.getenv("SUMMARIZE_MAX_VARIANTS", "8")),
+            batch_max_items=int(os.getenv("BATCH_MAX_ITEMS", "500")),
+            history_page_max=int(os.getenv("HISTORY_PAGE_MAX", "100")),
+            history_import_max_errors=int(os.getenv("HISTORY_IMPORT_MAX_ERRORS", "20")),
+            llm_backend=os.getenv("LLM_BACKEND", "openai"),
+            llm_model=os.getenv("LLM_MODEL", "gpt-4o-mini"),
+            llm_notes_model=os.getenv("LLM_NOTES_MODEL") or None,
+            llm_model_by_summary_type=_mapping(os.getenv("LLM_MODEL_BY_SUMMARY_TYPE", "")),
+            llm_base_url=os.getenv("LLM_BASE_URL", "http://127.0.0.1:8080/v1"),
+            llm_api_key=os.getenv("LLM_API_KEY") or None,
+            fake_llm_latency=float(os.getenv("FAKE_LLM_LATENCY", "0")),
+            fake_llm_tokens_per_second=float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", "0")),
+            fake_llm_output_tokens=int(os.getenv("FAKE_LLM_OUTPUT_TOKENS", "50")),
+            openai_max_connections=int(os.getenv("OPENAI_MAX_CONNECTIONS", "100")),
+            openai_max_keepalive_connections=int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "20")),
+            openai_max_concurrency=int(os.getenv("OPENAI_MAX_CONCURRENCY", "64")),
+            openai_timeout=float(os.getenv("OPENAI_TIMEOUT", "120")),
+            openai_connect_timeout=float(os.getenv("OPENAI_CONNECT_TIMEOUT", "10")),
+            long_doc_threshold_tokens=int(os.getenv("LONG_DOC_THRESHOLD_TOKENS", "12000")),
+            chunk_tokens=int(os.getenv("CHUNK_TOKENS", "3000")),
+            chunk_overlap_tokens=int(os.getenv("CHUNK_OVERLAP_TOKENS", "150")),
+            map_concurrency=int(os.getenv("MAP_CONCURRENCY", "8")),
+            prefix_cache_min_tokens=int(os.getenv("PREFIX_CACHE_MIN_TOKENS", "1024")),
+            variant_prime_prefix=_flag(os.getenv("VARIANT_PRIME_PREFIX", "true")),
+            llm_rpm_limit=float(os.getenv("LLM_RPM_LIMIT", "0")),
+            llm_tpm_limit=float(os.getenv("LLM_TPM_LIMIT", "0")),
+            admission_output_tokens=int(os.getenv("ADMISSION_OUTPUT_TOKENS", "400")),
+            admission_max_queue=int(os.getenv("ADMISSION_MAX_QUEUE", "256")),
+            admission_max_queue_per_client=int(os.getenv("ADMISSION_MAX_QUEUE_PER_CLIENT", "16")),
+            admission_max_wait=float(os.getenv("ADMISSION_MAX_WAIT", "30")),
+            admission_max_retries=int(os.getenv("ADMISSION_MAX_RETRIES", "3")),
+            admission_backoff_base=float(os.getenv("ADMISSION_BACKOFF_BASE", "0.5")),
+            admission_backoff_max=float(os.getenv("ADMISSION_BACKOFF_MAX", "20")),
+            batch_workers=int(os.getenv("BATCH_WORKERS", "4")),
+            batch_max_retries=int(os.getenv("BATCH_MAX_RETRIES", "5")),
+            batch_backoff_base=float(os.getenv("BATCH_BACKOFF_BASE", "1.0")),
+            batch_backoff_max=float(os.getenv("BATCH_BACKOFF_MAX", "60")),
+            batch_max_jobs_retained=int(os.getenv("BATCH_MAX_JOBS_RETAINED", "200")),
+        )
+
+
+settings = Settings.from_env()
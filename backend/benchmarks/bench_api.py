@@ -0,0 +1,375 @@
+"""
+End-to-end load benchmark for the API: scenarios mixing /summarize,
+/translate, /upload and the /history endpoints, driven through the whole
+FastAPI app in-process, with fakes of configurable latency behind it.
+
+The LLM is llm_backends.FakeBackend, the translator a stand-in for
+GoogleTranslator that blocks its thread for --translate-latency, and history
+is a throwaway SQLite store or MongoDB (mongomock, or BENCH_MONGODB_URI) with
+--db-rtt-ms added to every call. Transcripts grow from test_transcript.txt to
+a mix of sizes up to past the long-document threshold; every request carries
+its own text, so the caches do not answer for the backends.
+
+Each scenario runs --requests requests at --concurrency in flight and
+reports throughput, p50/p95/p99 latency (also per endpoint), errors and
+process memory. --json writes the results with the commit they were taken
+at; --compare prints the change against such a file.
+
+    python -m benchmarks.bench_api
+    python -m benchmarks.bench_api --scenario mixed --requests 1000 --json after.json --compare before.json
+    python -m benchmarks.bench_api --storage mongo --db-rtt-ms 20 --llm-latency 1.5
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import tempfile
+import time
+import zipfile
+from contextlib import ExitStack
+from datetime import datetime, timezone
+from pathlib import Path
+from unittest.mock import patch
+
+import httpx
+
+from app.main import app
+from app.services import file_parser, history_service, llm_backends, openai_service, translate_service
+from app.services.history_sqlite import SQLiteHistoryStore
+from benchmarks.mongo import SlowDatabase, bench_db
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+SEED_FILE = BACKEND_DIR / "test_transcript.txt"
+
+
+def _read_seed() -> str:
+    raw = SEED_FILE.read_bytes()
+    encoding = next((encoding for bom, encoding in file_parser._BOMS if raw.startswith(bom)), "utf-8")
+    return raw.decode(encoding).strip()
+
+
+SEED = _read_seed()
+
+# Transcript size classes and how often each is sent (bytes of text, weight).
+# 64 KB is past LONG_DOC_THRESHOLD_TOKENS, so it takes the map-reduce path.
+SIZES = {"seed": (0, 20), "2k": (2_000, 45), "16k": (16_000, 25), "64k": (64_000, 10)}
+
+SCENARIOS = {
+    "summarize": {"summarize": 1},
+    "translate": {"translate": 1},
+    "upload": {"upload": 1},
+    "history": {"history_page": 45, "history_item": 20, "history_save": 15, "history_search": 15, "history_delete": 5},
+    "mixed": {
+        "summarize": 25, "translate": 10, "upload": 10,
+        "history_page": 30, "history_item": 10, "history_save": 10, "history_search": 5,
+    },
+}
+
+LANGUAGES = ["fi", "sv", "ar", "ur", "de"]
+SEARCH_TERMS = ["knee", "headache exercises", "blood pressure", "sleep", "medication dose"]
+_LINES = [
+    "Doctor: How has the {0} been since the last visit?",
+    "Patient: Better in the morning, but the {0} comes back in the evening.",
+    "Doctor: Are you still taking the medication dose we agreed on for the {0}?",
+    "Patient: Yes, and I did the knee exercises most days.",
+    "Doctor: Let's check your blood pressure and talk about sleep.",
+]
+_TOPICS = ["headache", "knee pain", "cough", "back pain", "dizziness"]
+
+
+def transcript(size: int, i: int) -> str:
+    """The seed transcript, grown to about size bytes with doctor-patient
+    dialogue; i makes it unique so no cache answers for it."""
+    lines = [f"Visit {i}. {SEED}"]
+    length = len(lines[0])
+    n = 0
+    while length < size:
+        line = _LINES[n % len(_LINES)].format(_TOPICS[(n // len(_LINES) + i) % len(_TOPICS)])
+        lines.append(line)
+        length += len(line) + 1
+        n += 1
+    return "\n".join(lines)
+
+
+def _docx(text: str) -> bytes:
+    paragraphs = "".join(f"<w:p><w:r><w:t>{line}</w:t></w:r></w:p>" for line in text.splitlines())
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr(
+            "word/document.xml",
+            f'<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"><w:body>{paragraphs}</w:body></w:document>',
+        )
+    return buffer.getvalue()
+
+
+class FakeTranslator:
+    """Stand-in for deep_translator.GoogleTranslator: a blocking call of
+    `latency` seconds, as the real one makes an HTTP request."""
+
+    latency = 0.0
+
+    def __init__(self, source: str = "auto", target: str = "en"):
+        self.target = target
+
+    def translate(self, text: str) -> str:
+        time.sleep(self.latency)
+        return f"[{self.target}] {text}"
+
+
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        # Peak rather than current outside Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def _summary(latencies: list[float]) -> dict:
+    if not latencies:
+        return {"count": 0}
+    return {
+        "count": len(latencies),
+        "p50_ms": _percentile(latencies, 50) * 1000,
+        "p95_ms": _percentile(latencies, 95) * 1000,
+        "p99_ms": _percentile(latencies, 99) * 1000,
+    }
+
+
+class Workload:
+    """The requests of every scenario, over --devices devices whose history
+    is seeded with --history-items entries each."""
+
+    def __init__(self, rng: random.Random, devices: int):
+        self.rng = rng
+        self.devices = [f"bench-device-{n}" for n in range(devices)]
+        self.ids: dict[str, list[str]] = {}
+        self._sizes = list(SIZES.values())
+
+    def _size(self) -> int:
+        return self.rng.choices([size for size, _ in self._sizes], [weight for _, weight in self._sizes])[0]
+
+    def _device(self) -> dict:
+        return {"X-Device-Id": self.rng.choice(self.devices)}
+
+    async def seed(self, items: int) -> None:
+        for device in self.devices:
+            payloads = [
+                {"input_text": transcript(2_000, i), "summary": f"Visit {i}: {_TOPICS[i % len(_TOPICS)]} improving.", "summary_type": "brief"}
+                for i in range(items)
+            ]
+            await history_service.bulk_upsert_summaries(device, payloads, ordered=True)
+            page = await history_service.get_history(device, limit=min(100, items))
+            self.ids[device] = [item["id"] for item in page["items"]]
+
+    async def summarize(self, client: httpx.AsyncClient, i: int) -> httpx.Response:
+        body = {"text": transcript(self._size(), i), "summary_type": self.rng.choice(["brief", "detailed"])}
+        # The app sends its device id; admission queues are per client
+        return await client.post("/summarize", json=body, headers=self._device())
+
+    async def translate(self, client: httpx.AsyncClient, i: int) -> httpx.Response:
+        # Summaries are what gets translated: a few hundred words
+        body = {"text": transcript(1_500, i), "target_language": self.rng.choice(LANGUAGES)}
+        return await client.post("/translate", json=body)
+
+    async def upload(self, client: httpx.AsyncClient, i: int) -> httpx.Response:
+        kind = self.rng.random()
+        if kind < 0.2:
+            name, content = SEED_FILE.name, SEED_FILE.read_bytes()
+        elif kind < 0.7:
+            name, content = "visit.txt", transcript(self._size(), i).encode("utf-8")
+        else:
+            name, content = "visit.docx", _docx(transcript(self._size(), i))
+        return await client.post("/upload", files={"file": (name, content, "application/octet-stream")})
+
+    async def history_page(self, client: httpx.AsyncClient, i: int) -> httpx.Response:
+        return await client.get("/history", params={"limit": 20}, headers=self._device())
+
+    async def history_item(self, client: httpx.AsyncClient, i: int) -> httpx.Response:
+        headers = self._device()
+        ids = self.ids[headers["X-Device-Id"]]
+        return await client.get(f"/history/{self.rng.choice(ids)}", headers=headers)
+
+    async def history_save(self, client: httpx.AsyncClient, i: int) -> httpx.Response:
+        body = {"input_text": transcript(2_000, 10_000 + i), "summary": f"Visit {i}.", "summary_type": "brief"}
+        response = await client.post("/history", json=body, headers=(headers := self._device()))
+        if response.status_code == 200:
+            self.ids[headers["X-Device-Id"]].append(response.json()["id"])
+        return response
+
+    async def history_search(self, client: httpx.AsyncClient, i: int) -> httpx.Response:
+        return await client.get("/history/search", params={"q": self.rng.choice(SEARCH_TERMS)}, headers=self._device())
+
+    async def history_delete(self, client: httpx.AsyncClient, i: int) -> httpx.Response:
+        headers = self._device()
+        ids = self.ids[headers["X-Device-Id"]]
+        # Keep a few entries so history_item always has something to read
+        summary_id = ids.pop(self.rng.randrange(len(ids))) if len(ids) > 5 else "000000000000000000000000"
+        return await client.delete(f"/history/{summary_id}", headers=headers)
+
+
+async def run_scenario(client: httpx.AsyncClient, workload: Workload, mix: dict[str, int], requests: int, concurrency: int) -> dict:
+    operations = workload.rng.choices(list(mix), list(mix.values()), k=requests)
+    latencies: dict[str, list[float]] = {operation: [] for operation in mix}
+    errors: dict[str, int] = {}
+    semaphore = asyncio.Semaphore(concurrency)
+    rss_start = peak = _rss_mb()
+    done = asyncio.Event()
+
+    async def sample_memory():
+        nonlocal peak
+        while not done.is_set():
+            peak = max(peak, _rss_mb())
+            await asyncio.sleep(0.02)
+
+    async def one(i: int, operation: str):
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                response = await getattr(workload, operation)(client, i)
+                ok = response.status_code < 400
+            except Exception:
+                ok = False
+            latencies[operation].append(time.perf_counter() - started)
+            if not ok:
+                errors[operation] = errors.get(operation, 0) + 1
+
+    sampler = asyncio.create_task(sample_memory())
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i, operation) for i, operation in enumerate(operations)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    await sampler
+
+    everything = [latency for values in latencies.values() for latency in values]
+    return {
+        **_summary(everything),
+        "errors": sum(errors.values()),
+        "duration_s": elapsed,
+        "throughput_rps": requests / elapsed,
+        "rss_start_mb": rss_start,
+        "rss_peak_mb": max(peak, _rss_mb()),
+        "endpoints": {operation: {**_summary(values), "errors": errors.get(operation, 0)} for operation, values in latencies.items()},
+    }
+
+
+def _commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args: argparse.Namespace) -> dict:
+    FakeTranslator.latency = args.translate_latency
+    backend = llm_backends.FakeBackend(args.llm_latency, args.llm_tps, args.llm_output_tokens)
+    scenarios = list(SCENARIOS) if args.scenario == "all" else [args.scenario]
+    results = {
+        "meta": {
+            "commit": _commit(),
+            "taken_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "args": vars(args),
+        },
+        "scenarios": {},
+    }
+    with ExitStack() as stack:
+        stack.enter_context(patch.object(openai_service, "_backend", backend))
+        stack.enter_context(patch.object(translate_service, "GoogleTranslator", FakeTranslator))
+        if args.storage == "sqlite":
+            directory = stack.enter_context(tempfile.TemporaryDirectory())
+            store = SQLiteHistoryStore(os.path.join(directory, "history.db"))
+            stack.enter_context(patch.object(history_service, "BACKEND", "sqlite"))
+            stack.enter_context(patch.object(history_service, "_store", store))
+        else:
+            store = None
+            raw_db, _ = bench_db("text_summarizer_api_bench")
+            for name in ("summaries", history_service.TRANSCRIPTS):
+                await raw_db[name].drop()
+            stack.enter_context(patch.object(history_service, "get_db", return_value=SlowDatabase(raw_db, args.db_rtt_ms)))
+        try:
+            await history_service.ensure_indexes()
+            workload = Workload(random.Random(args.seed), args.devices)
+            await workload.seed(args.history_items)
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+                for name in scenarios:
+                    results["scenarios"][name] = await run_scenario(
+                        client, workload, SCENARIOS[name], args.requests, args.concurrency
+                    )
+        finally:
+            if store is not None:
+                await store.close()
+            translate_service.close()
+            file_parser.close()
+    return results
+
+
+def _print(results: dict, baseline: dict | None) -> None:
+    print(f"{'':>12}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}{'peak MB':>9}")
+    for name, result in results["scenarios"].items():
+        print(
+            f"{name:>12}{result['throughput_rps']:>9.1f}{result['p50_ms']:>9.1f}{result['p95_ms']:>9.1f}"
+            f"{result['p99_ms']:>9.1f}{result['errors']:>8}{result['rss_peak_mb']:>9.0f}"
+        )
+        for operation, stats in result["endpoints"].items():
+            if stats["count"] and len(result["endpoints"]) > 1:
+                print(f"{operation:>24}{stats['p50_ms']:>18.1f}{stats['p95_ms']:>9.1f}{stats['p99_ms']:>9.1f}{stats['errors']:>8}")
+    if not baseline:
+        return
+    print(f"\nchange against {baseline['meta'].get('commit') or 'baseline'} (negative latency is better)")
+    for name, result in results["scenarios"].items():
+        before = baseline["scenarios"].get(name)
+        if not before:
+            continue
+        changes = "".join(
+            f"{key}: {(result[key] - before[key]) / before[key]:+7.1%}   "
+            for key in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms", "rss_peak_mb")
+            if before.get(key)
+        )
+        print(f"{name:>12}  {changes}")
+
+
+def parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scenario", choices=["all", *SCENARIOS], default="all")
+    parser.add_argument("--requests", type=int, default=300, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="fake LLM time to first token (s)")
+    parser.add_argument("--llm-tps", type=float, default=200, help="fake LLM tokens per second (0 = instant)")
+    parser.add_argument("--llm-output-tokens", type=int, default=50)
+    parser.add_argument("--translate-latency", type=float, default=0.05, help="fake translator call (s)")
+    parser.add_argument("--storage", choices=["sqlite", "mongo"], default="sqlite")
+    parser.add_argument("--db-rtt-ms", type=float, default=0, help="simulated round trip per MongoDB call")
+    parser.add_argument("--devices", type=int, default=20)
+    parser.add_argument("--history-items", type=int, default=50, help="history entries seeded per device")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", metavar="PATH", help="write the results as JSON")
+    parser.add_argument("--compare", metavar="PATH", help="a previous --json output to compare against")
+    return parser
+
+
+def main():
+    args = parser().parse_args()
+
+    results = asyncio.run(run(args))
+    baseline = json.loads(Path(args.compare).read_text()) if args.compare else None
+    _print(results, baseline)
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Time and memory benchmark for compression.compress on synthetic consultation
+transcripts of 10k-500k characters: speaker turns mixing small talk, filler
+and clinical content, with enough varied vocabulary to grow the TF-IDF
+matrix the way real transcripts do.
+
+    python -m benchmarks.bench_compression --sizes 10000 100000 500000 --ratio 0.3
+"""
+import argparse
+import random
+import time
+import tracemalloc
+
+from app.services import compression
+
+FILLER = [
+    "Um, okay.", "Right, right.", "Yeah, I see.", "Uh, sure.", "Okay, thank you.", "Mm-hmm.",
+    "Good morning, how are you?", "Let me just pull that up.", "Sorry, one second.", "Alright then.",
+]
+SMALL_TALK = [
+    "The traffic on the way here was terrible this morning.",
+    "My daughter started at a new school in {word} last week.",
+    "We had the whole family over for {word} on Sunday.",
+    "The weather has been lovely, we went walking near {word}.",
+]
+CLINICAL = [
+    "The {word} pain started about {n} days ago and is worse at night.",
+    "I take {n} mg of {word} twice a day with food.",
+    "Blood pressure today is {n} over 85.",
+    "Any allergies to {word} or other medications?",
+    "We will order a {word} scan and follow up in {n} weeks.",
+    "The cough has been producing some {word} phlegm since {word}.",
+]
+VOCABULARY = [f"{a}{b}" for a in ("ker", "mal", "tor", "vin", "sal", "dep", "lum", "rox") for b in ("a", "o", "ine", "ex", "ol", "an")]
+
+
+def make_transcript(chars: int, seed: int = 0) -> tuple[str, int]:
+    """A transcript of about chars characters and how many clinical sentences it holds."""
+    rng = random.Random(seed)
+    lines: list[str] = []
+    size = clinical = 0
+    speakers = ("Doctor", "Patient")
+    while size < chars:
+        sentences = []
+        for _ in range(rng.randint(1, 3)):
+            kind = rng.random()
+            if kind < 0.45:
+                sentences.append(rng.choice(FILLER))
+            elif kind < 0.7:
+                sentences.append(rng.choice(SMALL_TALK).format(word=rng.choice(VOCABULARY)))
+            else:
+                template = rng.choice(CLINICAL)
+                sentences.append(template.format(word=rng.choice(VOCABULARY), n=rng.randint(2, 400)))
+                clinical += 1
+        line = f"{speakers[len(lines) % 2]}: {' '.join(sentences)}"
+        lines.append(line)
+        size += len(line) + 1
+    return "\n".join(lines), clinical
+
+
+def _measure(text: str, ratio: float, repeats: int) -> tuple[float, float, compression.CompressionResult]:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = compression.compress(text, ratio=ratio)
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    compression.compress(text, ratio=ratio)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak / 1024 / 1024, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 50_000, 100_000, 250_000, 500_000])
+    parser.add_argument("--ratio", type=float, default=0.5)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    compression.MIN_TOKENS = 0
+    print(f"ratio={args.ratio}")
+    for chars in args.sizes:
+        text, clinical = make_transcript(chars)
+        seconds, peak_mb, result = _measure(text, args.ratio, args.repeats)
+        kept = sum(1 for line in result.text.splitlines() for m in compression._CLINICAL.finditer(line))
+        total = sum(1 for m in compression._CLINICAL.finditer(text))
+        report = result.report()
+        print(
+            f"{chars:>8} chars: {seconds * 1000:7.1f} ms  {chars / seconds / 1e6:5.2f} MB/s  peak {peak_mb:6.1f} MB  "
+            f"tokens {report['original_tokens']:>6} -> {report['compressed_tokens']:>6} "
+            f"(-{report['reduction']:.0%})  clinical mentions kept {kept / total:.0%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
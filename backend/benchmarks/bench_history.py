@@ -0,0 +1,110 @@
+"""
+Save-latency benchmark for history_service.upsert_summary.
+
+Seeds one device with many large history items, then times saves of an
+existing transcript (update path) and of new transcripts (insert path) with
+the previous find_one-on-input_text implementation and the current atomic
+hash-keyed upsert.
+
+    python -m benchmarks.bench_history --items 2000 --transcript-kb 50
+    python -m benchmarks.bench_history --rtt-ms 20   # approximate WAN latency
+    BENCH_MONGODB_URI=mongodb://localhost:27017 python -m benchmarks.bench_history
+
+mongomock has no real indexes, so without BENCH_MONGODB_URI the numbers
+mostly reflect the number of round trips per save.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+from app.services import history_service
+from benchmarks.mongo import SlowDatabase, bench_db
+
+DEVICE = "bench-device"
+
+
+async def _legacy_upsert(db, device_id: str, data: dict) -> None:
+    existing = await db["summaries"].find_one({
+        "device_id": device_id,
+        "input_text": data["input_text"],
+        "deleted_at": None,
+    })
+    now = datetime.now(timezone.utc)
+    if existing:
+        await db["summaries"].update_one({"_id": existing["_id"]}, {"$set": {"summary": data["summary"], "updated_at": now}})
+    else:
+        await db["summaries"].insert_one({
+            **data, "input_hash": history_service.hash_input(data["input_text"]),
+            "device_id": device_id, "created_at": now, "updated_at": now, "deleted_at": None,
+        })
+
+
+def _transcript(i: int, size_kb: int) -> str:
+    line = f"Doctor: Visit {i}, how is the pain today? Patient: About the same as last week.\n"
+    return line * (size_kb * 1024 // len(line))
+
+
+async def _seed(db, items: int, size_kb: int) -> None:
+    await db["summaries"].delete_many({"device_id": DEVICE})
+    now = datetime.now(timezone.utc)
+    docs = []
+    for i in range(items):
+        text = _transcript(i, size_kb)
+        docs.append({
+            "device_id": DEVICE, "title": f"Visit {i}", "input_text": text,
+            "input_hash": history_service.hash_input(text), "summary": "s",
+            "created_at": now, "updated_at": now, "deleted_at": None,
+        })
+        if len(docs) == 500:
+            await db["summaries"].insert_many(docs)
+            docs = []
+    if docs:
+        await db["summaries"].insert_many(docs)
+    await history_service.ensure_indexes()
+
+
+async def _time(save, payloads) -> list[float]:
+    latencies = []
+    for payload in payloads:
+        started = time.perf_counter()
+        await save(payload)
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+async def _run(items: int, size_kb: int, saves: int, rtt_ms: float) -> None:
+    raw_db, backend = bench_db()
+    db = SlowDatabase(raw_db, rtt_ms)
+    print(f"backend={backend} items={items} transcript={size_kb} KB saves={saves} rtt={rtt_ms} ms")
+    with patch("app.services.history_service.get_db", return_value=db):
+        implementations = {
+            "legacy": lambda payload: _legacy_upsert(db, DEVICE, payload),
+            "atomic": lambda payload: history_service.upsert_summary(DEVICE, payload),
+        }
+        for name, save in implementations.items():
+            await _seed(db, items, size_kb)
+            existing = [{"input_text": _transcript(i, size_kb), "summary": "updated"} for i in range(saves)]
+            new = [{"input_text": _transcript(items + i, size_kb), "summary": "new"} for i in range(saves)]
+            for label, payloads in (("update", existing), ("insert", new)):
+                latencies = await _time(save, payloads)
+                print(
+                    f"{name:>7} {label}: p50 {statistics.median(latencies) * 1000:8.2f} ms  "
+                    f"max {max(latencies) * 1000:8.2f} ms"
+                )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--transcript-kb", type=int, default=50)
+    parser.add_argument("--saves", type=int, default=50)
+    parser.add_argument("--rtt-ms", type=float, default=0, help="simulated network round trip per DB call")
+    args = parser.parse_args()
+    asyncio.run(_run(args.items, args.transcript_kb, args.saves, args.rtt_ms))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Latency benchmark for the history storage backends: the same workload through
+history_service against MongoDB and against the embedded SQLite store.
+
+Seeds one device with --items history entries, then times each operation
+--repeat times: saves of existing and new transcripts, the first and a deep
+page of history, a single entry, a search, a predecessor lookup and a delete.
+
+    python -m benchmarks.bench_history_backends --items 2000
+    python -m benchmarks.bench_history_backends --rtt-ms 20   # Atlas over the WAN
+    BENCH_MONGODB_URI=mongodb://localhost:27017 python -m benchmarks.bench_history_backends
+
+Without BENCH_MONGODB_URI the MongoDB column is mongomock, which scans every
+document on each query; --rtt-ms adds the per-call network delay a remote
+cluster would.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from unittest.mock import patch
+
+from app.services import history_service
+from app.services.history_sqlite import SQLiteHistoryStore
+from benchmarks.mongo import SlowDatabase, bench_db
+
+DEVICE = "bench-device"
+
+
+def _transcript(i: int) -> str:
+    lines = [f"Doctor: Visit {i}, question {j} about the knee and the physiotherapy exercises?" for j in range(60)]
+    return "\n".join(lines)
+
+
+def _payload(i: int, summary: str = "Knee pain improving with exercises.") -> dict:
+    return {"input_text": _transcript(i), "summary": f"{summary} Visit {i}.", "summary_type": "brief"}
+
+
+async def _seed(items: int) -> None:
+    await history_service.ensure_indexes()
+    for start in range(0, items, 500):
+        batch = [_payload(i) for i in range(start, min(items, start + 500))]
+        await history_service.bulk_upsert_summaries(DEVICE, batch, ordered=True)
+
+
+async def _time(label: str, operation, repeat: int) -> tuple[str, float, float]:
+    latencies = []
+    for i in range(repeat):
+        started = time.perf_counter()
+        await operation(i)
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    return label, statistics.median(latencies) * 1000, p99 * 1000
+
+
+async def _workload(items: int, repeat: int) -> list[tuple[str, float, float]]:
+    await _seed(items)
+    first = await history_service.get_history(DEVICE, limit=20)
+    deep_cursor = first["next_cursor"]
+    for _ in range(min(20, items // 40)):
+        deep_cursor = (await history_service.get_history(DEVICE, cursor=deep_cursor, limit=20))["next_cursor"]
+    ids = [item["id"] for item in first["items"]]
+    extended = _transcript(items - 1) + "\nPatient: One more thing about the swelling."
+    await history_service.search_history(DEVICE, "knee")  # Build the search index once
+
+    return [
+        await _time("save (update)", lambda i: history_service.upsert_summary(DEVICE, _payload(i % items, "Updated.")), repeat),
+        await _time("save (insert)", lambda i: history_service.upsert_summary(DEVICE, _payload(items + i)), repeat),
+        await _time("history page 1", lambda i: history_service.get_history(DEVICE, limit=20), repeat),
+        await _time("history deep page", lambda i: history_service.get_history(DEVICE, cursor=deep_cursor, limit=20), repeat),
+        await _time("get summary", lambda i: history_service.get_summary(DEVICE, ids[i % len(ids)]), repeat),
+        await _time("search (warm)", lambda i: history_service.search_history(DEVICE, "knee exercises"), repeat),
+        await _time("find predecessor", lambda i: history_service.find_predecessor(DEVICE, extended, "brief", "paragraph", "professional"), repeat),
+        await _time("delete", lambda i: history_service.delete_summary(DEVICE, ids[i % len(ids)]), repeat),
+    ]
+
+
+async def _mongo(items: int, repeat: int, rtt_ms: float) -> tuple[str, list]:
+    raw_db, backend = bench_db("text_summarizer_backends_bench")
+    for name in ("summaries", history_service.TRANSCRIPTS):
+        await raw_db[name].drop()
+    with patch("app.services.history_service.get_db", return_value=SlowDatabase(raw_db, rtt_ms)):
+        return f"{backend} (rtt {rtt_ms:g} ms)", await _workload(items, repeat)
+
+
+async def _sqlite(items: int, repeat: int) -> tuple[str, list]:
+    with tempfile.TemporaryDirectory() as directory:
+        store = SQLiteHistoryStore(os.path.join(directory, "history.db"))
+        with patch.object(history_service, "BACKEND", "sqlite"), patch.object(history_service, "_store", store):
+            try:
+                return "sqlite", await _workload(items, repeat)
+            finally:
+                await store.close()
+
+
+async def _run(items: int, repeat: int, rtt_ms: float) -> None:
+    print(f"items={items} repeat={repeat}")
+    results = [await _sqlite(items, repeat), await _mongo(items, repeat, rtt_ms)]
+    print(f"{'':>18}" + "".join(f"{name:>28}" for name, _ in results))
+    print(f"{'':>18}" + "".join(f"{'p50 ms':>14}{'p99 ms':>14}" for _ in results))
+    for row in range(len(results[0][1])):
+        label = results[0][1][row][0]
+        print(f"{label:>18}" + "".join(f"{timings[row][1]:>14.3f}{timings[row][2]:>14.3f}" for _, timings in results))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=100)
+    parser.add_argument("--rtt-ms", type=float, default=0, help="simulated network round trip per MongoDB call")
+    args = parser.parse_args()
+    asyncio.run(_run(args.items, args.repeat, args.rtt_ms))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Latency benchmark for the history read cache: GET /history and
+GET /history/{id} through the app, with the cache off, on, and on with
+clients revalidating by If-None-Match.
+
+Seeds one device with --items history entries, then issues --requests reads
+alternating between the first page and one of its entries, with a save every
+--write-every reads to exercise invalidation.
+
+    python -m benchmarks.bench_history_cache --items 500 --rtt-ms 20
+    BENCH_MONGODB_URI=mongodb://localhost:27017 python -m benchmarks.bench_history_cache
+
+Without BENCH_MONGODB_URI the database is mongomock, which scans every
+document on each query; --rtt-ms adds the per-call network delay of a remote
+cluster.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from unittest.mock import patch
+
+import httpx
+
+from app.main import app
+from app.services import history_cache, history_service
+from benchmarks.mongo import SlowDatabase, bench_db
+
+DEVICE = "bench-device"
+HEADERS = {"X-Device-Id": DEVICE}
+
+
+def _payload(i: int) -> dict:
+    return {"input_text": f"Visit {i}: knee pain, physiotherapy exercises.\n" * 20, "summary": f"Visit {i}.", "summary_type": "brief"}
+
+
+async def _workload(client: httpx.AsyncClient, requests: int, write_every: int, revalidate: bool) -> tuple[list[float], int]:
+    ids = [item["id"] for item in (await client.get("/history", headers=HEADERS)).json()["items"]]
+    etags: dict[str, str] = {}
+    latencies = []
+    not_modified = 0
+    for i in range(requests):
+        if write_every and i and i % write_every == 0:
+            await client.post("/history", json=_payload(i % len(ids)), headers=HEADERS)
+        url = "/history" if i % 2 == 0 else f"/history/{ids[i // 2 % len(ids)]}"
+        headers = {**HEADERS, "If-None-Match": etags[url]} if revalidate and url in etags else HEADERS
+        started = time.perf_counter()
+        response = await client.get(url, headers=headers)
+        latencies.append(time.perf_counter() - started)
+        if response.status_code == 304:
+            not_modified += 1
+        else:
+            etags[url] = response.headers["etag"]
+    return latencies, not_modified
+
+
+async def _run(items: int, requests: int, write_every: int, rtt_ms: float) -> None:
+    raw_db, backend = bench_db("text_summarizer_cache_bench")
+    for name in ("summaries", history_service.TRANSCRIPTS):
+        await raw_db[name].drop()
+    print(f"backend={backend} items={items} requests={requests} write_every={write_every} rtt={rtt_ms:g} ms")
+    transport = httpx.ASGITransport(app=app)
+    with patch("app.services.history_service.get_db", return_value=SlowDatabase(raw_db, rtt_ms)):
+        await history_service.ensure_indexes()
+        for start in range(0, items, 500):
+            await history_service.bulk_upsert_summaries(DEVICE, [_payload(i) for i in range(start, min(items, start + 500))])
+        modes = {
+            "no cache": (history_cache.HistoryCache(maxsize=0), False),
+            "cache": (history_cache.HistoryCache(), False),
+            "cache + If-None-Match": (history_cache.HistoryCache(), True),
+        }
+        print(f"{'':>22}{'p50 ms':>10}{'p99 ms':>10}{'hit rate':>10}{'304s':>8}")
+        for label, (cache, revalidate) in modes.items():
+            with patch.object(history_cache, "cache", cache):
+                async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                    latencies, not_modified = await _workload(client, requests, write_every, revalidate)
+            latencies.sort()
+            stats = cache.stats()
+            lookups = stats["hits"] + stats["misses"]
+            print(
+                f"{label:>22}{statistics.median(latencies) * 1000:>10.3f}"
+                f"{latencies[int(len(latencies) * 0.99)] * 1000:>10.3f}"
+                f"{stats['hits'] / lookups if lookups else 0:>10.0%}{not_modified:>8}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--items", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--write-every", type=int, default=20, help="save one entry every N reads (0: read only)")
+    parser.add_argument("--rtt-ms", type=float, default=0, help="simulated network round trip per MongoDB call")
+    args = parser.parse_args()
+    asyncio.run(_run(args.items, args.requests, args.write_every, args.rtt_ms))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""
+Export and import benchmark for history: documents per second and MB per
+second streaming one device's history out as NDJSON, NDJSON + gzip and CSV,
+and the peak Python memory each export holds, which should depend on the
+batch size and not on the number of documents. Then imports part of the
+NDJSON export into a second device.
+
+    python -m benchmarks.bench_history_export --documents 100000 --rtt-ms 2
+    BENCH_MONGODB_URI=mongodb://localhost:27017 python -m benchmarks.bench_history_export
+
+mongomock scans, and copies, a whole collection for every query, which makes
+a 100k-document export take hours, so without BENCH_MONGODB_URI the export
+reads from MemoryDatabase: documents held in a pre-sorted list, as the
+device_live_created_at index returns them, and transcripts in a dict, as
+their _id index finds them, with --rtt-ms paid per cursor batch and per
+transcript lookup. The import still runs against mongomock (--mongomock
+runs the export there too), so its numbers are a lower bound.
+"""
+import argparse
+import asyncio
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+from app.services import history_export, history_service, text_codec
+from benchmarks.bench_compression import make_transcript
+from benchmarks.mongo import bench_db
+
+DEVICE = "device-export"
+
+
+class _MemoryCursor:
+    def __init__(self, docs: list[dict], projection: dict | None, rtt: float):
+        self._docs = docs
+        self._fields = set(projection or ()) | {"_id"} if projection else None
+        self._rtt = rtt
+        self._batch_size = 101
+
+    def batch_size(self, batch_size: int) -> "_MemoryCursor":
+        self._batch_size = batch_size
+        return self
+
+    async def __aiter__(self):
+        for start in range(0, len(self._docs), self._batch_size):
+            if self._rtt:
+                await asyncio.sleep(self._rtt)
+            for doc in self._docs[start:start + self._batch_size]:
+                # Decoding BSON hands out fresh documents too
+                yield {k: v for k, v in doc.items() if self._fields is None or k in self._fields}
+
+
+class _MemoryCollection:
+    def __init__(self, rtt: float):
+        self.docs: dict = {}
+        self._rtt = rtt
+
+    async def insert_many(self, docs: list[dict]) -> None:
+        for doc in docs:
+            self.docs[doc.setdefault("_id", len(self.docs))] = doc
+
+    async def drop(self) -> None:
+        self.docs.clear()
+
+    def find(self, query: dict, projection: dict | None = None, sort=None) -> _MemoryCursor:
+        ids = query.get("_id", {}).get("$in")
+        if ids is not None:
+            docs = [self.docs[i] for i in ids if i in self.docs]
+        else:
+            docs = [doc for doc in self.docs.values() if all(doc.get(k) == v for k, v in query.items())]
+            if sort:
+                for field, direction in reversed(sort):
+                    docs.sort(key=lambda doc: doc[field], reverse=direction < 0)
+        return _MemoryCursor(docs, projection, self._rtt)
+
+
+class MemoryDatabase:
+    """Just enough of a collection API for export_history; see the module docstring."""
+
+    def __init__(self, rtt_ms: float = 0):
+        self._collections: dict[str, _MemoryCollection] = {}
+        self._rtt = rtt_ms / 1000
+
+    def __getitem__(self, name: str) -> _MemoryCollection:
+        return self._collections.setdefault(name, _MemoryCollection(self._rtt))
+
+
+async def _seed(db, documents: int, transcript_chars: int) -> None:
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    template, _ = make_transcript(transcript_chars * 4, seed=0)
+    summaries, transcripts = [], []
+    for i in range(documents):
+        text = f"Visit {i}.\n" + template[(i * 37) % (len(template) - transcript_chars):][:transcript_chars]
+        input_hash = history_service.hash_input(text)
+        created_at = start + timedelta(seconds=i)
+        transcripts.append({"_id": input_hash, "body": text_codec.encode(text), "size": len(text), "last_used_at": created_at})
+        summaries.append({
+            "device_id": DEVICE, "input_hash": input_hash, "title": f"Visit {i}",
+            "summary": f"Summary of visit {i}. The patient is improving.", "translated_summary": None,
+            "summary_type": "brief", "style": "paragraph", "tonality": "professional", "language": "original",
+            "created_at": created_at, "updated_at": created_at, "deleted_at": None,
+        })
+        if len(summaries) >= 5000:
+            await db[history_service.TRANSCRIPTS].insert_many(transcripts)
+            await db["summaries"].insert_many(summaries)
+            summaries, transcripts = [], []
+    if summaries:
+        await db[history_service.TRANSCRIPTS].insert_many(transcripts)
+        await db["summaries"].insert_many(summaries)
+
+
+async def _drain(chunks) -> int:
+    total = 0
+    async for chunk in chunks:
+        total += len(chunk)
+    return total
+
+
+def _report(label: str, documents: int, size: int, elapsed: float) -> None:
+    print(
+        f"{label:>14}: {documents / elapsed:9.0f} docs/s {size / 1024 / 1024 / elapsed:7.1f} MB/s "
+        f"{size / 1024 / 1024:7.1f} MB in {elapsed:6.1f} s"
+    )
+
+
+def _body(fmt: str, gzip: bool, batch_size: int):
+    body = history_export.render(history_service.export_history(DEVICE, batch_size=batch_size), fmt)
+    return history_export.gzipped(body) if gzip else body
+
+
+async def _export(label: str, documents: int, fmt: str, gzip: bool, batch_size: int) -> None:
+    started = time.perf_counter()
+    size = await _drain(_body(fmt, gzip, batch_size))
+    _report(label, documents, size, time.perf_counter() - started)
+
+
+async def _peak_memory(batch_size: int) -> int:
+    """Peak Python allocations during an NDJSON export, in a separate pass since tracing slows it down."""
+    tracemalloc.start()
+    await _drain(_body("ndjson", False, batch_size))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+async def _run(documents: int, transcript_chars: int, batch_size: int, import_documents: int, rtt_ms: float, mongomock: bool) -> None:
+    import_db, backend = bench_db("text_summarizer_export_bench")
+    db = import_db
+    if backend == "mongomock" and not mongomock:
+        db, backend = MemoryDatabase(rtt_ms), f"memory (rtt {rtt_ms} ms)"
+    print(f"export backend={backend} documents={documents} transcript={transcript_chars} chars batch={batch_size}")
+    with patch("app.services.history_service.get_db", return_value=db):
+        for name in ("summaries", history_service.TRANSCRIPTS):
+            await db[name].drop()
+        started = time.perf_counter()
+        await _seed(db, documents, transcript_chars)
+        print(f"seeded in {time.perf_counter() - started:.1f} s")
+
+        await _export("ndjson", documents, "ndjson", False, batch_size)
+        await _export("ndjson + gzip", documents, "ndjson", True, batch_size)
+        await _export("csv", documents, "csv", False, batch_size)
+        for size in sorted({batch_size // 10 or 1, batch_size}):
+            print(f"peak memory, batch {size}: {await _peak_memory(size) / 1024 / 1024:.1f} MB")
+
+        # The same rendering without the database, from batches already in memory
+        batches = [batch async for batch in history_service.export_history(DEVICE, batch_size=batch_size)]
+
+    async def cached():
+        for batch in batches:
+            yield batch
+
+    started = time.perf_counter()
+    size = await _drain(history_export.render(cached(), "ndjson"))
+    _report("format only", documents, size, time.perf_counter() - started)
+
+    # Import the first import_documents lines of the NDJSON export into another device
+    lines = []
+    async for chunk in history_export.render(cached(), "ndjson"):
+        lines.extend(chunk.splitlines(keepends=True))
+        if len(lines) >= import_documents:
+            break
+    data = b"".join(lines[:import_documents])
+    del batches, lines
+
+    async def upload():
+        for start in range(0, len(data), 64 * 1024):
+            yield data[start:start + 64 * 1024]
+
+    with patch("app.services.history_service.get_db", return_value=import_db):
+        if import_db is not db:
+            for name in ("summaries", history_service.TRANSCRIPTS):
+                await import_db[name].drop()
+        await history_service.ensure_indexes()
+        errors = []
+        started = time.perf_counter()
+        result = await history_service.import_history("device-import", history_export.parse_ndjson(upload(), errors))
+        elapsed = time.perf_counter() - started
+    _report("import", result["received"], len(data), elapsed)
+    print(f"import result {result}, {len(errors)} errors")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--documents", type=int, default=100_000)
+    parser.add_argument("--transcript-chars", type=int, default=1500)
+    parser.add_argument("--batch-size", type=int, default=history_service.EXPORT_BATCH_SIZE)
+    parser.add_argument("--import-documents", type=int, default=2000)
+    parser.add_argument("--rtt-ms", type=float, default=0, help="MemoryDatabase delay per cursor batch and lookup")
+    parser.add_argument("--mongomock", action="store_true", help="export from mongomock instead of MemoryDatabase")
+    args = parser.parse_args()
+    asyncio.run(_run(
+        args.documents, args.transcript_chars, args.batch_size, args.import_documents, args.rtt_ms, args.mongomock,
+    ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Latency benchmark for history_service.search_history.
+
+Seeds one device with many summaries of varied clinical vocabulary, then
+times searches with a case-insensitive $regex scan over the text fields (the
+obvious implementation without a text index) against search_history: the
+first, cold search and warm searches once the device's index is built.
+
+    python -m benchmarks.bench_history_search --items 20000 --searches 50
+    BENCH_MONGODB_URI=mongodb://localhost:27017 python -m benchmarks.bench_history_search
+
+Without BENCH_MONGODB_URI, search_history answers from the local inverted
+index; against a real MongoDB it uses the text index. mongomock scans and
+copies every document for each query, so "ranking only" shows the local
+index's own share of a warm search.
+"""
+import argparse
+import asyncio
+import random
+import re
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+from app.services import history_service, search_index
+from benchmarks.mongo import bench_db
+
+DEVICE = "bench-device"
+TERMS = [
+    "headache", "migraine", "cough", "fever", "asthma", "inhaler", "eczema", "rash", "diabetes", "insulin",
+    "hypertension", "amlodipine", "knee", "physiotherapy", "anxiety", "sertraline", "reflux", "omeprazole",
+    "back", "ibuprofen", "allergy", "cetirizine", "sleep", "fatigue", "anaemia", "iron", "thyroid", "levothyroxine",
+]
+FILLER = "patient reports the symptoms started recently and discussed options for follow up in clinic".split()
+
+
+def _text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(TERMS) if rng.random() < 0.15 else rng.choice(FILLER) for _ in range(words))
+
+
+async def _seed(db, items: int) -> None:
+    rng = random.Random(0)
+    await db["summaries"].delete_many({"device_id": DEVICE})
+    now = datetime.now(timezone.utc)
+    docs = []
+    for i in range(items):
+        created = now - timedelta(minutes=items - i)
+        docs.append({
+            "device_id": DEVICE, "title": _text(rng, 6).capitalize(), "input_text": "", "input_hash": str(i),
+            "summary": _text(rng, 120), "translated_summary": _text(rng, 120) if i % 4 == 0 else None,
+            "summary_type": "brief", "created_at": created, "updated_at": created, "deleted_at": None,
+        })
+        if len(docs) == 1000:
+            await db["summaries"].insert_many(docs)
+            docs = []
+    if docs:
+        await db["summaries"].insert_many(docs)
+    await history_service.ensure_indexes()
+
+
+async def _regex_search(db, query: str, limit: int) -> list[dict]:
+    pattern = re.compile("|".join(re.escape(t) for t in search_index.query_terms(query)), re.IGNORECASE)
+    cursor = db["summaries"].find(
+        {
+            "device_id": DEVICE, "deleted_at": None,
+            "$or": [{field: pattern} for field in search_index.FIELD_WEIGHTS],
+        },
+        history_service.LIST_PROJECTION,
+    ).sort([("created_at", -1)]).limit(limit)
+    return await cursor.to_list(length=limit)
+
+
+async def _time(search, queries) -> list[float]:
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        await search(query)
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def _print(label: str, latencies: list[float]) -> None:
+    print(f"{label:>16}: p50 {statistics.median(latencies) * 1000:8.2f} ms  max {max(latencies) * 1000:8.2f} ms")
+
+
+async def _run(items: int, searches: int, limit: int) -> None:
+    db, backend = bench_db()
+    rng = random.Random(1)
+    queries = [" ".join(rng.sample(TERMS, rng.randint(1, 2))) for _ in range(searches)]
+    print(f"backend={backend} items={items} searches={searches} limit={limit}")
+    with patch("app.services.history_service.get_db", return_value=db):
+        await _seed(db, items)
+        _print("regex scan", await _time(lambda q: _regex_search(db, q, limit), queries))
+        search_index.cache.clear()
+        _print("search cold", await _time(lambda q: history_service.search_history(DEVICE, q, limit=limit), queries[:1]))
+        _print("search warm", await _time(lambda q: history_service.search_history(DEVICE, q, limit=limit), queries))
+        index = search_index.cache.fresh(DEVICE)
+        if index is not None:
+            async def rank(query):
+                index.search(search_index.query_terms(query))
+            _print("ranking only", await _time(rank, queries))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--items", type=int, default=20_000)
+    parser.add_argument("--searches", type=int, default=50)
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(_run(args.items, args.searches, args.limit))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Storage benchmark for history: bytes taken by the summaries collection with
+transcripts inline (the old layout), after the migration moves them into the
+shared, compressed transcripts collection, and after compact_history purges
+summaries soft-deleted longer than the retention window.
+
+Seeds synthetic consultation transcripts, each saved on one to three devices,
+some deleted and summarized again (a soft-deleted copy plus a live one) and
+some deleted for good. The synthetic transcripts reuse a small set of
+sentence templates, so they compress better than real ones would.
+
+    python -m benchmarks.bench_history_storage --transcripts 1000 --transcript-kb 30
+    BENCH_MONGODB_URI=mongodb://localhost:27017 python -m benchmarks.bench_history_storage
+
+Sizes are summed BSON document sizes, without indexes or storage-engine
+compression, so they compare layouts rather than predict disk usage.
+"""
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+import bson
+
+from app.services import history_service
+from benchmarks.bench_compression import make_transcript
+from benchmarks.mongo import bench_db
+
+
+async def _size(db, name: str) -> tuple[int, int]:
+    count = total = 0
+    async for doc in db[name].find({}):
+        count += 1
+        total += len(bson.encode(doc))
+    return count, total
+
+
+async def _report(db, label: str) -> int:
+    total = 0
+    parts = []
+    for name in ("summaries", history_service.TRANSCRIPTS):
+        count, size = await _size(db, name)
+        total += size
+        parts.append(f"{name} {count:>6} docs {size / 1024 / 1024:8.1f} MB")
+    print(f"{label:>10}: {'  '.join(parts)}  total {total / 1024 / 1024:8.1f} MB")
+    return total
+
+
+async def _seed(db, transcripts: int, size_kb: int, deleted_share: float) -> None:
+    rng = random.Random(0)
+    now = datetime.now(timezone.utc)
+    long_ago = now - timedelta(days=history_service.RETENTION_DAYS * 2)
+    docs = []
+    for i in range(transcripts):
+        text, _ = make_transcript(size_kb * 1024, seed=i)
+        base = {
+            "title": f"Visit {i}", "input_text": text, "input_hash": history_service.hash_input(text),
+            "summary": f"Summary of visit {i}. " * 20, "translated_summary": None, "summary_type": "brief",
+            "style": "paragraph", "tonality": "professional", "language": "original",
+            "created_at": now, "updated_at": now,
+        }
+        # Some transcripts were deleted everywhere and never summarized again
+        gone = rng.random() < deleted_share / 2
+        for device in rng.sample(range(50), rng.randint(1, 3)):
+            if not gone:
+                docs.append({**base, "device_id": f"device-{device}", "deleted_at": None})
+            if gone or rng.random() < deleted_share:
+                docs.append({**base, "device_id": f"device-{device}", "deleted_at": long_ago})
+        if len(docs) >= 500:
+            await db["summaries"].insert_many(docs)
+            docs = []
+    if docs:
+        await db["summaries"].insert_many(docs)
+
+
+async def _run(transcripts: int, size_kb: int, deleted_share: float) -> None:
+    db, backend = bench_db("text_summarizer_storage_bench")
+    print(f"backend={backend} transcripts={transcripts} transcript={size_kb} KB deleted={deleted_share:.0%}")
+    with patch("app.services.history_service.get_db", return_value=db):
+        for name in ("summaries", history_service.TRANSCRIPTS):
+            await db[name].drop()
+        await _seed(db, transcripts, size_kb, deleted_share)
+        before = await _report(db, "inline")
+
+        started = time.perf_counter()
+        await history_service.migrate()
+        migrated_in = time.perf_counter() - started
+        after = await _report(db, "migrated")
+
+        # Transcripts were just touched by the migration; age them past the cutoff too
+        await db[history_service.TRANSCRIPTS].update_many(
+            {}, {"$set": {"last_used_at": datetime.now(timezone.utc) - timedelta(days=history_service.RETENTION_DAYS * 2)}}
+        )
+        started = time.perf_counter()
+        result = await history_service.compact_history()
+        compacted_in = time.perf_counter() - started
+        compacted = await _report(db, "compacted")
+
+    print(f"migration {migrated_in:.1f} s, compaction {compacted_in:.1f} s removed {result}")
+    print(f"size vs inline: migrated {after / before:.1%}, compacted {compacted / before:.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--transcripts", type=int, default=1000)
+    parser.add_argument("--transcript-kb", type=int, default=30)
+    parser.add_argument("--deleted-share", type=float, default=0.25, help="chance each save also has an expired deleted copy")
+    args = parser.parse_args()
+    asyncio.run(_run(args.transcripts, args.transcript_kb, args.deleted_share))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Token savings of incremental re-summarization over a growing transcript.
+
+Simulates a clinician summarizing, appending a few more turns and summarizing
+again, step after step: each step looks up its predecessor in history (as
+/summarize does with "incremental": true), plans the incremental prompt and
+saves the result linked to its parent. Prints the tokens a full summarize
+would send against the tokens actually sent.
+
+    python -m benchmarks.bench_incremental --start-kb 20 --step-kb 2 --steps 20
+"""
+import argparse
+import asyncio
+import time
+from unittest.mock import patch
+
+from app.services import chunking, history_service, incremental
+from benchmarks.bench_compression import make_transcript
+from benchmarks.mongo import bench_db
+
+DEVICE = "bench-device"
+
+
+async def _run(start_kb: int, step_kb: int, steps: int) -> None:
+    db, backend = bench_db("text_summarizer_incremental_bench")
+    full_text, _ = make_transcript((start_kb + step_kb * steps) * 1024)
+    lines = full_text.splitlines()
+    print(f"backend={backend} start={start_kb} KB step={step_kb} KB steps={steps}")
+    total_full = total_sent = 0
+    with patch("app.services.history_service.get_db", return_value=db):
+        await db["summaries"].delete_many({"device_id": DEVICE})
+        size, end = 0, 0
+        for step in range(steps + 1):
+            target = (start_kb + step_kb * step) * 1024
+            while end < len(lines) and size < target:
+                size += len(lines[end]) + 1
+                end += 1
+            text = "\n".join(lines[:end])
+
+            started = time.perf_counter()
+            previous = await history_service.find_predecessor(DEVICE, text, "brief", "paragraph", "professional")
+            plan = incremental.plan(previous, text) if previous else None
+            planned_in = time.perf_counter() - started
+
+            full = chunking.estimate_tokens(text)
+            sent = plan.sent_tokens if plan else full
+            total_full += full
+            total_sent += sent
+            summary = f"Summary after step {step}. " * 40
+            await history_service.upsert_summary(DEVICE, {
+                "input_text": text, "summary": summary, "parent_id": plan.parent_id if plan else None,
+            })
+            print(
+                f"step {step:>3}: full {full:>7} tokens  sent {sent:>7} tokens  "
+                f"saved {1 - sent / full:6.1%}  lookup+plan {planned_in * 1000:6.1f} ms"
+            )
+    print(f"total: full {total_full} tokens, sent {total_sent} tokens, saved {1 - total_sent / total_full:.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--start-kb", type=int, default=20)
+    parser.add_argument("--step-kb", type=int, default=2)
+    parser.add_argument("--steps", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(_run(args.start_kb, args.step_kb, args.steps))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Response encoding benchmark: serialization CPU and bytes on the wire for the
+large bodies the API returns, a page of history items, one history entry
+with its transcript, and /upload's echo of transcripts of growing size.
+
+Serialization compares FastAPI's default path (jsonable_encoder, then
+json.dumps in its JSONResponse) with response_encoding.dumps (orjson).
+Compression compares identity, gzip and, when the brotli package is
+installed, brotli at the levels CompressionMiddleware uses.
+
+    python -m benchmarks.bench_response_encoding
+    python -m benchmarks.bench_response_encoding --page-size 100 --json
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from starlette.responses import JSONResponse as StarletteJSONResponse
+
+from app.services import history_service, response_encoding
+from benchmarks.bench_api import transcript
+
+UPLOAD_SIZES = {"upload 64 KB": 64_000, "upload 1 MB": 1_000_000, "upload 8 MB": 8_000_000}
+
+
+def _history_doc(i: int, text: str | None = None) -> dict:
+    """A history document as MongoDB returns it."""
+    created = datetime(2025, 1, 1, tzinfo=timezone.utc) + timedelta(minutes=i)
+    doc = {
+        "_id": ObjectId(), "title": f"Visit {i}: knee pain after running, physiotherapy...",
+        "summary_type": "brief", "style": "paragraph", "tonality": "professional", "language": "fi",
+        "created_at": created, "updated_at": created,
+    }
+    if text is not None:
+        doc.update(input_text=text, summary="Knee pain, improving with exercises. " * 10, translated_summary=None)
+    return doc
+
+
+def payloads(page_size: int) -> dict[str, dict]:
+    """What the endpoints hand to the response class, by label."""
+    page = [_history_doc(i) for i in range(page_size)]
+    bodies = {
+        f"history page ({page_size} items)": {
+            "items": [history_service._serialize(doc) for doc in page], "has_more": True, "next_cursor": "x" * 40,
+        },
+        "history entry (64 KB)": history_service._serialize(_history_doc(0, transcript(64_000, 0))),
+    }
+    bodies.update({label: {"text": transcript(size, 0)} for label, size in UPLOAD_SIZES.items()})
+    return bodies
+
+
+def _best(func, repeat: int) -> float:
+    """Seconds per call, best of repeat timed batches (CPU bound, so the minimum is the signal)."""
+    started = time.perf_counter()
+    func()
+    once = time.perf_counter() - started
+    # About 50 ms per batch
+    calls = max(1, int(0.05 / once)) if once else 1000
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(calls):
+            func()
+        best = min(best, (time.perf_counter() - started) / calls)
+    return best
+
+
+def fastapi_default(content) -> bytes:
+    return StarletteJSONResponse(jsonable_encoder(content)).body
+
+
+def measure(content, repeat: int) -> dict:
+    body = response_encoding.dumps(content)
+    assert json.loads(body) == json.loads(fastapi_default(content))
+    results = {
+        "json_bytes": len(body),
+        "serialize_s": {
+            "fastapi": _best(lambda: fastapi_default(content), repeat),
+            "orjson": _best(lambda: response_encoding.dumps(content), repeat),
+        },
+        "wire_bytes": {"identity": len(body)},
+        "compress_s": {},
+    }
+    encodings = ["gzip", "br"] if response_encoding.brotli_available() else ["gzip"]
+    for encoding in encodings:
+        results["wire_bytes"][encoding] = len(response_encoding.compress(body, encoding))
+        results["compress_s"][encoding] = _best(lambda: response_encoding.compress(body, encoding), repeat)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="print one JSON object instead of tables")
+    args = parser.parse_args()
+
+    results = {label: measure(content, args.repeat) for label, content in payloads(args.page_size).items()}
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    if not response_encoding.brotli_available():
+        print("brotli is not installed; measuring gzip only")
+    print(f"{'serialization':<28}{'bytes':>12}{'fastapi ms':>12}{'orjson ms':>12}{'speedup':>9}")
+    for label, result in results.items():
+        serialize = result["serialize_s"]
+        print(
+            f"{label:<28}{result['json_bytes']:>12,}{serialize['fastapi'] * 1000:>12.3f}"
+            f"{serialize['orjson'] * 1000:>12.3f}{serialize['fastapi'] / serialize['orjson']:>8.1f}x"
+        )
+    print(f"\n{'bytes on the wire':<28}{'encoding':>10}{'bytes':>12}{'ratio':>8}{'compress ms':>13}")
+    for label, result in results.items():
+        for encoding, size in result["wire_bytes"].items():
+            seconds = result["compress_s"].get(encoding, 0)
+            print(f"{label:<28}{encoding:>10}{size:>12,}{size / result['json_bytes']:>8.1%}{seconds * 1000:>13.3f}")
+
+
+if __name__ == "__main__":
+    main()
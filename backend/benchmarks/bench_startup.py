@@ -0,0 +1,148 @@
+"""
+Cold-start benchmark: how long importing the app takes, and what dominates
+it, and how long gunicorn takes from launch to the first successful request.
+
+The server runs the command in startup.txt (with and without --preload) on a
+free port, offline: the fake LLM backend and a throwaway SQLite history.
+Time to first request is measured against /ready, which answers 200 only
+once a worker has finished its warm-up.
+
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --workers 4 --json
+
+tests/test_startup.py runs the same measurements against fixed budgets.
+"""
+import argparse
+import json
+import os
+import re
+import shlex
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+STARTUP_COMMAND = (BACKEND_DIR / "startup.txt").read_text().strip()
+
+_IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| \s*(\S+)")
+
+
+def offline_env(directory: str, **overrides: str) -> dict:
+    """Environment for an app that needs no network: fake LLM, SQLite history."""
+    return {
+        **os.environ,
+        "LLM_BACKEND": "fake",
+        "OPENAI_API_KEY": "",
+        "MONGODB_URI": "",
+        "HISTORY_BACKEND": "sqlite",
+        "HISTORY_SQLITE_PATH": os.path.join(directory, "history.db"),
+        "HISTORY_COMPACTION_INTERVAL": "0",
+        "METRICS_ENABLED": "false",
+        **overrides,
+    }
+
+
+def import_profile(env: dict | None = None, top: int = 10) -> dict:
+    """Import app.main in a fresh interpreter under -X importtime. Returns the
+    total seconds, the packages that took longest by the time spent in their
+    own modules (app modules individually), and every module imported."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    by_package: dict[str, float] = {}
+    modules = []
+    total = 0
+    for line in result.stderr.splitlines():
+        match = _IMPORT_LINE.match(line)
+        if not match:
+            continue
+        name = match.group(3)
+        modules.append(name)
+        package = name if name.startswith("app.") else name.split(".")[0]
+        by_package[package] = by_package.get(package, 0) + int(match.group(1)) / 1e6
+        if name == "app.main":
+            total = int(match.group(2)) / 1e6
+    slowest = sorted(by_package.items(), key=lambda item: item[1], reverse=True)[:top]
+    return {"import_s": total, "slowest": dict(slowest), "modules": modules}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _server_command(port: int, workers: int, preload: bool) -> list[str]:
+    args = shlex.split(STARTUP_COMMAND)
+    args = [arg for arg in args if arg != "--preload"]
+    bind = args.index("--bind")
+    args[bind + 1] = f"127.0.0.1:{port}"
+    args += ["--workers", str(workers)]
+    if preload:
+        args.append("--preload")
+    # Run gunicorn from this interpreter's environment
+    return [sys.executable, "-m", *args]
+
+
+def time_to_first_request(workers: int = 1, preload: bool = True, timeout: float = 60) -> float:
+    """Seconds from launching the server to its first 200 from /ready."""
+    port = _free_port()
+    with tempfile.TemporaryDirectory() as directory:
+        started = time.perf_counter()
+        server = subprocess.Popen(
+            _server_command(port, workers, preload), cwd=BACKEND_DIR, env=offline_env(directory),
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            while time.perf_counter() - started < timeout:
+                if server.poll() is not None:
+                    raise RuntimeError(f"server exited with {server.returncode}")
+                try:
+                    with urllib.request.urlopen(f"http://127.0.0.1:{port}/ready", timeout=1) as response:
+                        if response.status == 200:
+                            return time.perf_counter() - started
+                except OSError:
+                    pass
+                time.sleep(0.01)
+            raise TimeoutError(f"no successful request within {timeout:g} s")
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", action="store_true", help="print one JSON object instead of a table")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        profiles = [import_profile(offline_env(directory)) for _ in range(args.repeat)]
+    profile = min(profiles, key=lambda p: p["import_s"])
+    results = {
+        "import_s": profile["import_s"],
+        "slowest_imports_s": profile["slowest"],
+        "first_request_s": {
+            label: min(time_to_first_request(args.workers, preload) for _ in range(args.repeat))
+            for label, preload in (("preload", True), ("no_preload", False))
+        },
+    }
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"import app.main: {results['import_s'] * 1000:.0f} ms (best of {args.repeat})")
+    for name, seconds in results["slowest_imports_s"].items():
+        print(f"  {name:<40}{seconds * 1000:>8.0f} ms")
+    print(f"first successful request, {args.workers} worker(s):")
+    for label, seconds in results["first_request_s"].items():
+        print(f"  {label:<12}{seconds * 1000:>8.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Time-to-first-byte benchmark for POST /summarize vs POST /summarize/stream.
+
+Both endpoints are driven against the fake OpenAI server, which streams
+FAKE_OPENAI_TOKENS tokens after FAKE_OPENAI_LATENCY seconds. The run finishes
+with an abandoned stream to check that the upstream generation is cancelled.
+
+    python -m benchmarks.bench_stream_ttfb --requests 20
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+from benchmarks import fake_openai
+from benchmarks.bench_summarize import API_PORT, FAKE_PORT, _configure_env
+from benchmarks.fake_openai import ServerThread
+
+
+async def _ttfb(http: httpx.AsyncClient, path: str, text: str) -> tuple[float, float]:
+    started = time.perf_counter()
+    first = None
+    async with http.stream("POST", path, json={"text": text, "bypass_cache": True}) as response:
+        response.raise_for_status()
+        async for _ in response.aiter_bytes():
+            if first is None:
+                first = time.perf_counter() - started
+    return first, time.perf_counter() - started
+
+
+async def _abandon_stream(http: httpx.AsyncClient) -> None:
+    async with http.stream("POST", "/summarize/stream", json={"text": "abandon", "bypass_cache": True}) as response:
+        async for _ in response.aiter_bytes():
+            break
+    # Give the server a moment to notice the disconnect
+    await asyncio.sleep(1.0)
+
+
+async def _drive(total: int) -> None:
+    base = f"http://127.0.0.1:{API_PORT}"
+    async with httpx.AsyncClient(base_url=base, timeout=300) as http:
+        for path in ("/summarize", "/summarize/stream"):
+            results = await asyncio.gather(*(_ttfb(http, path, f"Transcript {i}") for i in range(total)))
+            ttfb = [r[0] for r in results]
+            total_time = [r[1] for r in results]
+            print(
+                f"{path:>18}: TTFB p50 {statistics.median(ttfb) * 1000:6.0f} ms  "
+                f"max {max(ttfb) * 1000:6.0f} ms  "
+                f"complete p50 {statistics.median(total_time) * 1000:6.0f} ms"
+            )
+
+        before = dict(fake_openai.stats)
+        await _abandon_stream(http)
+        started = fake_openai.stats["streams_started"] - before["streams_started"]
+        completed = fake_openai.stats["streams_completed"] - before["streams_completed"]
+        print(f"abandoned stream: upstream started={started} completed={completed}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=20)
+    args = parser.parse_args()
+
+    _configure_env()
+    from app.main import app
+
+    with ServerThread(fake_openai.app, FAKE_PORT), ServerThread(app, API_PORT):
+        asyncio.run(_drive(args.requests))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Load benchmark for POST /summarize against a local fake OpenAI server.
+
+Compares the legacy blocking client (sync OpenAI SDK called on the event loop)
+with the pooled async client in app.services.openai_service. Both the fake
+server and the API run in this process on real sockets, so the numbers include
+HTTP overhead on both hops.
+
+    python -m benchmarks.bench_summarize --requests 200 --concurrency 50
+
+--backend fake skips the fake server and the OpenAI SDK and serves completions
+from the in-process FakeBackend, measuring the app alone:
+
+    python -m benchmarks.bench_summarize --backend fake --fake-latency 0.5 --fake-tps 100
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+import httpx
+
+from benchmarks.fake_openai import ServerThread, app as fake_app
+
+FAKE_PORT = 9999
+API_PORT = 8001
+
+
+def _configure_env():
+    os.environ["OPENAI_API_KEY"] = "sk-fake"
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{FAKE_PORT}/v1"
+
+
+def _install_blocking_summarize():
+    """Swap in the pre-async implementation for the 'before' numbers."""
+    from openai import OpenAI
+    from app.prompts import get_prefix_prompt, get_variant_prompt
+    from app.services import openai_service
+
+    sync_client = OpenAI(api_key="sk-fake", base_url=os.environ["OPENAI_BASE_URL"])
+
+    async def summarize(text, summary_type, style, tonality, **_):
+        response = sync_client.chat.completions.create(
+            model=openai_service.MODEL,
+            messages=openai_service._messages(
+                get_prefix_prompt(), text, get_variant_prompt(summary_type, style, tonality)
+            ),
+            temperature=0.7,
+        )
+        return response.choices[0].message.content
+
+    original = openai_service.summarize
+    openai_service.summarize = summarize
+    return lambda: setattr(openai_service, "summarize", original)
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def _drive(total: int, concurrency: int) -> dict:
+    latencies = []
+    health_latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+    base = f"http://127.0.0.1:{API_PORT}"
+    limits = httpx.Limits(max_connections=concurrency + 1)
+
+    async with httpx.AsyncClient(base_url=base, limits=limits, timeout=300) as http:
+        async def one(i: int):
+            async with semaphore:
+                started = time.perf_counter()
+                response = await http.post("/summarize", json={"text": f"Transcript {i}"})
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - started)
+
+        async def probe_health(stop: asyncio.Event):
+            while not stop.is_set():
+                started = time.perf_counter()
+                await http.get("/health")
+                health_latencies.append(time.perf_counter() - started)
+                await asyncio.sleep(0.05)
+
+        stop = asyncio.Event()
+        prober = asyncio.create_task(probe_health(stop))
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await prober
+
+    return {
+        "throughput_rps": total / elapsed,
+        "p50_s": statistics.median(latencies),
+        "p99_s": _percentile(latencies, 99),
+        "health_p99_s": _percentile(health_latencies, 99) if health_latencies else None,
+    }
+
+
+def run(mode: str, total: int, concurrency: int) -> dict:
+    from app.main import app
+
+    restore = _install_blocking_summarize() if mode == "blocking" else None
+    try:
+        with ServerThread(app, API_PORT):
+            return asyncio.run(_drive(total, concurrency))
+    finally:
+        if restore:
+            restore()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--mode", choices=["blocking", "async", "both"], default="both")
+    parser.add_argument("--backend", choices=["openai", "fake"], default="openai")
+    parser.add_argument("--fake-latency", type=float, default=0.0, help="fake backend time to first token (s)")
+    parser.add_argument("--fake-tps", type=float, default=0.0, help="fake backend tokens per second (0 = instant)")
+    args = parser.parse_args()
+
+    if args.backend == "fake":
+        os.environ.update(
+            LLM_BACKEND="fake",
+            FAKE_LLM_LATENCY=str(args.fake_latency),
+            FAKE_LLM_TOKENS_PER_SECOND=str(args.fake_tps),
+        )
+        _print("fake", run("async", args.requests, args.concurrency))
+        return
+
+    _configure_env()
+    modes = ["blocking", "async"] if args.mode == "both" else [args.mode]
+    with ServerThread(fake_app, FAKE_PORT):
+        for mode in modes:
+            _print(mode, run(mode, args.requests, args.concurrency))
+
+
+def _print(mode: str, result: dict) -> None:
+    print(
+        f"{mode:>9}: {result['throughput_rps']:7.1f} req/s  "
+        f"p50 {result['p50_s'] * 1000:7.0f} ms  "
+        f"p99 {result['p99_s'] * 1000:7.0f} ms  "
+        f"/health p99 {result['health_p99_s'] * 1000:7.0f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Memory and time benchmark for file_parser.parse_file on large uploads.
+
+Compares the previous read-everything-then-decode approach with the
+streaming parser, using Starlette UploadFile objects backed by spooled
+temporary files exactly like real requests.
+
+    python -m benchmarks.bench_upload --sizes 1 5 10
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import tracemalloc
+
+from starlette.datastructures import UploadFile
+
+from app.services import file_parser
+
+LINE = "Doctor: How has the cough been since the last visit?   \r\nPatient: Better at night, still bad in the morning.\r\n"
+
+
+async def _legacy_parse(file: UploadFile) -> str:
+    contents = await file.read()
+    return contents.decode("utf-8")
+
+
+def _make_upload(size_mb: float) -> UploadFile:
+    spooled = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    line = LINE.encode("utf-8")
+    for _ in range(int(size_mb * 1024 * 1024 / len(line))):
+        spooled.write(line)
+    size = spooled.tell()
+    spooled.seek(0)
+    return UploadFile(file=spooled, filename="transcript.txt", size=size)
+
+
+async def _measure(parse, size_mb: float) -> tuple[float, float]:
+    upload = _make_upload(size_mb)
+    tracemalloc.start()
+    started = time.perf_counter()
+    await parse(upload)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    upload.file.close()
+    return elapsed, peak / (1024 * 1024)
+
+
+async def _run(sizes: list[float]) -> None:
+    file_parser.MAX_UPLOAD_BYTES = int(max(sizes) * 1024 * 1024) + 1
+    for size_mb in sizes:
+        for name, parse in (("legacy", _legacy_parse), ("streaming", file_parser.parse_file)):
+            elapsed, peak = await _measure(parse, size_mb)
+            print(f"{size_mb:6.1f} MB {name:>9}: {elapsed * 1000:8.1f} ms  peak {peak:7.1f} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1, 5, 10])
+    args = parser.parse_args()
+    asyncio.run(_run(args.sizes))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Benchmark for summarizing one transcript several ways (brief, detailed,
+action points) against the fake OpenAI server's simulated prefix cache.
+
+Compares:
+  legacy      one call per variant with the variant-specific system prompt
+              first, so no two calls share a prefix
+  sequential  one call per variant with the shared transcript prefix layout
+  variants    one summarize_variants() call, variants run concurrently
+
+    python -m benchmarks.bench_variants --transcript-kb 40
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from benchmarks import fake_openai
+from benchmarks.fake_openai import ServerThread
+
+FAKE_PORT = 9999
+VARIANTS = [
+    {"summary_type": "brief", "style": "paragraph", "tonality": "professional"},
+    {"summary_type": "detailed", "style": "bullets", "tonality": "professional"},
+    {"summary_type": "action_points", "style": "numbered", "tonality": "professional"},
+]
+
+
+def _transcript(size_kb: int) -> str:
+    line = "Patient: The headaches started two weeks ago and get worse in the evening.\n"
+    return line * (size_kb * 1024 // len(line))
+
+
+async def _legacy(text: str) -> None:
+    from app.prompts import get_prefix_prompt, get_variant_prompt
+    from app.services import openai_service
+    for variant in VARIANTS:
+        # The variant leads the system prompt, as before the shared-prefix layout
+        system_prompt = get_variant_prompt(**variant) + "\n\n" + get_prefix_prompt()
+        await openai_service._complete(system_prompt, text, bypass_cache=True)
+
+
+async def _sequential(text: str) -> None:
+    from app.services import openai_service
+    for variant in VARIANTS:
+        await openai_service.summarize(text, **variant, bypass_cache=True)
+
+
+async def _variants(text: str) -> None:
+    from app.services import openai_service
+    async for _ in openai_service.summarize_variants(text, VARIANTS, bypass_cache=True):
+        pass
+
+
+async def _run(size_kb: int) -> None:
+    from app.services import openai_service
+    text = _transcript(size_kb)
+    print(f"transcript={size_kb} KB variants={len(VARIANTS)} prefill={fake_openai.PREFILL_PER_1K}s/1k tokens")
+    for name, mode in (("legacy", _legacy), ("sequential", _sequential), ("variants", _variants)):
+        fake_openai._prefix_cache.clear()
+        fake_openai.stats.update(prompt_tokens=0, cached_tokens=0)
+        start = time.perf_counter()
+        await mode(text)
+        elapsed = time.perf_counter() - start
+        prompt, cached = fake_openai.stats["prompt_tokens"], fake_openai.stats["cached_tokens"]
+        print(f"{name:>11}: {elapsed:6.2f} s  prompt tokens {prompt:>6}  cached {cached:>6} ({cached / prompt:.0%})")
+    await openai_service.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--transcript-kb", type=int, default=40)
+    args = parser.parse_args()
+
+    os.environ["OPENAI_API_KEY"] = "sk-fake"
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{FAKE_PORT}/v1"
+    with ServerThread(fake_openai.app, FAKE_PORT):
+        asyncio.run(_run(args.transcript_kb))
+
+
+if __name__ == "__main__":
+    main()
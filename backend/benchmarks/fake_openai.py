@@ -0,0 +1,136 @@
+"""
+Minimal stand-in for the OpenAI chat completions API, used by the benchmarks.
+
+Run it on its own with:
+    uvicorn benchmarks.fake_openai:app --port 9999
+
+and point the service at it with OPENAI_BASE_URL=http://127.0.0.1:9999/v1.
+Latency is controlled by FAKE_OPENAI_LATENCY (seconds before the first token,
+default 0.5). Streaming requests then emit FAKE_OPENAI_TOKENS tokens spaced
+FAKE_OPENAI_TOKEN_DELAY seconds apart.
+
+FAKE_OPENAI_PREFILL_PER_1K adds that many seconds per 1000 prompt tokens not
+served from a simulated prefix cache. Like the real one, the cache matches
+prompts from the start in 128-token steps once they reach 1024 tokens, and a
+prefix becomes cached once a request has finished processing it.
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+LATENCY = float(os.getenv("FAKE_OPENAI_LATENCY", "0.5"))
+TOKENS = int(os.getenv("FAKE_OPENAI_TOKENS", "50"))
+TOKEN_DELAY = float(os.getenv("FAKE_OPENAI_TOKEN_DELAY", "0.02"))
+PREFILL_PER_1K = float(os.getenv("FAKE_OPENAI_PREFILL_PER_1K", "0"))
+CACHE_MIN_TOKENS = 1024
+CACHE_STEP_TOKENS = 128
+
+# Lets benchmarks check that abandoned client streams are cancelled upstream,
+# and how many prompt tokens hit the simulated prefix cache.
+stats = {"streams_started": 0, "streams_completed": 0, "prompt_tokens": 0, "cached_tokens": 0}
+_prefix_cache: set[int] = set()
+
+
+def _prefill(messages: list[dict]) -> tuple[int, int, list[int]]:
+    """Return (prompt tokens, cached prompt tokens, prefix hashes to cache)."""
+    prompt = "".join(f"<{m.get('role')}>{m.get('content') or ''}" for m in messages)
+    tokens = len(prompt) // 4
+    cached = 0
+    hashes = []
+    for boundary in range(CACHE_MIN_TOKENS, tokens + 1, CACHE_STEP_TOKENS):
+        prefix_hash = hash(prompt[:boundary * 4])
+        if prefix_hash in _prefix_cache:
+            cached = boundary
+        hashes.append(prefix_hash)
+    stats["prompt_tokens"] += tokens
+    stats["cached_tokens"] += cached
+    return tokens, cached, hashes
+
+
+async def _process_prompt(messages: list[dict]) -> tuple[int, int]:
+    tokens, cached, hashes = _prefill(messages)
+    await asyncio.sleep(LATENCY + (tokens - cached) / 1000 * PREFILL_PER_1K)
+    _prefix_cache.update(hashes)
+    return tokens, cached
+
+
+async def _stream_chunks(model: str, messages: list[dict]):
+    stats["streams_started"] += 1
+    await _process_prompt(messages)
+    for i in range(TOKENS):
+        if i:
+            await asyncio.sleep(TOKEN_DELAY)
+        chunk = {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": {"content": f"tok{i} "}, "finish_reason": None}],
+        }
+        yield f"data: {json.dumps(chunk)}\n\n"
+    yield "data: [DONE]\n\n"
+    stats["streams_completed"] += 1
+
+
+async def chat_completions(request: Request):
+    body = await request.json()
+    if body.get("stream"):
+        return StreamingResponse(
+            _stream_chunks(body.get("model", "fake"), body.get("messages", [])),
+            media_type="text/event-stream",
+        )
+    prompt_tokens, cached_tokens = await _process_prompt(body.get("messages", []))
+    await asyncio.sleep(TOKENS * TOKEN_DELAY)
+    return JSONResponse({
+        "id": "chatcmpl-fake",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "fake"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": " ".join(f"tok{i}" for i in range(TOKENS))},
+            "finish_reason": "stop",
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": TOKENS,
+            "total_tokens": prompt_tokens + TOKENS,
+            "prompt_tokens_details": {"cached_tokens": cached_tokens},
+        },
+    })
+
+
+async def models(request: Request):
+    return JSONResponse({"object": "list", "data": [{"id": "gpt-4o-mini", "object": "model", "owned_by": "fake"}]})
+
+
+app = Starlette(routes=[
+    Route("/v1/chat/completions", chat_completions, methods=["POST"]),
+    Route("/v1/models", models, methods=["GET"]),
+])
+
+
+class ServerThread:
+    """Run a uvicorn server for an ASGI app in a background thread."""
+
+    def __init__(self, asgi_app, port: int):
+        self.server = uvicorn.Server(uvicorn.Config(asgi_app, port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join()
@@ -0,0 +1,63 @@
+"""
+Database used by the history benchmarks: a real MongoDB when BENCH_MONGODB_URI
+is set (e.g. a local mongod), otherwise the in-memory mongomock-motor stand-in.
+"""
+import os
+from unittest.mock import patch
+
+
+def bench_db(name: str = "text_summarizer_bench"):
+    uri = os.getenv("BENCH_MONGODB_URI")
+    if uri:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        return AsyncIOMotorClient(uri)[name], "mongodb"
+
+    from mongomock.collection import BulkOperationBuilder
+    from mongomock_motor import AsyncMongoMockClient
+    from app.services import history_service
+
+    # mongomock predates the `sort` option newer pymongo passes for UpdateOne
+    original = BulkOperationBuilder.add_update
+    patch.object(
+        BulkOperationBuilder, "add_update",
+        lambda self, *args, sort=None, **kwargs: original(self, *args, **kwargs),
+    ).start()
+    # mongomock has no $text; search with the local index
+    patch.object(history_service, "TEXT_SEARCH", False).start()
+    return AsyncMongoMockClient()[name], "mongomock"
+
+
+class SlowDatabase:
+    """
+    Wrap a database so every collection call pays an extra round-trip delay,
+    approximating the WAN latency between App Service and Atlas.
+    """
+
+    def __init__(self, db, rtt_ms: float):
+        self._db = db
+        self._rtt = rtt_ms / 1000
+
+    def __getitem__(self, name):
+        return _SlowCollection(self._db[name], self._rtt)
+
+
+class _SlowCollection:
+    _ASYNC_METHODS = {
+        "find_one", "find_one_and_update", "insert_one", "insert_many", "update_one",
+        "update_many", "delete_many", "bulk_write", "count_documents", "create_index",
+    }
+
+    def __init__(self, collection, rtt: float):
+        self._collection = collection
+        self._rtt = rtt
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if name not in self._ASYNC_METHODS or not self._rtt:
+            return attr
+
+        async def call(*args, **kwargs):
+            import asyncio
+            await asyncio.sleep(self._rtt)
+            return await attr(*args, **kwargs)
+        return call
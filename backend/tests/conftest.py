@@ -0,0 +1,38 @@
+import pytest
+from unittest.mock import patch
+from mongomock.collection import BulkOperationBuilder
+from mongomock_motor import AsyncMongoMockClient
+
+from app.services import history_cache, history_service, openai_service, search_index, summary_cache, translate_service
+
+
+@pytest.fixture(autouse=True)
+def _reset_caches():
+    """Keep in-process caches from leaking results between tests."""
+    summary_cache.clear()
+    translate_service.clear()
+    search_index.cache.clear()
+    openai_service.flights.clear()
+    history_cache.cache.clear()
+    yield
+    summary_cache.clear()
+    translate_service.clear()
+    search_index.cache.clear()
+    history_cache.cache.clear()
+
+
+def _add_update_ignoring_sort(self, *args, sort=None, **kwargs):
+    # mongomock predates the `sort` option newer pymongo passes for UpdateOne
+    return _original_add_update(self, *args, **kwargs)
+
+
+_original_add_update = BulkOperationBuilder.add_update
+
+
+@pytest.fixture
+def mongo_db():
+    """An in-memory stand-in for the text_summarizer database. It has no $text,
+    so history searches use the local index."""
+    with patch.object(BulkOperationBuilder, "add_update", _add_update_ignoring_sort), \
+            patch.object(history_service, "TEXT_SEARCH", False):
+        yield AsyncMongoMockClient()["text_summarizer"]
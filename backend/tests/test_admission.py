@@ -0,0 +1,371 @@
+"""
+Tests for LLM admission control: the token buckets, fair per-client queuing,
+load shedding, rate-limit header adaptation and a goodput simulation against
+a fake rate-limited provider.
+"""
+import asyncio
+import logging
+import time
+import httpx
+import openai
+import pytest
+from unittest.mock import AsyncMock, patch
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services import admission, llm_backends, openai_service
+
+client = TestClient(app)
+
+
+def _rate_limit_error(retry_after="1"):
+    response = httpx.Response(
+        429, headers={"retry-after": retry_after}, request=httpx.Request("POST", "http://llm/v1/chat/completions")
+    )
+    return openai.RateLimitError("rate limited", response=response, body=None)
+
+
+@pytest.fixture
+async def controller():
+    c = admission.AdmissionController(rpm=0, tpm=0)
+    yield c
+    await c.close()
+
+
+# ---------------------------------------------------------------------------
+# Token buckets and headers
+# ---------------------------------------------------------------------------
+
+class TestTokenBucket:
+    def test_unlimited_never_waits(self):
+        bucket = admission.TokenBucket(0)
+        assert bucket.wait_time(10 ** 9, time.monotonic()) == 0
+
+    def test_refills_at_the_per_minute_rate(self):
+        bucket = admission.TokenBucket(600)  # 10 per second
+        now = time.monotonic()
+        bucket.take(600, now)
+        assert bucket.wait_time(5, now) == pytest.approx(0.5)
+        assert bucket.wait_time(5, now + 0.5) == pytest.approx(0)
+
+    def test_oversized_calls_wait_for_a_full_bucket_only(self):
+        bucket = admission.TokenBucket(60)
+        now = time.monotonic()
+        bucket.take(60, now)
+        assert bucket.wait_time(1000, now) == pytest.approx(60)
+
+    def test_sync_adopts_limit_and_remaining(self):
+        bucket = admission.TokenBucket(0)
+        now = time.monotonic()
+        bucket.sync(limit=120, remaining=10, now=now)
+        assert bucket.capacity == 120
+        assert bucket.level == 10
+        # Never raises the level above what we already counted
+        bucket.sync(limit=120, remaining=50, now=now)
+        assert bucket.level == 10
+
+    @pytest.mark.parametrize("value, seconds", [
+        ("20ms", 0.02), ("1s", 1.0), ("6m0s", 360.0), ("1m30.5s", 90.5), ("2", 2.0), ("soon", None), (None, None),
+    ])
+    def test_parse_duration(self, value, seconds):
+        assert admission.parse_duration(value) == seconds
+
+    def test_backoff_respects_retry_after(self):
+        assert admission.backoff(0, _rate_limit_error("3"), base=0.1, cap=1) == 3.0
+        assert 0.05 <= admission.backoff(0, RuntimeError(), base=0.1, cap=1) <= 0.1
+
+
+# ---------------------------------------------------------------------------
+# Scheduling and shedding
+# ---------------------------------------------------------------------------
+
+class TestAdmissionController:
+    async def test_admits_immediately_with_headroom(self, controller):
+        await asyncio.wait_for(controller.acquire("dev-1", 100), 1)
+        assert controller.stats()["admitted"] == 1
+
+    async def test_round_robin_between_clients(self, controller):
+        # 20 per second: slow enough that the bucket cannot refill twice before "other" queues
+        controller.requests = admission.TokenBucket(1200)
+        controller.requests.level = 0
+        order = []
+
+        async def call(key, i):
+            await controller.acquire(key, 1)
+            order.append(f"{key}:{i}")
+
+        tasks = [asyncio.create_task(call("burst", i)) for i in range(4)]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(call("other", 0)))
+        await asyncio.wait_for(asyncio.gather(*tasks), 2)
+
+        # The other client is admitted second, not behind the whole burst
+        assert order[:3] == ["burst:0", "other:0", "burst:1"]
+
+    async def test_per_client_queue_limit_is_429(self, controller):
+        controller.pause(10)
+        with patch.object(admission, "MAX_QUEUE_PER_CLIENT", 2), patch.object(admission, "MAX_WAIT", 60):
+            waiting = [asyncio.create_task(controller.acquire("dev-1", 1)) for _ in range(2)]
+            await asyncio.sleep(0)
+            with pytest.raises(admission.Overloaded) as excinfo:
+                await controller.acquire("dev-1", 1)
+            assert excinfo.value.status == 429
+            # Other clients still get in line
+            waiting.append(asyncio.create_task(controller.acquire("dev-2", 1)))
+            await asyncio.sleep(0)
+            assert controller.stats()["queued"] == 3
+        for task in waiting:
+            task.cancel()
+
+    async def test_full_queue_is_503(self, controller):
+        controller.pause(10)
+        with patch.object(admission, "MAX_QUEUE", 1), patch.object(admission, "MAX_WAIT", 60):
+            waiting = asyncio.create_task(controller.acquire("dev-1", 1))
+            await asyncio.sleep(0)
+            with pytest.raises(admission.Overloaded) as excinfo:
+                await controller.acquire("dev-2", 1)
+        assert excinfo.value.status == 503
+        assert excinfo.value.retry_after == pytest.approx(10, abs=0.5)
+        waiting.cancel()
+
+    async def test_sheds_when_expected_wait_is_too_long(self, controller):
+        controller.tokens = admission.TokenBucket(6000)  # 100 tokens per second
+        controller.tokens.level = 0
+        with patch.object(admission, "MAX_WAIT", 1):
+            with pytest.raises(admission.Overloaded) as excinfo:
+                await controller.acquire("dev-1", 500)
+        assert excinfo.value.retry_after == pytest.approx(5, abs=0.1)
+
+    async def test_cancelled_waiters_leave_the_queue(self, controller):
+        controller.pause(10)
+        waiting = asyncio.create_task(controller.acquire("dev-1", 50))
+        await asyncio.sleep(0)
+        assert controller.stats()["queued"] == 1
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        assert controller.stats()["queued"] == 0
+        assert controller.stats()["clients_waiting"] == 0
+
+    async def test_run_retries_rate_limits_then_gives_up(self, controller):
+        call = AsyncMock(side_effect=[_rate_limit_error("0"), "ok"])
+        with patch.object(admission, "BACKOFF_BASE", 0.001):
+            assert await controller.run("dev-1", 1, call) == "ok"
+
+            call = AsyncMock(side_effect=_rate_limit_error("0"))
+            with patch.object(admission, "MAX_RETRIES", 2), pytest.raises(openai.RateLimitError):
+                await controller.run("dev-1", 1, call)
+        assert call.await_count == 3
+        assert controller.stats()["rate_limited"] == 4
+        assert controller.stats()["retries"] == 3
+
+    async def test_run_retries_transient_errors_without_pausing(self, controller):
+        request = httpx.Request("POST", "http://llm/v1/chat/completions")
+        server_error = openai.InternalServerError("boom", response=httpx.Response(502, request=request), body=None)
+        call = AsyncMock(side_effect=[openai.APIConnectionError(request=request), server_error, "ok"])
+        with patch.object(admission, "BACKOFF_BASE", 0.001):
+            assert await controller.run("dev-1", 1, call) == "ok"
+
+            call = AsyncMock(side_effect=server_error)
+            with patch.object(admission, "MAX_RETRIES", 1), pytest.raises(openai.InternalServerError):
+                await controller.run("dev-1", 1, call)
+        assert call.await_count == 2
+        assert controller.stats()["rate_limited"] == 0
+        assert controller.stats()["retries"] == 3
+
+    async def test_response_headers_update_the_buckets(self):
+        def handler(request):
+            return httpx.Response(
+                200,
+                headers={
+                    "x-ratelimit-limit-requests": "600",
+                    "x-ratelimit-remaining-requests": "0",
+                    "x-ratelimit-limit-tokens": "60000",
+                    "x-ratelimit-remaining-tokens": "30000",
+                },
+                json={"choices": [{"message": {"content": "ok"}}]},
+            )
+
+        backend = llm_backends.OpenAICompatibleBackend(
+            "http://llm.local/v1", None, httpx.Limits(), httpx.Timeout(5),
+            transport=httpx.MockTransport(handler),
+            event_hooks={"response": [admission.observe_response]},
+        )
+        controller = admission.get_controller()
+        await backend.complete([{"role": "user", "content": "hi"}], "m", 0.7)
+        await backend.close()
+
+        assert controller.stats()["rpm_limit"] == 600
+        assert controller.stats()["tpm_limit"] == 60000
+        # No requests left: the next one waits for a tenth of a second of refill
+        assert controller.requests.wait_time(1, time.monotonic()) == pytest.approx(0.1, abs=0.01)
+        await admission.close()
+
+
+# ---------------------------------------------------------------------------
+# API behaviour
+# ---------------------------------------------------------------------------
+
+class TestSummarizeAdmission:
+    def test_shed_request_is_503_with_retry_after(self):
+        overloaded = admission.Overloaded("Summarization queue is full", retry_after=7.2)
+        with patch.object(admission, "check", side_effect=overloaded):
+            for path in ("/summarize", "/summarize/stream"):
+                response = client.post(path, json={"text": "Transcript."}, headers={"X-Device-Id": "dev-1"})
+                assert response.status_code == 503
+                assert response.headers["Retry-After"] == "8"
+
+    def test_provider_rate_limit_is_429_not_500(self):
+        with patch.object(openai_service, "summarize", side_effect=_rate_limit_error("4")):
+            response = client.post("/summarize", json={"text": "Transcript."})
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "4"
+
+    @pytest.mark.parametrize("error, status, level", [
+        (admission.Overloaded("Summarization queue is full", retry_after=1), 503, logging.WARNING),
+        (_rate_limit_error("1"), 429, logging.WARNING),
+        (RuntimeError("boom"), 500, logging.ERROR),
+    ], ids=["shed", "rate limited", "failed"])
+    def test_only_unexpected_failures_are_logged_as_errors(self, caplog, error, status, level):
+        with patch.object(openai_service, "summarize", side_effect=error):
+            response = client.post("/summarize", json={"text": "Transcript."})
+        assert response.status_code == status
+        assert [record.levelno for record in caplog.records if record.name == "app.main"] == [level]
+
+    def test_requests_are_queued_per_device(self):
+        seen = []
+
+        async def summarize(**kwargs):
+            seen.append(admission.client_key.get())
+            return "Summary."
+
+        with patch.object(openai_service, "summarize", side_effect=summarize):
+            client.post("/summarize", json={"text": "Transcript."}, headers={"X-Device-Id": "dev-7"})
+            client.post("/summarize", json={"text": "Transcript."})
+        assert seen == ["dev-7", "testclient"]
+
+
+    async def test_stream_retries_a_connection_error_before_the_first_delta(self):
+        request = httpx.Request("POST", "http://llm/v1/chat/completions")
+
+        class FlakyBackend(llm_backends.FakeBackend):
+            calls = 0
+
+            async def stream(self, messages, model, temperature):
+                self.calls += 1
+                if self.calls == 1:
+                    raise openai.APIConnectionError(request=request)
+                yield "Summary."
+
+        backend = FlakyBackend()
+        with patch.object(openai_service, "_backend", backend), patch.object(admission, "BACKOFF_BASE", 0.001):
+            deltas = [delta async for delta in openai_service.summarize_stream("Transcript.", "brief", "paragraph", "professional")]
+        assert deltas == ["Summary."]
+        assert backend.calls == 2
+
+
+# ---------------------------------------------------------------------------
+# Goodput simulation
+# ---------------------------------------------------------------------------
+
+class _ScaledBucket(admission.TokenBucket):
+    """TokenBucket with a burst smaller than one minute of its rate."""
+
+    def __init__(self, per_second: float, burst: int):
+        super().__init__(burst)
+        self._rate = per_second
+
+    @property
+    def rate(self) -> float:
+        return self._rate
+
+
+class RateLimitedBackend(llm_backends.FakeBackend):
+    """
+    A provider allowing per_second requests with bursts of up to burst, which
+    answers excess calls with 429 and reports x-ratelimit-* headers (per
+    minute, as OpenAI does) on every response.
+    """
+
+    def __init__(self, per_second: float, burst: int, latency: float):
+        super().__init__(latency=latency)
+        self.bucket = _ScaledBucket(per_second, burst)
+        self.per_second = per_second
+        self.rejected = 0
+
+    async def _respond(self, status: int, **headers) -> httpx.Response:
+        response = httpx.Response(
+            status,
+            headers={
+                "x-ratelimit-limit-requests": str(int(self.per_second * 60)),
+                "x-ratelimit-remaining-requests": str(max(0, int(self.bucket.level))),
+                **headers,
+            },
+            request=httpx.Request("POST", "http://llm/v1/chat/completions"),
+        )
+        await admission.observe_response(response)
+        return response
+
+    async def complete(self, messages, model, temperature):
+        wait = self.bucket.wait_time(1, time.monotonic())
+        if wait > 0:
+            self.rejected += 1
+            response = await self._respond(429, **{"retry-after": f"{wait:.3f}"})
+            raise openai.RateLimitError("rate limited", response=response, body=None)
+        self.bucket.take(1, time.monotonic())
+        await self._respond(200)
+        return await super().complete(messages, model, temperature)
+
+
+class TestGoodput:
+    DEVICES = 6
+    PER_DEVICE = 10
+
+    async def _simulate(self, backend, wave: int = 0) -> tuple[int, float]:
+        async def one(device: str, i: int) -> bool:
+            admission.client_key.set(device)
+            text = f"{device} transcript {wave}.{i}"
+            try:
+                await openai_service.summarize(text, "brief", "paragraph", "professional")
+                return True
+            except openai.RateLimitError:
+                return False
+
+        with patch.object(openai_service, "BACKEND", "fake"), \
+                patch.object(openai_service, "_backend", backend), \
+                patch.object(openai_service, "_semaphore", None):
+            start = time.perf_counter()
+            results = await asyncio.gather(*(
+                one(f"dev-{d}", i) for d in range(self.DEVICES) for i in range(self.PER_DEVICE)
+            ))
+            return sum(results), time.perf_counter() - start
+
+    async def test_admission_control_improves_goodput(self):
+        """60 summaries from 6 devices at once against a 50 req/s provider."""
+        total = self.DEVICES * self.PER_DEVICE
+
+        # Before: calls go straight to the provider and every 429 is a failure
+        baseline = RateLimitedBackend(per_second=50, burst=5, latency=0.02)
+        with patch.object(admission, "run", lambda messages, call: call()):
+            baseline_ok, _ = await self._simulate(baseline)
+
+        controlled = RateLimitedBackend(per_second=50, burst=5, latency=0.02)
+        with patch.object(admission, "BACKOFF_BASE", 0.05), patch.object(admission, "BACKOFF_MAX", 0.2):
+            cold_ok, cold_elapsed = await self._simulate(controlled)
+            cold_rejected = controlled.rejected
+            # Second wave: the limit learned from the headers paces calls up front
+            warm_ok, warm_elapsed = await self._simulate(controlled, wave=1)
+            warm_rejected = controlled.rejected - cold_rejected
+        await admission.close()
+
+        print(
+            f"\nno admission control: {baseline_ok}/{total} ok, {baseline.rejected} 429s"
+            f"\nadmission, cold: {cold_ok}/{total} ok in {cold_elapsed:.2f} s "
+            f"({cold_ok / cold_elapsed:.1f}/s), {cold_rejected} 429s"
+            f"\nadmission, warm: {warm_ok}/{total} ok in {warm_elapsed:.2f} s "
+            f"({warm_ok / warm_elapsed:.1f}/s), {warm_rejected} 429s"
+        )
+        assert baseline_ok < total / 4
+        assert cold_ok == warm_ok == total
+        assert warm_rejected <= total * 0.05
+        # Goodput stays close to the provider's 50 req/s ceiling
+        assert warm_ok / warm_elapsed > 35
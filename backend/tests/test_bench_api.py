@@ -0,0 +1,31 @@
+"""
+Smoke test for the end-to-end load benchmark, so the harness keeps working
+as the API changes: every scenario runs a few requests without errors and
+the results are JSON.
+"""
+import json
+
+from benchmarks import bench_api
+
+
+async def test_every_scenario_runs_without_errors():
+    args = bench_api.parser().parse_args([
+        "--requests", "12", "--concurrency", "4", "--devices", "2", "--history-items", "8",
+        "--llm-latency", "0", "--llm-tps", "0", "--translate-latency", "0",
+    ])
+
+    results = await bench_api.run(args)
+
+    assert set(results["scenarios"]) == set(bench_api.SCENARIOS)
+    for name, result in results["scenarios"].items():
+        assert result["errors"] == 0, (name, result["endpoints"])
+        assert result["count"] == 12
+        assert result["p50_ms"] <= result["p95_ms"] <= result["p99_ms"]
+    assert json.loads(json.dumps(results))["meta"]["args"]["requests"] == 12
+
+
+def test_transcripts_grow_from_the_seed():
+    text = bench_api.transcript(16_000, 7)
+    assert text.startswith(f"Visit 7. {bench_api.SEED}")
+    assert 16_000 <= len(text) < 16_200
+    assert bench_api.transcript(16_000, 8) != text
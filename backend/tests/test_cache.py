@@ -0,0 +1,114 @@
+"""
+Unit tests for the in-process TTL/LRU cache and the summary cache built on it.
+"""
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app.services import openai_service, summary_cache
+from app.services.cache import TTLCache
+
+
+# ---------------------------------------------------------------------------
+# cache.py
+# ---------------------------------------------------------------------------
+
+class TestTTLCache:
+    def test_get_and_set(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+
+    def test_evicts_least_recently_used(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.evictions == 1
+
+    def test_expired_entries_are_misses(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        with patch("app.services.cache.time.monotonic", return_value=0):
+            cache.set("a", 1)
+        with patch("app.services.cache.time.monotonic", return_value=61):
+            assert cache.get("a") is None
+        assert len(cache) == 0
+
+
+# ---------------------------------------------------------------------------
+# summary_cache.py
+# ---------------------------------------------------------------------------
+
+class TestSummaryCache:
+    def test_key_ignores_whitespace_differences(self):
+        a = summary_cache.make_key("Patient  has\nfever. ", "prompt", "model")
+        b = summary_cache.make_key("Patient has fever.", "prompt", "model")
+        assert a == b
+
+    def test_key_depends_on_prompt_and_model(self):
+        base = summary_cache.make_key("text", "prompt", "model")
+        assert base != summary_cache.make_key("text", "other prompt", "model")
+        assert base != summary_cache.make_key("text", "prompt", "other-model")
+
+    @pytest.mark.asyncio
+    async def test_mongo_tier_fills_memory_tier(self):
+        collection = MagicMock()
+        collection.find_one = AsyncMock(return_value={"_id": "k", "summary": "shared"})
+        with patch.object(summary_cache, "MONGO_ENABLED", True), \
+                patch.object(summary_cache, "_collection", return_value=collection):
+            assert await summary_cache.get("k") == "shared"
+            assert await summary_cache.get("k") == "shared"
+        collection.find_one.assert_awaited_once()
+        assert summary_cache.stats()["mongo"]["hits"] == 1
+
+    @pytest.mark.asyncio
+    async def test_mongo_errors_degrade_to_miss(self):
+        collection = MagicMock()
+        collection.find_one = AsyncMock(side_effect=Exception("network down"))
+        with patch.object(summary_cache, "MONGO_ENABLED", True), \
+                patch.object(summary_cache, "_collection", return_value=collection):
+            assert await summary_cache.get("k") is None
+
+
+class TestSummarizeCaching:
+    def _client(self, content="Fresh summary."):
+        response = MagicMock()
+        response.choices[0].message.content = content
+        client = MagicMock()
+        client.chat.completions.create = AsyncMock(return_value=response)
+        return client
+
+    @pytest.mark.asyncio
+    async def test_repeat_request_is_served_from_cache(self):
+        client = self._client()
+        with patch("app.services.openai_service.get_client", return_value=client):
+            first = await openai_service.summarize("Transcript.", "brief", "paragraph", "professional")
+            second = await openai_service.summarize("Transcript. ", "brief", "paragraph", "professional")
+        assert first == second == "Fresh summary."
+        client.chat.completions.create.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_different_options_miss(self):
+        client = self._client()
+        with patch("app.services.openai_service.get_client", return_value=client):
+            await openai_service.summarize("Transcript.", "brief", "paragraph", "professional")
+            await openai_service.summarize("Transcript.", "detailed", "paragraph", "professional")
+        assert client.chat.completions.create.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_bypass_cache_forces_new_completion(self):
+        client = self._client()
+        with patch("app.services.openai_service.get_client", return_value=client):
+            await openai_service.summarize("Transcript.", "brief", "paragraph", "professional")
+            client.chat.completions.create.return_value.choices[0].message.content = "Regenerated."
+            result = await openai_service.summarize(
+                "Transcript.", "brief", "paragraph", "professional", bypass_cache=True
+            )
+            cached = await openai_service.summarize("Transcript.", "brief", "paragraph", "professional")
+        assert result == cached == "Regenerated."
+        assert client.chat.completions.create.await_count == 2
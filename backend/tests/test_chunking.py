@@ -0,0 +1,44 @@
+"""
+Unit tests for transcript chunking used by long-document summarization.
+"""
+from app.services import chunking
+
+
+def _transcript(turns: int) -> str:
+    return "\n".join(
+        f"{'Doctor' if i % 2 else 'Patient'}: Statement number {i} about the symptoms." for i in range(turns)
+    )
+
+
+class TestChunkText:
+    def test_short_text_is_single_chunk(self):
+        assert chunking.chunk_text("Doctor: Hello.\nPatient: Hi.", max_tokens=100) == [
+            "Doctor: Hello.\nPatient: Hi."
+        ]
+
+    def test_chunks_respect_token_budget(self):
+        chunks = chunking.chunk_text(_transcript(200), max_tokens=120, overlap_tokens=20)
+        assert len(chunks) > 1
+        assert all(chunking.estimate_tokens(chunk) <= 120 for chunk in chunks)
+
+    def test_chunks_split_on_speaker_turns(self):
+        chunks = chunking.chunk_text(_transcript(50), max_tokens=60)
+        for chunk in chunks:
+            assert all(line.startswith(("Doctor: ", "Patient: ")) for line in chunk.splitlines())
+
+    def test_overlap_repeats_trailing_context(self):
+        chunks = chunking.chunk_text(_transcript(50), max_tokens=60, overlap_tokens=20)
+        assert chunks[0].splitlines()[-1] == chunks[1].splitlines()[0]
+
+    def test_long_turn_is_split_at_sentences(self):
+        turn = "Patient: " + " ".join(f"Sentence {i} is here." for i in range(100))
+        chunks = chunking.chunk_text(turn, max_tokens=50)
+        assert len(chunks) > 1
+        assert all(chunk.endswith(".") for chunk in chunks)
+
+    def test_editing_the_end_keeps_leading_chunks(self):
+        original = _transcript(200)
+        edited = original + "\nDoctor: One more thing about the prescription."
+        before = chunking.chunk_text(original, max_tokens=120, overlap_tokens=20)
+        after = chunking.chunk_text(edited, max_tokens=120, overlap_tokens=20)
+        assert after[:-1] == before[:-1]
@@ -0,0 +1,118 @@
+"""
+Tests for extractive transcript compression: sentence splitting, the
+vectorized TextRank scores and budgeted selection.
+"""
+import numpy as np
+import pytest
+from unittest.mock import patch
+
+from app.services import compression
+
+TRANSCRIPT = """Doctor: Hi, good morning. How are you today?
+Patient: Um, good morning. I'm okay, thanks.
+Doctor: Okay. So what brings you in?
+Patient: Uh, I've had a headache for about two weeks. It gets worse in the evening, you know.
+Doctor: Right. Any nausea?
+Patient: Yes.
+Doctor: Are you taking anything for it?
+Patient: I take ibuprofen 400 mg twice a day. It helps a little.
+Doctor: Okay, okay. Right.
+Patient: Yeah.
+Doctor: The weather has been nice lately.
+Patient: It has, I went to the lake on Sunday with my family and the kids loved it.
+Doctor: I'll order an MRI and we'll follow up in two weeks.
+Patient: Thank you so much, doctor.
+"""
+
+
+@pytest.fixture(autouse=True)
+def _compress_short_texts():
+    with patch.object(compression, "MIN_TOKENS", 0):
+        yield
+
+
+def _dense_textrank(sentences):
+    """Reference TextRank built on the full similarity matrix."""
+    rows, cols, values, d = compression._term_matrix(sentences)
+    x = np.zeros((len(sentences), d))
+    x[rows, cols] = values
+    similarity = x @ x.T
+    np.fill_diagonal(similarity, 0)
+    degree = similarity.sum(axis=1)
+    connected = degree > 1e-12
+    transition = np.divide(similarity, degree[:, None], out=np.zeros_like(similarity), where=connected[:, None])
+    count = connected.sum()
+    rank = connected / count
+    for _ in range(200):
+        rank = (1 - compression.DAMPING) / count * connected + compression.DAMPING * transition.T @ rank
+    return rank
+
+
+class TestSplitSentences:
+    def test_keeps_speakers_and_strips_disfluencies(self):
+        sentences = compression.split_sentences(TRANSCRIPT)
+        first_patient = next(s for s in sentences if s.speaker == "Patient")
+        assert first_patient.text == "Good morning."
+        assert all("Um" not in s.text and "Uh," not in s.text for s in sentences)
+        assert {s.speaker for s in sentences} == {"Doctor", "Patient"}
+
+    def test_lines_without_speaker(self):
+        sentences = compression.split_sentences("First point here. Second point here.")
+        assert [s.text for s in sentences] == ["First point here.", "Second point here."]
+        assert sentences[0].speaker is None
+
+
+class TestTextRank:
+    def test_matches_dense_reference(self):
+        sentences = compression.split_sentences(TRANSCRIPT * 3)
+        np.testing.assert_allclose(compression.textrank(sentences), _dense_textrank(sentences), atol=1e-5)
+
+    def test_central_sentences_outrank_off_topic_ones(self):
+        sentences = compression.split_sentences(
+            "The headache is worse at night.\n"
+            "The headache started two weeks ago.\n"
+            "Night time headache keeps me awake.\n"
+            "We went to the lake on Sunday."
+        )
+        scores = compression.textrank(sentences)
+        assert scores[3] < scores[:3].min()
+
+    def test_filler_scores_zero(self):
+        scores = compression.textrank(compression.split_sentences("Okay. Yeah, right. Thank you."))
+        assert not scores.any()
+
+
+class TestCompress:
+    def test_short_text_is_unchanged(self):
+        with patch.object(compression, "MIN_TOKENS", 1000):
+            result = compression.compress(TRANSCRIPT, ratio=0.2)
+        assert result.text == TRANSCRIPT
+        assert result.report()["reduction"] == 0
+
+    def test_fits_budget_and_keeps_clinical_content_in_order(self):
+        result = compression.compress(TRANSCRIPT, max_tokens=80)
+        lines = result.text.splitlines()
+
+        assert result.compressed_tokens <= 80
+        assert result.compressed_tokens < result.original_tokens
+        assert "Patient: I take ibuprofen 400 mg twice a day." in lines
+        assert lines.index("Patient: I've had a headache for about two weeks.") < lines.index(
+            "Doctor: I'll order an MRI and we'll follow up in two weeks."
+        )
+        assert "lake" not in result.text
+        assert "Okay, okay" not in result.text
+
+    def test_short_reply_stays_with_its_question(self):
+        result = compression.compress(TRANSCRIPT, max_tokens=80)
+        lines = result.text.splitlines()
+        assert lines[lines.index("Doctor: Any nausea?") + 1] == "Patient: Yes."
+
+    @pytest.mark.parametrize("text", ["um uh okay so yeah", "um. uh. " * 50, "Patient: um uh okay so yeah " * 100])
+    def test_text_that_would_compress_to_nothing_is_unchanged(self, text):
+        result = compression.compress(text, ratio=0.5)
+        assert result.text == text
+        assert result.report()["reduction"] == 0
+
+    def test_ratio_sets_the_budget(self):
+        result = compression.compress(TRANSCRIPT * 10, ratio=0.25)
+        assert result.compressed_tokens <= result.original_tokens * 0.25
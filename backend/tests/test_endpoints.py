@@ -2,10 +2,12 @@
 Endpoint integration tests for the Text Summarizer & Translator API.
 Uses FastAPI TestClient and mocks external service calls to keep tests fast and offline.
 """
+import json
 import pytest
 from unittest.mock import AsyncMock, patch
 from fastapi.testclient import TestClient
 from app.main import app
+from app.settings import settings
 
 client = TestClient(app)
 
@@ -20,6 +22,58 @@ def test_health_check():
     assert response.json() == {"status": "ok"}
 
 
+# ---------------------------------------------------------------------------
+# Lifecycle and /ready
+# ---------------------------------------------------------------------------
+
+def test_ready_is_503_outside_lifespan():
+    response = client.get("/ready")
+    assert response.status_code == 503
+
+
+@patch("app.services.db.close")
+@patch("app.services.openai_service.close", new_callable=AsyncMock)
+@patch("app.services.openai_service.warm_up", new_callable=AsyncMock)
+@patch("app.services.history_service.ensure_indexes", new_callable=AsyncMock)
+@patch("app.services.db.ping", new_callable=AsyncMock)
+@patch("app.services.db.is_configured", return_value=True)
+def test_lifespan_warms_up_and_closes(_configured, mock_ping, mock_indexes, mock_warm, mock_close, mock_db_close, monkeypatch):
+    monkeypatch.setattr(settings, "openai_api_key", "sk-test")
+    with TestClient(app) as lifespan_client:
+        mock_indexes.assert_awaited_once()
+        mock_warm.assert_awaited_once()
+        response = lifespan_client.get("/ready")
+        assert response.status_code == 200
+        assert response.json() == {"status": "ready", "checks": {"mongo": "ok"}}
+
+    mock_close.assert_awaited_once()
+    mock_db_close.assert_called_once()
+    assert client.get("/ready").status_code == 503
+
+
+@patch("app.services.db.close")
+@patch("app.services.history_service.ensure_indexes", new_callable=AsyncMock)
+@patch("app.services.db.ping", new_callable=AsyncMock)
+@patch("app.services.db.is_configured", return_value=True)
+def test_ready_reports_database_outage(_configured, mock_ping, _indexes, _db_close):
+    mock_ping.side_effect = ConnectionError("down")
+    # A failed warm-up is logged, not fatal
+    with TestClient(app) as lifespan_client:
+        response = lifespan_client.get("/ready")
+        assert response.status_code == 503
+        assert response.json()["checks"] == {"mongo": "unavailable"}
+
+        mock_ping.side_effect = None
+        assert lifespan_client.get("/ready").status_code == 200
+
+
+@patch("app.services.translate_service.GoogleTranslator", side_effect=ValueError("xx is not supported"))
+def test_unsupported_warm_language_does_not_abort_startup(_translator, monkeypatch):
+    monkeypatch.setattr(settings, "translate_warm_languages", ["xx"])
+    with TestClient(app) as lifespan_client:
+        assert lifespan_client.get("/health").status_code == 200
+
+
 # ---------------------------------------------------------------------------
 # /summarize endpoint
 # ---------------------------------------------------------------------------
@@ -42,6 +96,16 @@ def test_summarize_success(mock_summarize):
     mock_summarize.assert_called_once()
 
 
+@patch("app.services.openai_service.summarize", new_callable=AsyncMock)
+def test_summarize_error_is_a_500(mock_summarize):
+    mock_summarize.side_effect = RuntimeError("API error")
+
+    response = client.post("/summarize", json={"text": "Some text."})
+
+    assert response.status_code == 500
+    assert response.json() == {"detail": "API error"}
+
+
 def test_summarize_missing_text():
     """Omitting required 'text' field should return a 422 validation error."""
     response = client.post("/summarize", json={})
@@ -59,6 +123,200 @@ def test_summarize_defaults(mock_summarize):
     assert data["summary"] == "Default summary."
 
 
+@patch("app.services.openai_service.summarize", new_callable=AsyncMock)
+def test_summarize_passes_bypass_cache(mock_summarize):
+    mock_summarize.return_value = "Regenerated summary."
+
+    response = client.post("/summarize", json={"text": "Some text.", "bypass_cache": True})
+    assert response.status_code == 200
+    assert mock_summarize.call_args.kwargs["bypass_cache"] is True
+
+
+def _stream_of(*deltas, error=None):
+    async def summarize_stream(**kwargs):
+        for delta in deltas:
+            yield delta
+        if error:
+            raise error
+    return summarize_stream
+
+
+@patch("app.services.openai_service.summarize_stream", new=_stream_of("Brief ", "summary."))
+def test_summarize_stream_sends_deltas_then_done():
+    response = client.post("/summarize/stream", json={"text": "Some text."})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [e for e in response.text.split("\n\n") if e]
+    assert events[0] == 'data: {"delta": "Brief "}'
+    assert events[1] == 'data: {"delta": "summary."}'
+    assert events[2].startswith("event: done\n")
+
+
+@patch("app.services.openai_service.summarize_stream", new=_stream_of("Partial", error=Exception("API error")))
+def test_summarize_stream_reports_errors_as_events():
+    response = client.post("/summarize/stream", json={"text": "Some text."})
+
+    assert response.status_code == 200
+    assert 'event: error\ndata: {"error": "API error"}' in response.text
+
+
+async def _variants_out_of_order(text, variants, bypass_cache=False):
+    # Results arrive in completion order, not request order
+    for index in reversed(range(len(variants))):
+        yield index, {**variants[index], "summary": f"{variants[index]['summary_type']} summary"}
+
+
+@patch("app.services.openai_service.summarize_variants", new=_variants_out_of_order)
+def test_summarize_variants_returns_all_in_request_order():
+    response = client.post("/summarize", json={
+        "text": "Some text.",
+        "variants": [{"summary_type": "brief"}, {"summary_type": "detailed", "style": "bullets"}],
+    })
+
+    assert response.status_code == 200
+    variants = response.json()["variants"]
+    assert [v["summary"] for v in variants] == ["brief summary", "detailed summary"]
+    assert variants[1]["style"] == "bullets"
+    assert variants[0]["tonality"] == "professional"
+
+
+def test_summarize_variants_are_validated():
+    assert client.post("/summarize", json={"text": "Some text.", "variants": []}).status_code == 400
+    too_many = [{"summary_type": "brief"}] * 50
+    assert client.post("/summarize", json={"text": "Some text.", "variants": too_many}).status_code == 400
+
+
+@patch("app.services.openai_service.summarize_variants", new=_variants_out_of_order)
+def test_summarize_stream_sends_each_variant_as_it_completes():
+    response = client.post("/summarize/stream", json={
+        "text": "Some text.",
+        "variants": [{"summary_type": "brief"}, {"summary_type": "detailed"}],
+    })
+
+    events = [e for e in response.text.split("\n\n") if e]
+    assert events[0].startswith("event: variant\n")
+    assert json.loads(events[0].split("data: ", 1)[1])["index"] == 1
+    assert json.loads(events[1].split("data: ", 1)[1])["index"] == 0
+    assert events[2] == 'event: done\ndata: {"total": 2}'
+
+
+_CHATTY_TRANSCRIPT = "\n".join([
+    "Doctor: Hi, good morning. How are you today?",
+    "Patient: Um, good morning. I'm okay, thanks.",
+    "Patient: I've had a headache for about two weeks and I take ibuprofen 400 mg daily.",
+    "Doctor: The weather has been lovely, have you been out walking much?",
+    "Patient: Yeah, we went to the lake on Sunday with the kids.",
+] * 20)
+
+
+@patch("app.services.openai_service.summarize", new_callable=AsyncMock)
+def test_summarize_compression_trims_text_and_reports_tokens(mock_summarize):
+    mock_summarize.return_value = "Summary."
+
+    response = client.post("/summarize", json={"text": _CHATTY_TRANSCRIPT, "compression": {"ratio": 0.3}})
+
+    assert response.status_code == 200
+    report = response.json()["compression"]
+    sent = mock_summarize.call_args.kwargs["text"]
+    assert len(sent) < len(_CHATTY_TRANSCRIPT)
+    assert "ibuprofen 400 mg" in sent
+    assert report["compressed_tokens"] < report["original_tokens"]
+    assert 0 < report["reduction"] < 1
+
+
+@patch("app.services.openai_service.summarize", new_callable=AsyncMock)
+def test_summarize_without_compression_sends_text_unchanged(mock_summarize):
+    mock_summarize.return_value = "Summary."
+
+    response = client.post("/summarize", json={"text": _CHATTY_TRANSCRIPT})
+
+    assert "compression" not in response.json()
+    assert mock_summarize.call_args.kwargs["text"] == _CHATTY_TRANSCRIPT
+
+
+@patch("app.services.history_service.find_predecessor", new_callable=AsyncMock)
+@patch("app.services.openai_service.summarize", new_callable=AsyncMock)
+def test_summarize_incremental_reports_tokens_saved(mock_summarize, mock_find):
+    mock_summarize.return_value = "Updated summary."
+    mock_find.return_value = {"id": "parent-1", "input_text": _CHATTY_TRANSCRIPT, "summary": "Earlier summary."}
+    text = _CHATTY_TRANSCRIPT + "\nDoctor: Let's add a blood test."
+
+    response = client.post(
+        "/summarize", json={"text": text, "incremental": True}, headers={"X-Device-Id": "dev-1"}
+    )
+
+    assert response.status_code == 200
+    report = response.json()["incremental"]
+    assert report["parent_id"] == "parent-1"
+    assert report["tokens_saved"] > 0
+    assert mock_summarize.call_args.kwargs["plan"].parent_id == "parent-1"
+    mock_find.assert_awaited_once_with("dev-1", text, "brief", "paragraph", "professional")
+
+
+@patch("app.services.history_service.find_predecessor", new_callable=AsyncMock)
+@patch("app.services.openai_service.summarize", new_callable=AsyncMock)
+def test_summarize_incremental_without_predecessor_runs_in_full(mock_summarize, mock_find):
+    mock_summarize.return_value = "Summary."
+    mock_find.return_value = None
+
+    response = client.post(
+        "/summarize", json={"text": "New transcript.", "incremental": True}, headers={"X-Device-Id": "dev-1"}
+    )
+
+    assert response.json()["incremental"] is None
+    assert mock_summarize.call_args.kwargs["plan"] is None
+
+
+def test_summarize_compression_is_validated():
+    response = client.post("/summarize", json={"text": "Some text.", "compression": {"ratio": 1.5}})
+    assert response.status_code == 422
+
+
+# ---------------------------------------------------------------------------
+# /batch endpoints
+# ---------------------------------------------------------------------------
+
+@patch("app.services.openai_service.summarize", new_callable=AsyncMock)
+def test_batch_summarize_runs_items(mock_summarize):
+    mock_summarize.side_effect = lambda text, summary_type, **kwargs: f"{summary_type}: {text}"
+
+    with TestClient(app) as batch_client:
+        response = batch_client.post("/batch/summarize", json={
+            "text": "Shared transcript.",
+            "items": [{"summary_type": "brief"}, {"summary_type": "detailed"}, {"text": "Other.", "summary_type": "brief"}],
+        })
+        assert response.status_code == 202
+        job_id = response.json()["job_id"]
+
+        stream = batch_client.get(f"/batch/{job_id}/stream")
+        assert stream.text.count("event: result") == 3
+        assert "event: done" in stream.text
+
+        data = batch_client.get(f"/batch/{job_id}").json()
+
+    assert data["status"] == "completed"
+    assert [r["summary"] for r in data["results"]] == [
+        "brief: Shared transcript.", "detailed: Shared transcript.", "brief: Other."
+    ]
+
+
+def test_batch_requires_text():
+    response = client.post("/batch/summarize", json={"items": [{"summary_type": "brief"}]})
+    assert response.status_code == 400
+
+
+def test_batch_history_requires_device_id():
+    response = client.post("/batch/summarize", json={
+        "text": "Some text.", "items": [{}], "save_to_history": True,
+    })
+    assert response.status_code == 400
+
+
+def test_batch_unknown_job():
+    assert client.get("/batch/does-not-exist").status_code == 404
+
+
 # ---------------------------------------------------------------------------
 # /translate endpoint
 # ---------------------------------------------------------------------------
@@ -91,6 +349,25 @@ def test_translate_missing_text():
     assert response.status_code == 422
 
 
+@patch("app.services.translate_service.translate_many", new_callable=AsyncMock)
+def test_translate_multi_success(mock_translate_many):
+    mock_translate_many.return_value = {"fi": "Yhteenveto.", "sv": "Sammanfattning."}
+
+    response = client.post("/translate/multi", json={
+        "text": "Summary.",
+        "target_languages": ["fi", "sv"]
+    })
+
+    assert response.status_code == 200
+    assert response.json()["translations"] == {"fi": "Yhteenveto.", "sv": "Sammanfattning."}
+    mock_translate_many.assert_called_once_with(text="Summary.", target_languages=["fi", "sv"])
+
+
+def test_translate_multi_requires_languages():
+    response = client.post("/translate/multi", json={"text": "Summary.", "target_languages": []})
+    assert response.status_code == 400
+
+
 # ---------------------------------------------------------------------------
 # /upload endpoint
 # ---------------------------------------------------------------------------
@@ -106,6 +383,20 @@ def test_upload_txt_success():
     assert response.json()["text"] == "Patient reports persistent cough."
 
 
+def test_upload_large_text_is_compressed():
+    """A long transcript goes back gzip-encoded to clients that accept it."""
+    file_content = b"Doctor: How is the cough?\nPatient: Worse at night.\n" * 2000
+    response = client.post(
+        "/upload",
+        files={"file": ("notes.txt", file_content, "text/plain")},
+        headers={"Accept-Encoding": "gzip"},
+    )
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.num_bytes_downloaded < len(file_content) // 10
+    assert response.json()["text"] == file_content.decode("utf-8").strip()
+
+
 def test_upload_non_txt():
     """Uploading a non-.txt file should return a 400 error."""
     file_content = b"%PDF-1.4 fake pdf content"
@@ -114,3 +405,198 @@ def test_upload_non_txt():
         files={"file": ("document.pdf", file_content, "application/pdf")}
     )
     assert response.status_code == 400
+
+
+# ---------------------------------------------------------------------------
+# /history endpoints
+# ---------------------------------------------------------------------------
+
+@patch("app.services.history_service.get_history", new_callable=AsyncMock)
+def test_history_passes_cursor(mock_get_history):
+    mock_get_history.return_value = {"items": [], "has_more": False, "next_cursor": None}
+
+    response = client.get("/history", params={"cursor": "abc", "limit": 5}, headers={"X-Device-Id": "dev-1"})
+
+    assert response.status_code == 200
+    mock_get_history.assert_awaited_once_with("dev-1", cursor="abc", limit=5)
+
+
+def test_history_invalid_cursor():
+    with patch("app.services.history_service.get_db"):
+        response = client.get("/history", params={"cursor": "garbage"}, headers={"X-Device-Id": "dev-1"})
+    assert response.status_code == 400
+
+
+def test_history_limit_is_bounded():
+    response = client.get("/history", params={"limit": 10_000}, headers={"X-Device-Id": "dev-1"})
+    assert response.status_code == 422
+
+
+@patch("app.services.history_service.search_history", new_callable=AsyncMock)
+def test_history_search(mock_search):
+    mock_search.return_value = {"items": [], "has_more": False, "next_cursor": None}
+
+    response = client.get("/history/search", params={"q": "chest pain", "limit": 5}, headers={"X-Device-Id": "dev-1"})
+
+    assert response.status_code == 200
+    mock_search.assert_awaited_once_with("dev-1", "chest pain", cursor=None, limit=5)
+
+
+def test_history_search_requires_query():
+    response = client.get("/history/search", headers={"X-Device-Id": "dev-1"})
+    assert response.status_code == 422
+
+
+def test_history_search_invalid_cursor():
+    with patch("app.services.history_service.get_db"):
+        response = client.get("/history/search", params={"q": "x", "cursor": "garbage"}, headers={"X-Device-Id": "dev-1"})
+    assert response.status_code == 400
+
+
+def _export_batches(*batches):
+    async def export(device_id, batch_size=None):
+        for batch in batches:
+            yield batch
+    return export
+
+
+_EXPORTED = {
+    "id": "65f0c0ffee", "title": "Cough, day 3", "input_text": "Patient coughs.\nNo fever.",
+    "summary": "Dry cough.", "summary_type": "brief", "created_at": "2025-01-01T00:00:00+00:00",
+}
+
+
+def test_history_export_streams_ndjson():
+    with patch("app.services.history_service.export_history", _export_batches([_EXPORTED], [_EXPORTED])):
+        response = client.get("/history/export", headers={"X-Device-Id": "dev-1"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert 'filename="history.ndjson"' in response.headers["content-disposition"]
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert len(lines) == 2
+    assert lines[0]["input_text"] == "Patient coughs.\nNo fever."
+    assert lines[0]["translated_summary"] is None
+
+
+def test_history_export_csv_gzip():
+    import csv, gzip, io
+    with patch("app.services.history_service.export_history", _export_batches([_EXPORTED])):
+        response = client.get("/history/export", params={"format": "csv", "gzip": True}, headers={"X-Device-Id": "dev-1"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/gzip"
+    assert 'filename="history.csv.gz"' in response.headers["content-disposition"]
+    rows = list(csv.DictReader(io.StringIO(gzip.decompress(response.content).decode("utf-8"))))
+    assert rows[0]["title"] == "Cough, day 3"
+    assert rows[0]["input_text"] == "Patient coughs.\nNo fever."
+
+
+def test_history_export_rejects_unknown_format():
+    response = client.get("/history/export", params={"format": "xml"}, headers={"X-Device-Id": "dev-1"})
+    assert response.status_code == 422
+
+
+def test_history_export_database_error_is_a_500():
+    async def failing(device_id, batch_size=None):
+        raise RuntimeError("mongo unavailable")
+        yield
+
+    with patch("app.services.history_service.export_history", failing):
+        response = client.get("/history/export", headers={"X-Device-Id": "dev-1"})
+    assert response.status_code == 500
+
+
+def test_history_import_round_trips_export(mongo_db):
+    import gzip
+    lines = [
+        json.dumps({"input_text": "First visit.", "summary": "v1", "created_at": "2024-03-01T09:00:00Z"}),
+        "not json",
+        json.dumps({"input_text": "Second visit.", "summary": 3}),
+        "",
+        json.dumps({"input_text": "First visit.", "summary": "v2", "id": "ignored"}),
+    ]
+    body = gzip.compress("\n".join(lines).encode("utf-8"))
+
+    with patch("app.services.history_service.get_db", return_value=mongo_db):
+        response = client.post(
+            "/history/import", content=body, headers={"X-Device-Id": "dev-1", "Content-Encoding": "gzip"}
+        )
+        exported = client.get("/history/export", headers={"X-Device-Id": "dev-1"})
+
+    assert response.status_code == 200
+    result = response.json()
+    assert result["received"] == 2
+    assert [error["line"] for error in result["errors"]] == [2, 3]
+    assert "summary must be a string" in result["errors"][1]["error"]
+    items = [json.loads(line) for line in exported.text.splitlines()]
+    assert [(item["input_text"], item["summary"]) for item in items] == [("First visit.", "v2")]
+    assert items[0]["created_at"].startswith("2024-03-01T09:00:00")
+
+
+def test_history_import_rejects_unknown_encoding():
+    response = client.post("/history/import", content=b"", headers={"X-Device-Id": "dev-1", "Content-Encoding": "br"})
+    assert response.status_code == 415
+
+
+def test_history_import_invalid_gzip_is_a_400(mongo_db):
+    with patch("app.services.history_service.get_db", return_value=mongo_db):
+        response = client.post(
+            "/history/import", content=b"not gzip", headers={"X-Device-Id": "dev-1", "Content-Encoding": "gzip"}
+        )
+    assert response.status_code == 400
+
+
+def test_history_revalidates_with_etag(mongo_db):
+    headers = {"X-Device-Id": "dev-1"}
+    with patch("app.services.history_service.get_db", return_value=mongo_db):
+        saved = client.post("/history", json={"input_text": "Visit.", "summary": "v1"}, headers=headers).json()
+        first = client.get("/history", headers=headers)
+        unchanged = client.get("/history", headers={**headers, "If-None-Match": first.headers["etag"]})
+        item = client.get(f"/history/{saved['id']}", headers=headers)
+        item_unchanged = client.get(f"/history/{saved['id']}", headers={**headers, "If-None-Match": item.headers["etag"]})
+
+        client.post("/history", json={"input_text": "Visit.", "summary": "v2"}, headers=headers)
+        changed = client.get(f"/history/{saved['id']}", headers={**headers, "If-None-Match": item.headers["etag"]})
+
+    assert first.status_code == 200
+    assert first.json()["items"][0]["id"] == saved["id"]
+    assert first.headers["cache-control"] == "private, no-cache"
+    assert "X-Device-Id" in first.headers["vary"]
+    assert unchanged.status_code == 304 and unchanged.content == b""
+    assert unchanged.headers["etag"] == first.headers["etag"]
+    assert item.json()["summary"] == "v1"
+    assert item_unchanged.status_code == 304
+    assert changed.status_code == 200 and changed.json()["summary"] == "v2"
+    assert changed.headers["etag"] != item.headers["etag"]
+
+
+def test_compressed_history_page_revalidates_with_weak_etag(mongo_db):
+    headers = {"X-Device-Id": "dev-1", "Accept-Encoding": "gzip"}
+    with patch("app.services.history_service.get_db", return_value=mongo_db):
+        for i in range(20):
+            client.post("/history", json={"input_text": f"Visit {i}: knee pain, physiotherapy.", "summary": "Fine."}, headers=headers)
+        first = client.get("/history", params={"limit": 20}, headers=headers)
+        unchanged = client.get("/history", params={"limit": 20}, headers={**headers, "If-None-Match": first.headers["etag"]})
+
+    assert first.headers["content-encoding"] == "gzip"
+    assert first.headers["etag"].startswith('W/"')
+    assert "X-Device-Id" in first.headers["vary"] and "Accept-Encoding" in first.headers["vary"]
+    assert len(first.json()["items"]) == 20
+    assert unchanged.status_code == 304
+    assert unchanged.headers["etag"] == first.headers["etag"]
+    assert "Accept-Encoding" in unchanged.headers["vary"]
+
+
+# ---------------------------------------------------------------------------
+# /cache/stats endpoint
+# ---------------------------------------------------------------------------
+
+def test_cache_stats():
+    response = client.get("/cache/stats")
+    assert response.status_code == 200
+    data = response.json()
+    assert set(data["summary"]["memory"]) >= {"hits", "misses", "evictions", "size"}
+    assert set(data["translation"]) >= {"hits", "misses", "evictions", "size"}
+    assert set(data["coalescing"]["summary"]) >= {"leaders", "coalesced", "in_flight"}
+    assert set(data["coalescing"]["translation"]) >= {"leaders", "coalesced", "in_flight"}
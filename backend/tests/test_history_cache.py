@@ -0,0 +1,302 @@
+"""
+Tests for the history read cache: rendering and ETags, read-through and
+coalescing, and invalidation by writes through both storage backends.
+"""
+import asyncio
+import json
+import pytest
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+from app.services import history_cache, history_service
+from app.services.history_cache import HistoryCache
+from app.services.history_sqlite import SQLiteHistoryStore
+
+
+class _Loader:
+    """Counts calls and returns whatever value currently holds."""
+
+    def __init__(self, value):
+        self.value = value
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(0)
+        return self.value
+
+
+# ---------------------------------------------------------------------------
+# Rendering and ETags
+# ---------------------------------------------------------------------------
+
+def test_render_matches_json_and_formats_datetimes():
+    entry = history_cache.render({"title": "Käynti", "created_at": datetime(2025, 1, 2, 3, 4, 5, tzinfo=timezone.utc)})
+    assert json.loads(entry.body) == {"title": "Käynti", "created_at": "2025-01-02T03:04:05+00:00"}
+    assert "Käynti".encode("utf-8") in entry.body
+
+
+def test_etag_depends_on_content_only():
+    assert history_cache.render({"a": 1}).etag == history_cache.render({"a": 1}).etag
+    assert history_cache.render({"a": 1}).etag != history_cache.render({"a": 2}).etag
+    assert history_cache.render({"a": 1}).etag.startswith('"')
+
+
+@pytest.mark.parametrize("header,matches", [
+    (None, False),
+    ('"abc"', True),
+    ('W/"abc"', True),
+    ('"x", "abc"', True),
+    ("*", True),
+    ('"abcd"', False),
+])
+def test_etag_matches(header, matches):
+    assert history_cache.etag_matches(header, '"abc"') is matches
+
+
+# ---------------------------------------------------------------------------
+# Read-through
+# ---------------------------------------------------------------------------
+
+async def test_second_read_is_a_hit():
+    cache = HistoryCache(maxsize=16, ttl=60)
+    load = _Loader({"items": [], "has_more": False})
+
+    first = await cache.history("dev-1", None, 10, load)
+    second = await cache.history("dev-1", None, 10, load)
+
+    assert load.calls == 1
+    assert first == second
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+async def test_pages_are_keyed_by_device_cursor_and_limit():
+    cache = HistoryCache(maxsize=16, ttl=60)
+    load = _Loader({"items": []})
+
+    await cache.history("dev-1", None, 10, load)
+    await cache.history("dev-1", None, 20, load)
+    await cache.history("dev-1", "abc", 10, load)
+    await cache.history("dev-2", None, 10, load)
+
+    assert load.calls == 4
+
+
+async def test_concurrent_misses_share_one_load():
+    cache = HistoryCache(maxsize=16, ttl=60)
+    load = _Loader({"id": "1"})
+
+    entries = await asyncio.gather(*(cache.summary("dev-1", "1", load) for _ in range(5)))
+
+    assert load.calls == 1
+    assert len({entry.etag for entry in entries}) == 1
+
+
+async def test_missing_summary_is_not_cached():
+    cache = HistoryCache(maxsize=16, ttl=60)
+    load = _Loader(None)
+
+    assert await cache.summary("dev-1", "1", load) is None
+    assert await cache.summary("dev-1", "1", load) is None
+    assert load.calls == 2
+
+
+async def test_load_errors_propagate_and_are_not_cached():
+    cache = HistoryCache(maxsize=16, ttl=60)
+
+    async def failing():
+        raise history_service.InvalidCursor("bad cursor")
+
+    with pytest.raises(history_service.InvalidCursor):
+        await cache.history("dev-1", "bad", 10, failing)
+    assert await cache.history("dev-1", "bad", 10, _Loader({"items": []})) is not None
+
+
+async def test_size_zero_disables_caching():
+    cache = HistoryCache(maxsize=0, ttl=60)
+    load = _Loader({"items": []})
+
+    await cache.history("dev-1", None, 10, load)
+    await cache.history("dev-1", None, 10, load)
+
+    assert load.calls == 2
+
+
+# ---------------------------------------------------------------------------
+# Invalidation
+# ---------------------------------------------------------------------------
+
+async def test_write_retires_pages_and_the_written_entry_only():
+    cache = HistoryCache(maxsize=16, ttl=60)
+    page, first, second = _Loader({"items": ["v1"]}), _Loader({"id": "1"}), _Loader({"id": "2"})
+    await cache.history("dev-1", None, 10, page)
+    await cache.summary("dev-1", "1", first)
+    await cache.summary("dev-1", "2", second)
+
+    await cache.invalidate("dev-1", "1")
+    page.value = {"items": ["v2"]}
+    await cache.history("dev-1", None, 10, page)
+    await cache.summary("dev-1", "1", first)
+    await cache.summary("dev-1", "2", second)
+
+    assert (page.calls, first.calls, second.calls) == (2, 2, 1)
+
+
+async def test_bulk_write_retires_every_entry_of_the_device():
+    cache = HistoryCache(maxsize=16, ttl=60)
+    mine, theirs = _Loader({"id": "1"}), _Loader({"id": "1"})
+    await cache.summary("dev-1", "1", mine)
+    await cache.summary("dev-2", "1", theirs)
+
+    await cache.invalidate("dev-1")
+    await cache.summary("dev-1", "1", mine)
+    await cache.summary("dev-2", "1", theirs)
+
+    assert (mine.calls, theirs.calls) == (2, 1)
+
+
+async def test_fill_racing_a_write_is_not_stored():
+    cache = HistoryCache(maxsize=16, ttl=60)
+    loaded = asyncio.Event()
+    release = asyncio.Event()
+
+    async def slow():
+        loaded.set()
+        await release.wait()
+        return {"items": ["before the write"]}
+
+    reader = asyncio.ensure_future(cache.history("dev-1", None, 10, slow))
+    await loaded.wait()
+    await cache.invalidate("dev-1", "1")
+    release.set()
+    await reader
+
+    fresh = _Loader({"items": ["after the write"]})
+    entry = await cache.history("dev-1", None, 10, fresh)
+    assert fresh.calls == 1
+    assert json.loads(entry.body) == {"items": ["after the write"]}
+    assert cache.stats()["stale_fills"] == 1
+
+
+async def test_unavailable_shared_tier_falls_back_to_the_loader():
+    cache = HistoryCache(maxsize=16, ttl=60)
+
+    async def down(*args):
+        raise ConnectionError("redis is down")
+
+    cache.tier.versions = down
+    cache.tier.invalidate = down
+    load = _Loader({"items": []})
+
+    await cache.history("dev-1", None, 10, load)
+    await cache.history("dev-1", None, 10, load)
+    await cache.invalidate("dev-1")
+
+    assert load.calls == 2
+    assert cache.stats()["errors"] == 3
+
+
+@pytest.mark.parametrize("failing", ["get", "set"])
+async def test_shared_tier_failing_after_the_versions_read_falls_back_to_the_loader(failing):
+    cache = HistoryCache(maxsize=16, ttl=60)
+
+    async def down(*args):
+        raise ConnectionError("redis is down")
+
+    setattr(cache.tier, failing, down)
+    load, item = _Loader({"items": ["v1"]}), _Loader({"id": "1"})
+
+    page = await cache.history("dev-1", None, 10, load)
+    entry = await cache.summary("dev-1", "1", item)
+
+    assert json.loads(page.body) == {"items": ["v1"]} and json.loads(entry.body) == {"id": "1"}
+    assert cache.stats()["errors"] == 2
+
+
+async def test_versions_are_kept_for_a_bounded_number_of_devices():
+    cache = HistoryCache(maxsize=2, ttl=60)
+    for device in ("dev-1", "dev-2", "dev-3"):
+        await cache.invalidate(device)
+    assert cache.stats()["devices"] == 2
+
+
+async def test_evicted_device_versions_never_bring_back_stale_entries():
+    cache = HistoryCache(maxsize=4, ttl=60)
+    page = _Loader({"items": ["v1"]})
+    await cache.history("dev-1", None, 10, page)
+    # dev-1 is written, then the others push its versions out
+    page.value = {"items": ["v2"]}
+    await cache.invalidate("dev-1", "1")
+    for i in range(4):
+        await cache.invalidate(f"other-{i}")
+
+    entry = await cache.history("dev-1", None, 10, page)
+
+    assert json.loads(entry.body) == {"items": ["v2"]}
+
+
+def test_redis_url_without_the_package_is_a_clear_error():
+    cache = HistoryCache(redis_url="redis://localhost:6379/0")
+    with patch.dict("sys.modules", {"redis": None, "redis.asyncio": None}):
+        with pytest.raises(RuntimeError, match="redis package"):
+            cache.tier._connection()
+
+
+# ---------------------------------------------------------------------------
+# Writes through history_service, on both backends
+# ---------------------------------------------------------------------------
+
+@pytest.fixture(params=["mongo", "sqlite"])
+async def backend(request, mongo_db, tmp_path):
+    if request.param == "mongo":
+        with patch("app.services.history_service.get_db", return_value=mongo_db):
+            yield request.param
+        return
+    store = SQLiteHistoryStore(str(tmp_path / "history.db"))
+    with patch.object(history_service, "BACKEND", "sqlite"), patch.object(history_service, "_store", store):
+        yield request.param
+    await store.close()
+
+
+async def _page(device_id="dev-1") -> dict:
+    entry = await history_cache.cache.history(
+        device_id, None, 10, lambda: history_service.get_history(device_id, limit=10)
+    )
+    return json.loads(entry.body)
+
+
+async def _summary(summary_id: str, device_id="dev-1") -> dict | None:
+    entry = await history_cache.cache.summary(
+        device_id, summary_id, lambda: history_service.get_summary(device_id, summary_id)
+    )
+    return None if entry is None else json.loads(entry.body)
+
+
+async def test_cached_reads_follow_writes(backend):
+    saved = await history_service.upsert_summary("dev-1", {"input_text": "Visit one.", "summary": "v1"})
+    assert [item["id"] for item in (await _page())["items"]] == [saved["id"]]
+    assert (await _summary(saved["id"]))["summary"] == "v1"
+
+    await history_service.upsert_summary("dev-1", {"input_text": "Visit one.", "summary": "v2"})
+    assert (await _summary(saved["id"]))["summary"] == "v2"
+
+    other = await history_service.save_summary("dev-1", {"input_text": "Visit two.", "summary": "Other."})
+    assert [item["id"] for item in (await _page())["items"]] == [other["id"], saved["id"]]
+
+    await history_service.bulk_upsert_summaries("dev-1", [{"input_text": "Visit one.", "summary": "v3"}])
+    assert (await _summary(saved["id"]))["summary"] == "v3"
+
+    await history_service.delete_summary("dev-1", saved["id"])
+    assert (await _summary(saved["id"]))["deleted_at"] is not None
+    assert [item["id"] for item in (await _page())["items"]] == [other["id"]]
+
+
+async def test_writes_leave_other_devices_cached(backend):
+    await history_service.upsert_summary("dev-2", {"input_text": "Theirs.", "summary": "Kept."})
+    await _page("dev-2")
+    hits = history_cache.cache.stats()["hits"]
+
+    await history_service.upsert_summary("dev-1", {"input_text": "Mine.", "summary": "New."})
+    await _page("dev-2")
+
+    assert history_cache.cache.stats()["hits"] == hits + 1
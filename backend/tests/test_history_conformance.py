@@ -0,0 +1,346 @@
+"""
+Conformance suite for the history storage backends: every test runs through
+history_service's public functions against MongoDB (mongomock-motor) and
+against the embedded SQLite store, and expects the same results from both.
+"""
+import pytest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+from app.services import history_service
+from app.services.history_sqlite import SQLiteHistoryStore
+
+
+@pytest.fixture(params=["mongo", "sqlite"])
+async def backend(request, mongo_db, tmp_path):
+    if request.param == "mongo":
+        with patch("app.services.history_service.get_db", return_value=mongo_db):
+            yield request.param
+        return
+    store = SQLiteHistoryStore(str(tmp_path / "history.db"))
+    with patch.object(history_service, "BACKEND", "sqlite"), patch.object(history_service, "_store", store):
+        await history_service.ensure_indexes()
+        yield request.param
+    await store.close()
+
+
+def _payload(input_text="Patient reports a headache.", summary="Headache.", **fields):
+    return {
+        "input_text": input_text,
+        "summary": summary,
+        "translated_summary": None,
+        "summary_type": "brief",
+        "style": "paragraph",
+        "tonality": "professional",
+        "language": "original",
+        **fields,
+    }
+
+
+def _utc(value: datetime) -> datetime:
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+# A cutoff just ahead of now: everything deleted so far has expired. (Not
+# timedelta(0): mongomock rounds stored times to the millisecond.)
+EXPIRE_ALL = timedelta(seconds=-1)
+
+
+async def _export(device_id="dev-1", batch_size=1000) -> list[list[dict]]:
+    return [batch async for batch in history_service.export_history(device_id, batch_size=batch_size)]
+
+
+# Keys of the dicts every backend returns; anything else stored stays internal
+ENTRY_KEYS = {
+    "id", "device_id", "title", "input_text", "summary", "translated_summary", "summary_type", "style",
+    "tonality", "language", "created_at", "updated_at", "deleted_at",
+}
+LIST_ITEM_KEYS = {"id", *history_service.LIST_PROJECTION}
+
+
+# ---------------------------------------------------------------------------
+# Saving
+# ---------------------------------------------------------------------------
+
+class TestSave:
+    async def test_upsert_inserts_then_updates_in_place(self, backend):
+        first = await history_service.upsert_summary("dev-1", _payload(summary="v1"))
+        second = await history_service.upsert_summary("dev-1", _payload(summary="v2", style="bullets"))
+
+        assert first["id"] == second["id"]
+        assert second["summary"] == "v2" and second["style"] == "bullets"
+        assert second["input_text"] == "Patient reports a headache."
+        assert second["title"] == "Patient reports a headache."
+        assert second["created_at"] == first["created_at"]
+        assert second["updated_at"] >= first["updated_at"]
+        assert second["deleted_at"] is None
+        assert len((await history_service.get_history("dev-1"))["items"]) == 1
+
+    async def test_devices_are_isolated(self, backend):
+        one = await history_service.upsert_summary("dev-1", _payload())
+        two = await history_service.upsert_summary("dev-2", _payload())
+
+        assert one["id"] != two["id"]
+        assert await history_service.get_summary("dev-2", one["id"]) is None
+
+    async def test_deleted_summary_is_not_reused(self, backend):
+        first = await history_service.upsert_summary("dev-1", _payload())
+        assert await history_service.delete_summary("dev-1", first["id"]) is True
+        second = await history_service.upsert_summary("dev-1", _payload())
+
+        assert first["id"] != second["id"]
+
+    async def test_save_summary_inserts(self, backend):
+        saved = await history_service.save_summary("dev-1", _payload(input_text="Saved once."))
+        loaded = await history_service.get_summary("dev-1", saved["id"])
+
+        assert loaded["input_text"] == "Saved once."
+        assert loaded["summary"] == "Headache."
+
+    async def test_parent_id_is_kept_until_replaced(self, backend):
+        parent = await history_service.upsert_summary("dev-1", _payload(input_text="Parent."))
+        child = await history_service.upsert_summary("dev-1", _payload(input_text="Child.", parent_id=parent["id"]))
+        await history_service.upsert_summary("dev-1", _payload(input_text="Child.", summary="Edited."))
+
+        loaded = await history_service.get_summary("dev-1", child["id"])
+        assert loaded["parent_id"] == parent["id"]
+        assert "parent_id" not in await history_service.get_summary("dev-1", parent["id"])
+
+    async def test_bulk_upsert_applies_items_in_order(self, backend):
+        created_at = datetime(2024, 3, 1, 9, 30, tzinfo=timezone.utc)
+        written = await history_service.bulk_upsert_summaries("dev-1", [
+            _payload(input_text="First.", created_at=created_at),
+            _payload(input_text="Second.", summary="old"),
+            _payload(input_text="Second.", summary="new"),
+        ], ordered=True)
+
+        assert written == 3
+        items = [item for batch in await _export() for item in batch]
+        assert [(item["input_text"], item["summary"]) for item in items] == [("First.", "Headache."), ("Second.", "new")]
+        assert _utc(items[0]["created_at"]) == created_at
+
+
+# ---------------------------------------------------------------------------
+# Reading
+# ---------------------------------------------------------------------------
+
+class TestResponseShape:
+    async def test_entries_have_the_same_keys(self, backend):
+        saved = await history_service.save_summary("dev-1", _payload("First transcript."))
+        upserted = await history_service.upsert_summary("dev-1", _payload("Second transcript."))
+        child = await history_service.upsert_summary("dev-1", _payload("Third transcript.", parent_id=upserted["id"]))
+        loaded = await history_service.get_summary("dev-1", upserted["id"])
+
+        assert set(saved) == set(upserted) == set(loaded) == ENTRY_KEYS
+        assert set(child) == set(await history_service.get_summary("dev-1", child["id"])) == ENTRY_KEYS | {"parent_id"}
+
+    async def test_list_items_have_the_same_keys(self, backend):
+        await history_service.upsert_summary("dev-1", _payload())
+        page = await history_service.get_history("dev-1")
+
+        assert set(page) == {"items", "has_more", "next_cursor"}
+        assert set(page["items"][0]) == LIST_ITEM_KEYS
+
+        search = await history_service.search_history("dev-1", "headache")
+        assert set(search["items"][0]) == LIST_ITEM_KEYS | {"score", "snippet"}
+
+
+class TestRead:
+    async def test_large_transcripts_round_trip(self, backend):
+        transcript = "Doctor: How is the knee? Patient: Better, thanks. Köpfe, 頭痛.\n" * 500
+        saved = await history_service.upsert_summary("dev-1", _payload(input_text=transcript))
+
+        assert (await history_service.get_summary("dev-1", saved["id"]))["input_text"] == transcript
+
+    async def test_get_summary_of_unknown_or_invalid_id(self, backend):
+        await history_service.upsert_summary("dev-1", _payload())
+        assert await history_service.get_summary("dev-1", "65f0c0ffee65f0c0ffee65f0") is None
+        assert await history_service.get_summary("dev-1", "not-an-id") is None
+
+    async def test_history_pages_newest_first_with_list_fields(self, backend):
+        saved = [await history_service.upsert_summary("dev-1", _payload(input_text=f"Visit {i}.")) for i in range(7)]
+        await history_service.delete_summary("dev-1", saved[3]["id"])
+
+        seen, cursor = [], None
+        while True:
+            page = await history_service.get_history("dev-1", cursor=cursor, limit=2)
+            seen.extend(page["items"])
+            if not page["has_more"]:
+                assert page["next_cursor"] is None
+                break
+            cursor = page["next_cursor"]
+
+        assert [item["id"] for item in seen] == [saved[i]["id"] for i in (6, 5, 4, 2, 1, 0)]
+        assert set(seen[0]) == {"id", "title", "summary_type", "style", "tonality", "language", "created_at", "updated_at"}
+
+    async def test_invalid_history_cursor(self, backend):
+        with pytest.raises(history_service.InvalidCursor):
+            await history_service.get_history("dev-1", cursor="garbage")
+
+    async def test_delete_summary(self, backend):
+        saved = await history_service.upsert_summary("dev-1", _payload())
+
+        assert await history_service.delete_summary("dev-2", saved["id"]) is False
+        assert await history_service.delete_summary("dev-1", "not-an-id") is False
+        assert await history_service.delete_summary("dev-1", saved["id"]) is True
+        assert await history_service.delete_summary("dev-1", saved["id"]) is False
+        assert (await history_service.get_history("dev-1"))["items"] == []
+        assert (await history_service.get_summary("dev-1", saved["id"]))["deleted_at"] is not None
+
+
+# ---------------------------------------------------------------------------
+# Search
+# ---------------------------------------------------------------------------
+
+class TestSearch:
+    async def test_ranks_and_pages_matches(self, backend):
+        for i in range(12):
+            await history_service.upsert_summary("dev-1", _payload(input_text=f"Visit {i}.", summary=f"Persistent cough, day {i}."))
+        title_match = await history_service.upsert_summary("dev-1", _payload(input_text="Cough follow-up.", summary="Cough."))
+        await history_service.upsert_summary("dev-1", _payload(input_text="Unrelated.", summary="Sprained ankle."))
+        await history_service.upsert_summary("dev-2", _payload(input_text="Other device.", summary="Cough."))
+
+        seen, cursor = [], None
+        while True:
+            page = await history_service.search_history("dev-1", "cough", cursor=cursor, limit=5)
+            seen.extend(page["items"])
+            if not page["has_more"]:
+                break
+            cursor = page["next_cursor"]
+
+        assert len({item["id"] for item in seen}) == len(seen) == 13
+        assert seen[0]["id"] == title_match["id"]
+        assert [item["score"] for item in seen] == sorted((item["score"] for item in seen), reverse=True)
+        snippet = seen[1]["snippet"]
+        assert snippet["field"] == "summary"
+        assert snippet["text"][slice(*snippet["highlights"][0])].lower() == "cough"
+        assert "summary" not in seen[0]
+
+    async def test_follows_writes_and_deletes(self, backend):
+        saved = await history_service.upsert_summary("dev-1", _payload(input_text="Rash.", summary="Eczema flare."))
+        assert len((await history_service.search_history("dev-1", "eczema"))["items"]) == 1
+
+        await history_service.upsert_summary("dev-1", _payload(input_text="Rash again.", summary="Eczema improving."))
+        assert len((await history_service.search_history("dev-1", "eczema"))["items"]) == 2
+
+        await history_service.delete_summary("dev-1", saved["id"])
+        assert len((await history_service.search_history("dev-1", "eczema"))["items"]) == 1
+
+    async def test_blank_query_and_invalid_cursor(self, backend):
+        assert (await history_service.search_history("dev-1", " ..."))["items"] == []
+        with pytest.raises(history_service.InvalidCursor):
+            await history_service.search_history("dev-1", "cough", cursor="garbage")
+
+
+# ---------------------------------------------------------------------------
+# Incremental summaries
+# ---------------------------------------------------------------------------
+
+# summary_type, style and tonality of _payload
+BRIEF = ("brief", "paragraph", "professional")
+
+
+class TestFindPredecessor:
+    TRANSCRIPT = "\n".join(f"Doctor: Question {i} about the knee pain and physiotherapy?" for i in range(150))
+
+    async def test_finds_the_entry_sharing_the_longest_opening(self, backend):
+        lines = self.TRANSCRIPT.splitlines()
+        await history_service.upsert_summary("dev-1", _payload(input_text="\n".join(lines[:60]), summary="Short."))
+        longer = await history_service.upsert_summary("dev-1", _payload(input_text="\n".join(lines[:120]), summary="Longer."))
+
+        found = await history_service.find_predecessor("dev-1", self.TRANSCRIPT, *BRIEF)
+
+        assert found == {"id": longer["id"], "input_text": "\n".join(lines[:120]), "summary": "Longer."}
+
+    async def test_ignores_other_devices_deleted_entries_and_itself(self, backend):
+        lines = self.TRANSCRIPT.splitlines()
+        await history_service.upsert_summary("dev-2", _payload(input_text="\n".join(lines[:100])))
+        deleted = await history_service.upsert_summary("dev-1", _payload(input_text="\n".join(lines[:100])))
+        await history_service.delete_summary("dev-1", deleted["id"])
+        await history_service.upsert_summary("dev-1", _payload(input_text=self.TRANSCRIPT))
+
+        assert await history_service.find_predecessor("dev-1", self.TRANSCRIPT, *BRIEF) is None
+        assert await history_service.find_predecessor("dev-1", "Too short to have a boundary.", *BRIEF) is None
+
+    async def test_only_entries_summarized_the_same_way_count(self, backend):
+        lines = self.TRANSCRIPT.splitlines()
+        brief = await history_service.upsert_summary("dev-1", _payload(input_text="\n".join(lines[:100])))
+
+        assert (await history_service.find_predecessor("dev-1", self.TRANSCRIPT, *BRIEF))["id"] == brief["id"]
+        assert await history_service.find_predecessor("dev-1", self.TRANSCRIPT, "detailed", "paragraph", "professional") is None
+        assert await history_service.find_predecessor("dev-1", self.TRANSCRIPT, "brief", "bullets", "professional") is None
+        assert await history_service.find_predecessor("dev-1", self.TRANSCRIPT, "brief", "paragraph", "casual") is None
+
+
+# ---------------------------------------------------------------------------
+# Export and import
+# ---------------------------------------------------------------------------
+
+class TestExportImport:
+    async def test_exports_live_summaries_oldest_first_in_batches(self, backend):
+        saved = [
+            await history_service.upsert_summary("dev-1", _payload(input_text=f"Visit {i}. " * (i * 100 + 1)))
+            for i in range(5)
+        ]
+        await history_service.delete_summary("dev-1", saved[2]["id"])
+
+        batches = await _export(batch_size=2)
+
+        assert [len(batch) for batch in batches] == [2, 2]
+        items = [item for batch in batches for item in batch]
+        assert [item["id"] for item in items] == [saved[i]["id"] for i in (0, 1, 3, 4)]
+        assert [item["input_text"] for item in items] == [saved[i]["input_text"] for i in (0, 1, 3, 4)]
+        assert "input_hash" not in items[0] and "device_id" not in items[0]
+        assert await _export("dev-2") == []
+
+    async def test_import_round_trips_an_export(self, backend):
+        for i in range(3):
+            await history_service.upsert_summary("dev-1", _payload(input_text=f"Visit {i}."))
+
+        async def exported():
+            for batch in await _export():
+                for item in batch:
+                    yield item
+
+        assert await history_service.import_history("dev-2", exported(), batch_size=2) == {"received": 3, "written": 3}
+        assert [item["input_text"] for batch in await _export("dev-2") for item in batch] == [
+            "Visit 0.", "Visit 1.", "Visit 2.",
+        ]
+
+
+# ---------------------------------------------------------------------------
+# Compaction
+# ---------------------------------------------------------------------------
+
+class TestCompactHistory:
+    async def test_keeps_summaries_deleted_within_retention(self, backend):
+        saved = await history_service.upsert_summary("dev-1", _payload())
+        await history_service.delete_summary("dev-1", saved["id"])
+
+        assert await history_service.compact_history(timedelta(days=1)) == {"summaries": 0, "transcripts": 0}
+        assert await history_service.get_summary("dev-1", saved["id"]) is not None
+
+    async def test_purges_expired_summaries_and_orphaned_transcripts(self, backend):
+        gone = await history_service.upsert_summary("dev-1", _payload(input_text="Gone."))
+        shared = await history_service.upsert_summary("dev-1", _payload(input_text="Shared."))
+        await history_service.upsert_summary("dev-2", _payload(input_text="Shared."))
+        live = await history_service.upsert_summary("dev-1", _payload(input_text="Live."))
+        await history_service.delete_summary("dev-1", gone["id"])
+        await history_service.delete_summary("dev-1", shared["id"])
+
+        result = await history_service.compact_history(EXPIRE_ALL, batch_size=1)
+
+        # "Shared." is still used by dev-2
+        assert result == {"summaries": 2, "transcripts": 1}
+        assert await history_service.get_summary("dev-1", gone["id"]) is None
+        assert (await history_service.get_summary("dev-1", live["id"]))["input_text"] == "Live."
+        assert [item["input_text"] for batch in await _export("dev-2") for item in batch] == ["Shared."]
+
+    async def test_archive_mode(self, backend):
+        saved = await history_service.upsert_summary("dev-1", _payload(input_text="Archived. " * 200))
+        await history_service.delete_summary("dev-1", saved["id"])
+
+        with patch.object(history_service, "COMPACTION_MODE", "archive"):
+            result = await history_service.compact_history(EXPIRE_ALL)
+
+        assert result == {"summaries": 1, "transcripts": 1}
@@ -0,0 +1,83 @@
+"""
+Tests for the history export formats and the streaming NDJSON import parser.
+"""
+import gzip
+import json
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+from app.services import history_export
+
+
+async def _chunks(data: bytes, size: int):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+async def _parse(data: bytes, size: int = 7, **kwargs):
+    errors = []
+    items = [item async for item in history_export.parse_ndjson(_chunks(data, size), errors, **kwargs)]
+    return items, errors
+
+
+def _line(**record) -> str:
+    return json.dumps({"input_text": "Visit.", "summary": "Fine.", **record})
+
+
+async def test_render_ndjson_is_one_chunk_per_batch():
+    async def batches():
+        yield [{"id": "a", "created_at": datetime(2025, 1, 1, tzinfo=timezone.utc)}]
+        yield [{"id": "b"}, {"id": "c"}]
+
+    chunks = [chunk async for chunk in history_export.render(batches(), "ndjson")]
+
+    assert len(chunks) == 2
+    first = json.loads(chunks[0])
+    assert list(first) == list(history_export.FIELDS)
+    assert first["created_at"] == "2025-01-01T00:00:00+00:00"
+
+
+async def test_gzipped_stream_decompresses_to_the_input():
+    data = ("".join(_line(summary=str(i)) + "\n" for i in range(200))).encode("utf-8")
+    compressed = b"".join([chunk async for chunk in history_export.gzipped(_chunks(data, 1000))])
+    assert gzip.decompress(compressed) == data
+
+
+async def test_parser_reassembles_lines_split_across_chunks():
+    data = "\n".join([_line(summary="Früh. 頭痛."), _line(created_at="2024-03-01T09:00:00")]).encode("utf-8")
+
+    items, errors = await _parse(data, size=3)
+
+    assert errors == []
+    assert items[0]["summary"] == "Früh. 頭痛."
+    assert items[1]["created_at"] == datetime(2024, 3, 1, 9, tzinfo=timezone.utc)
+
+
+async def test_parser_decompresses_gzip():
+    data = gzip.compress((_line() + "\n" + _line(summary="Two.") + "\n").encode("utf-8"))
+    items, errors = await _parse(data, gzip=True)
+    assert [item["summary"] for item in items] == ["Fine.", "Two."]
+
+
+async def test_parser_skips_invalid_lines_and_caps_errors():
+    lines = ["[1]", _line(created_at="yesterday"), _line(style=1), _line()] + ["{"] * 5
+    items, errors = await _parse("\n".join(lines).encode("utf-8"), max_errors=4)
+
+    assert len(items) == 1
+    assert [error["line"] for error in errors] == [1, 2, 3, 5]
+    assert "created_at" in errors[1]["error"]
+
+
+async def test_parser_ignores_server_assigned_fields():
+    items, _ = await _parse(_line(id="x", parent_id="y", updated_at="2024-01-01", title="T").encode("utf-8"))
+    assert set(items[0]) == {"input_text", "summary"}
+
+
+async def test_parser_rejects_overlong_lines_without_buffering_them():
+    data = "\n".join([_line(summary="x" * 500), _line(summary="after")]).encode("utf-8")
+
+    with patch.object(history_export, "MAX_LINE_BYTES", 100):
+        items, errors = await _parse(data, size=50)
+
+    assert [item["summary"] for item in items] == ["after"]
+    assert errors == [{"line": 1, "error": "line longer than 100 bytes"}]
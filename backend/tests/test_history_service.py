@@ -0,0 +1,462 @@
+"""
+Tests for history_service against an in-memory MongoDB stand-in (mongomock-motor).
+"""
+import asyncio
+import pytest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+from app.services import history_service, text_codec
+
+
+@pytest.fixture
+def db(mongo_db):
+    with patch("app.services.history_service.get_db", return_value=mongo_db):
+        yield mongo_db
+
+
+def _payload(input_text="Patient reports a headache.", summary="Headache."):
+    return {
+        "input_text": input_text,
+        "summary": summary,
+        "translated_summary": None,
+        "summary_type": "brief",
+        "style": "paragraph",
+        "tonality": "professional",
+        "language": "original",
+    }
+
+
+def test_serialize_builds_a_new_item():
+    doc = {"_id": "64b000000000000000000001", "title": "Visit", "summary": "Fine."}
+
+    item = history_service._serialize(doc, omit=("summary",))
+
+    assert item == {"id": "64b000000000000000000001", "title": "Visit"}
+    assert list(item)[0] == "id"
+    assert doc == {"_id": "64b000000000000000000001", "title": "Visit", "summary": "Fine."}
+
+
+ENTRY_KEYS = {
+    "id", "device_id", "title", "input_text", "summary", "translated_summary", "summary_type", "style",
+    "tonality", "language", "created_at", "updated_at", "deleted_at",
+}
+
+
+async def test_entries_leave_out_internal_fields(db):
+    saved = await history_service.save_summary("dev-1", _payload("First transcript."))
+    upserted = await history_service.upsert_summary("dev-1", _payload("Second transcript."))
+    loaded = await history_service.get_summary("dev-1", upserted["id"])
+
+    assert set(saved) == set(upserted) == set(loaded) == ENTRY_KEYS
+
+
+class TestUpsertSummary:
+    async def test_inserts_new_summary(self, db):
+        saved = await history_service.upsert_summary("dev-1", _payload())
+
+        assert saved["summary"] == "Headache."
+        assert saved["input_text"] == "Patient reports a headache."
+        stored = await db["summaries"].find_one({})
+        assert stored["input_hash"] == history_service.hash_input("Patient reports a headache.")
+        assert saved["deleted_at"] is None
+        assert await db["summaries"].count_documents({}) == 1
+
+    async def test_updates_existing_summary_in_place(self, db):
+        first = await history_service.upsert_summary("dev-1", _payload(summary="v1"))
+        second = await history_service.upsert_summary("dev-1", _payload(summary="v2"))
+
+        assert first["id"] == second["id"]
+        assert second["summary"] == "v2"
+        assert second["created_at"] == first["created_at"]
+        assert await db["summaries"].count_documents({}) == 1
+
+    async def test_devices_are_isolated(self, db):
+        await history_service.upsert_summary("dev-1", _payload())
+        await history_service.upsert_summary("dev-2", _payload())
+        assert await db["summaries"].count_documents({}) == 2
+
+    async def test_deleted_summary_is_not_reused(self, db):
+        first = await history_service.upsert_summary("dev-1", _payload())
+        await history_service.delete_summary("dev-1", first["id"])
+        second = await history_service.upsert_summary("dev-1", _payload())
+
+        assert first["id"] != second["id"]
+
+    async def test_concurrent_saves_produce_one_document(self, db):
+        await history_service.ensure_indexes()
+        await asyncio.gather(*(
+            history_service.upsert_summary("dev-1", _payload(summary=f"v{i}")) for i in range(10)
+        ))
+        assert await db["summaries"].count_documents({"deleted_at": None}) == 1
+
+
+class TestMigrate:
+    async def test_backfills_hashes_and_resolves_duplicates(self, db):
+        now = datetime.now(timezone.utc)
+        legacy = {"device_id": "dev-1", "input_text": "Old transcript.", "deleted_at": None, "summary": "s"}
+        await db["summaries"].insert_many([
+            {**legacy, "updated_at": now.replace(year=2024)},
+            {**legacy, "updated_at": now},
+            {**legacy, "updated_at": now.replace(year=2023)},
+        ])
+
+        await history_service.migrate()
+        await history_service.ensure_indexes()
+
+        live = await db["summaries"].find({"deleted_at": None}).to_list(None)
+        assert len(live) == 1
+        assert live[0]["input_hash"] == history_service.hash_input("Old transcript.")
+        assert live[0]["updated_at"].year == now.year
+        info = await db["summaries"].index_information()
+        assert info["device_input_hash_live_unique"]["unique"] is True
+
+    async def test_ensure_indexes_leaves_documents_alone(self, db):
+        await db["summaries"].insert_one({"device_id": "dev-1", "input_text": "Old transcript.", "deleted_at": None})
+
+        await history_service.ensure_indexes()
+
+        doc = await db["summaries"].find_one({})
+        assert doc["input_text"] == "Old transcript." and "input_hash" not in doc
+
+
+class TestTranscriptStorage:
+    async def test_transcripts_are_stored_once_and_compressed(self, db):
+        transcript = "Doctor: How is the cough? Patient: Better since the inhaler.\n" * 200
+        await history_service.upsert_summary("dev-1", _payload(input_text=transcript))
+        await history_service.upsert_summary("dev-2", _payload(input_text=transcript))
+
+        assert await db["summaries"].count_documents({"input_text": {"$exists": True}}) == 0
+        stored = await db["transcripts"].find({}).to_list(None)
+        assert len(stored) == 1
+        assert isinstance(stored[0]["body"], bytes)
+        assert len(stored[0]["body"]) < stored[0]["size"] // 10
+
+    async def test_get_summary_returns_the_transcript(self, db):
+        transcript = "Patient reports headaches. " * 100
+        saved = await history_service.upsert_summary("dev-1", _payload(input_text=transcript))
+
+        loaded = await history_service.get_summary("dev-1", saved["id"])
+
+        assert saved["input_text"] == loaded["input_text"] == transcript
+
+    async def test_bulk_upsert_stores_transcripts(self, db):
+        await history_service.bulk_upsert_summaries("dev-1", [_payload(input_text=f"Transcript {i}.") for i in range(3)])
+
+        assert await db["transcripts"].count_documents({}) == 3
+        doc = await db["summaries"].find_one({"input_hash": history_service.hash_input("Transcript 1.")})
+        assert (await history_service.get_summary("dev-1", str(doc["_id"])))["input_text"] == "Transcript 1."
+
+    async def test_migrate_moves_inline_transcripts(self, db):
+        now = datetime.now(timezone.utc)
+        await db["summaries"].insert_many([
+            {"device_id": f"dev-{i}", "input_text": "Old transcript. " * 200, "summary": "s",
+             "created_at": now, "updated_at": now, "deleted_at": None}
+            for i in range(3)
+        ])
+
+        with patch.object(history_service, "BULK_WRITE_BATCH_SIZE", 2):
+            await history_service.migrate()
+
+        assert await db["summaries"].count_documents({"input_text": {"$exists": True}}) == 0
+        assert await db["transcripts"].count_documents({}) == 1
+        doc = await db["summaries"].find_one({"device_id": "dev-2"})
+        assert (await history_service.get_summary("dev-2", str(doc["_id"])))["input_text"] == "Old transcript. " * 200
+
+
+# summary_type, style and tonality of _payload
+BRIEF = ("brief", "paragraph", "professional")
+
+
+class TestFindPredecessor:
+    TRANSCRIPT = "\n".join(f"Doctor: Question {i} about the knee pain and physiotherapy?" for i in range(150))
+
+    async def test_finds_the_entry_sharing_the_longest_opening(self, db):
+        lines = self.TRANSCRIPT.splitlines()
+        short = await history_service.upsert_summary("dev-1", _payload(input_text="\n".join(lines[:60]), summary="Short."))
+        longer = await history_service.upsert_summary("dev-1", _payload(input_text="\n".join(lines[:120]), summary="Longer."))
+        await history_service.upsert_summary("dev-1", _payload(input_text="Unrelated transcript.", summary="Other."))
+
+        found = await history_service.find_predecessor("dev-1", self.TRANSCRIPT, *BRIEF)
+
+        assert found["id"] == longer["id"] != short["id"]
+        assert found["summary"] == "Longer."
+        assert found["input_text"] == "\n".join(lines[:120])
+
+    async def test_ignores_other_devices_deleted_entries_and_itself(self, db):
+        lines = self.TRANSCRIPT.splitlines()
+        await history_service.upsert_summary("dev-2", _payload(input_text="\n".join(lines[:100])))
+        deleted = await history_service.upsert_summary("dev-1", _payload(input_text="\n".join(lines[:100])))
+        await history_service.delete_summary("dev-1", deleted["id"])
+        await history_service.upsert_summary("dev-1", _payload(input_text=self.TRANSCRIPT))
+
+        assert await history_service.find_predecessor("dev-1", self.TRANSCRIPT, *BRIEF) is None
+
+    async def test_links_parent(self, db):
+        parent = await history_service.upsert_summary("dev-1", _payload(input_text=self.TRANSCRIPT))
+        child = await history_service.upsert_summary(
+            "dev-1", {**_payload(input_text=self.TRANSCRIPT + "\nPatient: Thanks."), "parent_id": parent["id"]}
+        )
+
+        assert (await history_service.get_summary("dev-1", child["id"]))["parent_id"] == parent["id"]
+
+    async def test_migrate_backfills_prefix_hashes(self, db):
+        now = datetime.now(timezone.utc)
+        await db["summaries"].insert_one({
+            "device_id": "dev-1", "input_text": self.TRANSCRIPT, "summary": "Legacy.",
+            "summary_type": "brief", "style": "paragraph", "tonality": "professional",
+            "created_at": now, "updated_at": now, "deleted_at": None,
+        })
+
+        await history_service.migrate()
+
+        found = await history_service.find_predecessor("dev-1", self.TRANSCRIPT + "\nDoctor: Anything else?", *BRIEF)
+        assert found["summary"] == "Legacy."
+
+
+class TestCompactHistory:
+    async def _soft_delete(self, db, summary_id, days_ago):
+        from bson import ObjectId
+        await db["summaries"].update_one(
+            {"_id": ObjectId(summary_id)},
+            {"$set": {"deleted_at": datetime.now(timezone.utc) - timedelta(days=days_ago)}},
+        )
+
+    async def _age_transcripts(self, db, days_ago):
+        await db["transcripts"].update_many(
+            {}, {"$set": {"last_used_at": datetime.now(timezone.utc) - timedelta(days=days_ago)}}
+        )
+
+    async def test_purges_expired_summaries_and_orphaned_transcripts(self, db):
+        expired = await history_service.upsert_summary("dev-1", _payload(input_text="Expired."))
+        recent = await history_service.upsert_summary("dev-1", _payload(input_text="Recently deleted."))
+        await history_service.upsert_summary("dev-1", _payload(input_text="Live."))
+        await self._soft_delete(db, expired["id"], days_ago=40)
+        await self._soft_delete(db, recent["id"], days_ago=1)
+        await self._age_transcripts(db, days_ago=40)
+
+        with patch.object(history_service, "BULK_WRITE_BATCH_SIZE", 1):
+            result = await history_service.compact_history(timedelta(days=30), batch_size=1)
+
+        assert result == {"summaries": 1, "transcripts": 1}
+        assert await db["summaries"].count_documents({}) == 2
+        remaining = {doc["_id"] for doc in await db["transcripts"].find({}).to_list(None)}
+        assert history_service.hash_input("Expired.") not in remaining
+        assert history_service.hash_input("Recently deleted.") in remaining
+
+    async def test_keeps_transcripts_still_referenced_or_recently_used(self, db):
+        shared = await history_service.upsert_summary("dev-1", _payload(input_text="Shared."))
+        await history_service.upsert_summary("dev-2", _payload(input_text="Shared."))
+        fresh = await history_service.upsert_summary("dev-1", _payload(input_text="Fresh."))
+        await self._soft_delete(db, shared["id"], days_ago=40)
+        await self._soft_delete(db, fresh["id"], days_ago=40)
+
+        result = await history_service.compact_history(timedelta(days=30))
+
+        # "Shared." is still used by dev-2 and "Fresh." was saved just now
+        assert result == {"summaries": 2, "transcripts": 0}
+        assert await db["transcripts"].count_documents({}) == 2
+
+    async def test_archive_mode_keeps_the_transcript(self, db):
+        transcript = "Archived transcript. " * 100
+        saved = await history_service.upsert_summary("dev-1", _payload(input_text=transcript))
+        await self._soft_delete(db, saved["id"], days_ago=40)
+        await self._age_transcripts(db, days_ago=40)
+
+        with patch.object(history_service, "COMPACTION_MODE", "archive"):
+            result = await history_service.compact_history(timedelta(days=30))
+
+        assert result == {"summaries": 1, "transcripts": 1}
+        archived = await db["summaries_archive"].find_one({})
+        assert archived["summary"] == "Headache."
+        assert text_codec.decode(archived["input_text"]) == transcript
+
+
+class TestGetHistory:
+    async def _seed(self, db, count, device_id="dev-1"):
+        # Identical created_at values exercise the _id tie-breaker
+        created_at = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        await db["summaries"].insert_many([
+            {
+                "device_id": device_id, "title": f"T{i}", "input_text": "x" * 1000, "summary": "s" * 1000,
+                "summary_type": "brief", "style": "paragraph", "tonality": "professional",
+                "language": "original", "created_at": created_at if i % 3 else created_at.replace(day=i + 1),
+                "updated_at": created_at, "deleted_at": None,
+            }
+            for i in range(count)
+        ])
+
+    async def test_pages_cover_history_once_in_order(self, db):
+        await self._seed(db, 25)
+        await self._seed(db, 5, device_id="dev-2")
+
+        seen, cursor = [], None
+        while True:
+            page = await history_service.get_history("dev-1", cursor=cursor, limit=10)
+            seen.extend(page["items"])
+            if not page["has_more"]:
+                assert page["next_cursor"] is None
+                break
+            cursor = page["next_cursor"]
+
+        assert len(seen) == 25
+        assert len({item["id"] for item in seen}) == 25
+        keys = [(item["created_at"], item["id"]) for item in seen]
+        assert keys == sorted(keys, reverse=True)
+
+    async def test_list_items_are_lean(self, db):
+        await self._seed(db, 1)
+        page = await history_service.get_history("dev-1")
+
+        item = page["items"][0]
+        assert "input_text" not in item
+        assert "summary" not in item
+        assert item["title"] == "T0"
+
+    async def test_deleted_items_are_skipped(self, db):
+        first = await history_service.upsert_summary("dev-1", _payload())
+        await history_service.upsert_summary("dev-1", _payload(input_text="Another transcript."))
+        await history_service.delete_summary("dev-1", first["id"])
+
+        page = await history_service.get_history("dev-1")
+        assert [item["title"] for item in page["items"]] == ["Another transcript."]
+
+    async def test_invalid_cursor(self, db):
+        with pytest.raises(history_service.InvalidCursor):
+            await history_service.get_history("dev-1", cursor="not-a-cursor")
+
+
+class TestSearchHistory:
+    async def _save(self, input_text, summary, device_id="dev-1"):
+        return await history_service.upsert_summary(device_id, _payload(input_text=input_text, summary=summary))
+
+    async def test_ranks_title_matches_first(self, db):
+        await self._save("Follow-up visit.", "Patient mentions a mild headache after the migraine medication.")
+        await self._save("Migraine consultation.", "Discussed triggers and a new prescription.")
+        await self._save("Knee pain.", "No neurological complaints.")
+
+        page = await history_service.search_history("dev-1", "migraine")
+
+        assert [item["title"] for item in page["items"]] == ["Migraine consultation.", "Follow-up visit."]
+        assert page["items"][0]["score"] > page["items"][1]["score"]
+        assert "summary" not in page["items"][0]
+
+    async def test_snippet_highlights_matches(self, db):
+        await self._save("Visit.", "Blood pressure was high, so the blood test is repeated next week.")
+
+        item = (await history_service.search_history("dev-1", "BLOOD"))["items"][0]
+
+        snippet = item["snippet"]
+        assert snippet["field"] == "summary"
+        assert [snippet["text"][s:e] for s, e in snippet["highlights"]] == ["Blood", "blood"]
+
+    async def test_skips_deleted_and_other_devices(self, db):
+        deleted = await self._save("Asthma review.", "Inhaler technique.")
+        await self._save("Asthma plan.", "Inhaler refill.", device_id="dev-2")
+        await history_service.delete_summary("dev-1", deleted["id"])
+
+        page = await history_service.search_history("dev-1", "asthma inhaler")
+
+        assert page["items"] == []
+
+    async def test_pages_cover_results_once(self, db):
+        for i in range(23):
+            await self._save(f"Visit {i}.", "cough " * (i % 4 + 1) + f"note {i}")
+
+        seen, cursor = [], None
+        while True:
+            page = await history_service.search_history("dev-1", "cough", cursor=cursor, limit=5)
+            seen.extend(page["items"])
+            if not page["has_more"]:
+                break
+            cursor = page["next_cursor"]
+
+        assert len({item["id"] for item in seen}) == 23
+        scores = [item["score"] for item in seen]
+        assert scores == sorted(scores, reverse=True)
+
+    async def test_index_follows_writes(self, db):
+        await self._save("Rash.", "Eczema flare on both arms.")
+        assert len((await history_service.search_history("dev-1", "eczema"))["items"]) == 1
+
+        await self._save("Rash again.", "Eczema improving with cream.")
+        assert len((await history_service.search_history("dev-1", "eczema"))["items"]) == 2
+
+    async def test_index_follows_writes_from_other_workers(self, db):
+        await self._save("Rash.", "Eczema flare on both arms.")
+        await history_service.search_history("dev-1", "eczema")
+        # Written behind this process's back, so only the signature check sees it
+        await db["summaries"].insert_one({
+            "device_id": "dev-1", "title": "Eczema review.", "summary": "", "deleted_at": None,
+            "created_at": datetime.now(timezone.utc), "updated_at": datetime.now(timezone.utc),
+        })
+
+        assert len((await history_service.search_history("dev-1", "eczema"))["items"]) == 1
+        with patch.object(history_service.search_index.cache, "revalidate_after", 0):
+            assert len((await history_service.search_history("dev-1", "eczema"))["items"]) == 2
+
+    async def test_blank_query_matches_nothing(self, db):
+        await self._save("Visit.", "Anything.")
+        assert (await history_service.search_history("dev-1", "  ..."))["items"] == []
+
+    async def test_invalid_cursor(self, db):
+        with pytest.raises(history_service.InvalidCursor):
+            await history_service.search_history("dev-1", "cough", cursor="not-a-cursor")
+
+
+class TestExportImport:
+    async def _export(self, device_id="dev-1", batch_size=1000):
+        return [batch async for batch in history_service.export_history(device_id, batch_size=batch_size)]
+
+    async def test_exports_live_summaries_oldest_first_in_batches(self, db):
+        saved = [
+            await history_service.upsert_summary("dev-1", _payload(input_text=f"Visit {i}. " * (i * 100 + 1)))
+            for i in range(5)
+        ]
+        await history_service.delete_summary("dev-1", saved[2]["id"])
+        await history_service.upsert_summary("dev-2", _payload(input_text="Other device."))
+
+        batches = await self._export(batch_size=2)
+
+        assert [len(batch) for batch in batches] == [2, 2]
+        items = [item for batch in batches for item in batch]
+        assert [item["id"] for item in items] == [saved[i]["id"] for i in (0, 1, 3, 4)]
+        # Transcripts, compressed or not, are joined back in
+        assert [item["input_text"] for item in items] == [saved[i]["input_text"] for i in (0, 1, 3, 4)]
+        assert "input_hash" not in items[0] and "device_id" not in items[0]
+
+    async def test_empty_history_yields_nothing(self, db):
+        assert await self._export() == []
+
+    async def test_import_applies_items_in_order_with_upsert_dedup(self, db):
+        created_at = datetime(2024, 3, 1, tzinfo=timezone.utc)
+
+        async def items():
+            yield {**_payload(input_text="First."), "created_at": created_at}
+            yield _payload(input_text="Second.", summary="old")
+            yield _payload(input_text="Second.", summary="new")
+
+        with patch.object(history_service, "BULK_WRITE_BATCH_SIZE", 2):
+            result = await history_service.import_history("dev-1", items(), batch_size=2)
+
+        assert result["received"] == 3
+        docs = {doc["title"]: doc for doc in await db["summaries"].find({}).to_list(None)}
+        assert len(docs) == 2
+        assert docs["Second."]["summary"] == "new"
+        assert docs["First."]["created_at"].replace(tzinfo=timezone.utc) == created_at
+
+    async def test_import_round_trips_an_export(self, db):
+        for i in range(3):
+            await history_service.upsert_summary("dev-1", _payload(input_text=f"Visit {i}."))
+
+        async def exported():
+            for batch in await self._export():
+                for item in batch:
+                    yield item
+
+        result = await history_service.import_history("dev-2", exported())
+
+        assert result == {"received": 3, "written": 3}
+        assert [item["input_text"] for batch in await self._export("dev-2") for item in batch] == [
+            "Visit 0.", "Visit 1.", "Visit 2.",
+        ]
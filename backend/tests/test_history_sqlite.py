@@ -0,0 +1,74 @@
+"""
+Tests specific to the embedded SQLite history store; behaviour shared with
+MongoDB is covered by test_history_conformance.
+"""
+import sqlite3
+import threading
+import pytest
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services import history_service
+from app.services.history_sqlite import SQLiteHistoryStore
+
+
+@pytest.fixture
+async def store(tmp_path):
+    store = SQLiteHistoryStore(str(tmp_path / "history.db"))
+    with patch.object(history_service, "BACKEND", "sqlite"), patch.object(history_service, "_store", store):
+        yield store
+    await store.close()
+
+
+def _plan(path, sql: str, params=()) -> str:
+    with sqlite3.connect(path) as conn:
+        return " ".join(row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params))
+
+
+async def test_database_is_in_wal_mode(store):
+    await store.ensure_indexes()
+    assert await store._call(lambda conn: conn.execute("PRAGMA journal_mode").fetchone()[0]) == "wal"
+
+
+async def test_statements_run_on_the_store_thread(store):
+    name = await store._call(lambda conn: threading.current_thread().name)
+    assert name.startswith("history-sqlite")
+    assert name != threading.current_thread().name
+
+
+async def test_queries_use_indexes(store):
+    await history_service.upsert_summary("dev-1", {"input_text": "Visit.", "summary": "Fine."})
+
+    history = _plan(
+        store.path,
+        "SELECT id FROM summaries WHERE device_id = ? AND deleted_at IS NULL "
+        "AND (created_at, id) < (?, ?) ORDER BY created_at DESC, id DESC LIMIT 10",
+        ("dev-1", 0, ""),
+    )
+    assert "summaries_device_live_created_at" in history and "TEMP B-TREE" not in history
+    upsert = _plan(store.path, "SELECT id FROM summaries WHERE device_id = ? AND input_hash = ? AND deleted_at IS NULL", ("d", "h"))
+    assert "summaries_device_input_hash_live" in upsert
+    expired = _plan(store.path, "SELECT id FROM summaries WHERE deleted_at IS NOT NULL AND deleted_at < ?", (0,))
+    assert "summaries_soft_deleted" in expired
+
+
+async def test_history_survives_reopening(store, tmp_path):
+    saved = await history_service.upsert_summary("dev-1", {"input_text": "Kept.", "summary": "On disk."})
+    await store.close()
+
+    reopened = SQLiteHistoryStore(store.path)
+    try:
+        assert (await reopened.get_summary("dev-1", saved["id"]))["summary"] == "On disk."
+    finally:
+        await reopened.close()
+
+
+@patch("app.services.db.is_configured", return_value=False)
+def test_lifespan_uses_the_sqlite_store(_configured, store):
+    with TestClient(app) as client:
+        assert client.get("/ready").json() == {"status": "ready", "checks": {"sqlite": "ok"}}
+        response = client.post("/history", json={"input_text": "Offline.", "summary": "Saved."}, headers={"X-Device-Id": "dev-1"})
+        assert response.status_code == 200
+        items = client.get("/history", headers={"X-Device-Id": "dev-1"}).json()["items"]
+        assert [item["title"] for item in items] == ["Offline."]
@@ -0,0 +1,88 @@
+"""
+Tests for incremental re-summarization: segment hashes, transcript diffs,
+the decision to go incremental and the prompt openai_service sends for it.
+"""
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app.services import incremental, openai_service
+
+TRANSCRIPT = "\n".join(
+    f"{'Doctor' if i % 2 else 'Patient'}: Line {i} about the cough, the inhaler and the follow-up plan."
+    for i in range(200)
+)
+APPENDED = TRANSCRIPT + "\nDoctor: One more thing, the chest X-ray came back clear.\nPatient: That is a relief."
+
+
+@pytest.fixture(autouse=True)
+def _reset_stats():
+    incremental.clear()
+    yield
+    incremental.clear()
+
+
+def test_appending_keeps_every_prefix_hash():
+    before = incremental.prefix_hashes(TRANSCRIPT)
+    after = incremental.prefix_hashes(APPENDED)
+
+    assert len(before) > 3
+    assert after[:len(before)] == before
+
+
+def test_edit_changes_hashes_from_the_edited_segment_on():
+    lines = TRANSCRIPT.splitlines()
+    lines[150] = "Doctor: Edited line."
+    edited = incremental.prefix_hashes("\n".join(lines))
+    original = incremental.prefix_hashes(TRANSCRIPT)
+
+    shared = next(i for i, (a, b) in enumerate(zip(original, edited)) if a != b)
+    assert 0 < shared < len(original)
+
+
+def test_diff_splits_after_shared_lines():
+    delta = incremental.diff("a\nb\nc", "a\nb\nC\nd\n")
+
+    assert delta.shared_chars == len("a\nb\n")
+    assert delta.removed == "c"
+    assert delta.added == "C\nd\n"
+
+
+def test_plan_sends_previous_summary_and_only_the_changes():
+    previous = {"id": "abc", "input_text": TRANSCRIPT, "summary": "Cough, inhaler, follow-up."}
+
+    plan = incremental.plan(previous, APPENDED)
+
+    assert plan.parent_id == "abc"
+    assert "Cough, inhaler, follow-up." in plan.text
+    assert "chest X-ray came back clear" in plan.text
+    assert "Line 0 " not in plan.text
+    report = plan.report()
+    assert report["tokens_saved"] == report["full_tokens"] - report["sent_tokens"] > 0
+    assert incremental.stats() == {"requests": 1, "fallbacks": 0, "tokens_saved": report["tokens_saved"]}
+
+
+def test_plan_falls_back_when_little_is_shared():
+    previous = {"id": "abc", "input_text": TRANSCRIPT, "summary": "Summary."}
+    lines = TRANSCRIPT.splitlines()
+    lines[1] = "Doctor: Rewritten near the start."
+
+    assert incremental.plan(previous, "\n".join(lines)) is None
+    assert incremental.plan(previous, "Patient: Something else entirely.") is None
+    assert incremental.stats()["fallbacks"] == 2
+
+
+async def test_summarize_with_plan_sends_the_incremental_prompt():
+    response = MagicMock()
+    response.choices[0].message.content = "Updated summary."
+    mock_client = MagicMock()
+    mock_client.chat.completions.create = AsyncMock(return_value=response)
+    plan = incremental.plan({"id": "abc", "input_text": TRANSCRIPT, "summary": "Earlier summary."}, APPENDED)
+
+    with patch("app.services.openai_service.get_client", return_value=mock_client):
+        result = await openai_service.summarize(APPENDED, "brief", "paragraph", "professional", plan=plan)
+
+    assert result == "Updated summary."
+    messages = mock_client.chat.completions.create.await_args.kwargs["messages"]
+    assert "summarized before" in messages[0]["content"]
+    assert messages[1]["content"] == plan.text
+    assert messages[2]["content"].startswith("Write a summary")
@@ -0,0 +1,181 @@
+"""
+Unit tests for the in-process batch job queue.
+openai_service.summarize and history writes are mocked throughout.
+"""
+import asyncio
+import httpx
+import pytest
+import openai
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app.services import admission, job_queue, llm_backends, openai_service
+
+
+def _items(n, **overrides):
+    return [
+        {"text": f"Transcript {i}", "summary_type": "brief", "style": "paragraph", "tonality": "professional", **overrides}
+        for i in range(n)
+    ]
+
+
+def _rate_limit_error(retry_after="0"):
+    response = MagicMock()
+    response.status_code = 429
+    response.headers = {"retry-after": retry_after}
+    return openai.RateLimitError("rate limited", response=response, body=None)
+
+
+def _overloaded():
+    return admission.Overloaded("Summarization queue is full", retry_after=0)
+
+
+async def _wait(job, timeout=5):
+    async def done():
+        async for _ in job.events():
+            pass
+    await asyncio.wait_for(done(), timeout)
+
+
+@pytest.fixture
+async def queue():
+    q = job_queue.JobQueue(workers=3)
+    yield q
+    await q.stop()
+
+
+@pytest.fixture(autouse=True)
+def _fast_backoff():
+    with patch.object(job_queue, "BACKOFF_BASE", 0.001), patch.object(job_queue, "BACKOFF_MAX", 0.01):
+        yield
+
+
+class TestJobQueue:
+    async def test_runs_all_items_in_order(self, queue):
+        async def summarize(text, **kwargs):
+            return f"summary of {text}"
+
+        with patch("app.services.openai_service.summarize", side_effect=summarize):
+            job = queue.submit(job_queue.Job(_items(5)))
+            await _wait(job)
+
+        assert job.status == "completed"
+        assert job.completed == 5
+        assert [r["summary"] for r in job.results] == [f"summary of Transcript {i}" for i in range(5)]
+        assert "text" not in job.results[0]
+
+    async def test_worker_pool_bounds_concurrency(self, queue):
+        in_flight = 0
+        peak = 0
+
+        async def summarize(**kwargs):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return "ok"
+
+        with patch("app.services.openai_service.summarize", side_effect=summarize):
+            job = queue.submit(job_queue.Job(_items(10)))
+            await _wait(job)
+
+        assert peak == 3
+
+    async def test_retries_shed_items_then_succeeds(self, queue):
+        mock = AsyncMock(side_effect=[_overloaded(), _overloaded(), "recovered"])
+        with patch("app.services.openai_service.summarize", mock):
+            job = queue.submit(job_queue.Job(_items(1)))
+            await _wait(job)
+
+        assert job.results[0]["summary"] == "recovered"
+        assert mock.await_count == 3
+
+    async def test_non_retryable_errors_fail_the_item(self, queue):
+        mock = AsyncMock(side_effect=ValueError("bad input"))
+        with patch("app.services.openai_service.summarize", mock):
+            job = queue.submit(job_queue.Job(_items(2)))
+            await _wait(job)
+
+        assert job.failed == 2
+        assert job.results[0]["error"] == "bad input"
+        assert mock.await_count == 2
+
+    async def test_gives_up_after_max_retries(self, queue):
+        mock = AsyncMock(side_effect=_overloaded())
+        with patch("app.services.openai_service.summarize", mock), \
+                patch.object(job_queue, "MAX_RETRIES", 2):
+            job = queue.submit(job_queue.Job(_items(1)))
+            await _wait(job)
+
+        assert job.failed == 1
+        assert mock.await_count == 3
+
+    @pytest.mark.parametrize("error", [
+        lambda request: openai.InternalServerError("bad gateway", response=httpx.Response(502, request=request), body=None),
+        lambda request: openai.RateLimitError("rate limited", response=httpx.Response(429, request=request), body=None),
+    ], ids=["502", "429"])
+    async def test_provider_errors_are_retried_by_admission_only(self, queue, error):
+        request = httpx.Request("POST", "http://llm/v1/chat/completions")
+
+        class FailingBackend(llm_backends.FakeBackend):
+            calls = 0
+
+            async def complete(self, messages, model, temperature):
+                self.calls += 1
+                raise error(request)
+
+        backend = FailingBackend()
+        with patch.object(openai_service, "_backend", backend), patch.object(admission, "MAX_RETRIES", 3), \
+                patch.object(admission, "BACKOFF_BASE", 0.001), patch.object(admission, "BACKOFF_MAX", 0.01):
+            job = queue.submit(job_queue.Job(_items(2)))
+            await _wait(job)
+
+        assert job.failed == 2
+        # Admission's MAX_RETRIES + 1 attempts per item, with no batch retries on top
+        assert backend.calls == 2 * 4
+
+    async def test_saves_successful_results_to_history_in_bulk(self, queue):
+        mock = AsyncMock(side_effect=["first", ValueError("boom"), "third"])
+        bulk = AsyncMock(return_value=2)
+        with patch("app.services.openai_service.summarize", mock), \
+                patch("app.services.history_service.bulk_upsert_summaries", bulk):
+            job = queue.submit(job_queue.Job(_items(3), device_id="dev-1", save_to_history=True))
+            await _wait(job)
+
+        bulk.assert_awaited_once()
+        device_id, entries = bulk.await_args.args
+        assert device_id == "dev-1"
+        assert [e["input_text"] for e in entries] == ["Transcript 0", "Transcript 2"]
+        assert [e["summary"] for e in entries] == ["first", "third"]
+
+    async def test_events_stream_every_result(self, queue):
+        with patch("app.services.openai_service.summarize", AsyncMock(return_value="ok")):
+            job = queue.submit(job_queue.Job(_items(4)))
+            indexes = [event["index"] async for event in job.events()]
+
+        assert sorted(indexes) == [0, 1, 2, 3]
+
+
+class TestDrain:
+    async def test_drain_finishes_queued_items(self, queue):
+        async def summarize(text, **kwargs):
+            await asyncio.sleep(0.01)
+            return "ok"
+
+        with patch("app.services.openai_service.summarize", side_effect=summarize):
+            job = queue.submit(job_queue.Job(_items(6)))
+            await queue.drain(timeout=5)
+
+        assert job.status == "completed"
+        assert queue.stats()["workers"] == 0
+
+    async def test_drain_gives_up_after_timeout(self, queue):
+        async def summarize(text, **kwargs):
+            await asyncio.sleep(10)
+
+        with patch("app.services.openai_service.summarize", side_effect=summarize):
+            job = queue.submit(job_queue.Job(_items(2)))
+            await asyncio.wait_for(queue.drain(timeout=0.05), 2)
+
+        assert not job.done
+        assert queue.stats()["workers"] == 0
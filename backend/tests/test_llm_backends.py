@@ -0,0 +1,170 @@
+"""
+Tests for the LLM backends: the deterministic fake, the OpenAI-compatible HTTP
+client (against an httpx mock transport) and backend/model selection in
+openai_service.
+"""
+import json
+import time
+import httpx
+import openai
+import pytest
+from unittest.mock import AsyncMock, patch
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services import llm_backends, openai_service
+from app.settings import settings
+
+MESSAGES = [
+    {"role": "system", "content": "You are a summarizer."},
+    {"role": "user", "content": "Patient reports headaches in the evening."},
+    {"role": "user", "content": "Write a brief summary."},
+]
+
+
+@pytest.fixture
+def fake_backend():
+    """Route openai_service through a zero-latency FakeBackend."""
+    with patch.object(openai_service, "BACKEND", "fake"), \
+            patch.object(openai_service, "_backend", None), \
+            patch.object(openai_service, "_semaphore", None):
+        yield openai_service.get_backend()
+
+
+# ---------------------------------------------------------------------------
+# FakeBackend
+# ---------------------------------------------------------------------------
+
+class TestFakeBackend:
+    async def test_output_is_deterministic_and_names_the_model(self):
+        backend = llm_backends.FakeBackend()
+        first = await backend.complete(MESSAGES, "small-model", 0.7)
+        second = await backend.complete(MESSAGES, "small-model", 0.7)
+        assert first == second == "[small-model] Patient reports headaches in the evening."
+
+    async def test_stream_matches_complete(self):
+        backend = llm_backends.FakeBackend(output_tokens=4)
+        deltas = [delta async for delta in backend.stream(MESSAGES, "m", 0.7)]
+        assert len(deltas) == 4
+        assert "".join(deltas) == await backend.complete(MESSAGES, "m", 0.7)
+
+    async def test_latency_and_token_rate(self):
+        backend = llm_backends.FakeBackend(latency=0.05, tokens_per_second=100)
+        start = time.perf_counter()
+        await backend.complete(MESSAGES, "m", 0.7)
+        # 50 ms to first token plus 7 tokens (model tag and six words) at 10 ms each
+        assert time.perf_counter() - start >= 0.12
+
+
+# ---------------------------------------------------------------------------
+# OpenAICompatibleBackend
+# ---------------------------------------------------------------------------
+
+def _compatible(handler) -> llm_backends.OpenAICompatibleBackend:
+    return llm_backends.OpenAICompatibleBackend(
+        "http://llm.local/v1",
+        "local-key",
+        limits=httpx.Limits(max_connections=4),
+        timeout=httpx.Timeout(5),
+        transport=httpx.MockTransport(handler),
+    )
+
+
+class TestOpenAICompatibleBackend:
+    async def test_complete_posts_chat_request(self):
+        seen = {}
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            seen["url"] = str(request.url)
+            seen["auth"] = request.headers.get("Authorization")
+            seen["body"] = json.loads(request.content)
+            return httpx.Response(200, json={
+                "choices": [{"message": {"content": "Summary."}}],
+                "usage": {"prompt_tokens": 12, "completion_tokens": 2},
+            })
+
+        backend = _compatible(handler)
+        assert await backend.complete(MESSAGES, "llama-3-8b", 0.7) == "Summary."
+        await backend.close()
+
+        assert seen["url"] == "http://llm.local/v1/chat/completions"
+        assert seen["auth"] == "Bearer local-key"
+        assert seen["body"]["model"] == "llama-3-8b"
+        assert seen["body"]["messages"] == MESSAGES
+
+    async def test_stream_parses_server_sent_events(self):
+        def handler(request: httpx.Request) -> httpx.Response:
+            assert json.loads(request.content)["stream"] is True
+            events = "".join(
+                f"data: {json.dumps({'choices': [{'delta': {'content': piece}}]})}\n\n"
+                for piece in ("Sum", "mary", ".")
+            )
+            return httpx.Response(200, text=events + "data: [DONE]\n\n")
+
+        backend = _compatible(handler)
+        deltas = [delta async for delta in backend.stream(MESSAGES, "m", 0.7)]
+        await backend.close()
+        assert deltas == ["Sum", "mary", "."]
+
+    @pytest.mark.parametrize("status, error", [
+        (429, openai.RateLimitError),
+        (503, openai.InternalServerError),
+        (400, openai.APIStatusError),
+    ])
+    async def test_errors_use_openai_types(self, status, error):
+        backend = _compatible(lambda request: httpx.Response(status, json={"error": "no"}))
+        with pytest.raises(error):
+            await backend.complete(MESSAGES, "m", 0.7)
+        await backend.close()
+
+    async def test_connection_failure_is_api_connection_error(self):
+        def handler(request: httpx.Request) -> httpx.Response:
+            raise httpx.ConnectError("refused", request=request)
+
+        backend = _compatible(handler)
+        with pytest.raises(openai.APIConnectionError):
+            await backend.complete(MESSAGES, "m", 0.7)
+        await backend.close()
+
+
+# ---------------------------------------------------------------------------
+# Backend and model selection
+# ---------------------------------------------------------------------------
+
+class TestBackendSelection:
+    def test_unknown_backend_raises(self):
+        with patch.object(openai_service, "BACKEND", "nope"), patch.object(openai_service, "_backend", None):
+            with pytest.raises(ValueError):
+                openai_service.get_backend()
+
+    def test_fake_backend_needs_no_key(self, fake_backend, monkeypatch):
+        monkeypatch.setattr(settings, "openai_api_key", None)
+        assert isinstance(fake_backend, llm_backends.FakeBackend)
+        assert openai_service.is_configured()
+
+    async def test_model_per_summary_type(self, fake_backend):
+        with patch.object(openai_service, "MODELS_BY_SUMMARY_TYPE", {"detailed": "big-model"}):
+            detailed = await openai_service.summarize("Some text.", "detailed", "paragraph", "professional")
+            brief = await openai_service.summarize("Some text.", "brief", "paragraph", "professional")
+        assert detailed.startswith("[big-model]")
+        assert brief.startswith(f"[{openai_service.MODEL}]")
+
+    async def test_long_documents_map_with_notes_model(self, fake_backend):
+        text = " ".join(f"word{i}" for i in range(400))
+        with patch.object(openai_service, "LONG_DOC_THRESHOLD_TOKENS", 100), \
+                patch.object(openai_service, "CHUNK_TOKENS", 60), \
+                patch.object(openai_service, "CHUNK_OVERLAP_TOKENS", 0), \
+                patch.object(openai_service, "NOTES_MODEL", "notes-model"), \
+                patch.object(fake_backend, "complete", AsyncMock(wraps=fake_backend.complete)) as complete:
+            result = await openai_service.summarize(text, "brief", "paragraph", "professional")
+
+        models = [call.args[1] for call in complete.call_args_list]
+        assert models[-1] == openai_service.MODEL
+        assert set(models[:-1]) == {"notes-model"}
+        assert "[notes-model]" in result
+
+    def test_endpoint_runs_offline(self, fake_backend, monkeypatch):
+        monkeypatch.setattr(settings, "openai_api_key", None)
+        response = TestClient(app).post("/summarize", json={"text": "Offline transcript.", "bypass_cache": True})
+        assert response.status_code == 200
+        assert response.json()["summary"] == f"[{openai_service.MODEL}] Offline transcript."
@@ -0,0 +1,138 @@
+"""
+Tests for the metrics subsystem: stage timers, token counters, the /metrics
+endpoint and the cost of instrumentation on a fake-backend load run.
+"""
+import time
+import httpx
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services import metrics
+
+client = TestClient(app)
+
+
+def _sample(name, labels):
+    return metrics.registry.get_sample_value(name, labels) or 0
+
+
+def _fake_openai_client():
+    response = MagicMock()
+    response.choices[0].message.content = "Summary."
+    response.usage = SimpleNamespace(prompt_tokens=120, completion_tokens=30)
+    fake = MagicMock()
+    fake.chat.completions.create = AsyncMock(return_value=response)
+    return fake
+
+
+class TestStageTimers:
+    def test_stage_records_duration(self):
+        before = _sample("app_stage_duration_seconds_count", {"stage": "test.stage"})
+        with metrics.stage("test.stage"):
+            pass
+        assert _sample("app_stage_duration_seconds_count", {"stage": "test.stage"}) == before + 1
+
+    async def test_timed_records_even_on_error(self):
+        @metrics.timed("test.timed")
+        async def fails():
+            raise RuntimeError("boom")
+
+        before = _sample("app_stage_duration_seconds_count", {"stage": "test.timed"})
+        with pytest.raises(RuntimeError):
+            await fails()
+        assert _sample("app_stage_duration_seconds_count", {"stage": "test.timed"}) == before + 1
+
+    def test_disabled_records_nothing(self):
+        before = _sample("app_stage_duration_seconds_count", {"stage": "test.off"})
+        with patch.object(metrics, "ENABLED", False):
+            with metrics.stage("test.off"):
+                pass
+            metrics.observe_stage("test.off", 1.0)
+        assert _sample("app_stage_duration_seconds_count", {"stage": "test.off"}) == before
+
+    def test_record_tokens_skips_missing_usage(self):
+        before = _sample("llm_tokens_total", {"kind": "prompt"})
+        metrics.record_tokens(None)
+        metrics.record_tokens(SimpleNamespace(prompt_tokens=None, completion_tokens=None))
+        metrics.record_tokens(SimpleNamespace(prompt_tokens=7, completion_tokens=3))
+        assert _sample("llm_tokens_total", {"kind": "prompt"}) == before + 7
+
+
+class TestMetricsEndpoint:
+    def test_exposes_route_templates_stages_and_gauges(self):
+        with patch("app.services.openai_service.get_client", return_value=_fake_openai_client()):
+            client.post("/summarize", json={"text": "Transcript.", "bypass_cache": True})
+        with patch("app.services.history_service.get_summary", new_callable=AsyncMock, return_value=None):
+            client.get("/history/abc123", headers={"X-Device-Id": "dev-1"})
+
+        body = client.get("/metrics").text
+
+        assert 'route="/summarize"' in body
+        assert 'route="/history/{summary_id}"' in body
+        assert 'route="/history/abc123"' not in body
+        assert 'app_stage_duration_seconds_count{stage="llm"}' in body
+        assert 'app_stage_duration_seconds_count{stage="prompt"}' in body
+        assert 'llm_tokens_total{kind="completion"}' in body
+        assert "app_summary_cache_memory_hits" in body
+        assert "app_batch_queue_queued_items" in body
+
+    def test_disabled_endpoint_is_404(self):
+        with patch.object(metrics, "ENABLED", False):
+            assert client.get("/metrics").status_code == 404
+
+
+class TestOverhead:
+    async def _load_run(self, requests: int) -> float:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            start = time.perf_counter()
+            for i in range(requests):
+                response = await http.post("/summarize", json={"text": f"Transcript {i}.", "bypass_cache": True})
+                assert response.status_code == 200
+            return (time.perf_counter() - start) / requests
+
+    async def _instrumentation_cost(self, requests: int) -> float:
+        """Time what metrics add to one /summarize call: the middleware, two stages and token counting."""
+        async def endpoint(scope, receive, send):
+            await send({"type": "http.response.start", "status": 200})
+            await send({"type": "http.response.body", "body": b""})
+
+        async def send(message):
+            pass
+
+        usage = SimpleNamespace(prompt_tokens=120, completion_tokens=30)
+        scope = {"type": "http", "method": "POST"}
+
+        async def run(asgi_app) -> float:
+            start = time.perf_counter()
+            for _ in range(requests):
+                with metrics.stage("prompt"):
+                    pass
+                with metrics.stage("llm"):
+                    pass
+                metrics.record_tokens(usage)
+                await asgi_app(scope, None, send)
+            return time.perf_counter() - start
+
+        instrumented = min([await run(metrics.MetricsMiddleware(endpoint)) for _ in range(3)])
+        with patch.object(metrics, "ENABLED", False):
+            bare = min([await run(endpoint) for _ in range(3)])
+        return max(0.0, instrumented - bare) / requests
+
+    async def test_instrumentation_overhead_is_small(self):
+        """Metrics cost well under 5% of a request against a zero-latency fake LLM."""
+        with patch("app.services.openai_service.get_client", return_value=_fake_openai_client()):
+            await self._load_run(50)  # warm up
+            with patch.object(metrics, "ENABLED", False):
+                baseline = min([await self._load_run(200) for _ in range(3)])
+
+            before = _sample("app_stage_duration_seconds_count", {"stage": "llm"})
+            await self._load_run(200)
+            assert _sample("app_stage_duration_seconds_count", {"stage": "llm"}) == before + 200
+
+        overhead = await self._instrumentation_cost(5000)
+        print(f"\nrequest {baseline * 1e6:.0f} us, metrics overhead {overhead * 1e6:.1f} us")
+        assert overhead < 0.05 * baseline
@@ -0,0 +1,155 @@
+import asyncio
+import gzip
+import json
+import zlib
+from datetime import datetime, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.applications import Starlette
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Route
+
+from app.services import response_encoding
+from app.services.response_encoding import CompressionMiddleware, JSONResponse, negotiate
+
+BIG = b'{"text":"' + b"Patient reports persistent cough. " * 200 + b'"}'
+
+
+@pytest.fixture(autouse=True)
+def _clear_stats():
+    response_encoding.clear()
+
+
+def _app() -> Starlette:
+    async def big(request):
+        return Response(BIG, media_type="application/json", headers={"ETag": '"abc"'})
+
+    async def small(request):
+        return Response(b'{"ok":true}', media_type="application/json", headers={"ETag": '"small"'})
+
+    async def stream(request):
+        async def chunks():
+            for i in range(3):
+                yield b'{"line":%d}\n' % i
+        return StreamingResponse(chunks(), media_type="application/x-ndjson")
+
+    async def events(request):
+        return StreamingResponse(iter([b"data: x\n\n" * 200]), media_type="text/event-stream")
+
+    async def archive(request):
+        return Response(gzip.compress(BIG), media_type="application/gzip")
+
+    async def not_modified(request):
+        return Response(status_code=304, headers={"ETag": '"abc"'})
+
+    routes = [Route(f"/{endpoint.__name__}", endpoint) for endpoint in (big, small, stream, events, archive, not_modified)]
+    return CompressionMiddleware(Starlette(routes=routes))
+
+
+client = TestClient(_app())
+
+
+@pytest.mark.parametrize("header, brotli, expected", [
+    ("", True, None),
+    ("identity", True, None),
+    ("gzip, deflate", True, "gzip"),
+    ("gzip, deflate, br", True, "br"),
+    ("gzip, deflate, br", False, "gzip"),
+    ("br;q=0.5, gzip", True, "gzip"),
+    ("br;q=0, gzip;q=0", True, None),
+    ("*", True, "br"),
+    ("*;q=0.2, gzip;q=0", False, None),
+    ("GZIP;Q=0.8", False, "gzip"),
+    ("gzip;q=nope", False, None),
+])
+def test_negotiate(header, brotli, expected):
+    assert negotiate(header, brotli=brotli) == expected
+
+
+def test_json_response_renders_what_fastapi_renders():
+    content = {"id": "a", "created_at": datetime(2025, 1, 2, 3, 4, 5, 678, tzinfo=timezone.utc), "text": "Päivää ✓", "n": [1, 2.5, None]}
+    expected = {**content, "created_at": content["created_at"].isoformat()}
+
+    body = JSONResponse(content).body
+
+    assert body == json.dumps(expected, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def test_large_body_is_gzipped():
+    response = client.get("/big", headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.headers["etag"] == 'W/"abc"'
+    assert int(response.headers["content-length"]) == response.num_bytes_downloaded < len(BIG) // 10
+    assert response.content == BIG
+    assert response_encoding.stats() == {"responses": 1, "compressed": 1, "bytes_in": len(BIG), "bytes_out": response.num_bytes_downloaded}
+
+
+def test_brotli_falls_back_to_gzip_without_the_package(monkeypatch):
+    monkeypatch.setattr(response_encoding, "_brotli", False)
+    response = client.get("/big", headers={"Accept-Encoding": "br, gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+
+
+def test_large_body_is_compressed_off_the_event_loop(monkeypatch):
+    monkeypatch.setattr(response_encoding, "THREAD_BYTES", 0)
+    response = client.get("/big", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip" and response.content == BIG
+
+
+def test_small_body_and_identity_are_sent_as_is():
+    small = client.get("/small", headers={"Accept-Encoding": "gzip"})
+    identity = client.get("/big", headers={"Accept-Encoding": "identity"})
+
+    assert "content-encoding" not in small.headers
+    assert "content-encoding" not in identity.headers
+    # Either could be encoded for another client
+    assert small.headers["vary"] == identity.headers["vary"] == "Accept-Encoding"
+    # Weak for every client that accepts an encoding, strong for the rest
+    assert small.headers["etag"] == 'W/"small"'
+    assert identity.headers["etag"] == '"abc"'
+    assert identity.content == BIG
+
+
+async def test_streamed_body_is_compressed_chunk_by_chunk():
+    chunks = []
+
+    async def receive():
+        await asyncio.Event().wait()
+
+    async def send(message):
+        chunks.append(message)
+
+    scope = {
+        "type": "http", "method": "GET", "path": "/stream", "raw_path": b"/stream", "root_path": "",
+        "query_string": b"", "headers": [(b"accept-encoding", b"gzip")], "scheme": "http", "server": ("test", 80),
+    }
+    await _app()(scope, receive, send)
+
+    start, *bodies = chunks
+    headers = dict(start["headers"])
+    assert headers[b"content-encoding"] == b"gzip" and b"content-length" not in headers
+    decompressor = zlib.decompressobj(31)
+    # Every line can be decoded as soon as its chunk arrives
+    lines = [decompressor.decompress(body["body"]) for body in bodies]
+    assert lines[:3] == [b'{"line":0}\n', b'{"line":1}\n', b'{"line":2}\n']
+    assert not bodies[-1]["more_body"]
+
+
+@pytest.mark.parametrize("path", ["/events", "/archive"])
+def test_event_streams_and_archives_pass_through(path):
+    response = client.get(path, headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert "vary" not in response.headers
+
+
+@pytest.mark.parametrize("accept_encoding, etag", [("gzip", 'W/"abc"'), ("identity", '"abc"')])
+def test_304_carries_the_etag_of_the_body_it_stands_for(accept_encoding, etag):
+    body = client.get("/big", headers={"Accept-Encoding": accept_encoding})
+    not_modified = client.get("/not_modified", headers={"Accept-Encoding": accept_encoding})
+
+    assert not_modified.status_code == 304 and "content-encoding" not in not_modified.headers
+    assert not_modified.headers["etag"] == body.headers["etag"] == etag
+    assert not_modified.headers["vary"] == "Accept-Encoding"
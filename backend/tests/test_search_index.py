@@ -0,0 +1,89 @@
+"""
+Tests for the local search index used where MongoDB $text is unavailable.
+"""
+from unittest.mock import patch
+
+from app.services import search_index
+
+
+def _doc(i, title="", summary="", translated_summary=None):
+    return {"_id": i, "title": title, "summary": summary, "translated_summary": translated_summary}
+
+
+def test_tokenize_casefolds_and_keeps_non_ascii():
+    assert search_index.tokenize("Kopfschmerzen, STRASSE café") == ["kopfschmerzen", "strasse", "café"]
+    assert search_index.query_terms("cough Cough fever") == ["cough", "fever"]
+
+
+def test_field_weights_and_rarity_rank():
+    index = search_index.InvertedIndex([
+        _doc(0, summary="fever and cough"),
+        _doc(1, title="fever"),
+        _doc(2, summary="cough"),
+        _doc(3, summary="cough cough"),
+        _doc(4, summary="nothing relevant"),
+    ])
+
+    positions, scores = index.search(["fever"])
+    assert positions.tolist() == [1, 0]
+
+    positions, scores = index.search(["fever", "cough"])
+    assert positions[0] == 0
+    assert 4 not in positions.tolist()
+    assert all(a >= b for a, b in zip(scores, scores[1:]))
+
+
+def test_ties_prefer_later_documents():
+    index = search_index.InvertedIndex([_doc(i, summary="same words") for i in range(3)])
+    positions, _ = index.search(["same"])
+    assert positions.tolist() == [2, 1, 0]
+
+
+def test_unknown_terms_and_empty_index():
+    assert len(search_index.InvertedIndex([]).search(["x"])[0]) == 0
+    assert len(search_index.InvertedIndex([_doc(0, summary="a")]).search(["b"])[0]) == 0
+
+
+def test_cache_checks_signature_and_evicts():
+    cache = search_index.IndexCache(max_devices=2)
+    index = search_index.InvertedIndex([])
+    cache.put("a", (1, None), index)
+    assert cache.validate("a", (1, None)) is index
+    assert cache.validate("a", (2, None)) is None
+
+    cache.put("b", (1, None), index)
+    cache.validate("a", (1, None))
+    cache.put("c", (1, None), index)
+    assert cache.validate("b", (1, None)) is None
+    assert cache.validate("a", (1, None)) is index
+
+
+def test_cache_revalidates_after_window():
+    cache = search_index.IndexCache(revalidate_after=10)
+    index = search_index.InvertedIndex([])
+    with patch("app.services.search_index.time.monotonic", return_value=100.0):
+        cache.put("a", (1, None), index)
+    with patch("app.services.search_index.time.monotonic", return_value=105.0):
+        assert cache.fresh("a") is index
+    with patch("app.services.search_index.time.monotonic", return_value=111.0):
+        assert cache.fresh("a") is None
+        assert cache.validate("a", (1, None)) is index
+        assert cache.fresh("a") is index
+
+    cache.invalidate("a")
+    assert cache.fresh("a") is None
+
+
+def test_snippet_windows_long_text():
+    text = "word " * 100 + "chest pain radiating to the arm " + "word " * 100
+    snippet = search_index.snippet({"summary": text}, ["pain"], width=60)
+
+    assert snippet["text"].startswith("…") and snippet["text"].endswith("…")
+    assert len(snippet["text"]) <= 70
+    assert [snippet["text"][s:e] for s, e in snippet["highlights"]] == ["pain"]
+
+
+def test_snippet_falls_back_to_title():
+    snippet = search_index.snippet({"title": "Dermatology", "summary": "Nothing."}, ["dermatology"])
+    assert snippet["field"] == "title"
+    assert search_index.snippet({"summary": "Nothing."}, ["absent"]) is None
@@ -2,56 +2,65 @@
 Unit tests for individual backend service functions and prompt builder.
 External dependencies (OpenAI, Google Translate) are mocked throughout.
 """
+import asyncio
+import codecs
+import json
+import os
+import zipfile
 import pytest
 from unittest.mock import AsyncMock, MagicMock, patch
 from io import BytesIO
 from fastapi import HTTPException
 from starlette.datastructures import UploadFile
+from openai import AsyncOpenAI
 
-from app.prompts import get_system_prompt
-from app.services import translate_service, file_parser, openai_service
+from app.prompts import get_prefix_prompt, get_variant_prompt
+from app.services import translate_service, file_parser, openai_service, summary_cache, history_service
+from app.settings import settings
 
 
 # ---------------------------------------------------------------------------
 # prompts.py
 # ---------------------------------------------------------------------------
 
-class TestGetSystemPrompt:
+class TestPrompts:
     def test_brief_summary_type(self):
-        prompt = get_system_prompt("brief", "paragraph", "professional")
+        prompt = get_variant_prompt("brief", "paragraph", "professional")
         assert "concise" in prompt.lower()
 
     def test_detailed_summary_type(self):
-        prompt = get_system_prompt("detailed", "paragraph", "professional")
+        prompt = get_variant_prompt("detailed", "paragraph", "professional")
         assert "comprehensive" in prompt.lower()
 
     def test_key_points_summary_type(self):
-        prompt = get_system_prompt("key_points", "paragraph", "professional")
+        prompt = get_variant_prompt("key_points", "paragraph", "professional")
         assert "key" in prompt.lower()
 
     def test_action_points_summary_type(self):
-        prompt = get_system_prompt("action_points", "paragraph", "professional")
+        prompt = get_variant_prompt("action_points", "paragraph", "professional")
         assert "actionable" in prompt.lower() or "action" in prompt.lower()
 
     def test_bullets_style(self):
-        prompt = get_system_prompt("brief", "bullets", "professional")
+        prompt = get_variant_prompt("brief", "bullets", "professional")
         assert "bullet" in prompt.lower()
 
     def test_numbered_style(self):
-        prompt = get_system_prompt("brief", "numbered", "professional")
+        prompt = get_variant_prompt("brief", "numbered", "professional")
         assert "numbered" in prompt.lower()
 
     def test_casual_tonality(self):
-        prompt = get_system_prompt("brief", "paragraph", "casual")
+        prompt = get_variant_prompt("brief", "paragraph", "casual")
         assert "casual" in prompt.lower()
 
     def test_simplified_tonality(self):
-        prompt = get_system_prompt("brief", "paragraph", "simplified")
+        prompt = get_variant_prompt("brief", "paragraph", "simplified")
         assert "simple" in prompt.lower() or "simplified" in prompt.lower()
 
-    def test_prompt_ends_with_transcript_header(self):
-        prompt = get_system_prompt("brief", "paragraph", "professional")
-        assert "Transcript" in prompt
+    def test_prefix_prompt_is_the_same_for_every_variant(self):
+        prompt = get_prefix_prompt()
+        assert "transcript" in prompt.lower()
+        assert "same language" in prompt
+        assert "concise" not in prompt.lower()
 
 
 # ---------------------------------------------------------------------------
@@ -81,6 +90,59 @@ class TestTranslateService:
                 await translate_service.translate("text", "fi")
 
 
+    @pytest.mark.asyncio
+    async def test_translate_caches_by_text_and_language(self):
+        with patch("app.services.translate_service.GoogleTranslator") as MockTranslator:
+            instance = MockTranslator.return_value
+            instance.translate.side_effect = lambda text: f"[{text}]"
+
+            first = await translate_service.translate("Summary.", "fi")
+            second = await translate_service.translate("Summary.", "fi")
+            other = await translate_service.translate("Summary.", "sv")
+
+        assert first == second == other == "[Summary.]"
+        assert instance.translate.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_translate_reuses_translator_per_language(self):
+        with patch("app.services.translate_service.GoogleTranslator") as MockTranslator:
+            MockTranslator.return_value.translate.side_effect = lambda text: text.upper()
+            await translate_service.translate("one", "fi")
+            await translate_service.translate("two", "fi")
+
+        MockTranslator.assert_called_once_with(source="auto", target="fi")
+
+    @pytest.mark.asyncio
+    async def test_long_text_is_split_and_reassembled_in_order(self):
+        paragraphs = [f"Paragraph {i}. " + "word " * 30 for i in range(10)]
+        text = "\n".join(paragraphs)
+        with patch("app.services.translate_service.GoogleTranslator") as MockTranslator, \
+                patch.object(translate_service, "SEGMENT_CHARS", 400):
+            instance = MockTranslator.return_value
+            instance.translate.side_effect = lambda segment: segment.upper()
+            result = await translate_service.translate(text, "fi")
+
+        assert instance.translate.call_count > 1
+        assert all(len(call.args[0]) <= 400 for call in instance.translate.call_args_list)
+        assert result == text.upper()
+
+    def test_split_segments_cuts_long_lines_at_sentences(self):
+        line = " ".join(f"Sentence {i} is here." for i in range(40))
+        segments = translate_service.split_segments(line, max_chars=100)
+        assert all(len(segment) <= 100 for segment, _ in segments)
+        assert "".join(segment + sep for segment, sep in segments) == line
+
+    @pytest.mark.asyncio
+    async def test_translate_many_runs_each_language_once(self):
+        with patch("app.services.translate_service.GoogleTranslator") as MockTranslator:
+            MockTranslator.side_effect = lambda source, target: MagicMock(
+                translate=MagicMock(side_effect=lambda text: f"{target}:{text}")
+            )
+            result = await translate_service.translate_many("Hello.", ["fi", "sv", "ar", "ur", "fi"])
+
+        assert result == {"fi": "fi:Hello.", "sv": "sv:Hello.", "ar": "ar:Hello.", "ur": "ur:Hello."}
+
+
 # ---------------------------------------------------------------------------
 # file_parser.py
 # ---------------------------------------------------------------------------
@@ -97,7 +159,7 @@ class TestFileParser:
 
     @pytest.mark.asyncio
     async def test_parse_non_txt_raises_http_exception(self):
-        upload = self._make_upload_file("report.pdf", b"%PDF fake content")
+        upload = self._make_upload_file("report.exe", b"MZ fake content")
         with pytest.raises(HTTPException) as exc_info:
             await file_parser.parse_file(upload)
         assert exc_info.value.status_code == 400
@@ -110,6 +172,126 @@ class TestFileParser:
         assert result == "Potilaalla on kuumetta."
 
 
+    @pytest.mark.asyncio
+    async def test_parse_utf16_with_bom(self):
+        with open(os.path.join(os.path.dirname(__file__), "..", "test_transcript.txt"), "rb") as f:
+            upload = self._make_upload_file("transcript.txt", f.read())
+        result = await file_parser.parse_file(upload)
+        assert result.startswith("This is a test transcript for file upload.")
+
+    @pytest.mark.asyncio
+    async def test_parse_falls_back_for_non_utf8(self):
+        upload = self._make_upload_file("notes.txt", "Café visit, 5 mg dose.".encode("cp1252"))
+        result = await file_parser.parse_file(upload)
+        assert result == "Café visit, 5 mg dose."
+
+    @pytest.mark.asyncio
+    async def test_parse_invalid_utf16_keeps_the_bom_encoding(self):
+        # An unpaired surrogate: replaced, without reading any of the file as UTF-8 or cp1252
+        content = codecs.BOM_UTF16_LE + "Café ".encode("utf-16-le") + b"\x00\xdc" + " 5 mg.".encode("utf-16-le")
+        upload = self._make_upload_file("notes.txt", content)
+        with patch.object(file_parser, "READ_CHUNK_BYTES", 3):
+            result = await file_parser.parse_file(upload)
+        assert result == "Café � 5 mg."
+
+    @pytest.mark.asyncio
+    async def test_text_is_normalized_the_same_whole_or_in_pieces(self):
+        text = " Doctor:  Hello.\r\n\r\n\r\n\tPatient:  Hi. \r\n\n\n\nDoctor: Bye.\n"
+
+        async def pieces(size):
+            for i in range(0, len(text), size):
+                yield text[i:i + size]
+
+        expected = "Doctor: Hello.\n\nPatient: Hi.\n\nDoctor: Bye."
+        assert file_parser._normalize(text) == expected
+        for size in (1, 2, 3, 7):
+            assert await file_parser._normalized_text(pieces(size)) == expected
+
+    @pytest.mark.asyncio
+    async def test_parse_multibyte_characters_across_chunks(self):
+        text = "ä" * 100
+        upload = self._make_upload_file("notes.txt", text.encode("utf-8"))
+        with patch.object(file_parser, "READ_CHUNK_BYTES", 7):
+            result = await file_parser.parse_file(upload)
+        assert result == text
+
+    @pytest.mark.asyncio
+    async def test_parse_normalizes_whitespace(self):
+        content = b"  Doctor:\tHello   there.  \r\n\r\n\r\n\r\nPatient: Hi.\r\n\r\n"
+        upload = self._make_upload_file("notes.txt", content)
+        with patch.object(file_parser, "READ_CHUNK_BYTES", 5):
+            result = await file_parser.parse_file(upload)
+        assert result == "Doctor: Hello there.\n\nPatient: Hi."
+
+    @pytest.mark.asyncio
+    async def test_parse_rejects_oversized_upload(self):
+        upload = self._make_upload_file("notes.txt", b"x" * 2048)
+        with patch.object(file_parser, "MAX_UPLOAD_BYTES", 1024), \
+                patch.object(file_parser, "READ_CHUNK_BYTES", 256):
+            with pytest.raises(HTTPException) as exc_info:
+                await file_parser.parse_file(upload)
+        assert exc_info.value.status_code == 413
+
+    @pytest.mark.asyncio
+    async def test_parse_srt_subtitles(self):
+        content = (
+            b"1\n00:00:01,000 --> 00:00:03,000\nDoctor: How are you feeling?\n\n"
+            b"2\n00:00:03,500 --> 00:00:05,000\nPatient: <i>Much better.</i>\n"
+        )
+        upload = self._make_upload_file("visit.srt", content)
+        result = await file_parser.parse_file(upload)
+        assert result == "Doctor: How are you feeling?\nPatient: Much better."
+
+    @pytest.mark.asyncio
+    async def test_parse_vtt_with_voice_tags(self):
+        content = (
+            b"WEBVTT\n\nNOTE recorded in clinic\n\n"
+            b"00:01.000 --> 00:03.000\n<v Dr. Smith>Any allergies?</v>\n\n"
+            b"00:03.000 --> 00:04.000\n<v Patient>Penicillin.\n"
+        )
+        upload = self._make_upload_file("visit.vtt", content)
+        result = await file_parser.parse_file(upload)
+        assert result == "Dr. Smith: Any allergies?\nPatient: Penicillin."
+
+    @pytest.mark.asyncio
+    async def test_parse_json_segments(self):
+        content = json.dumps({"segments": [
+            {"speaker": "Doctor", "text": "Any pain?"},
+            {"speaker": "Patient", "text": "In my knee."},
+        ]}).encode()
+        upload = self._make_upload_file("export.json", content)
+        result = await file_parser.parse_file(upload)
+        assert result == "Doctor: Any pain?\nPatient: In my knee."
+
+    @pytest.mark.asyncio
+    async def test_parse_json_without_text_raises_400(self):
+        upload = self._make_upload_file("export.json", b'{"foo": 1}')
+        with pytest.raises(HTTPException) as exc_info:
+            await file_parser.parse_file(upload)
+        assert exc_info.value.status_code == 400
+
+    @pytest.mark.asyncio
+    async def test_parse_docx(self):
+        body = (
+            '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"><w:body>'
+            '<w:p><w:r><w:t>Doctor: Any fever?</w:t></w:r></w:p>'
+            '<w:p><w:r><w:t>Patient:</w:t><w:tab/><w:t>No.</w:t></w:r></w:p>'
+            '</w:body></w:document>'
+        )
+        buffer = BytesIO()
+        with zipfile.ZipFile(buffer, "w") as archive:
+            archive.writestr("word/document.xml", body)
+        upload = self._make_upload_file("notes.docx", buffer.getvalue())
+        result = await file_parser.parse_file(upload)
+        assert result == "Doctor: Any fever?\nPatient: No."
+
+    @pytest.mark.asyncio
+    async def test_parse_corrupt_pdf_raises_400(self):
+        upload = self._make_upload_file("report.pdf", b"%PDF fake content")
+        with pytest.raises(HTTPException) as exc_info:
+            await file_parser.parse_file(upload)
+        assert exc_info.value.status_code == 400
+
 # ---------------------------------------------------------------------------
 # openai_service.py
 # ---------------------------------------------------------------------------
@@ -121,7 +303,7 @@ class TestOpenAIService:
         mock_response.choices[0].message.content = "Mocked summary output."
 
         mock_client = MagicMock()
-        mock_client.chat.completions.create.return_value = mock_response
+        mock_client.chat.completions.create = AsyncMock(return_value=mock_response)
 
         with patch("app.services.openai_service.get_client", return_value=mock_client):
             result = await openai_service.summarize(
@@ -132,12 +314,12 @@ class TestOpenAIService:
             )
 
         assert result == "Mocked summary output."
-        mock_client.chat.completions.create.assert_called_once()
+        mock_client.chat.completions.create.assert_awaited_once()
 
     @pytest.mark.asyncio
     async def test_summarize_propagates_exception(self):
         mock_client = MagicMock()
-        mock_client.chat.completions.create.side_effect = Exception("API error")
+        mock_client.chat.completions.create = AsyncMock(side_effect=Exception("API error"))
 
         with patch("app.services.openai_service.get_client", return_value=mock_client):
             with pytest.raises(Exception, match="API error"):
@@ -146,6 +328,299 @@ class TestOpenAIService:
     def test_get_client_raises_without_api_key(self):
         # Reset the global client so get_client() tries to create a new one
         openai_service.client = None
-        with patch.dict("os.environ", {"OPENAI_API_KEY": "your_openai_api_key_here"}):
+        with patch.object(settings, "openai_api_key", "your_openai_api_key_here"):
             with pytest.raises(ValueError, match="OPENAI_API_KEY"):
                 openai_service.get_client()
+
+    @pytest.mark.asyncio
+    async def test_summarize_bounds_in_flight_requests(self):
+        in_flight = 0
+        peak = 0
+
+        async def slow_create(**kwargs):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            response = MagicMock()
+            response.choices[0].message.content = "ok"
+            return response
+
+        mock_client = MagicMock()
+        mock_client.chat.completions.create = slow_create
+
+        with patch("app.services.openai_service.get_client", return_value=mock_client), \
+                patch("app.services.openai_service._semaphore", asyncio.Semaphore(2)):
+            results = await asyncio.gather(*(
+                openai_service.summarize(f"text {i}", "brief", "paragraph", "professional")
+                for i in range(6)
+            ))
+
+        assert results == ["ok"] * 6
+        assert peak == 2
+
+    def test_get_client_uses_pooled_async_client(self):
+        openai_service.client = None
+        try:
+            with patch.object(settings, "openai_api_key", "sk-test"):
+                created = openai_service.get_client()
+            assert isinstance(created, AsyncOpenAI)
+            assert openai_service.get_client() is created
+            # Admission retries, so it sees and counts every upstream request
+            assert created.max_retries == 0
+        finally:
+            openai_service.client = None
+
+
+class _FakeStream:
+    """Async iterator mimicking openai.AsyncStream of chat completion chunks."""
+
+    def __init__(self, deltas):
+        self._deltas = iter(deltas)
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            delta = next(self._deltas)
+        except StopIteration:
+            raise StopAsyncIteration
+        chunk = MagicMock()
+        chunk.choices[0].delta.content = delta
+        return chunk
+
+    async def close(self):
+        self.closed = True
+
+
+class TestOpenAIStreaming:
+    def _client(self, stream):
+        mock_client = MagicMock()
+        mock_client.chat.completions.create = AsyncMock(return_value=stream)
+        return mock_client
+
+    @pytest.mark.asyncio
+    async def test_stream_yields_deltas_and_caches_result(self):
+        stream = _FakeStream(["Patient ", "is ", "stable."])
+        mock_client = self._client(stream)
+
+        with patch("app.services.openai_service.get_client", return_value=mock_client):
+            deltas = [d async for d in openai_service.summarize_stream(
+                "Transcript.", "brief", "paragraph", "professional"
+            )]
+            cached = await openai_service.summarize("Transcript.", "brief", "paragraph", "professional")
+
+        assert deltas == ["Patient ", "is ", "stable."]
+        assert cached == "Patient is stable."
+        assert stream.closed
+        assert mock_client.chat.completions.create.call_args.kwargs["stream"] is True
+
+    @pytest.mark.asyncio
+    async def test_closing_early_cancels_upstream_and_skips_cache(self):
+        stream = _FakeStream(["one ", "two ", "three"])
+        mock_client = self._client(stream)
+
+        with patch("app.services.openai_service.get_client", return_value=mock_client):
+            generator = openai_service.summarize_stream("Transcript.", "brief", "paragraph", "professional")
+            assert await generator.__anext__() == "one "
+            await generator.aclose()
+
+        assert stream.closed
+        assert len(summary_cache.memory) == 0
+
+
+class TestLongDocumentSummarization:
+    def _client(self):
+        async def create(**kwargs):
+            system, user = kwargs["messages"][0]["content"], kwargs["messages"][1]["content"]
+            response = MagicMock()
+            if system.startswith("You are a medical assistant") and "Section to process" in system:
+                response.choices[0].message.content = f"notes({len(user)})"
+            else:
+                response.choices[0].message.content = "final summary"
+            return response
+
+        mock_client = MagicMock()
+        mock_client.chat.completions.create = AsyncMock(side_effect=create)
+        return mock_client
+
+    def _transcript(self, turns):
+        return "\n".join(f"Patient: Line {i} describing the symptoms in detail." for i in range(turns))
+
+    @pytest.fixture(autouse=True)
+    def _small_budgets(self):
+        with patch.object(openai_service, "LONG_DOC_THRESHOLD_TOKENS", 200), \
+                patch.object(openai_service, "CHUNK_TOKENS", 100), \
+                patch.object(openai_service, "CHUNK_OVERLAP_TOKENS", 10):
+            yield
+
+    @pytest.mark.asyncio
+    async def test_short_text_uses_single_call(self):
+        mock_client = self._client()
+        with patch("app.services.openai_service.get_client", return_value=mock_client):
+            await openai_service.summarize("Patient: Short.", "brief", "paragraph", "professional")
+        mock_client.chat.completions.create.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_long_text_is_mapped_then_reduced(self):
+        mock_client = self._client()
+        text = self._transcript(100)
+        with patch("app.services.openai_service.get_client", return_value=mock_client):
+            result = await openai_service.summarize(text, "detailed", "bullets", "casual")
+
+        calls = mock_client.chat.completions.create.await_args_list
+        final_system, final_notes, final_instructions = (m["content"] for m in calls[-1].kwargs["messages"])
+        assert result == "final summary"
+        assert len(calls) > 2
+        assert "notes from its consecutive sections" in final_system
+        assert final_notes.startswith("--- Section 1 ---")
+        assert "comprehensive" in final_instructions.lower() and "bullet" in final_instructions.lower()
+
+    @pytest.mark.asyncio
+    async def test_editing_end_reuses_cached_chunk_summaries(self):
+        mock_client = self._client()
+        text = self._transcript(100)
+        with patch("app.services.openai_service.get_client", return_value=mock_client):
+            await openai_service.summarize(text, "brief", "paragraph", "professional")
+            first_run = mock_client.chat.completions.create.await_count
+            await openai_service.summarize(text + "\nDoctor: Follow up in two weeks.", "brief", "paragraph", "professional")
+            second_run = mock_client.chat.completions.create.await_count - first_run
+
+        # Only the last chunk and the final reduce need new completions
+        assert second_run == 2
+        assert first_run > second_run
+
+    @pytest.mark.asyncio
+    async def test_map_fan_out_is_bounded(self):
+        in_flight = 0
+        peak = 0
+
+        async def create(**kwargs):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            response = MagicMock()
+            response.choices[0].message.content = "n"
+            return response
+
+        mock_client = MagicMock()
+        mock_client.chat.completions.create = create
+        with patch("app.services.openai_service.get_client", return_value=mock_client), \
+                patch.object(openai_service, "MAP_CONCURRENCY", 3):
+            await openai_service.summarize(self._transcript(200), "brief", "paragraph", "professional")
+        assert peak == 3
+
+
+class TestSummarizeVariants:
+    VARIANTS = [
+        {"summary_type": "brief", "style": "paragraph", "tonality": "professional"},
+        {"summary_type": "detailed", "style": "bullets", "tonality": "casual"},
+        {"summary_type": "action_points", "style": "numbered", "tonality": "simplified"},
+    ]
+
+    def _client(self, fail_on=None):
+        async def create(**kwargs):
+            instructions = kwargs["messages"][-1]["content"]
+            if fail_on and fail_on in instructions:
+                raise RuntimeError("provider error")
+            content = f"summary for: {instructions}"
+            if kwargs.get("stream"):
+                return _FakeStream([content])
+            response = MagicMock()
+            response.choices[0].message.content = content
+            return response
+
+        mock_client = MagicMock()
+        mock_client.chat.completions.create = AsyncMock(side_effect=create)
+        return mock_client
+
+    async def _collect(self, text, variants=None):
+        return dict([item async for item in openai_service.summarize_variants(text, variants or self.VARIANTS)])
+
+    @pytest.mark.asyncio
+    async def test_variants_share_the_transcript_prefix(self):
+        mock_client = self._client()
+        with patch("app.services.openai_service.get_client", return_value=mock_client):
+            results = await self._collect("Patient reports a headache.")
+
+        calls = mock_client.chat.completions.create.await_args_list
+        assert len(calls) == 3
+        prefixes = {str(call.kwargs["messages"][:2]) for call in calls}
+        assert len(prefixes) == 1
+        assert calls[0].kwargs["messages"][1]["content"] == "Patient reports a headache."
+        assert [results[i]["summary_type"] for i in range(3)] == ["brief", "detailed", "action_points"]
+        assert "concise" in results[0]["summary"]
+        assert "comprehensive" in results[1]["summary"]
+
+    @pytest.mark.asyncio
+    async def test_cacheable_prefix_is_primed_by_the_first_variant(self):
+        mock_client = self._client()
+        with patch("app.services.openai_service.get_client", return_value=mock_client), \
+                patch.object(openai_service, "PREFIX_CACHE_MIN_TOKENS", 1):
+            results = await self._collect("Patient reports a headache.")
+
+        calls = mock_client.chat.completions.create.await_args_list
+        assert calls[0].kwargs.get("stream") is True
+        assert "concise" in calls[0].kwargs["messages"][-1]["content"]
+        assert not any(call.kwargs.get("stream") for call in calls[1:])
+        assert all("summary" in result for result in results.values())
+
+    @pytest.mark.asyncio
+    async def test_failed_variant_does_not_fail_the_others(self):
+        mock_client = self._client(fail_on="comprehensive")
+        with patch("app.services.openai_service.get_client", return_value=mock_client):
+            results = await self._collect("Patient reports a headache.")
+
+        assert results[1]["error"] == "provider error"
+        assert "summary" in results[0] and "summary" in results[2]
+
+    @pytest.mark.asyncio
+    async def test_long_document_is_condensed_once(self):
+        mock_client = self._client()
+        text = "\n".join(f"Patient: Line {i} describing the symptoms in detail." for i in range(100))
+        with patch("app.services.openai_service.get_client", return_value=mock_client), \
+                patch.object(openai_service, "LONG_DOC_THRESHOLD_TOKENS", 200), \
+                patch.object(openai_service, "CHUNK_TOKENS", 100), \
+                patch.object(openai_service, "CHUNK_OVERLAP_TOKENS", 10):
+            await self._collect(text)
+
+        calls = mock_client.chat.completions.create.await_args_list
+        final_calls = [call for call in calls if len(call.kwargs["messages"]) == 3]
+        map_calls = [call for call in calls if len(call.kwargs["messages"]) == 2]
+        assert len(final_calls) == 3
+        assert len(map_calls) == len(set(str(call.kwargs["messages"]) for call in map_calls))
+
+
+# ---------------------------------------------------------------------------
+# history_service.py
+# ---------------------------------------------------------------------------
+
+class TestHistoryService:
+    @pytest.mark.asyncio
+    async def test_bulk_upsert_batches_writes(self):
+        collection = MagicMock()
+        collection.bulk_write = AsyncMock(return_value=MagicMock(upserted_count=2, modified_count=1))
+        transcripts = MagicMock()
+        transcripts.bulk_write = AsyncMock()
+        db = {"summaries": collection, "transcripts": transcripts}
+        items = [{"input_text": f"Transcript {i}", "summary": f"S{i}"} for i in range(5)]
+
+        with patch("app.services.history_service.get_db", return_value=db), \
+                patch.object(history_service, "BULK_WRITE_BATCH_SIZE", 2):
+            written = await history_service.bulk_upsert_summaries("dev-1", items)
+
+        assert collection.bulk_write.await_count == 3
+        assert transcripts.bulk_write.await_count == 3
+        assert written == 9
+        first_op = collection.bulk_write.await_args_list[0].args[0][0]
+        assert first_op._filter == {
+            "device_id": "dev-1",
+            "input_hash": history_service.hash_input("Transcript 0"),
+            "deleted_at": None,
+        }
+        assert first_op._upsert is True
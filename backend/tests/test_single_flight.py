@@ -0,0 +1,165 @@
+"""
+Tests for request coalescing: the SingleFlight primitive, and the summarize
+and translate paths built on it.
+"""
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app.services import openai_service, translate_service
+from app.services.single_flight import SingleFlight
+
+
+async def _settle():
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+
+# ---------------------------------------------------------------------------
+# SingleFlight
+# ---------------------------------------------------------------------------
+
+class TestSingleFlight:
+    async def test_concurrent_callers_share_one_call(self):
+        flights = SingleFlight()
+        calls = 0
+
+        async def call():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return "result"
+
+        results = await asyncio.gather(*(flights.do("key", call) for _ in range(5)))
+
+        assert results == ["result"] * 5
+        assert calls == 1
+        assert flights.stats() == {"in_flight": 0, "leaders": 1, "coalesced": 4, "failures": 0, "abandoned": 0}
+
+    async def test_different_keys_and_later_calls_run_separately(self):
+        flights = SingleFlight()
+        call = AsyncMock(return_value="result")
+
+        await asyncio.gather(flights.do("a", call), flights.do("b", call))
+        await flights.do("a", call)
+
+        assert call.await_count == 3
+        assert flights.coalesced == 0
+
+    async def test_failure_reaches_every_waiter_and_is_not_remembered(self):
+        flights = SingleFlight()
+        release = asyncio.Event()
+
+        async def failing():
+            await release.wait()
+            raise RuntimeError("upstream down")
+
+        waiters = [asyncio.create_task(flights.do("key", failing)) for _ in range(3)]
+        await _settle()
+        release.set()
+        results = await asyncio.gather(*waiters, return_exceptions=True)
+
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert flights.failures == 1
+        assert await flights.do("key", AsyncMock(return_value="recovered")) == "recovered"
+
+    async def test_leader_disconnecting_does_not_cancel_followers(self):
+        flights = SingleFlight()
+        release = asyncio.Event()
+        finished = False
+
+        async def call():
+            nonlocal finished
+            await release.wait()
+            finished = True
+            return "result"
+
+        leader = asyncio.create_task(flights.do("key", call))
+        await _settle()
+        follower = asyncio.create_task(flights.do("key", call))
+        await _settle()
+
+        leader.cancel()
+        await _settle()
+        release.set()
+
+        assert await follower == "result"
+        assert leader.cancelled()
+        assert finished
+        assert flights.abandoned == 0
+
+    async def test_call_is_cancelled_once_every_waiter_has_gone(self):
+        flights = SingleFlight()
+        cancelled = asyncio.Event()
+
+        async def call():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        waiters = [asyncio.create_task(flights.do("key", call)) for _ in range(2)]
+        await _settle()
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        await _settle()
+
+        assert cancelled.is_set()
+        assert flights.abandoned == 1
+        assert len(flights) == 0
+
+
+# ---------------------------------------------------------------------------
+# Summarize and translate
+# ---------------------------------------------------------------------------
+
+class TestCoalescedServices:
+    async def test_identical_summaries_share_one_completion(self):
+        release = asyncio.Event()
+
+        async def create(**kwargs):
+            await release.wait()
+            response = MagicMock()
+            response.choices[0].message.content = "Shared summary."
+            return response
+
+        mock_client = MagicMock()
+        mock_client.chat.completions.create = AsyncMock(side_effect=create)
+
+        with patch("app.services.openai_service.get_client", return_value=mock_client):
+            requests = [
+                asyncio.create_task(openai_service.summarize("Same transcript.", "brief", "paragraph", "professional"))
+                for _ in range(4)
+            ]
+            other = asyncio.create_task(openai_service.summarize("Same transcript.", "detailed", "paragraph", "professional"))
+            await _settle()
+            release.set()
+            results = await asyncio.gather(*requests, other)
+
+        assert results == ["Shared summary."] * 5
+        assert mock_client.chat.completions.create.await_count == 2
+        assert openai_service.flights.coalesced == 3
+
+    async def test_identical_translations_share_one_call(self):
+        with patch("app.services.translate_service.GoogleTranslator") as MockTranslator:
+            instance = MockTranslator.return_value
+            instance.translate.side_effect = lambda text: f"[{text}]"
+
+            results = await asyncio.gather(*(translate_service.translate("Summary.", "fi") for _ in range(3)))
+
+        assert results == ["[Summary.]"] * 3
+        assert instance.translate.call_count == 1
+        assert translate_service.flights.stats()["coalesced"] == 2
+
+    async def test_translation_failure_reaches_every_request(self):
+        with patch("app.services.translate_service.GoogleTranslator") as MockTranslator:
+            MockTranslator.return_value.translate.side_effect = Exception("Network error")
+
+            results = await asyncio.gather(
+                *(translate_service.translate("Summary.", "fi") for _ in range(3)), return_exceptions=True
+            )
+
+        assert [str(r) for r in results] == ["Network error"] * 3
+        assert translate_service.flights.failures == 1
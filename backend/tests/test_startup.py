@@ -0,0 +1,60 @@
+"""
+Cold-start regression tests: what importing the app loads, and budgets for
+import time and time to the first successful request, measured in fresh
+processes by benchmarks/bench_startup.
+"""
+import shlex
+
+from app.settings import Settings
+from benchmarks import bench_startup
+
+# About three times what a developer laptop measures, so only a real
+# regression (an SDK imported eagerly again, a slow warm-up step) fails them.
+IMPORT_BUDGET_S = 5.0
+FIRST_REQUEST_BUDGET_S = 10.0
+
+
+def test_settings_from_env(monkeypatch):
+    monkeypatch.setenv("MONGODB_URI", "")
+    monkeypatch.setenv("FRONTEND_URL", "https://example.org/")
+    monkeypatch.setenv("TRANSLATE_WARM_LANGUAGES", "en, fi,,sv")
+    monkeypatch.setenv("READY_CHECK_TIMEOUT", "0.5")
+    monkeypatch.setenv("LLM_MODEL_BY_SUMMARY_TYPE", "brief=small, detailed=large,junk")
+    monkeypatch.setenv("VARIANT_PRIME_PREFIX", "off")
+    monkeypatch.setenv("ADMISSION_MAX_RETRIES", "1")
+
+    settings = Settings.from_env()
+
+    assert settings.mongodb_uri is None
+    assert settings.frontend_url == "https://example.org"
+    assert settings.translate_warm_languages == ["en", "fi", "sv"]
+    assert settings.ready_check_timeout == 0.5
+    assert settings.llm_model_by_summary_type == {"brief": "small", "detailed": "large"}
+    assert settings.variant_prime_prefix is False
+    assert settings.admission_max_retries == 1
+    assert settings.batch_max_items == 500
+
+
+def test_import_skips_sdks_the_configuration_does_not_use(tmp_path):
+    env = bench_startup.offline_env(str(tmp_path), TRANSLATE_WARM_LANGUAGES="")
+    modules = set(bench_startup.import_profile(env)["modules"])
+    assert not modules & {"motor", "deep_translator"}
+
+
+def test_import_preloads_the_configured_sdks(tmp_path):
+    env = bench_startup.offline_env(str(tmp_path), HISTORY_BACKEND="mongo", MONGODB_URI="mongodb://127.0.0.1:1")
+    modules = set(bench_startup.import_profile(env)["modules"])
+    assert {"motor.motor_asyncio", "deep_translator"} <= modules
+
+
+def test_import_time_budget(tmp_path):
+    profile = bench_startup.import_profile(bench_startup.offline_env(str(tmp_path)))
+    assert profile["import_s"] < IMPORT_BUDGET_S, profile["slowest"]
+
+
+def test_startup_command_preloads_the_app():
+    assert "--preload" in shlex.split(bench_startup.STARTUP_COMMAND)
+
+
+def test_time_to_first_request_budget():
+    assert bench_startup.time_to_first_request(workers=2, preload=True) < FIRST_REQUEST_BUDGET_S
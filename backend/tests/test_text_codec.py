@@ -0,0 +1,29 @@
+"""
+Tests for the compressed text encoding used for stored transcripts.
+"""
+from unittest.mock import patch
+
+from bson import Binary
+
+from app.services import text_codec
+
+
+def test_large_text_round_trips_compressed():
+    text = "Patient: The headache is worse in the mornings. Köpfe, 頭痛.\n" * 100
+    encoded = text_codec.encode(text)
+
+    assert isinstance(encoded, Binary) and encoded.subtype == text_codec.ZLIB_SUBTYPE
+    assert text_codec.stored_size(encoded) < len(text.encode("utf-8")) // 10
+    assert text_codec.decode(encoded) == text
+
+
+def test_short_or_incompressible_text_stays_a_string():
+    assert text_codec.encode("Short note.") == "Short note."
+    with patch.object(text_codec, "COMPRESS_MIN_BYTES", 0):
+        # zlib's header alone outweighs this
+        assert text_codec.encode("ok") == "ok"
+
+
+def test_decode_passes_plain_values_through():
+    assert text_codec.decode("Inline transcript.") == "Inline transcript."
+    assert text_codec.decode(None) is None
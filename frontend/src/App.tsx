@@ -7,7 +7,7 @@ import SummaryTypeTabs from './components/SummaryTypeTabs';
 import HistoryList from './components/HistoryList';
 import api from './services/api';
 import historyApi from './services/historyApi';
-import type { HistoryItem } from './services/historyApi';
+import type { HistoryListItem } from './services/historyApi';
 import { useDeviceId } from './hooks/useDeviceId';
 import { Loader2, Copy, Paperclip, RotateCcw, Eraser, Menu, X, Activity } from "lucide-react";
 import { Card, CardContent, CardTitle, CardHeader, CardFooter } from "./components/ui/card";
@@ -26,10 +26,10 @@ function App() {
   const [isRegenerating, setIsRegenerating] = useState(false);
   const [error, setError] = useState<string | null>(null);
   const [copied, setCopied] = useState(false);
-  const [history, setHistory] = useState<HistoryItem[]>([]);
+  const [history, setHistory] = useState<HistoryListItem[]>([]);
   const [currentHistoryId, setCurrentHistoryId] = useState<string | null>(null);
   const [hasMore, setHasMore] = useState(false);
-  const [historySkip, setHistorySkip] = useState(0);
+  const [historyCursor, setHistoryCursor] = useState<string | null>(null);
   const [isSidebarOpen, setIsSidebarOpen] = useState(false);
   const fileInputRef = useRef<HTMLInputElement>(null);
 
@@ -65,11 +65,11 @@ function App() {
   // Fetch history when deviceId is available
   useEffect(() => {
     if (!deviceId) return;
-    historyApi.getHistory(deviceId, 0)
-      .then(({ items, has_more }) => {
+    historyApi.getHistory(deviceId)
+      .then(({ items, has_more, next_cursor }) => {
         setHistory(items);
         setHasMore(has_more);
-        setHistorySkip(items.length);
+        setHistoryCursor(next_cursor);
       })
       .catch(() => { });
   }, [deviceId]);
@@ -78,21 +78,21 @@ function App() {
   const fetchHistory = async () => {
     if (!deviceId) return;
     try {
-      const { items, has_more } = await historyApi.getHistory(deviceId, 0);
+      const { items, has_more, next_cursor } = await historyApi.getHistory(deviceId);
       setHistory(items);
       setHasMore(has_more);
-      setHistorySkip(items.length);
+      setHistoryCursor(next_cursor);
     } catch { }
   };
 
   // Append next page (called by infinite scroll)
   const loadMoreHistory = async () => {
-    if (!deviceId || !hasMore) return;
+    if (!deviceId || !hasMore || !historyCursor) return;
     try {
-      const { items, has_more } = await historyApi.getHistory(deviceId, historySkip);
+      const { items, has_more, next_cursor } = await historyApi.getHistory(deviceId, historyCursor);
       setHistory((prev) => [...prev, ...items]);
       setHasMore(has_more);
-      setHistorySkip((prev) => prev + items.length);
+      setHistoryCursor(next_cursor);
     } catch { }
   };
 
@@ -124,7 +124,8 @@ function App() {
     localStorage.removeItem('last_input_text');
   };
 
-  const handleSelectHistory = (item: HistoryItem) => {
+  const handleSelectHistory = async (listItem: HistoryListItem) => {
+    if (!deviceId) return;
     // If there's a summary currently in the UI, save it before switching
     if (originalSummary && deviceId) {
       historyApi.saveHistory(deviceId, {
@@ -137,6 +138,14 @@ function App() {
         language: selectedLanguage || 'original',
       }).then(fetchHistory).catch(() => { });
     }
+    // List items only carry titles; fetch the full summary before showing it
+    let item;
+    try {
+      item = await historyApi.loadSummary(deviceId, listItem.id);
+    } catch {
+      setError('Could not load this summary.');
+      return;
+    }
     // Load the clicked history item into the UI
     setInputText(item.input_text);
     setOriginalSummary(item.summary);
@@ -184,17 +193,17 @@ function App() {
     setCurrentHistoryId(null);
 
     try {
-      const result = await api.summarize(inputText, {
-        style,
-        tonality,
-        summary_type: summaryType
-      });
-      setOriginalSummary(result.summary);
-      setDisplayedSummary(result.summary);
+      const summary = await api.summarizeStream(
+        inputText,
+        { style, tonality, summary_type: summaryType },
+        setDisplayedSummary,
+      );
+      setOriginalSummary(summary);
+      setDisplayedSummary(summary);
       // Summary stays in localStorage only — DB save happens on "New summary" click
     } catch (err: any) {
       console.error(err);
-      setError(err.response?.data?.error || 'Failed to summarize text.');
+      setError(err.response?.data?.detail || 'Failed to summarize text.');
     } finally {
       setIsGenerating(false);
     }
@@ -214,7 +223,8 @@ function App() {
       const result = await api.summarize(textToSummarize, {
         style,
         tonality,
-        summary_type: summaryType
+        summary_type: summaryType,
+        bypass_cache: true
       });
       setOriginalSummary(result.summary);
 
@@ -235,7 +245,7 @@ function App() {
       }
     } catch (err: any) {
       console.error(err);
-      setError(err.response?.data?.error || 'Failed to regenerate summary.');
+      setError(err.response?.data?.detail || 'Failed to regenerate summary.');
     } finally {
       setIsRegenerating(false);
     }
@@ -299,7 +309,7 @@ function App() {
       setInputText(result.text);
     } catch (err: any) {
       console.error(err);
-      setError(err.response?.data?.error || 'Failed to upload file.');
+      setError(err.response?.data?.detail || 'Failed to upload file.');
     } finally {
       setIsGenerating(false);
     }
@@ -6,6 +6,8 @@ interface FileUploadProps {
     isLoading: boolean;
 }
 
+const SUPPORTED_EXTENSIONS = ['.txt', '.vtt', '.srt', '.docx', '.pdf', '.json'];
+
 const FileUpload = ({ onUpload, isLoading }: FileUploadProps) => {
     const fileInputRef = useRef<HTMLInputElement>(null);
 
@@ -13,8 +15,9 @@ const FileUpload = ({ onUpload, isLoading }: FileUploadProps) => {
         const file = e.target.files?.[0];
         if (!file) return;
 
-        if (!file.name.endsWith('.txt')) {
-            alert('Please upload a .txt file.');
+        const name = file.name.toLowerCase();
+        if (!SUPPORTED_EXTENSIONS.some((ext) => name.endsWith(ext))) {
+            alert(`Please upload one of: ${SUPPORTED_EXTENSIONS.join(', ')}`);
             return;
         }
 
@@ -32,7 +35,7 @@ const FileUpload = ({ onUpload, isLoading }: FileUploadProps) => {
         >
             <input
                 type="file"
-                accept=".txt"
+                accept={SUPPORTED_EXTENSIONS.join(',')}
                 onChange={handleFileChange}
                 disabled={isLoading}
                 ref={fileInputRef}
@@ -47,7 +50,7 @@ const FileUpload = ({ onUpload, isLoading }: FileUploadProps) => {
             {/* Text Wrap */}
             <div className="flex-1 min-w-0">
                 <div className="text-[13px] font-semibold text-text">Drop a file or click to upload</div>
-                <div className="text-[11px] text-muted-foreground font-mono mt-[1px]">.txt files only</div>
+                <div className="text-[11px] text-muted-foreground font-mono mt-[1px]">.txt, .docx, .pdf, .srt, .vtt, .json</div>
             </div>
 
             {/* Browse Button */}
@@ -1,11 +1,11 @@
 import { useState, useRef, useEffect } from 'react';
 import { Trash2 } from 'lucide-react';
-import type { HistoryItem } from '../services/historyApi';
+import type { HistoryListItem } from '../services/historyApi';
 import ConfirmDialog from './ConfirmDialog';
 
 interface HistoryListProps {
-    items: HistoryItem[];
-    onSelect: (item: HistoryItem) => void;
+    items: HistoryListItem[];
+    onSelect: (item: HistoryListItem) => void;
     onDelete: (id: string) => void;
     activeId: string | null;
     hasMore: boolean;
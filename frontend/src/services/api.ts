@@ -8,6 +8,14 @@ export interface SummarizeOptions {
     summary_type?: string;
     style?: string;
     tonality?: string;
+    bypass_cache?: boolean;
+    /** Trim filler from the transcript before summarizing: a token budget, or a fraction of its size. */
+    compression?: { max_tokens?: number; ratio?: number };
+    /**
+     * Summarize only what changed since the closest earlier history entry of the
+     * device (sent as X-Device-Id). The response's incremental.parent_id links the new entry to it.
+     */
+    incremental?: boolean;
 }
 
 export const summarize = async (text: string, options: SummarizeOptions = {}) => {
@@ -18,6 +26,53 @@ export const summarize = async (text: string, options: SummarizeOptions = {}) =>
     return response.data;
 };
 
+/**
+ * Streams a summary from the server-sent events endpoint, calling onUpdate with
+ * the text received so far. Resolves with the complete summary.
+ */
+export const summarizeStream = async (
+    text: string,
+    options: SummarizeOptions = {},
+    onUpdate: (partial: string) => void = () => {},
+): Promise<string> => {
+    const response = await fetch(`${api.defaults.baseURL}/summarize/stream`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ text, ...options }),
+    });
+    if (!response.ok || !response.body) {
+        throw new Error(`Summarize stream failed with status ${response.status}`);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let summary = '';
+    for (;;) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const rawEvent = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            let event = 'message';
+            let data = '';
+            for (const line of rawEvent.split('\n')) {
+                if (line.startsWith('event: ')) event = line.slice(7);
+                else if (line.startsWith('data: ')) data += line.slice(6);
+            }
+            const payload = JSON.parse(data);
+            if (event === 'error') throw new Error(payload.error);
+            if (event === 'message') {
+                summary += payload.delta;
+                onUpdate(summary);
+            }
+        }
+    }
+    return summary;
+};
+
 export const translate = async (text: string, targetLanguage: string) => {
     const response = await api.post('/translate', {
         text,
@@ -39,6 +94,7 @@ export const uploadFile = async (file: File) => {
 
 export default {
     summarize,
+    summarizeStream,
     translate,
     uploadFile,
 };
@@ -4,17 +4,46 @@ const api = axios.create({
     baseURL: import.meta.env.VITE_API_URL || '/api',
 });
 
-export interface HistoryItem {
+export interface HistoryListItem {
     id: string;
     title: string;
-    input_text: string;
-    summary: string;
-    translated_summary: string | null;
     summary_type: string;
     style: string;
     tonality: string;
     language: string;
     created_at: string;
+    updated_at: string;
+}
+
+export interface HistoryItem extends HistoryListItem {
+    input_text: string;
+    summary: string;
+    translated_summary: string | null;
+    parent_id?: string;
+}
+
+export interface HistoryPage {
+    items: HistoryListItem[];
+    has_more: boolean;
+    next_cursor: string | null;
+}
+
+export interface SearchSnippet {
+    field: 'summary' | 'translated_summary' | 'title';
+    text: string;
+    // [start, end) offsets of matched words within text
+    highlights: [number, number][];
+}
+
+export interface HistorySearchItem extends HistoryListItem {
+    score: number;
+    snippet: SearchSnippet | null;
+}
+
+export interface HistorySearchPage {
+    items: HistorySearchItem[];
+    has_more: boolean;
+    next_cursor: string | null;
 }
 
 export interface SaveHistoryPayload {
@@ -25,6 +54,7 @@ export interface SaveHistoryPayload {
     style?: string;
     tonality?: string;
     language?: string;
+    parent_id?: string | null;
 }
 
 function getHeaders(deviceId: string) {
@@ -43,12 +73,25 @@ export const saveHistory = async (
 
 export const getHistory = async (
     deviceId: string,
-    skip = 0,
+    cursor: string | null = null,
     limit = 10,
-): Promise<{ items: HistoryItem[]; has_more: boolean }> => {
+): Promise<HistoryPage> => {
     const response = await api.get('/history', {
         headers: getHeaders(deviceId),
-        params: { skip, limit },
+        params: cursor ? { cursor, limit } : { limit },
+    });
+    return response.data;
+};
+
+export const searchHistory = async (
+    deviceId: string,
+    query: string,
+    cursor: string | null = null,
+    limit = 10,
+): Promise<HistorySearchPage> => {
+    const response = await api.get('/history/search', {
+        headers: getHeaders(deviceId),
+        params: cursor ? { q: query, cursor, limit } : { q: query, limit },
     });
     return response.data;
 };
@@ -72,4 +115,35 @@ export const deleteSummary = async (
     });
 };
 
+export type HistoryExportFormat = 'ndjson' | 'csv';
+
+export interface HistoryImportResult {
+    received: number;
+    written: number;
+    errors: { line: number; error: string }[];
+}
+
+export const exportHistory = async (
+    deviceId: string,
+    format: HistoryExportFormat = 'ndjson',
+    gzip = false,
+): Promise<Blob> => {
+    const response = await api.get('/history/export', {
+        headers: getHeaders(deviceId),
+        params: { format, gzip },
+        responseType: 'blob',
+    });
+    return response.data;
+};
+
+export const importHistory = async (
+    deviceId: string,
+    ndjson: Blob,
+): Promise<HistoryImportResult> => {
+    const response = await api.post('/history/import', ndjson, {
+        headers: { ...getHeaders(deviceId), 'Content-Type': 'application/x-ndjson' },
+    });
+    return response.data;
+};
+
 export default { saveHistory, getHistory, loadSummary, deleteSummary };